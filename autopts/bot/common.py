@@ -106,6 +106,10 @@ class BotConfigArgs(Namespace):
         self.bd_addr = args.get('bd_addr', '')
         self.enable_max_logs = args.get('enable_max_logs', False)
         self.retry = args.get('retry', 0)
+        self.adaptive_retry = args.get('adaptive_retry', False)
+        self.pipeline = args.get('pipeline', False)
+        self.memory_profile = args.get('memory_profile', 0)
+        self.memory_leak_threshold = args.get('memory_leak_threshold', 50.0)
         self.repeat_until_fail = args.get('repeat_until_fail', False)
         self.stress_test = args.get('stress_test', False)
         self.ykush = args.get('ykush', None)
@@ -119,6 +123,7 @@ class BotConfigArgs(Namespace):
         self.simple_mode = args.get('simple_mode', False)
         self.server_args = args.get('server_args', None)
         self.pylink_reset = args.get('pylink_reset', False)
+        self.btp_session = args.get('btp_session', False)
         self.max_server_restart_time = args.get('max_server_restart_time', MAX_SERVER_RESTART_TIME)
         self.use_backup = args.get('use_backup', False)
         self.no_build = args.get('no_build', False)
@@ -212,9 +217,14 @@ class BotClient(Client):
         # Skip already completed configs
         config_index = run_order.index(continue_config)
         if continue_test_case:
-            # Skip already completed test cases and the faulty one
-            tc_index = test_cases_per_config[continue_config].index(continue_test_case)
-            test_cases_per_config[continue_config] = test_cases_per_config[continue_config][tc_index + 1:]
+            # Skip already completed test cases and the faulty one. They are
+            # looked up by name, as the run order may differ from the listed
+            # one, e.g. the quarantined flaky test cases are run last.
+            completed = set(self.backup['tc_stats'].get_results())
+            completed.add(continue_test_case)
+            test_cases_per_config[continue_config] = [
+                test_case for test_case in test_cases_per_config[continue_config]
+                if test_case not in completed]
             self.backup['tc_stats'].index += 1
             self.backup['tc_stats'].update(continue_test_case, 0, 'TIMEOUT')
 
@@ -20,11 +20,13 @@
 import copy
 import datetime
 import errno
+import functools
 import json
 import logging
 import os
 import queue
 import random
+import re
 import shutil
 import signal
 import socket
@@ -44,12 +46,17 @@ from autopts.ptsprojects import ptstypes
 from autopts.ptsprojects import stack
 from autopts.ptsprojects.boards import get_available_boards, tty_to_com
 from autopts.ptsprojects.ptstypes import E_FATAL_ERROR
-from autopts.ptsprojects.testcase import PTSCallback, TestCaseLT1, TestCaseLT2, TestCaseLT3
+from autopts.ptsprojects.testcase import SETTLE_DOWN_TIME, PTSCallback, TestCaseRegistry
 from autopts.ptsprojects.testcase_db import TestCaseTable
 from autopts.pybtp import btp, defs
 from autopts.pybtp.types import BTPError, SynchError, MissingWIDError
-from autopts.utils import InterruptableThread, ResultWithFlag, CounterWithFlag, set_global_end, \
+from autopts.memory_profiler import MEMORY_TIMELINE_FILE, MemoryProfiler
+from autopts.retry_policy import RetryPolicy
+from autopts.sharding import LocalShard, RemoteShard, ShardScheduler, get_durations, get_shard_authkey, \
+    parse_address, run_stations
+from autopts.utils import DEADLINE_SCHEDULER, InterruptableThread, ResultWithFlag, CounterWithFlag, WakeUp, set_global_end, \
     raise_on_global_end, RunEnd, get_global_end, have_admin_rights, ykush_replug_usb, active_hub_server_replug_usb
+from autopts.wid.wid import get_test_case_wid_table
 from cliparser import CliParser
 
 log = logging.debug
@@ -59,6 +66,9 @@ RUNNING_TEST_CASE = {}
 autoprojects = None
 TEST_CASE_TIMEOUT_MS = 300000  # milliseconds
 
+# BTP events with the most handler time logged at the end of a run
+EVENT_STATS_TOP = 10
+
 # To test autopts client locally:
 # Envrinment variable AUTO_PTS_LOCAL must be set for FakeProxy to
 # be used. When FakeProxy is used autoptsserver on Windows will
@@ -183,11 +193,14 @@ class ClientCallback(PTSCallback):
     def __init__(self):
         super().__init__()
         self.exception = queue.Queue()
+        # Shared by the async results and the steps queue of a running
+        # test case, so a WID or a verdict wakes up the LT thread at once.
+        self.wakeup = WakeUp()
         self._results = {}
         self._callbacks = {}
         # Long methods run asynchronously
         for method in ['start_pts', 'restart_pts', 'recover_pts', 'run_test_case']:
-            self._results[method] = ResultWithFlag()
+            self._results[method] = ResultWithFlag(wakeup=self.wakeup)
             self._callbacks[method] = None
 
     def error_code(self):
@@ -322,9 +335,10 @@ class ClientCallback(PTSCallback):
         # Reinit everything in case a KeyboardInterrupt exception triggered
         # by a superguard timeout breaks the lock states.
         self.exception = queue.Queue()
+        self.wakeup = WakeUp()
 
         for key in self._results:
-            self._results[key] = ResultWithFlag()
+            self._results[key] = ResultWithFlag(wakeup=self.wakeup)
 
 
 class ClientCallbackServer(threading.Thread):
@@ -577,6 +591,8 @@ class TestCaseRunStats:
         self.pending_test_case = None
         self.test_run_completed = False
         self.session_log_dir = None
+        # {phase: seconds} of the last test case run, set by run_test_case
+        self.last_phases = None
 
         if self.xml_results and not os.path.exists(self.xml_results):
             os.makedirs(dirname(self.xml_results), exist_ok=True)
@@ -605,15 +621,21 @@ class TestCaseRunStats:
             stats.__dict__.update(data)
             return stats
 
-    def merge(self, stats2):
-        self.num_test_cases = self.num_test_cases + stats2.num_test_cases
-        self.num_test_cases_width = max(self.num_test_cases_width, stats2.num_test_cases_width)
-        self.max_project_name = max(self.max_project_name, stats2.max_project_name)
-        self.max_test_case_name = max(self.max_test_case_name, stats2.max_test_case_name)
-        self.est_duration = self.est_duration + stats2.est_duration
-        self.pending_config = stats2.pending_config
-        self.pending_test_case = stats2.pending_test_case
-        self.session_log_dir = stats2.session_log_dir
+    def merge(self, stats2, results_only=False):
+        """Merge results of stats2.
+
+        results_only -- if True, only the test case results are merged,
+                        e.g. of stats of a part of the same test run
+        """
+        if not results_only:
+            self.num_test_cases = self.num_test_cases + stats2.num_test_cases
+            self.num_test_cases_width = max(self.num_test_cases_width, stats2.num_test_cases_width)
+            self.max_project_name = max(self.max_project_name, stats2.max_project_name)
+            self.max_test_case_name = max(self.max_test_case_name, stats2.max_test_case_name)
+            self.est_duration = self.est_duration + stats2.est_duration
+            self.pending_config = stats2.pending_config
+            self.pending_test_case = stats2.pending_test_case
+            self.session_log_dir = stats2.session_log_dir
 
         stats2_tree = ElementTree.parse(stats2.xml_results)
         root2 = stats2_tree.getroot()
@@ -623,7 +645,19 @@ class TestCaseRunStats:
         root1.extend(root2)
         self_tree.write(self.xml_results)
 
-    def update(self, test_case_name, duration, status, description='', test_start_time=None, test_end_time=None):
+    def remove(self, test_case_name):
+        """Remove the results of the test case, e.g. requeued to another
+        station"""
+        tree = ElementTree.parse(self.xml_results)
+        root = tree.getroot()
+
+        elem = root.find("./test_case[@name='%s']" % test_case_name)
+        if elem is not None:
+            root.remove(elem)
+            tree.write(self.xml_results)
+
+    def update(self, test_case_name, duration, status, description='', test_start_time=None, test_end_time=None,
+               phases=None):
         tree = ElementTree.parse(self.xml_results)
         root = tree.getroot()
 
@@ -666,10 +700,76 @@ class TestCaseRunStats:
         elem.attrib["progress"] = str(progress)
         elem.attrib["run_count"] = str(run_count + 1)
 
+        if phases:
+            self._add_phases(elem, phases)
+
         tree.write(self.xml_results)
 
         return regression, progress
 
+    @staticmethod
+    def _add_phases(elem, phases):
+        """Adds {phase: seconds} to the phase timing of the test case
+        element, summed over its runs"""
+        phase_elems = {phase_elem.attrib["name"]: phase_elem
+                       for phase_elem in elem.findall("./phase")}
+
+        for phase, seconds in phases.items():
+            phase_elem = phase_elems.get(phase)
+            if phase_elem is None:
+                phase_elem = ElementTree.SubElement(elem, 'phase')
+                phase_elem.attrib["name"] = phase
+                phase_elem.attrib["duration"] = '0'
+                phase_elem.attrib["count"] = '0'
+
+            phase_elem.attrib["duration"] = str(float(phase_elem.attrib["duration"]) + seconds)
+            phase_elem.attrib["count"] = str(int(phase_elem.attrib["count"]) + 1)
+
+    def update_phases(self, test_case_name, phases):
+        """Adds phase timing of a test case, e.g. of its recovery"""
+        tree = ElementTree.parse(self.xml_results)
+        root = tree.getroot()
+
+        elem = root.find("./test_case[@name='%s']" % test_case_name)
+        if elem is None:
+            return
+
+        self._add_phases(elem, phases)
+        tree.write(self.xml_results)
+
+    def get_phase_report(self):
+        """[(phase, seconds, count)] of the phases of all the test cases,
+        most time consuming first. WIDs are ranked per profile, e.g.
+        "GAP WID 104"."""
+        tree = ElementTree.parse(self.xml_results)
+        root = tree.getroot()
+
+        totals = {}
+        for tc_xml in root.findall("./test_case"):
+            for phase_xml in tc_xml.findall("./phase"):
+                phase = phase_xml.attrib["name"]
+                if phase.startswith('WID '):
+                    phase = f'{tc_xml.attrib["project"]} {phase}'
+
+                seconds, count = totals.get(phase, (0.0, 0))
+                totals[phase] = (seconds + float(phase_xml.attrib["duration"]),
+                                 count + int(phase_xml.attrib["count"]))
+
+        return sorted(((phase, seconds, count) for phase, (seconds, count) in totals.items()),
+                      key=lambda x: x[1], reverse=True)
+
+    def print_phase_report(self, top=20):
+        """Prints the most time consuming phases of the test run"""
+        report = self.get_phase_report()[:top]
+        if not report:
+            return
+
+        width = max(len(phase) for phase, _, _ in report)
+        print(f"\nPhase timing, top {len(report)}:\n")
+        print(f"{'Phase'.ljust(width)} {'Total [s]':>10} {'Count':>6} {'Mean [s]':>9}")
+        for phase, seconds, count in report:
+            print(f"{phase.ljust(width)} {seconds:10.1f} {count:6d} {seconds / count:9.3f}")
+
     def update_descriptions(self, descriptions):
         tree = ElementTree.parse(self.xml_results)
         root = tree.getroot()
@@ -837,6 +937,7 @@ def run_test_case_wrapper(func):
 
         start_dt_test = datetime.datetime.now()
         start_time = time.time()
+        stats.last_phases = None
         status = func(*args)
         duration = time.time() - start_time
         end_dt_test = datetime.datetime.now()
@@ -847,6 +948,7 @@ def run_test_case_wrapper(func):
             status,
             test_start_time=start_dt_test,
             test_end_time=end_dt_test,
+            phases=stats.last_phases,
         )
 
         retries_max = run_count_max - 1
@@ -996,27 +1098,32 @@ class LTThread(InterruptableThread):
 
         error_code = None
         pts.callback.cleanup()
+        test_case.steps_queue.wakeup = pts.callback.wakeup
 
         try:
             pts.callback._callbacks['run_test_case'] = self.set_test_case_result
             RUNNING_TEST_CASE[test_case.name] = test_case
             test_case.state = "PRE_RUN"
-            test_case.pre_run()
+            with test_case.timed('pre_run'):
+                test_case.pre_run()
             test_case.status = "RUNNING"
             test_case.state = "RUNNING"
             self.interrupt_lock.release()
             self.locked = False
 
-            if not synchronize_instances(test_case.state, ["FINISHED"], end_flag=finish_count):
-                raise SynchError
+            with test_case.timed('LT synchronization'):
+                if not synchronize_instances(test_case.state, ["FINISHED"], end_flag=finish_count):
+                    raise SynchError
 
-            result = pts.run_test_case(test_case.project_name, test_case.name)
+            with test_case.timed('PTS RunTestCase'):
+                result = pts.run_test_case(test_case.project_name, test_case.name)
             if result != "WAIT":
                 raise Exception(f"Failed to start the test case {test_case.name}")
 
             def wait_if_no_step():
                 return test_case.steps_queue.empty()
 
+            run_start_time = time.monotonic()
             try:
                 while not finish_count.is_set():
                     # Wait for the test case result
@@ -1056,6 +1163,8 @@ class LTThread(InterruptableThread):
                 pts.stop_test_case(test_case.project_name, test_case.name)
 
             finally:
+                # WIDs included
+                test_case.phase_times.append(('test run', time.monotonic() - run_start_time))
                 if not self.locked:
                     self.locked = self.interrupt_lock.acquire(blocking=False)
 
@@ -1090,9 +1199,15 @@ class LTThread(InterruptableThread):
             else:
                 synchronize_instances(test_case.state, end_flag=finish_count)
 
-            test_case.post_run(error_code)  # stop qemu and other commands
+            with test_case.timed('post_run'):
+                test_case.post_run(error_code)  # stop qemu and other commands
             del RUNNING_TEST_CASE[test_case.name]
 
+            if test_case.wid_latencies:
+                wid, latency = max(test_case.wid_latencies, key=lambda x: x[1])
+                log("WID dispatch latency: %d WIDs, max %.3f ms (WID %d)",
+                    len(test_case.wid_latencies), latency * 1000, wid)
+
             log("Done TestCase %s %s", self._run_test_case.__name__, test_case)
 
     def set_test_case_result(self, status):
@@ -1101,51 +1216,158 @@ class LTThread(InterruptableThread):
             self.cancel_sync_points()
 
 
-@run_test_case_wrapper
-def run_test_case(ptses, test_case_instances, test_case_name, stats,
-                  session_log_dir, exceptions, timeout):
-    def test_case_lookup_name(name, test_case_class):
-        """Return 'test_case_class' instance if found or None otherwise"""
-        if test_case_instances is None:
-            return None
+class PreparedTestCase:
+    """Test case instances of all the LTs and log file handler of a test
+    case ready to run, or the status of a test case that cannot run"""
 
-        for tc in test_case_instances:
-            if tc.name == name and isinstance(tc, test_case_class):
-                return tc
+    def __init__(self, test_case_lts=None, file_handler=None, status=None):
+        self.test_case_lts = test_case_lts
+        self.file_handler = file_handler
+        self.status = status
 
-        return None
+    def discard(self):
+        if self.file_handler:
+            self.file_handler.close()
 
-    logger = logging.getLogger()
 
+def prepare_test_case(ptses, test_case_instances, test_case_name,
+                      session_log_dir):
+    """Looks up the test case instances of all the LTs, which loads their
+    profile at the first lookup, and creates the log directory and log
+    file of the test case. The IUT is not touched.
+    """
     format_template = ("%(asctime)s %(threadName)s %(name)s %(levelname)s %(filename)-25s "
                        "%(lineno)-5s %(funcName)-25s : %(message)s")
-    formatter = logging.Formatter(format_template)
 
     # Lookup TestCase class instances
+    registry = TestCaseRegistry.from_instances(test_case_instances)
+
     test_case_lts = []
     tc_name = test_case_name
 
-    for i, tc_class in enumerate([TestCaseLT1, TestCaseLT2, TestCaseLT3], 2):
-        test_case_lt = test_case_lookup_name(tc_name, tc_class)
+    for lt in (1, 2, 3):
+        test_case_lt = registry.get(tc_name, lt) if registry is not None else None
         if test_case_lt is None:
             log(f'The {tc_name} test case enabled in workspace, but the profile not implemented!')
-            return 'NOT_IMPLEMENTED'
+            return PreparedTestCase(status='NOT_IMPLEMENTED')
 
-        test_case_lt.reset()
         test_case_lts.append(test_case_lt)
 
-        tc_name = getattr(test_case_lts[0], f'name_lt{i}', None)
+        tc_name = getattr(test_case_lts[0], f'name_lt{lt + 1}', None)
         if tc_name is None:
             break
 
-        if len(ptses) < i:
-            log(f'Not enough PTS instances configured. At least {i}'
+        if len(ptses) < lt + 1:
+            log(f'Not enough PTS instances configured. At least {lt + 1}'
                 f'instances are required for this test case!')
-            return f'LT{i}_NOT_AVAILABLE'
+            return PreparedTestCase(status=f'LT{lt + 1}_NOT_AVAILABLE')
 
     test_case_lts[0].initialize_logging(session_log_dir)
     file_handler = logging.FileHandler(test_case_lts[0].log_filename)
-    file_handler.setFormatter(formatter)
+    file_handler.setFormatter(logging.Formatter(format_template))
+
+    return PreparedTestCase(test_case_lts, file_handler)
+
+
+class TestCasePipeline:
+    """Prepares the next test case while the current one waits for the
+    device to settle down at the end of its post_run, so the setup of the
+    next test case, see prepare_test_case, is off the per test case
+    overhead.
+
+    Preparing loads the profile of the next test case at its first test
+    case, which builds the commands of its test cases and reads the test
+    case list from PTS. Neither PTS nor the IUT are used while settling
+    down, and post_run goes on only once the next test case is prepared,
+    which is the sync point before they are used again. The instance reset,
+    the pre_run and post_run commands of the test case and the recovery
+    stay in place.
+    """
+
+    def __init__(self, ptses, test_case_instances, session_log_dir):
+        self.ptses = ptses
+        self.test_case_instances = test_case_instances
+        self.session_log_dir = session_log_dir
+        # (test case name, PreparedTestCase or None, seconds)
+        self._next = None
+        self.prepared_count = 0
+        self.saved_time = 0.0
+
+    def prefetch(self, prepared, test_case_name):
+        """Prepares test_case_name while the prepared test case settles down"""
+        if prepared.test_case_lts:
+            prepared.test_case_lts[0].settle_down_task = \
+                functools.partial(self._prepare, test_case_name)
+
+    def _prepare(self, test_case_name):
+        self.close()
+        start_time = time.monotonic()
+        prepared = None
+        try:
+            prepared = prepare_test_case(self.ptses, self.test_case_instances,
+                                         test_case_name, self.session_log_dir)
+        except Exception as e:
+            # Prepared again in place, where the error is handled
+            logging.exception(e)
+
+        self._next = (test_case_name, prepared, time.monotonic() - start_time)
+
+    def get(self, test_case_name):
+        """The test case prepared ahead, or None to prepare it in place"""
+        if self._next is None:
+            return None
+
+        name, prepared, duration = self._next
+        self._next = None
+
+        if prepared is None or name != test_case_name:
+            if prepared:
+                prepared.discard()
+            return None
+
+        self.prepared_count += 1
+        # Setup longer than the settle down extends it
+        self.saved_time += min(duration, SETTLE_DOWN_TIME)
+
+        return prepared
+
+    def close(self):
+        """Discards the test case prepared but not run"""
+        if self._next is None:
+            return
+
+        _, prepared, _ = self._next
+        self._next = None
+        if prepared:
+            prepared.discard()
+
+    def print_summary(self):
+        if not self.prepared_count:
+            return
+
+        print(f'Pipelined setup: {self.prepared_count} test cases prepared '
+              f'while the former one settled down, '
+              f'{self.saved_time / self.prepared_count * 1000:.1f} ms '
+              f'of setup saved per test case')
+
+
+@run_test_case_wrapper
+def run_test_case(ptses, test_case_instances, test_case_name, stats,
+                  session_log_dir, exceptions, timeout, prepared=None):
+    logger = logging.getLogger()
+
+    if prepared is None:
+        prepared = prepare_test_case(ptses, test_case_instances,
+                                     test_case_name, session_log_dir)
+
+    if prepared.status:
+        return prepared.status
+
+    test_case_lts = prepared.test_case_lts
+    for test_case_lt in test_case_lts:
+        test_case_lt.reset()
+
+    file_handler = prepared.file_handler
     logger.addHandler(file_handler)
 
     # Multi-instance related stuff
@@ -1194,6 +1416,18 @@ def run_test_case(ptses, test_case_instances, test_case_name, stats,
             test_case_lts[0].status = 'SUPERGUARD TIMEOUT'
 
     logger.removeHandler(file_handler)
+    file_handler.close()
+
+    # The LTs run in parallel, so only the LT1 phases go to the results
+    stats.last_phases = test_case_lts[0].get_phase_times()
+
+    if stats.db:
+        # WIDs the test cases can receive, for check_wid_handlers
+        for test_case_lt in test_case_lts:
+            stats.db.update_wids(test_case_lt.name,
+                                 {wid for wid, _ in test_case_lt.wid_latencies})
+            stats.db.update_phases(test_case_lt.name,
+                                   test_case_lt.get_phase_times())
 
     for test_case_lt in test_case_lts:
         if test_case_lt.status != "PASS":
@@ -1252,7 +1486,11 @@ def get_test_cases(pts, test_cases, excluded):
 
 
 def run_test_cases(ptses, test_case_instances, args, stats, **kwargs):
-    """Runs a list of test cases"""
+    """Runs a list of test cases
+
+    The test cases are args.test_cases, or the test cases of the station
+    if a LocalShard or RemoteShard is passed as shard.
+    """
     session_log_dir = stats.session_log_dir
 
     if not session_log_dir:
@@ -1267,18 +1505,65 @@ def run_test_cases(ptses, test_case_instances, args, stats, **kwargs):
             if e.errno != errno.EEXIST:
                 raise
 
-    test_cases = args.test_cases
+    shard = kwargs.get('shard', None)
+    test_cases = args.test_cases if shard is None else shard
+    test_case_instances = TestCaseRegistry.from_instances(test_case_instances)
     retry_config = getattr(args, 'retry_config', None)
     repeat_until_failed = getattr(args, 'repeat_until_fail', False)
     pre_test_case_fn = kwargs.get('pre_test_case_fn', None)
     exceptions = queue.Queue()
 
+    retry_policy = None
+    if getattr(args, 'adaptive_retry', False) and stats.db and \
+            not args.stress_test and not repeat_until_failed:
+        retry_policy = RetryPolicy(stats.db)
+
+    def test_case_queue():
+        """Test cases to run, the quarantined flaky ones last"""
+        quarantined = []
+        for test_case in test_cases:
+            if retry_policy and retry_policy.is_quarantined(test_case):
+                quarantined.append(test_case)
+                continue
+
+            yield test_case
+
+        if quarantined:
+            print(f"Running {len(quarantined)} quarantined flaky test cases last")
+
+        yield from quarantined
+
+    test_case_queue = test_case_queue()
+
+    pipeline = None
+    if getattr(args, 'pipeline', False) and shard is None:
+        # The next test case is known only without sharding
+        test_case_queue = list(test_case_queue)
+        pipeline = TestCasePipeline(ptses, test_case_instances, session_log_dir)
+
+    if shard is None:
+        missing_wids = check_wid_handlers(test_case_instances, test_cases, stats.db)
+        if missing_wids:
+            print("Test cases that received WIDs without handlers in former runs:")
+            for tc_name, wids in missing_wids.items():
+                print(f"    {tc_name}: {', '.join(map(str, wids))}")
+
+    memory_profiler = None
+    if getattr(args, 'memory_profile', 0):
+        memory_profiler = MemoryProfiler(args.memory_profile, args.memory_leak_threshold,
+                                         os.path.join(session_log_dir, MEMORY_TIMELINE_FILE))
+        memory_profiler.start()
+
+    if not isinstance(shard, LocalShard):
+        # Stations run in this process share the event stats
+        btp.reset_event_stats()
+
     approx = ''
     if stats.est_duration:
         approx = f" in approximately: " + str(datetime.timedelta(seconds=stats.est_duration))
     print(f"Number of test cases to run: {stats.num_test_cases}{approx}")
 
-    for test_case in test_cases:
+    for index, test_case in enumerate(test_case_queue):
         stats.run_count = 0
         test_retry_count = None
 
@@ -1286,16 +1571,41 @@ def run_test_cases(ptses, test_case_instances, args, stats, **kwargs):
             if test_case in retry_config:
                 test_retry_count = retry_config[test_case]
 
+        if test_retry_count is not None:
+            retry_limit = test_retry_count
+        else:
+            retry_limit = args.retry
+            if retry_policy:
+                retry_limit = retry_policy.retry_limit(test_case, args.retry)
+
+        prepared = None
+        if pipeline:
+            prepared = pipeline.get(test_case) or \
+                prepare_test_case(ptses, test_case_instances, test_case,
+                                  session_log_dir)
+            if index + 1 < len(test_case_queue):
+                pipeline.prefetch(prepared, test_case_queue[index + 1])
+
         while True:
             if pre_test_case_fn:
                 pre_test_case_fn(test_case=test_case, stats=stats, **kwargs)
 
             status, duration = run_test_case(ptses, test_case_instances,
                                              test_case, stats, session_log_dir,
-                                             exceptions, args.superguard)
+                                             exceptions, args.superguard,
+                                             prepared)
+            # Retries are prepared in place
+            prepared = None
 
             raise_on_global_end()
 
+            if shard is not None and re.match(r'LT(\d)_NOT_AVAILABLE', status):
+                # Let a station with enough PTS instances run it, the
+                # result of that station is reported instead
+                shard.requeue(test_case, int(status[2]))
+                stats.remove(test_case)
+                break
+
             exeption_msg = ''
             while not exceptions.empty():
                 try:
@@ -1307,27 +1617,158 @@ def run_test_cases(ptses, test_case_instances, args, stats, **kwargs):
                     log(f'exception_msg: {exeption_msg}')
 
             if args.recovery and (exeption_msg != '' or status not in args.not_recover):
+                recovery_start_time = time.monotonic()
                 run_recovery(args, ptses)
+                phases = {'recovery': time.monotonic() - recovery_start_time}
+                stats.update_phases(test_case, phases)
+                if stats.db:
+                    stats.db.update_phases(test_case, phases)
 
-            if test_retry_count is not None:
-                retry_limit = test_retry_count
-            else:
-                retry_limit = args.retry
+            if retry_policy:
+                retry_policy.record(test_case, status, duration)
 
             if repeat_until_failed and status == 'PASS':
                 continue
 
             if (status in ('PASS', 'MISSING WID ERROR') and not args.stress_test) or \
-                    stats.run_count == retry_limit:
+                    stats.run_count >= retry_limit or \
+                    (retry_policy and
+                     retry_policy.give_up(test_case, status, retry_limit - stats.run_count)):
+                if retry_policy and status != 'PASS' and retry_limit < args.retry and \
+                        test_retry_count is None:
+                    retry_policy.skip(test_case, args.retry - retry_limit, duration)
+
                 if stats.db:
                     stats.db.update_statistics(test_case, duration, status)
 
+                if shard is not None:
+                    shard.report(test_case, status, duration, stats.run_count)
+
                 break
 
             stats.run_count += 1
 
         stats.index += 1
 
+        if memory_profiler:
+            memory_profiler.check(test_case)
+
+    stats.print_summary()
+    stats.print_phase_report()
+    if retry_policy:
+        retry_policy.print_summary()
+    if pipeline:
+        pipeline.close()
+        pipeline.print_summary()
+
+    if memory_profiler:
+        memory_profiler.stop()
+        memory_profiler.print_summary()
+
+    log("Deadline scheduler: %s", DEADLINE_SCHEDULER.stats())
+
+    event_stats = sorted(btp.get_event_stats().items(), key=lambda item: item[1][1], reverse=True)
+    log("BTP events (svc_id, op): (count, handler time), most time first: %s",
+        event_stats[:EVENT_STATS_TOP])
+
+    return stats
+
+
+def check_wid_handlers(test_case_instances, test_cases, db):
+    """Find WIDs the test cases received in their former runs, stored
+    in the test case database, that have no handler in the WID dispatch
+    table of the test case, so would end with MISSING WID ERROR.
+
+    Returns {test case name: sorted WIDs without handler}, including the
+    LT2 and LT3 test cases.
+    """
+    missing = {}
+    if not db or not test_case_instances:
+        return missing
+
+    for test_case_name in test_cases:
+        test_case = test_case_instances.get(test_case_name)
+        if test_case is None:
+            continue
+
+        tc_names = [test_case_name, getattr(test_case, 'name_lt2', None),
+                    getattr(test_case, 'name_lt3', None)]
+        for lt, tc_name in enumerate(tc_names, 1):
+            test_case_lt = test_case_instances.get(tc_name, lt) if tc_name else None
+            if test_case_lt is None:
+                break
+
+            table = get_test_case_wid_table(test_case_lt)
+            if table is None:
+                continue
+
+            wids = db.get_wids(tc_name).difference(table)
+            if wids:
+                missing[tc_name] = sorted(wids)
+
+    return missing
+
+
+def get_lt_count(test_case_instances, test_case_name):
+    """Number of lower testers, i.e. PTS instances, of the test case"""
+    tc = test_case_instances.get(test_case_name) if test_case_instances else None
+    if tc is None:
+        return 1
+
+    return 1 + sum(1 for i in (2, 3) if getattr(tc, f'name_lt{i}', None))
+
+
+def run_test_cases_sharded(stations, test_case_instances, args, stats, **kwargs):
+    """Runs a list of test cases on several stations at once
+
+    The test cases are sharded across the stations by ShardScheduler and
+    each station runs its shard on its own PTS instances in a thread. The
+    results of the stations are merged into stats.
+
+    As the BTP stack and IUT control are global to the process, this is
+    usable with stub IUTs only, stations with real IUTs run a client
+    process each (see autopts/sharding.py).
+    """
+    test_cases = args.test_cases
+    test_case_instances = TestCaseRegistry.from_instances(test_case_instances)
+    scheduler = ShardScheduler(
+        stations, test_cases, get_durations(stats.db, test_cases),
+        {tc: get_lt_count(test_case_instances, tc) for tc in test_cases})
+
+    results_file = stats.xml_results or FILE_PATHS['TC_STATS_RESULTS_XML_FILE']
+    results_base, ext = os.path.splitext(results_file)
+    session_log_dir = stats.session_log_dir
+
+    def run_station(station, shard):
+        station_results = f'{results_base}_{station.name}{ext}'
+        if os.path.exists(station_results):
+            os.remove(station_results)
+
+        station_stats = TestCaseRunStats([], list(scheduler.shards[station.name]),
+                                         args.retry, stats.db,
+                                         xml_results_file=station_results)
+        station_stats.session_log_dir = session_log_dir
+
+        return run_test_cases(station.ptses, test_case_instances, args,
+                              station_stats, shard=shard, **kwargs)
+
+    if not session_log_dir:
+        ports_str = '_'.join(str(x) for x in args.cli_port)
+        now = datetime.datetime.now().strftime("%Y_%m_%d_%H_%M_%S")
+        logs_folder = kwargs["file_paths"]["IUT_LOGS_DIR"]
+        session_log_dir = f'{logs_folder}/cli_port_{ports_str}/{now}'
+        stats.session_log_dir = session_log_dir
+        os.makedirs(session_log_dir, exist_ok=True)
+
+    for station_stats in run_stations(scheduler, run_station).values():
+        stats.merge(station_stats, results_only=True)
+
+    for test_case in scheduler.unschedulable:
+        stats.update(test_case, 0, f'LT{scheduler.lt_count(test_case)}_NOT_AVAILABLE')
+
+    log('Sharded run: %d test cases stolen, %d unschedulable',
+        scheduler.stolen, len(scheduler.unschedulable))
+
     stats.print_summary()
 
     return stats
@@ -1473,12 +1914,15 @@ class Client:
         build-flash-run routines, so multiple reinitialization could
         be skipped. See BotClient class in bot/common.py.
         """
+        projects = self.ptses[0].get_project_list()
+
+        if getattr(self.args, 'shard_server', None):
+            return self.run_shard(projects)
+
         self.args.test_cases = get_test_cases(self.ptses[0],
                                               self.args.test_cases,
                                               self.args.excluded)
 
-        projects = self.ptses[0].get_project_list()
-
         if os.path.exists(self.file_paths['TC_STATS_RESULTS_XML_FILE']):
             os.remove(self.file_paths['TC_STATS_RESULTS_XML_FILE'])
 
@@ -1489,6 +1933,30 @@ class Client:
         return run_test_cases(self.ptses, self.test_cases, self.args, stats,
                               file_paths=copy.deepcopy(self.file_paths))
 
+    def run_shard(self, projects):
+        """Runs the test cases of this station served by a ShardServer"""
+        shard = RemoteShard(parse_address(self.args.shard_server),
+                            self.args.shard_station, get_shard_authkey())
+
+        if os.path.exists(self.file_paths['TC_STATS_RESULTS_XML_FILE']):
+            os.remove(self.file_paths['TC_STATS_RESULTS_XML_FILE'])
+
+        try:
+            # Only the stations have the test case instances
+            shard.set_lt_counts(functools.partial(get_lt_count, self.test_cases))
+
+            stats = TestCaseRunStats(projects, [], self.args.retry,
+                                     self.test_case_database,
+                                     xml_results_file=self.file_paths['TC_STATS_RESULTS_XML_FILE'])
+            stats.num_test_cases = len(shard)
+            stats.num_test_cases_width = len(str(stats.num_test_cases))
+
+            return run_test_cases(self.ptses, self.test_cases, self.args, stats,
+                                  file_paths=copy.deepcopy(self.file_paths),
+                                  shard=shard)
+        finally:
+            shard.close()
+
     def cleanup(self):
         log(f'{self.__class__.__name__}.{self.cleanup.__name__}')
         autoprojects.iutctl.cleanup()
@@ -1634,11 +2102,13 @@ def setup_project_pixits(ptses):
 
 
 def setup_test_cases(ptses):
-    test_cases = []
+    """Registry of the test cases of the workspace profiles. The test
+    cases of a profile are created when the first one of them is run."""
+    registry = TestCaseRegistry()
 
-    for profile in _get_profiles(ptses):
-        mod = getattr(autoprojects, profile, None)
+    for project in set(ptses[0].get_project_list()):
+        mod = getattr(autoprojects, project.lower(), None)
         if mod is not None:
-            test_cases += mod.test_cases(ptses)
+            registry.add_profile(project, functools.partial(mod.test_cases, ptses))
 
-    return test_cases
+    return registry
@@ -0,0 +1,151 @@
+#
+# auto-pts - The Bluetooth PTS Automation Framework
+#
+# Copyright (c) 2024, Codecoup.
+#
+# This program is free software; you can redistribute it and/or modify it
+# under the terms and conditions of the GNU General Public License,
+# version 2, as published by the Free Software Foundation.
+#
+# This program is distributed in the hope it will be useful, but WITHOUT
+# ANY WARRANTY; without even the implied warranty of MERCHANTABILITY or
+# FITNESS FOR A PARTICULAR PURPOSE.  See the GNU General Public License for
+# more details.
+#
+
+"""Memory growth of long test runs
+
+MemoryProfiler takes a tracemalloc snapshot every N test cases, diffs it
+with the former one and attributes the growth to the code lines that
+allocated it. The memory timeline of the session is written to a JSON
+file, and a leak is flagged once the traced memory grows by more than
+the threshold since the first snapshot.
+"""
+
+import json
+import logging
+import os
+import time
+import tracemalloc
+
+import psutil
+
+MEMORY_TIMELINE_FILE = 'memory_timeline.json'
+
+# Frames stored per allocation, the growth is attributed to the newest
+TRACEMALLOC_FRAMES = 1
+
+# Code locations reported per snapshot
+TOP_LOCATIONS = 10
+
+SNAPSHOT_FILTERS = [
+    tracemalloc.Filter(False, tracemalloc.__file__),
+    tracemalloc.Filter(False, '<frozen importlib._bootstrap>'),
+    tracemalloc.Filter(False, '<frozen importlib._bootstrap_external>'),
+    tracemalloc.Filter(False, '<unknown>'),
+]
+
+log = logging.debug
+
+
+def _mb(size):
+    return round(size / (1024 ** 2), 3)
+
+
+class MemoryProfiler:
+    """tracemalloc snapshots of a test run
+
+    interval -- number of test cases between the snapshots
+    threshold -- growth of the traced memory in MB flagged as a leak
+    timeline_file -- JSON file the memory timeline is written to
+    """
+
+    def __init__(self, interval, threshold, timeline_file):
+        self.interval = interval
+        self.threshold = threshold
+        self.timeline_file = timeline_file
+        self.timeline = []
+        self.leak = False
+        self._started_tracing = False
+        self._baseline_size = 0
+        self._previous = None
+        self._count = 0
+
+    @staticmethod
+    def _snapshot():
+        snapshot = tracemalloc.take_snapshot().filter_traces(SNAPSHOT_FILTERS)
+        return snapshot, sum(stat.size for stat in snapshot.statistics('filename'))
+
+    def start(self):
+        if not tracemalloc.is_tracing():
+            tracemalloc.start(TRACEMALLOC_FRAMES)
+            self._started_tracing = True
+
+        self._previous, self._baseline_size = self._snapshot()
+        self._record('start', self._baseline_size, [])
+
+    def stop(self):
+        if self._started_tracing:
+            tracemalloc.stop()
+            self._started_tracing = False
+
+        self._previous = None
+
+    def _record(self, test_case_name, total, growth):
+        traced, peak = tracemalloc.get_traced_memory()
+
+        entry = {
+            'test_cases': self._count,
+            'test_case': test_case_name,
+            'timestamp': time.time(),
+            'rss_mb': _mb(psutil.Process(os.getpid()).memory_info().rss),
+            'traced_mb': _mb(traced),
+            'traced_peak_mb': _mb(peak),
+            'snapshot_mb': _mb(total),
+            'growth_mb': _mb(total - self._baseline_size),
+            'top_growth': [{'location': str(stat.traceback),
+                            'size_diff_kb': round(stat.size_diff / 1024, 1),
+                            'count_diff': stat.count_diff}
+                           for stat in growth],
+        }
+        self.timeline.append(entry)
+
+        with open(self.timeline_file, 'w') as f:
+            json.dump(self.timeline, f, indent=4)
+
+        return entry
+
+    def check(self, test_case_name):
+        """Called after each test case, takes a snapshot every interval
+        test cases. Returns the timeline entry of the snapshot or None."""
+        self._count += 1
+        if self._previous is None or self._count % self.interval:
+            return None
+
+        snapshot, total = self._snapshot()
+        growth = [stat for stat in snapshot.compare_to(self._previous, 'lineno')
+                  if stat.size_diff > 0][:TOP_LOCATIONS]
+        self._previous = snapshot
+
+        entry = self._record(test_case_name, total, growth)
+        log("Memory after %d test cases: %s", self._count, entry)
+
+        if entry['growth_mb'] > self.threshold and not self.leak:
+            self.leak = True
+            print(f"Memory leak suspected: traced memory grew by "
+                  f"{entry['growth_mb']} MB in {self._count} test cases, "
+                  f"since the last snapshot most in:")
+            for stat in growth:
+                print(f"    {stat}")
+
+        return entry
+
+    def print_summary(self):
+        if len(self.timeline) < 2:
+            return
+
+        last = self.timeline[-1]
+        leak = ', LEAK SUSPECTED' if self.leak else ''
+        print(f"\nMemory: {last['growth_mb']} MB traced growth in "
+              f"{last['test_cases']} test cases, RSS {last['rss_mb']} MB{leak}")
+        print(f"Memory timeline: {self.timeline_file}")
@@ -49,6 +49,7 @@ from datetime import datetime
 from pathlib import Path
 from autopts.ptsprojects import ptstypes
 from autopts.ptsprojects.ptstypes import E_FATAL_ERROR
+from autopts.ptsstate import CALL_TIMEOUT, PICS, PIXIT, WORKSPACE, WORKSPACE_KEY, PTSState
 from autopts.utils import PTS_WORKSPACE_FILE_EXT, get_own_workspaces, count_script_instances, ResultWithFlag
 from autopts.winutils import get_pid_by_window_title, kill_all_processes
 
@@ -348,10 +349,8 @@ class PyPTS:
         self._init_attributes()
         self._end = threading.Event()
 
-        # list of tuples of methods and arguments to recover after PTS restart
-        self._recov = []
-        self._temp_changes = []
-        self._recov_in_progress = False
+        # settings to recover after PTS restart
+        self._state = PTSState()
         self._ready = False
 
         self._temp_workspace_path = None
@@ -390,8 +389,7 @@ class PyPTS:
         self._pts_projects = {}
 
     def cleanup_caches(self):
-        self._recov.clear()
-        self._recov_in_progress = False
+        self._state.clear()
 
     def ready(self):
         return self._ready
@@ -404,67 +402,20 @@ class PyPTS:
         if self._pts_logger:
             self._pts_logger.close()
 
-    def add_recov(self, func, *args, **kwds):
-        """Add function to recovery list"""
-        if self._recov_in_progress:
-            return
-
-        log("%s %r %r %r", self.add_recov.__name__, func, args, kwds)
-
-        # Re-set recovery element to avoid duplications
-        if func == self.set_pixit:  # pylint: disable=W0143
-            profile = args[0]
-            pixit = args[1]
-            # Look for possible re-setable PIXIT
-            try:
-                # Search for matching recover function, PIXIT and recover if value was changed.
-                item = next(x for x in self._recov if ((x[0] ==
-                                                        self.set_pixit) and (x[1][0] == profile) and
-                                                       (x[1][1] == pixit)))
-
-                self._recov.remove(item)
-                log("%s, re-set pixit: %s", self.add_recov.__name__, pixit)
-
-            except StopIteration:
-                pass
-
-        self._recov.append((func, args, kwds))
-
-    def _add_temp_change(self, func, *args, **kwds):
-        """Add function to set temporary value"""
-        if not self._recov_in_progress:
-            log("%s %r %r %r", self._add_temp_change.__name__, func, args, kwds)
-            self._temp_changes.append((func, args, kwds))
-
-    def del_recov(self, func, *args, **kwds):
-        """Remove function from recovery list"""
-        log("%s %r %r %r", self.del_recov.__name__, func, args, kwds)
-
-        recov_funcs = [item[0] for item in self._recov]
-
-        if func not in recov_funcs:
-            return
-
-        # no arguments specified: remove all method calls
-        if not args and not kwds:
-            self._recov = [item for item in self._recov if item[0] != func]
-
-        # remove single method call with matching arguments
-        else:
-            item = (func, args, kwds)
-            if item in self._recov:
-                self._recov.remove(item)
-
-    def _recover_item(self, item):
-        """Recovery item wraper"""
-
-        func = item[0]
-        args = item[1]
-        kwds = item[2]
-        log("%s, Recovering: %s, %r %r", self._recover_item.__name__,
-            func, args, kwds)
-
-        func(*args, **kwds)
+    def _apply_state(self, settings):
+        """Applies (key, value) settings of PTSState to PTS"""
+        for (kind, project_name, name), value in settings:
+            log("%s, Recovering: %s %s %s %r", self._apply_state.__name__,
+                kind, project_name, name, value)
+
+            if kind == WORKSPACE:
+                self.open_workspace(value)
+            elif kind == CALL_TIMEOUT:
+                self.set_call_timeout(value)
+            elif kind == PICS:
+                self.set_pics(project_name, name, value)
+            elif kind == PIXIT:
+                self.set_pixit(project_name, name, value)
 
     def _replug_dongle(self):
         log(f"{self._replug_dongle.__name__} not implemented")
@@ -488,16 +439,15 @@ class PyPTS:
         """
 
         log("recover_pts")
-        log("recov=%s", self._recov)
-
-        self._recov_in_progress = True
 
         self.restart_pts()
 
-        for item in self._recov:
-            self._recover_item(item)
+        # Nothing set in the new PTS instance
+        self._state.invalidate()
+        pending = self._state.pending()
+        log("recov=%s", pending)
+        self._apply_state(pending)
 
-        self._recov_in_progress = False
         self._last_recovery_time = datetime.now()
 
         return True
@@ -711,7 +661,7 @@ class PyPTS:
         log("Using temporary workspace: %s", self._temp_workspace_path)
 
         self._pts.OpenWorkspace(self._temp_workspace_path)
-        self.add_recov(self.open_workspace, workspace_path)
+        self._state.set(WORKSPACE_KEY, workspace_path)
         self._cache_test_cases()
 
     def _cache_test_cases(self):
@@ -758,32 +708,12 @@ class PyPTS:
     def _revert_temp_changes(self):
         """Recovery default state for test case"""
 
-        if not self._temp_changes:
+        pending = self._state.revert_temp()
+        if not pending:
             return
 
         log("%s", self._revert_temp_changes.__name__)
-
-        self._recov_in_progress = True
-
-        for tch in self._temp_changes:
-            func = tch[0]
-
-            if func == self.update_pixit_param:
-                # Look for possible recoverable parameter
-                try:
-                    '''Search for matching recover function, PIXIT and recover
-                    if value was changed. '''
-                    item = next(x for x in self._recov if ((x[0] ==
-                                                            self.set_pixit) and (x[1][0] ==
-                                                                                 tch[1][0]) and (x[1][1] == tch[1][1])))
-
-                    self._recover_item(item)
-
-                except StopIteration:
-                    continue
-
-        self._recov_in_progress = False
-        self._temp_changes = []
+        self._apply_state(pending)
 
     def run_test_case(self, project_name, test_case_name):
         """Executes the specified Test Case.
@@ -895,8 +825,7 @@ class PyPTS:
 
         try:
             self._pts.UpdatePics(project_name, entry_name, bool_value)
-            self.add_recov(self.set_pics, project_name, entry_name,
-                           bool_value)
+            self._state.set((PICS, project_name, entry_name), bool_value)
 
         except BaseException as e:
             if not parse_ptscontrol_error(e):
@@ -922,8 +851,7 @@ class PyPTS:
 
         try:
             self._pts.UpdatePixitParam(project_name, param_name, param_value)
-            self.add_recov(self.set_pixit, project_name, param_name,
-                           param_value)
+            self._state.set((PIXIT, project_name, param_name), param_value)
 
         except Exception as e:
             if isinstance(e, (pythoncom.com_error, TypeError)):
@@ -954,8 +882,8 @@ class PyPTS:
         try:
             self._pts.UpdatePixitParam(
                 project_name, param_name, new_param_value)
-            self._add_temp_change(self.update_pixit_param, project_name,
-                                  param_name)
+            self._state.set_temp((PIXIT, project_name, param_name),
+                                 new_param_value)
         except Exception as e:
             if isinstance(e, (pythoncom.com_error, TypeError)):
                 err = parse_ptscontrol_error(e)
@@ -980,9 +908,9 @@ class PyPTS:
         self._pts.SetPTSCallTimeout(timeout)
 
         if timeout:
-            self.add_recov(self.set_call_timeout, timeout)
+            self._state.set((CALL_TIMEOUT, None, None), timeout)
         else:  # timeout 0 = no timeout
-            self.del_recov(self.set_call_timeout)
+            self._state.discard((CALL_TIMEOUT, None, None))
 
     def save_test_history_log(self, save):
         """This function enables automation clients to specify whether test
@@ -14,3 +14,21 @@
 #
 
 """Automated PTS projects (bluetooth profiles and protocols)"""
+
+import importlib
+import importlib.util
+
+
+def lazy_submodules(package):
+    """Module __getattr__ of a project package, which imports the profile
+    modules and other submodules of the package on first access, e.g.
+    getattr(project, 'gap') imports project.gap"""
+
+    def __getattr__(name):
+        if not name.startswith('_') and \
+                importlib.util.find_spec(f'{package}.{name}') is not None:
+            return importlib.import_module(f'{package}.{name}')
+
+        raise AttributeError(f'module {package!r} has no attribute {name!r}')
+
+    return __getattr__
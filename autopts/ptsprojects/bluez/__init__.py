@@ -13,6 +13,15 @@
 # more details.
 #
 
-import autopts.ptsprojects.bluez.gap
-import autopts.ptsprojects.bluez.sm
-# GENERATOR append 1
+from autopts.ptsprojects import lazy_submodules
+
+# Profiles of the project. The profile modules, and with them their WID
+# modules, are imported on first access of the attribute of the profile,
+# e.g. by getattr(project, 'gap').
+PROFILES = (
+    'gap',
+    'sm',
+    # GENERATOR append 1
+)
+
+__getattr__ = lazy_submodules(__name__)
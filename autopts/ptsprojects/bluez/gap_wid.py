@@ -16,7 +16,7 @@
 import logging
 import time
 
-from autopts.wid import generic_wid_hdl
+from autopts.wid import generic_wid_hdl, wid_modules
 from autopts.pybtp import btp
 from autopts.pybtp.types import Prop, AdType, WIDParams
 from autopts.ptsprojects.stack import get_stack
@@ -24,9 +24,10 @@ from autopts.ptsprojects.stack import get_stack
 log = logging.debug
 
 
+@wid_modules(__name__, 'autopts.wid.gap')
 def gap_wid_hdl(wid, description, test_case_name):
     log(f'{gap_wid_hdl.__name__}, {wid}, {description}, {test_case_name}')
-    return generic_wid_hdl(wid, description, test_case_name, [__name__, 'autopts.wid.gap'])
+    return generic_wid_hdl(wid, description, test_case_name, gap_wid_hdl.wid_modules)
 
 
 def hdl_wid_47(_: WIDParams):
@@ -15,7 +15,7 @@
 
 import logging
 
-from autopts.wid import generic_wid_hdl
+from autopts.wid import generic_wid_hdl, wid_modules
 from autopts.pybtp import btp
 from autopts.ptsprojects.stack import get_stack
 from autopts.pybtp.types import WIDParams
@@ -23,9 +23,10 @@ from autopts.pybtp.types import WIDParams
 log = logging.debug
 
 
+@wid_modules(__name__, 'autopts.wid.sm')
 def sm_wid_hdl(wid, description, test_case_name):
     log(f'{sm_wid_hdl.__name__}, {wid}, {description}, {test_case_name}')
-    return generic_wid_hdl(wid, description, test_case_name, [__name__, 'autopts.wid.sm'])
+    return generic_wid_hdl(wid, description, test_case_name, sm_wid_hdl.wid_modules)
 
 
 # wid handlers section begin
@@ -13,11 +13,20 @@
 # more details.
 #
 
-import autopts.ptsprojects.mynewt.gap
-import autopts.ptsprojects.mynewt.gatt
-import autopts.ptsprojects.mynewt.sm
-import autopts.ptsprojects.mynewt.l2cap
-import autopts.ptsprojects.mynewt.mesh
-import autopts.ptsprojects.mynewt.bap
-import autopts.ptsprojects.mynewt.pacs
-# GENERATOR append 1
+from autopts.ptsprojects import lazy_submodules
+
+# Profiles of the project. The profile modules, and with them their WID
+# modules, are imported on first access of the attribute of the profile,
+# e.g. by getattr(project, 'gap').
+PROFILES = (
+    'gap',
+    'gatt',
+    'sm',
+    'l2cap',
+    'mesh',
+    'bap',
+    'pacs',
+    # GENERATOR append 1
+)
+
+__getattr__ = lazy_submodules(__name__)
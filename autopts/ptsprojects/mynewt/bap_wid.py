@@ -17,16 +17,17 @@ import logging
 
 from autopts.pybtp import btp
 from autopts.pybtp.types import WIDParams
-from autopts.wid import generic_wid_hdl
+from autopts.wid import generic_wid_hdl, wid_modules
 from autopts.ptsprojects.stack import get_stack
 from autopts.pybtp.types import *
 
 log = logging.debug
 
 
+@wid_modules(__name__, 'autopts.wid.bap')
 def bap_wid_hdl(wid, description, test_case_name):
     log(f'{bap_wid_hdl.__name__}, {wid}, {description}, {test_case_name}')
-    return generic_wid_hdl(wid, description, test_case_name, [__name__, 'autopts.wid.bap'])
+    return generic_wid_hdl(wid, description, test_case_name, bap_wid_hdl.wid_modules)
 
 def hdl_wid_380(_: WIDParams):
     """
@@ -17,7 +17,7 @@ import logging
 import socket
 from time import sleep
 
-from autopts.wid import generic_wid_hdl
+from autopts.wid import generic_wid_hdl, wid_modules
 from autopts.pybtp import btp
 from autopts.pybtp.types import WIDParams
 from autopts.wid.gap import hdl_wid_139_mode1_lvl2, hdl_wid_139_mode1_lvl4
@@ -26,9 +26,10 @@ from autopts.ptsprojects.stack import get_stack
 log = logging.debug
 
 
+@wid_modules(__name__, 'autopts.wid.gap')
 def gap_wid_hdl(wid, description, test_case_name):
     log(f'{gap_wid_hdl.__name__}, {wid}, {description}, {test_case_name}')
-    return generic_wid_hdl(wid, description, test_case_name, [__name__, 'autopts.wid.gap'])
+    return generic_wid_hdl(wid, description, test_case_name, gap_wid_hdl.wid_modules)
 
 
 # For tests in SC only, mode 1 level 3
@@ -209,17 +209,17 @@ def test_cases_server(ptses):
     test_case_name_list = pts.get_test_case_list('GATT')
     tc_list = []
 
+    custom_tcs = {tc.name: tc for tc in custom_test_cases}
+
     for tc_name in test_case_name_list:
         if not tc_name.startswith('GATT/SR'):
             continue
-        instance = ZTestCase('GATT', tc_name,
-                             cmds=pre_conditions_1,
-                             generic_wid_hdl=gatt_wid_hdl)
 
-        for custom_tc in custom_test_cases:
-            if tc_name == custom_tc.name:
-                instance = custom_tc
-                break
+        instance = custom_tcs.get(tc_name)
+        if instance is None:
+            instance = ZTestCase('GATT', tc_name,
+                                 cmds=pre_conditions_1,
+                                 generic_wid_hdl=gatt_wid_hdl)
 
         tc_list.append(instance)
 
@@ -276,17 +276,17 @@ def test_cases_client(pts):
     test_case_name_list = pts.get_test_case_list('GATT')
     tc_list = []
 
+    custom_tcs = {tc.name: tc for tc in custom_test_cases}
+
     for tc_name in test_case_name_list:
         if not tc_name.startswith('GATT/CL'):
             continue
-        instance = ZTestCase("GATT", tc_name,
-                             cmds=pre_conditions_cl,
-                             generic_wid_hdl=gattc_wid_hdl)
-
-        for custom_tc in custom_test_cases:
-            if tc_name == custom_tc.name:
-                instance = custom_tc
-                break
+
+        instance = custom_tcs.get(tc_name)
+        if instance is None:
+            instance = ZTestCase("GATT", tc_name,
+                                 cmds=pre_conditions_cl,
+                                 generic_wid_hdl=gattc_wid_hdl)
 
         tc_list.append(instance)
 
@@ -13,18 +13,14 @@
 # more details.
 #
 
-import socket
-import subprocess
 import logging
-import shlex
 import os
 import sys
-import serial
 
 from autopts.pybtp import defs, btp
 from autopts.ptsprojects.boards import Board, get_debugger_snr, tty_to_com
 from autopts.pybtp.types import BTPError
-from autopts.pybtp.iutctl_common import BTPWorker, BTP_ADDRESS, BTPSocketSrv
+from autopts.pybtp.iutctl_common import BTPWorker, BTP_ADDRESS, BTPSerial
 from autopts.rtt import RTTLogger, BTMON
 
 log = logging.debug
@@ -52,7 +48,6 @@ class MynewtCtl:
         self.debugger_snr = get_debugger_snr(self.tty_file) \
             if args.debugger_snr is None else args.debugger_snr
         self.board = Board(args.board_name, self)
-        self.socat_process = None
         self.socket_srv = None
         self.btp_socket = None
         self.test_case = None
@@ -73,51 +68,24 @@ class MynewtCtl:
 
         self.test_case = test_case
 
+        self.socket_srv = BTPSerial(test_case.log_dir)
+        self.socket_srv.open(self.tty_port(), SERIAL_BAUDRATE)
         self.flush_serial()
 
-        self.socket_srv = BTPSocketSrv(test_case.log_dir)
-        self.socket_srv.open(self.btp_address)
         self.btp_socket = BTPWorker(self.socket_srv)
+        self.btp_socket.accept()
 
-        if sys.platform == "win32":
-            # On windows socat.exe does not support setting serial baud rate.
-            # Set it with 'mode' from cmd.exe
-            com = tty_to_com(self.tty_file)
-            mode_cmd = (">nul 2>nul cmd.exe /c \"mode " + com + "BAUD=115200 PARITY=n DATA=8 STOP=1\"")
-            os.system(mode_cmd)
-
-            socat_cmd = ("socat.exe -x -v tcp:" + socket.gethostbyname(socket.gethostname()) +
-                         ":%s,retry=100,interval=1 %s,raw,b115200" %
-                         (self.socket_srv.sock.getsockname()[1], self.tty_file))
-        else:
-            socat_cmd = ("socat -x -v %s,rawer,b115200 UNIX-CONNECT:%s" %
-                         (self.tty_file, self.btp_address))
-
-        log("Starting socat process: %s", socat_cmd)
+    def tty_port(self):
+        if sys.platform == 'win32':
+            return tty_to_com(self.tty_file)
 
-        # socat dies after socket is closed, so no need to kill it
-        self.socat_process = subprocess.Popen(shlex.split(socat_cmd),
-                                              shell=False,
-                                              stdout=subprocess.DEVNULL,
-                                              stderr=subprocess.DEVNULL)
-
-        self.btp_socket.accept()
+        return self.tty_file
 
     def flush_serial(self):
         log("%s.%s", self.__class__, self.flush_serial.__name__)
-        # Try to read data or timeout
-        try:
-            if sys.platform == 'win32':
-                tty = tty_to_com(self.tty_file)
-            else:
-                tty = self.tty_file
 
-            ser = serial.Serial(port=tty,
-                                baudrate=SERIAL_BAUDRATE, timeout=1)
-            ser.read(99999)
-            ser.close()
-        except serial.SerialException:
-            pass
+        if self.socket_srv and self.socket_srv.conn:
+            self.socket_srv.flush()
 
     def btmon_start(self):
         if self.btmon:
@@ -187,10 +155,6 @@ class MynewtCtl:
             self.btp_socket.close()
             self.btp_socket = None
 
-        if self.socat_process and self.socat_process.poll() is None:
-            self.socat_process.terminate()
-            self.socat_process.wait()
-
         if not self.gdb and self.board:
             self.board.reset()
 
@@ -201,11 +165,6 @@ class MynewtCtl:
         self.rtt_logger_stop()
         self.btmon_stop()
 
-        if self.socat_process:
-            self.socat_process.terminate()
-            self.socat_process.wait()
-            self.socat_process = None
-
 
 class MynewtCtlStub:
     """Mynewt OS Control Class with stubs for testing"""
@@ -242,20 +242,19 @@ def test_cases(ptses):
     test_case_name_list = pts.get_test_case_list('L2CAP')
     tc_list = []
 
-    for tc_name in test_case_name_list:
-        if tc_name.startswith(('L2CAP/COS', 'L2CAP/ECFC', 'L2CAP/LE/CFC')):
-            instance = ZTestCase('L2CAP', tc_name,
-                                 pre_conditions,
-                                 generic_wid_hdl=l2cap_wid_hdl)
-        else:
-            instance = ZTestCase('L2CAP', tc_name,
-                                 common,
-                                 generic_wid_hdl=l2cap_wid_hdl)
+    custom_tcs = {tc.name: tc for tc in custom_test_cases}
 
-        for custom_tc in custom_test_cases:
-            if tc_name == custom_tc.name:
-                instance = custom_tc
-                break
+    for tc_name in test_case_name_list:
+        instance = custom_tcs.get(tc_name)
+        if instance is None:
+            if tc_name.startswith(('L2CAP/COS', 'L2CAP/ECFC', 'L2CAP/LE/CFC')):
+                instance = ZTestCase('L2CAP', tc_name,
+                                     pre_conditions,
+                                     generic_wid_hdl=l2cap_wid_hdl)
+            else:
+                instance = ZTestCase('L2CAP', tc_name,
+                                     common,
+                                     generic_wid_hdl=l2cap_wid_hdl)
 
         tc_list.append(instance)
 
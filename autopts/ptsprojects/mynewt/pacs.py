@@ -79,15 +79,14 @@ def test_cases(ptses):
     tc_list = []
     custom_test_cases = []
 
+    custom_tcs = {tc.name: tc for tc in custom_test_cases}
+
     for tc_name in test_case_name_list:
-        instance = ZTestCase("PACS", tc_name,
-                             cmds=pre_conditions,
-                             generic_wid_hdl=pacs_wid_hdl)
-
-        for custom_tc in custom_test_cases:
-            if tc_name == custom_tc.name:
-                instance = custom_tc
-                break
+        instance = custom_tcs.get(tc_name)
+        if instance is None:
+            instance = ZTestCase("PACS", tc_name,
+                                 cmds=pre_conditions,
+                                 generic_wid_hdl=pacs_wid_hdl)
 
         tc_list.append(instance)
 
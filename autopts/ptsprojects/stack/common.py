@@ -13,16 +13,74 @@
 # FITNESS FOR A PARTICULAR PURPOSE.  See the GNU General Public License for
 # more details.
 #
-from threading import Lock, Event, Timer
-from time import sleep
+from collections import OrderedDict, deque
+from threading import Condition, Lock
+from time import monotonic
 
 from autopts.utils import raise_on_global_end
 
+# Upper bound of a single wait, so that the global end and state changes
+# that are not notified (e.g. in place updates of containers) are noticed
+EVENT_POLL_INTERVAL = 0.1
+
+# Number of recent data events kept per stream by StreamSink
+STREAM_RECENT_EVENTS = 8
+
+EVENT_COND = Condition()
+EVENT_GENERATION = 0
+
+
+def notify_event():
+    """Wake up the threads waiting for stack events to recheck their
+    conditions. Called after each BTP event is handled and on Property
+    updates."""
+    global EVENT_GENERATION
+
+    with EVENT_COND:
+        EVENT_GENERATION += 1
+        EVENT_COND.notify_all()
+
+
+def _wait_for(timeout, check):
+    """Wait until check() returns a true value or timeout expires.
+
+    Returns the value of check() or None on timeout.
+    """
+    deadline = monotonic() + timeout
+
+    while True:
+        raise_on_global_end()
+
+        with EVENT_COND:
+            generation = EVENT_GENERATION
+
+        result = check()
+        if result:
+            return result
+
+        remaining = deadline - monotonic()
+        if remaining <= 0:
+            return None
+
+        with EVENT_COND:
+            # Do not sleep if something changed while check() was running
+            if generation == EVENT_GENERATION:
+                EVENT_COND.wait(min(remaining, EVENT_POLL_INTERVAL))
+
 
 class Property:
     def __init__(self, data):
         self._lock = Lock()
-        self.data = data
+        self._data = data
+
+    @property
+    def data(self):
+        return self._data
+
+    @data.setter
+    def data(self, value):
+        self._data = value
+        notify_event()
 
     def __get__(self, instance, owner):
         with self._lock:
@@ -33,63 +91,294 @@ class Property:
             setattr(instance, self.data, value)
 
 
-class WildCard:
+class EventQueue:
+    """Queue of layer events indexed by key fields
+
+    Behaves like the list of events it replaces (append, remove, clear,
+    iteration, indexing, len), but events with the same key fields are
+    also kept together, so waits for a given key do not rescan the whole
+    queue and removing an event does not shift it.
+
+    key_fields -- indexes (tuple events) or keys (dict events) of the
+                  fields the events are indexed by
+    maxlen -- max number of events kept, None for no limit
+    evict -- if True, the oldest event is evicted when the queue is full,
+             otherwise the new event is dropped
+    """
+
+    def __init__(self, key_fields=(), maxlen=None, evict=True):
+        self.key_fields = tuple(key_fields)
+        self.maxlen = maxlen
+        self.evict = evict
+        self.dropped = 0
+        self.evicted = 0
+        self._lock = Lock()
+        self._seq = 0
+        # seq -> (key, event) and key -> OrderedDict of seqs
+        self._events = OrderedDict()
+        self._index = {}
+
+    def key(self, ev):
+        """Key fields of the event, None if the event has not got them"""
+        if not self.key_fields:
+            return None
+
+        try:
+            return tuple(ev[field] for field in self.key_fields)
+        except (IndexError, KeyError, TypeError):
+            return None
+
+    def _discard(self, seq):
+        key, ev = self._events.pop(seq)
+        if key is not None:
+            bucket = self._index[key]
+            del bucket[seq]
+            if not bucket:
+                del self._index[key]
+
+        return ev
+
+    def append(self, ev):
+        key = self.key(ev)
+
+        with self._lock:
+            if self.maxlen is not None and len(self._events) >= self.maxlen:
+                if not self.evict:
+                    self.dropped += 1
+                    return
+
+                self._discard(next(iter(self._events)))
+                self.evicted += 1
+
+            seq = self._seq
+            self._seq += 1
+            self._events[seq] = (key, ev)
+            if key is not None:
+                self._index.setdefault(key, OrderedDict())[seq] = None
+
+    def remove(self, ev):
+        """Remove the oldest event equal to ev"""
+        key = self.key(ev)
+
+        with self._lock:
+            if key is not None and key in self._index:
+                seqs = self._index[key]
+            else:
+                seqs = self._events
+
+            for seq in seqs:
+                if self._events[seq][1] == ev:
+                    self._discard(seq)
+                    return
+
+        raise ValueError('EventQueue.remove(x): x not in queue')
+
+    def clear(self):
+        with self._lock:
+            self._events.clear()
+            self._index.clear()
+
+    def lookup(self, *key):
+        """Events with the given key fields, oldest first"""
+        with self._lock:
+            seqs = self._index.get(key, ())
+            return [self._events[seq][1] for seq in seqs]
+
+    def _snapshot(self):
+        with self._lock:
+            return [ev for _, ev in self._events.values()]
+
+    def __iter__(self):
+        return iter(self._snapshot())
+
+    def __len__(self):
+        return len(self._events)
+
+    def __getitem__(self, item):
+        if item == 0:
+            with self._lock:
+                for _, ev in self._events.values():
+                    return ev
+            raise IndexError('EventQueue index out of range')
+
+        return self._snapshot()[item]
+
     def __eq__(self, other):
-        return True
+        if isinstance(other, EventQueue):
+            other = other._snapshot()
 
+        return self._snapshot() == other
 
-def timeout_cb(flag):
-    flag.clear()
+    def __repr__(self):
+        return f'EventQueue({self._snapshot()!r}, dropped={self.dropped}, ' \
+               f'evicted={self.evicted})'
 
 
-def wait_for_queue_event(event_queue, test, timeout, remove):
-    flag = Event()
-    flag.set()
+class StreamStats:
+    """Data events received on a single stream"""
 
-    t = Timer(timeout, timeout_cb, [flag])
-    t.name = f'QEventTimer{t.name}'
-    t.start()
+    __slots__ = ('count', 'octets', 'first_seen', 'last_seen', 'recent',
+                 'pending')
 
-    while flag.is_set():
-        raise_on_global_end()
+    def __init__(self, recent):
+        self.count = 0
+        self.octets = 0
+        self.first_seen = None
+        self.last_seen = None
+        self.recent = deque(maxlen=recent)
+        # Events not consumed by the waits yet
+        self.pending = 0
+
+    def __repr__(self):
+        return f'StreamStats(count={self.count}, octets={self.octets}, ' \
+               f'first_seen={self.first_seen}, last_seen={self.last_seen}, ' \
+               f'pending={self.pending})'
+
+
+class StreamSink:
+    """Aggregates data events of streams
+
+    Stands in for the EventQueue of stream data events, which arrive at
+    the SDU interval. Instead of keeping every event, counters, data
+    totals, monotonic first and last timestamps and the most recent
+    events are kept per stream, so memory and waits do not grow with the
+    length of the stream.
+
+    key_fields -- indexes (tuple events) or keys (dict events) of the
+                  fields identifying the stream
+    data_field -- index or key of the stream data field
+    recent -- number of recent events kept per stream
+    """
+
+    def __init__(self, key_fields, data_field, recent=STREAM_RECENT_EVENTS):
+        self.key_fields = tuple(key_fields)
+        self.data_field = data_field
+        self.recent = recent
+        self._lock = Lock()
+        self._streams = OrderedDict()
+
+    def append(self, ev):
+        key = tuple(ev[field] for field in self.key_fields)
+        now = monotonic()
+
+        with self._lock:
+            stream = self._streams.get(key)
+            if stream is None:
+                stream = self._streams[key] = StreamStats(self.recent)
+                stream.first_seen = now
+
+            stream.count += 1
+            stream.octets += len(ev[self.data_field])
+            stream.last_seen = now
+            stream.recent.append(ev)
+            stream.pending += 1
+
+    def get(self, *key):
+        """StreamStats of the stream, None if nothing was received on it"""
+        return self._streams.get(key)
+
+    def take(self, key, consume):
+        """Most recent event of the first stream matching key with events
+        not consumed yet, None if there is none.
+
+        key -- key fields of the stream, may contain WildCards
+        consume -- if True, the stream has one event less to consume
+        """
+        with self._lock:
+            if any(isinstance(field, WildCard) for field in key):
+                streams = [stream for stream_key, stream in self._streams.items()
+                           if key == stream_key]
+            else:
+                stream = self._streams.get(tuple(key))
+                streams = [stream] if stream else []
+
+            for stream in streams:
+                if stream.pending:
+                    if consume:
+                        stream.pending -= 1
+                    return stream.recent[-1]
+
+        return None
 
-        for ev in event_queue:
+    def clear(self):
+        with self._lock:
+            self._streams.clear()
+
+    def items(self):
+        """(key, StreamStats) of the streams, in order of first event"""
+        with self._lock:
+            return list(self._streams.items())
+
+    def __iter__(self):
+        """Recent events of all streams"""
+        with self._lock:
+            return iter([ev for stream in self._streams.values()
+                         for ev in stream.recent])
+
+    def __len__(self):
+        return sum(stream.count for stream in self._streams.values())
+
+    def __repr__(self):
+        return f'StreamSink({dict(self.items())!r})'
+
+
+class WildCard:
+    def __eq__(self, other):
+        return True
+
+
+def wait_for_queue_event(event_queue, test, timeout, remove, key=None):
+    """Wait for event in the queue passing the test.
+
+    key -- key fields of the event, if event_queue is an EventQueue only
+           the events with these fields are tested
+    """
+    indexed = key is not None and isinstance(event_queue, EventQueue) and \
+        not any(isinstance(field, WildCard) for field in key)
+
+    def check():
+        if indexed:
+            events = event_queue.lookup(*key)
+        else:
+            events = list(event_queue)
+
+        for ev in events:
             if isinstance(ev, tuple):
                 result = test(*ev)
             else:
                 result = test(ev)
 
             if result:
-                t.cancel()
-                if ev and remove:
-                    event_queue.remove(ev)
+                return ev, True
+
+        return None
 
-                return ev
+    found = _wait_for(timeout, check)
+    if not found:
+        return None
 
-            # TODO: Use wait() and notify() from threading.Condition
-            #  instead of sleep()
-            sleep(0.5)
+    ev = found[0]
+    if ev and remove:
+        event_queue.remove(ev)
 
-    return None
+    return ev
 
 
 def wait_for_event(timeout, test, *args, **kwargs):
     if test(*args, **kwargs):
         return True
 
-    flag = Event()
-    flag.set()
+    result = _wait_for(timeout, lambda: test(*args, **kwargs))
+    if result:
+        return result
 
-    t = Timer(timeout, timeout_cb, [flag])
-    t.name = f'EventTimer{t.name}'
-    t.start()
+    return False
 
-    while flag.is_set():
-        raise_on_global_end()
 
-        result = test(*args, **kwargs)
-        if result:
-            t.cancel()
-            return result
+def wait_for_stream_event(sink, key, timeout, remove):
+    """Wait for data event of the stream in the StreamSink.
 
-    return False
+    Returns the most recent event of the stream, if it has events not
+    consumed yet. With remove, one of them is consumed.
+    """
+    return _wait_for(timeout, lambda: sink.take(key, remove))
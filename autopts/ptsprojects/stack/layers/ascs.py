@@ -13,16 +13,16 @@
 # FITNESS FOR A PARTICULAR PURPOSE.  See the GNU General Public License for
 # more details.
 #
-from autopts.ptsprojects.stack.common import wait_for_queue_event
+from autopts.ptsprojects.stack.common import EventQueue, wait_for_queue_event
 from autopts.pybtp import defs
 
 
 class ASCS:
     def __init__(self):
         self.event_queues = {
-            defs.BTP_ASCS_EV_OPERATION_COMPLETED: [],
-            defs.BTP_ASCS_EV_CHARACTERISTIC_SUBSCRIBED: [],
-            defs.BTP_ASCS_EV_ASE_STATE_CHANGED: [],
+            defs.BTP_ASCS_EV_OPERATION_COMPLETED: EventQueue((0, 1, 2)),
+            defs.BTP_ASCS_EV_CHARACTERISTIC_SUBSCRIBED: EventQueue((0, 1)),
+            defs.BTP_ASCS_EV_ASE_STATE_CHANGED: EventQueue((0, 1, 2, 3)),
         }
 
     def event_received(self, event_type, event_data_tuple):
@@ -32,17 +32,17 @@ class ASCS:
         return wait_for_queue_event(
             self.event_queues[defs.BTP_ASCS_EV_OPERATION_COMPLETED],
             lambda _addr_type, _addr, _ase_id, *_: (addr_type, addr, ase_id) == (_addr_type, _addr, _ase_id),
-            timeout, remove)
+            timeout, remove, key=(addr_type, addr, ase_id))
 
     def wait_ascs_characteristic_subscribed_ev(self, addr_type, addr, timeout, remove=True):
         return wait_for_queue_event(
             self.event_queues[defs.BTP_ASCS_EV_CHARACTERISTIC_SUBSCRIBED],
             lambda _addr_type, _addr, *_: (addr_type, addr) == (_addr_type, _addr),
-            timeout, remove)
+            timeout, remove, key=(addr_type, addr))
 
     def wait_ascs_ase_state_changed_ev(self, addr_type, addr, ase_id, state, timeout, remove=True):
         return wait_for_queue_event(
             self.event_queues[defs.BTP_ASCS_EV_ASE_STATE_CHANGED],
             lambda _addr_type, _addr, _ase_id, _state, *_:
             (addr_type, addr, ase_id, state) == (_addr_type, _addr, _ase_id, _state),
-            timeout, remove)
+            timeout, remove, key=(addr_type, addr, ase_id, state))
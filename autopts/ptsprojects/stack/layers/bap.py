@@ -13,9 +13,15 @@
 # FITNESS FOR A PARTICULAR PURPOSE.  See the GNU General Public License for
 # more details.
 #
-from autopts.ptsprojects.stack.common import wait_for_queue_event
+from autopts.ptsprojects.stack.common import EventQueue, StreamSink, wait_for_queue_event, \
+    wait_for_stream_event
 from autopts.pybtp import defs
 
+# Max number of events kept of each of the events repeated while scanning,
+# e.g. an event per periodic advertising report. The oldest event is
+# evicted, a newer one of the same source follows.
+BAP_SCAN_EVENTS_MAXLEN = 64
+
 
 class BAP:
     class Peer:
@@ -30,17 +36,24 @@ class BAP:
         self.broadcast_code = ''
         self.hdl_wid_114_cnt = 0
         self.event_queues = {
-            defs.BTP_BAP_EV_DISCOVERY_COMPLETED: [],
-            defs.BTP_BAP_EV_CODEC_CAP_FOUND: [],
-            defs.BTP_BAP_EV_ASE_FOUND: [],
-            defs.BTP_BAP_EV_STREAM_RECEIVED: [],
-            defs.BTP_BAP_EV_BAA_FOUND: [],
-            defs.BTP_BAP_EV_BIS_FOUND: [],
-            defs.BTP_BAP_EV_BIS_SYNCED: [],
-            defs.BTP_BAP_EV_BIS_STREAM_RECEIVED: [],
-            defs.BTP_BAP_EV_SCAN_DELEGATOR_FOUND: [],
-            defs.BTP_BAP_EV_BROADCAST_RECEIVE_STATE: [],
-            defs.BTP_BAP_EV_PA_SYNC_REQ: [],
+            defs.BTP_BAP_EV_DISCOVERY_COMPLETED: EventQueue((0, 1)),
+            defs.BTP_BAP_EV_CODEC_CAP_FOUND: EventQueue((0, 1, 2)),
+            defs.BTP_BAP_EV_ASE_FOUND: EventQueue((0, 1, 2)),
+            # Stream data events are aggregated per stream
+            defs.BTP_BAP_EV_STREAM_RECEIVED: StreamSink((0, 1, 2), 3),
+            defs.BTP_BAP_EV_BAA_FOUND: EventQueue(('addr_type', 'addr'),
+                                                  maxlen=BAP_SCAN_EVENTS_MAXLEN),
+            defs.BTP_BAP_EV_BIS_FOUND: EventQueue(('broadcast_id',),
+                                                  maxlen=BAP_SCAN_EVENTS_MAXLEN),
+            defs.BTP_BAP_EV_BIS_SYNCED: EventQueue(('broadcast_id', 'bis_id')),
+            defs.BTP_BAP_EV_BIS_STREAM_RECEIVED: StreamSink(('broadcast_id', 'bis_id'),
+                                                            'bid_data'),
+            defs.BTP_BAP_EV_SCAN_DELEGATOR_FOUND: EventQueue(('addr_type', 'addr'),
+                                                             maxlen=BAP_SCAN_EVENTS_MAXLEN),
+            defs.BTP_BAP_EV_BROADCAST_RECEIVE_STATE: EventQueue(('addr_type', 'addr'),
+                                                                maxlen=BAP_SCAN_EVENTS_MAXLEN),
+            defs.BTP_BAP_EV_PA_SYNC_REQ: EventQueue(('addr_type', 'addr'),
+                                                    maxlen=BAP_SCAN_EVENTS_MAXLEN),
         }
         self.event_handlers = {
             defs.BTP_BAP_EV_DISCOVERY_COMPLETED: self._ev_discovery_completed,
@@ -74,58 +87,63 @@ class BAP:
             self.event_queues[defs.BTP_BAP_EV_CODEC_CAP_FOUND],
             lambda _addr_type, _addr, _pac_dir, *_:
                 (addr_type, addr, pac_dir) == (_addr_type, _addr, _pac_dir),
-            timeout, remove)
+            timeout, remove, key=(addr_type, addr, pac_dir))
 
     def wait_discovery_completed_ev(self, addr_type, addr, timeout, remove=True):
         return wait_for_queue_event(
             self.event_queues[defs.BTP_BAP_EV_DISCOVERY_COMPLETED],
             lambda _addr_type, _addr, *_:
                 (addr_type, addr) == (_addr_type, _addr),
-            timeout, remove)
+            timeout, remove, key=(addr_type, addr))
 
     def wait_ase_found_ev(self, addr_type, addr, ase_dir, timeout, remove=False):
         return wait_for_queue_event(
             self.event_queues[defs.BTP_BAP_EV_ASE_FOUND],
             lambda _addr_type, _addr, _ase_dir, *_:
                 (addr_type, addr, ase_dir) == (_addr_type, _addr, _ase_dir),
-            timeout, remove)
+            timeout, remove, key=(addr_type, addr, ase_dir))
 
     def wait_stream_received_ev(self, addr_type, addr, ase_id, timeout, remove=True):
-        return wait_for_queue_event(
+        return wait_for_stream_event(
             self.event_queues[defs.BTP_BAP_EV_STREAM_RECEIVED],
-            lambda _addr_type, _addr, _ase_id, *_:
-                (addr_type, addr, ase_id) == (_addr_type, _addr, _ase_id),
-            timeout, remove)
+            (addr_type, addr, ase_id), timeout, remove)
 
     def wait_baa_found_ev(self, addr_type, addr, timeout, remove=True):
         return wait_for_queue_event(
             self.event_queues[defs.BTP_BAP_EV_BAA_FOUND],
             lambda ev: (addr_type, addr) == (ev['addr_type'], ev['addr']),
-            timeout, remove)
+            timeout, remove, key=(addr_type, addr))
 
     def wait_bis_found_ev(self, broadcast_id, timeout, remove=True):
         return wait_for_queue_event(
             self.event_queues[defs.BTP_BAP_EV_BIS_FOUND],
             lambda ev: broadcast_id == ev['broadcast_id'],
-            timeout, remove)
+            timeout, remove, key=(broadcast_id,))
 
     def wait_bis_synced_ev(self, broadcast_id, bis_id, timeout, remove=True):
         return wait_for_queue_event(
             self.event_queues[defs.BTP_BAP_EV_BIS_SYNCED],
             lambda ev: (broadcast_id, bis_id) == (ev['broadcast_id'], ev['bis_id']),
-            timeout, remove)
+            timeout, remove, key=(broadcast_id, bis_id))
 
     def wait_bis_stream_received_ev(self, broadcast_id, bis_id, timeout, remove=True):
-        return wait_for_queue_event(
+        return wait_for_stream_event(
             self.event_queues[defs.BTP_BAP_EV_BIS_STREAM_RECEIVED],
-            lambda ev: (broadcast_id, bis_id) == (ev['broadcast_id'], ev['bis_id']),
-            timeout, remove)
+            (broadcast_id, bis_id), timeout, remove)
+
+    def get_stream_stats(self, addr_type, addr, ase_id):
+        """StreamStats of unicast stream data received, None if none was"""
+        return self.event_queues[defs.BTP_BAP_EV_STREAM_RECEIVED].get(addr_type, addr, ase_id)
+
+    def get_bis_stream_stats(self, broadcast_id, bis_id):
+        """StreamStats of BIS data received, None if none was"""
+        return self.event_queues[defs.BTP_BAP_EV_BIS_STREAM_RECEIVED].get(broadcast_id, bis_id)
 
     def wait_scan_delegator_found_ev(self, addr_type, addr, timeout, remove=False):
         return wait_for_queue_event(
             self.event_queues[defs.BTP_BAP_EV_SCAN_DELEGATOR_FOUND],
             lambda ev: (addr_type, addr) == (ev["addr_type"], ev["addr"]),
-            timeout, remove)
+            timeout, remove, key=(addr_type, addr))
 
     def wait_broadcast_receive_state_ev(self, broadcast_id, peer_addr_type, peer_addr,
                                         broadcaster_addr_type, broadcaster_addr,
@@ -138,13 +156,13 @@ class BAP:
                        (ev["broadcast_id"], ev["addr_type"], ev["addr"],
                         ev["broadcaster_addr_type"], ev["broadcaster_addr"],
                         ev['pa_sync_state']),
-            timeout, remove)
+            timeout, remove, key=(peer_addr_type, peer_addr))
 
     def wait_pa_sync_req_ev(self, addr_type, addr, timeout, remove=False):
         return wait_for_queue_event(
             self.event_queues[defs.BTP_BAP_EV_PA_SYNC_REQ],
             lambda ev: (addr_type, addr) == (ev["addr_type"], ev["addr"]),
-            timeout, remove)
+            timeout, remove, key=(addr_type, addr))
 
     def _ev_discovery_completed(self, addr_type, addr, status):
         peer = self.get_peer(addr_type, addr)
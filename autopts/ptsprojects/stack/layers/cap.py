@@ -12,14 +12,14 @@
 # FITNESS FOR A PARTICULAR PURPOSE.  See the GNU General Public License for
 # more details.
 #
-from autopts.ptsprojects.stack.common import wait_for_queue_event
+from autopts.ptsprojects.stack.common import EventQueue, wait_for_queue_event
 from autopts.pybtp import defs
 
 
 class CAP:
     def __init__(self):
         self.event_queues = {
-            defs.BTP_CAP_EV_DISCOVERY_COMPLETED: [],
+            defs.BTP_CAP_EV_DISCOVERY_COMPLETED: EventQueue((0, 1)),
             defs.BTP_CAP_EV_UNICAST_START_COMPLETED: [],
             defs.BTP_CAP_EV_UNICAST_STOP_COMPLETED: [],
         }
@@ -32,7 +32,7 @@ class CAP:
             self.event_queues[defs.BTP_CAP_EV_DISCOVERY_COMPLETED],
             lambda _addr_type, _addr, *_:
                 (addr_type, addr) == (_addr_type, _addr),
-            timeout, remove)
+            timeout, remove, key=(addr_type, addr))
 
     def wait_unicast_start_completed_ev(self, cig_id, timeout, remove=True):
         return wait_for_queue_event(
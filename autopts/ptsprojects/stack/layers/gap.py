@@ -14,10 +14,20 @@
 # more details.
 #
 import logging
+import time
+from collections import OrderedDict
+from threading import Lock
 
 from autopts.ptsprojects.stack.common import Property, wait_for_event
 from autopts.pybtp.types import AdType, IOCap, Addr
 
+# Max number of devices kept by the discovery store, the device seen least
+# recently is evicted. None for no limit.
+DISCOVERY_MAX_DEVICES = None
+
+# Max number of distinct advertising data kept per device
+DISCOVERY_MAX_REPORTS = 8
+
 
 class ConnParams:
     def __init__(self, conn_itvl_min, conn_itvl_max, conn_latency, supervision_timeout):
@@ -27,6 +37,120 @@ class ConnParams:
         self.supervision_timeout = supervision_timeout
 
 
+def parse_eir_data(eir):
+    data = {}
+
+    eir_len = len(eir)
+    i = 0
+    while i < eir_len:
+        data_len = eir[i]
+        data_type = eir[i+1]
+        data[data_type] = eir[i+2:i+data_len+1]
+        i += 1 + data_len
+
+    return data
+
+
+class AdvReport:
+    """Advertising data of a device, parsed once when first received"""
+
+    def __init__(self, eir):
+        self.eir = eir
+        self.ad = parse_eir_data(eir)
+        self.count = 0
+        self._hex = None
+
+    @property
+    def hex(self):
+        """Upper case hex string of the advertising data"""
+        if self._hex is None:
+            self._hex = self.eir.hex().upper()
+
+        return self._hex
+
+
+class DiscoveredDevice:
+    def __init__(self, addr_type, addr):
+        self.addr_type = addr_type
+        self.addr = addr
+        self.count = 0
+        self.rssi = None
+        self.flags = None
+        self.first_seen = None
+        self.last_seen = None
+        # Distinct advertising data, the latest last
+        self.reports = OrderedDict()
+
+    @property
+    def eir(self):
+        """Advertising data of the latest report"""
+        return next(reversed(self.reports))
+
+
+class DiscoveryStore:
+    """Devices found during discovery keyed by (addr_type, addr)
+
+    Repeated reports only update the counters, RSSI and timestamps of the
+    device, so the size of the store does not grow with the length of
+    the discovery.
+    """
+
+    def __init__(self, max_devices=DISCOVERY_MAX_DEVICES,
+                 max_reports=DISCOVERY_MAX_REPORTS):
+        self.max_devices = max_devices
+        self.max_reports = max_reports
+        self.evicted = 0
+        self._lock = Lock()
+        self._devices = OrderedDict()
+
+    def add(self, addr_type, addr, rssi, flags, eir):
+        now = time.time()
+        key = (addr_type, addr)
+
+        with self._lock:
+            device = self._devices.get(key)
+            if device is None:
+                if self.max_devices is not None and \
+                        len(self._devices) >= self.max_devices:
+                    self._devices.popitem(last=False)
+                    self.evicted += 1
+
+                device = DiscoveredDevice(addr_type, addr)
+                device.first_seen = now
+                self._devices[key] = device
+            else:
+                self._devices.move_to_end(key)
+
+            device.count += 1
+            device.rssi = rssi
+            device.flags = flags
+            device.last_seen = now
+
+            report = device.reports.pop(eir, None)
+            if report is None:
+                report = AdvReport(eir)
+                if len(device.reports) >= self.max_reports:
+                    device.reports.popitem(last=False)
+            report.count += 1
+            device.reports[eir] = report
+
+        return device
+
+    def get(self, addr_type, addr):
+        return self._devices.get((addr_type, addr))
+
+    def clear(self):
+        with self._lock:
+            self._devices.clear()
+
+    def __iter__(self):
+        with self._lock:
+            return iter(list(self._devices.values()))
+
+    def __len__(self):
+        return len(self._devices)
+
+
 class GapConnection:
     def __init__(self, addr, addr_type):
         self.addr = addr
@@ -90,7 +214,7 @@ class Gap:
             "type": None,
         })
         self.discoverying = Property(False)
-        self.found_devices = Property([])  # List of found devices
+        self.found_devices = DiscoveryStore()
 
         self.passkey = Property(None)
         self.conn_params = Property(None)
@@ -208,7 +332,7 @@ class Gap:
 
     def reset_discovery(self):
         self.discoverying.data = True
-        self.found_devices.data = []
+        self.found_devices.clear()
 
     def set_passkey(self, passkey):
         self.passkey.data = passkey
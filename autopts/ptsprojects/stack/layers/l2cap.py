@@ -14,8 +14,100 @@
 # more details.
 #
 import logging
+from collections import deque
+from time import monotonic
+
 from autopts.ptsprojects.stack.common import wait_for_event
 
+# Size of the ring buffer of each channel direction, fits the max SDU
+L2CAP_DATA_BUFFER_SIZE = 0x10000
+
+
+class L2capData:
+    """SDUs of one direction of a channel
+
+    SDUs are copied into a bytearray ring buffer, so large and numerous
+    SDUs do not allocate per SDU. When the buffer is full the oldest SDUs
+    are dropped. Counters of all SDUs passed, including the dropped ones,
+    are kept for throughput statistics.
+    """
+
+    def __init__(self, size=L2CAP_DATA_BUFFER_SIZE):
+        self._buf = bytearray(size)
+        # (offset, length) of the buffered SDUs, oldest first
+        self._sdus = deque()
+        self._head = 0
+        self._used = 0
+
+        self.sdus = 0
+        self.octets = 0
+        self.dropped = 0
+        self.first = None
+        self.last = None
+
+    def append(self, data):
+        length = len(data)
+        size = len(self._buf)
+
+        self.sdus += 1
+        self.octets += length
+        self.last = monotonic()
+        if self.first is None:
+            self.first = self.last
+
+        if length > size:
+            self.dropped += 1
+            return
+
+        while self._used + length > size:
+            _, old_len = self._sdus.popleft()
+            self._head = (self._head + old_len) % size
+            self._used -= old_len
+            self.dropped += 1
+
+        offset = (self._head + self._used) % size
+        first = min(length, size - offset)
+        data = memoryview(data)
+        self._buf[offset:offset + first] = data[:first]
+        self._buf[:length - first] = data[first:]
+
+        self._sdus.append((offset, length))
+        self._used += length
+
+    def get(self):
+        """List of the buffered SDUs, oldest first"""
+        size = len(self._buf)
+        sdus = []
+        for offset, length in self._sdus:
+            end = offset + length
+            if end <= size:
+                sdus.append(bytes(self._buf[offset:end]))
+            else:
+                sdus.append(bytes(self._buf[offset:]) + self._buf[:end - size])
+
+        return sdus
+
+    def clear(self):
+        """Drop the buffered SDUs, the counters are kept"""
+        self._sdus.clear()
+        self._head = 0
+        self._used = 0
+
+    @property
+    def throughput(self):
+        """Octets per second between the first and the last SDU"""
+        if self.sdus < 2 or self.last == self.first:
+            return 0.0
+
+        return self.octets / (self.last - self.first)
+
+    def __len__(self):
+        return len(self._sdus)
+
+    def __repr__(self):
+        return f'L2capData(sdus={self.sdus}, octets={self.octets}, ' \
+               f'dropped={self.dropped}, buffered={len(self._sdus)})'
+
 
 class L2capChan:
     def __init__(self, chan_id, psm, peer_mtu, peer_mps, our_mtu, our_mps,
@@ -29,8 +121,8 @@ class L2capChan:
         self.peer_bd_addr_type = bd_addr_type
         self.peer_bd_addr = bd_addr
         self.disconn_reason = None
-        self.data_tx = []
-        self.data_rx = []
+        self.data_tx = L2capData()
+        self.data_rx = L2capData()
         self.state = "init"  # "connected" / "disconnected"
 
     def _get_state(self, timeout):
@@ -74,16 +166,14 @@ class L2capChan:
         self.data_tx.append(data)
 
     def rx_data_get(self, timeout):
-        if len(self.data_rx) != 0:
-            return self.data_rx
-
+        # Woken up by the data received events
         if wait_for_event(timeout, lambda: len(self.data_rx) != 0):
-            return self.data_rx
+            return self.data_rx.get()
 
         return None
 
     def tx_data_get(self):
-        return self.data_tx
+        return self.data_tx.get()
 
 
 class L2cap:
@@ -115,8 +205,8 @@ class L2cap:
 
     def clear_data(self):
         for chan in self.channels:
-            chan.data_tx = []
-            chan.data_rx = []
+            chan.data_tx.clear()
+            chan.data_rx.clear()
 
     def reconfigured(self, chan_id, peer_mtu, peer_mps, our_mtu, our_mps):
         channel = self.chan_lookup_id(chan_id)
@@ -25,14 +25,19 @@ import logging
 import datetime
 import errno
 import queue
+from collections import defaultdict
+from contextlib import contextmanager
 
 from .stack import get_stack
 from .utils import exec_iut_cmd
 from . import ptstypes
-from ..utils import get_global_end, ResultWithFlag
+from ..utils import get_global_end, ResultWithFlag, WakeUpQueue
 
 log = logging.debug
 
+# Seconds the device is given to settle down after a test case
+SETTLE_DOWN_TIME = 3
+
 
 class ResponseWithPostWID:
     def __init__(self, response, next_steps):
@@ -171,6 +176,11 @@ class TestCmd:
         """Returns string representation"""
         return "%s %s %s" % (self.command, self.start_wid, self.stop_wid)
 
+    @property
+    def phase(self):
+        """Name of the command in the phase timing"""
+        return self.command.split(' ', 1)[0]
+
 
 class TestFunc:
     """A wrapper around test functions"""
@@ -269,6 +279,11 @@ class TestFunc:
     def stop(self):
         """Does nothing, since not easy job to stop a function"""
 
+    @property
+    def phase(self):
+        """Name of the function in the phase timing"""
+        return getattr(self.func, '__name__', str(self.func))
+
     def __str__(self):
         """Returns string representation"""
         return ("class=%s, func=%s start_wid=%s stop_wid=%s post_wid=%s "
@@ -411,9 +426,16 @@ class TestCase(PTSCallback):
         self.generic_wid_hdl = generic_wid_hdl
         self.steps_queue = None
         self.post_wid_queue = None
+        # (wid, seconds) from queueing a WID to running its handler
+        self.wid_latencies = []
+        # (phase, seconds) of the test case run, see timed
+        self.phase_times = []
         self.ptsproject_name = ptsproject_name
         self.tc_subproc = None
         self.lf_subproc = None
+        # Function run once while post_run waits for the device to settle
+        # down, e.g. preparing the next test case, see TestCasePipeline
+        self.settle_down_task = None
         self.log_filename = log_filename
         self.log_dir = log_dir
 
@@ -426,13 +448,33 @@ class TestCase(PTSCallback):
         # Fields that have to be reinit before retrying a test case
         self.status = "init"
         self.state = None
-        self.steps_queue = queue.Queue()
+        self.steps_queue = WakeUpQueue()
         self.post_wid_queue = []
+        self.wid_latencies = []
+        self.phase_times = []
 
     def __str__(self):
         """Returns string representation"""
         return "%s %s" % (self.project_name, self.name)
 
+    @contextmanager
+    def timed(self, phase):
+        """Records the time spent in the with block as phase, e.g.
+        "pre_run", "post_run: stop" or "WID 104" """
+        start_time = time.monotonic()
+        try:
+            yield
+        finally:
+            self.phase_times.append((phase, time.monotonic() - start_time))
+
+    def get_phase_times(self):
+        """{phase: seconds} of the test case run, repeated phases summed"""
+        phases = defaultdict(float)
+        for phase, seconds in self.phase_times:
+            phases[phase] += seconds
+
+        return dict(phases)
+
     def initialize_logging(self, session_logging_dir):
         now = datetime.datetime.now().strftime("%Y_%m_%d_%H_%M_%S")
         normalized_name = self.name.replace('/', '_')
@@ -652,7 +694,7 @@ class TestCase(PTSCallback):
          a WID response to PTS, or other special step.
 
         :param func: function to queue in the steps queue"""
-        self.steps_queue.put((func, *args))
+        self.steps_queue.put((time.monotonic(), func, *args))
 
     def run_next_step(self):
         try:
@@ -660,7 +702,14 @@ class TestCase(PTSCallback):
         except queue.Empty:
             return None
 
-        step, *args = item
+        queued_at, step, *args = item
+
+        if step == self.run_wid:
+            latency = time.monotonic() - queued_at
+            wid = args[1]
+            self.wid_latencies.append((wid, latency))
+            log("WID %d dispatched %.3f ms after queueing", wid, latency * 1000)
+
         response = step(*args)
 
         return response
@@ -677,22 +726,23 @@ class TestCase(PTSCallback):
         if stack.synch:
             synch_elem = stack.synch.wait_for_start(wid, test_case_name)
 
-        # start/stop command if triggered by wid
-        self.start_stop_cmds_by_wid(wid, description)
+        with self.timed(f'WID {wid}'):
+            # start/stop command if triggered by wid
+            self.start_stop_cmds_by_wid(wid, description)
 
-        if self.generic_wid_hdl is not None:
-            my_response = self.handle_mmi_generic(wid, description, style,
-                                                  test_case_name)
-        else:
-            if style == ptstypes.MMI_Style_Yes_No1:
-                my_response = self.handle_mmi_style_yes_no1(wid, description)
+            if self.generic_wid_hdl is not None:
+                my_response = self.handle_mmi_generic(wid, description, style,
+                                                      test_case_name)
+            else:
+                if style == ptstypes.MMI_Style_Yes_No1:
+                    my_response = self.handle_mmi_style_yes_no1(wid, description)
 
-            elif style == ptstypes.MMI_Style_Edit1:
-                my_response = self.handle_mmi_style_edit1(wid, description)
+                elif style == ptstypes.MMI_Style_Edit1:
+                    my_response = self.handle_mmi_style_edit1(wid, description)
 
-            # actually style == MMI_Style_Ok_Cancel2
-            else:
-                my_response = self.handle_mmi_style_ok_cancel(wid, description)
+                # actually style == MMI_Style_Ok_Cancel2
+                else:
+                    my_response = self.handle_mmi_style_ok_cancel(wid, description)
 
         # If there are post wid TestFunc waiting, run those after this one
         if self.post_wid_queue:
@@ -742,7 +792,8 @@ class TestCase(PTSCallback):
         for cmd in self.cmds:
             if cmd.start_wid is None and cmd.post_wid is None and \
                not is_cleanup_func(cmd):
-                cmd.start()
+                with self.timed(f'pre_run: {cmd.phase}'):
+                    cmd.start()
 
     def post_run(self, error_code):
         """Method called after test case is run in PTS
@@ -761,14 +812,23 @@ class TestCase(PTSCallback):
         # run the clean-up commands
         for cmd in self.cmds:
             if is_cleanup_func(cmd):
-                cmd.start()
+                with self.timed(f'post_run: {cmd.phase}'):
+                    cmd.start()
+
+        settle_down_task, self.settle_down_task = self.settle_down_task, None
 
         # in accordance with PTSControlClient.cpp:
         # // Allow device to settle down
         # Sleep(3000);
         # otherwise 4th test case just blocks eternally
         if not get_global_end():
-            time.sleep(3)
+            with self.timed('post_run: settle down'):
+                settle_down_end = time.monotonic() + SETTLE_DOWN_TIME
+                # Neither PTS nor the IUT are used while settling down, the
+                # task ends before they are used again
+                if settle_down_task:
+                    settle_down_task()
+                time.sleep(max(0.0, settle_down_end - time.monotonic()))
 
         for cmd in self.cmds:
             cmd.stop()
@@ -789,23 +849,24 @@ class TestCase(PTSCallback):
 
         if os.path.exists(subproc_path):
             log("%s, run post test case script" % self.post_run.__name__)
-            self.lf_subproc = open(subproc_dir + "sp_post_stdout.log", "w")
+            with self.timed('post_run: post_tc.py'):
+                self.lf_subproc = open(subproc_dir + "sp_post_stdout.log", "w")
 
-            if sys.platform == "win32":
-                subproc_cmd = " ".join(["python", repr(subproc_path),
-                                        self.project_name, self.name])
-            else:
-                subproc_cmd = " ".join(
-                    [subproc_path, self.project_name, self.name])
+                if sys.platform == "win32":
+                    subproc_cmd = " ".join(["python", repr(subproc_path),
+                                            self.project_name, self.name])
+                else:
+                    subproc_cmd = " ".join(
+                        [subproc_path, self.project_name, self.name])
 
-            self.tc_subproc = subprocess.Popen(shlex.split(subproc_cmd),
-                                               shell=False,
-                                               stdin=subprocess.PIPE,
-                                               stdout=self.lf_subproc,
-                                               stderr=self.lf_subproc)
+                self.tc_subproc = subprocess.Popen(shlex.split(subproc_cmd),
+                                                   shell=False,
+                                                   stdin=subprocess.PIPE,
+                                                   stdout=self.lf_subproc,
+                                                   stderr=self.lf_subproc)
 
-            self.tc_subproc.communicate(input=b'#close\n')
-            self.lf_subproc.close()
+                self.tc_subproc.communicate(input=b'#close\n')
+                self.lf_subproc.close()
 
 
 class TestCaseLT1(TestCase):
@@ -839,6 +900,96 @@ class TestCaseLT3(TestCase):
         self.run_pre_and_post_sp = False
 
 
+LT_CLASSES = (TestCaseLT1, TestCaseLT2, TestCaseLT3)
+
+
+def get_lt_index(test_case):
+    """1, 2 or 3 for the TestCaseLT1, TestCaseLT2 and TestCaseLT3 instances,
+    None for the other test cases"""
+    for lt, lt_class in enumerate(LT_CLASSES, 1):
+        if isinstance(test_case, lt_class):
+            return lt
+
+    return None
+
+
+class TestCaseRegistry:
+    """Test case instances indexed by name and lower tester
+
+    Test cases are registered with a factory and the instance is created
+    at the first lookup, so only the test cases selected to run are ever
+    built. Profiles are registered as a whole with add_profile, and their
+    test_cases() is called at the first lookup of a test case with the
+    name prefixed by the profile name, e.g. GAP/...
+    """
+
+    def __init__(self):
+        # (name, lt) -> test case instance
+        self._instances = {}
+        # (name, lt) -> factory returning the instance
+        self._factories = {}
+        # profile name -> factory returning a list of instances
+        self._profiles = {}
+        self._loaded_profiles = set()
+
+    @staticmethod
+    def from_instances(test_cases):
+        """Registry of a list of test case instances, e.g. returned by
+        the test_cases() of a profile. Registries are returned as is."""
+        if test_cases is None or isinstance(test_cases, TestCaseRegistry):
+            return test_cases
+
+        registry = TestCaseRegistry()
+        registry.add_instances(test_cases)
+
+        return registry
+
+    def add(self, name, factory, lt=1):
+        """Register factory creating the LT<lt> instance of test case"""
+        self._factories[(name, lt)] = factory
+
+    def add_instances(self, test_cases):
+        for test_case in test_cases:
+            lt = get_lt_index(test_case)
+            if lt is not None:
+                # The first one wins, as with the former list lookup
+                self._instances.setdefault((test_case.name, lt), test_case)
+
+    def add_profile(self, profile, factory):
+        """Register factory returning the test case list of the profile"""
+        self._profiles[profile] = factory
+
+    def _load_profile(self, profile):
+        factory = self._profiles.pop(profile)
+        self._loaded_profiles.add(profile)
+        log("Loading %s test cases", profile)
+        self.add_instances(factory())
+
+    def get(self, name, lt=1):
+        """Instance of the LT<lt> test case or None if not implemented"""
+        key = (name, lt)
+        test_case = self._instances.get(key)
+        if test_case is not None:
+            return test_case
+
+        factory = self._factories.pop(key, None)
+        if factory is not None:
+            test_case = self._instances[key] = factory()
+            return test_case
+
+        profile = name.split('/', 1)[0]
+        if profile in self._profiles:
+            self._load_profile(profile)
+        elif self._profiles and profile not in self._loaded_profiles:
+            # Test case of a profile named differently than the test cases
+            for profile in list(self._profiles):
+                self._load_profile(profile)
+        else:
+            return None
+
+        return self.get(name, lt)
+
+
 def get_max_test_case_desc(test_cases):
     """Takes a list of test cases and return a tuple of longest project name
     and test case name."""
@@ -1,4 +1,5 @@
 import sqlite3
+import time
 
 DATABASE_FILE = 'TestCase.db'
 
@@ -12,6 +13,19 @@ class TestCaseTable:
         self.cursor.execute(
             "CREATE TABLE IF NOT EXISTS {} (name TEXT, duration REAL, "
             "count INTEGER, result TEXT);".format(self.name))
+        # Results of all runs of the test cases, retries included
+        self.cursor.execute(
+            "CREATE TABLE IF NOT EXISTS {}_history (name TEXT, result TEXT, "
+            "duration REAL, timestamp REAL);".format(self.name))
+        # Time spent in the phases of the test case runs, see
+        # TestCase.timed
+        self.cursor.execute(
+            "CREATE TABLE IF NOT EXISTS {}_phases (name TEXT, phase TEXT, "
+            "duration REAL, timestamp REAL);".format(self.name))
+        # WIDs received by the test cases in their runs
+        self.cursor.execute(
+            "CREATE TABLE IF NOT EXISTS {}_wids (name TEXT, wid INTEGER, "
+            "UNIQUE(name, wid));".format(self.name))
         self.conn.commit()
 
         self._close()
@@ -84,6 +98,65 @@ class TestCaseTable:
 
         return None
 
+    def add_run(self, test_case_name, result, duration):
+        self._open()
+
+        self.cursor.execute(
+            "INSERT INTO {}_history VALUES(?, ?, ?, ?);".format(self.name),
+            (test_case_name, result, duration, time.time()))
+        self.conn.commit()
+        self._close()
+
+    def get_history(self, test_case_name, limit):
+        """Results and durations of the last limit runs, newest first"""
+        self._open()
+
+        self.cursor.execute(
+            "SELECT result, duration FROM {}_history WHERE name=:name "
+            "ORDER BY timestamp DESC LIMIT :limit".format(self.name),
+            {"name": test_case_name, "limit": limit})
+        rows = self.cursor.fetchall()
+        self._close()
+
+        return rows
+
+    def update_phases(self, test_case_name, phases):
+        if not phases:
+            return
+
+        self._open()
+
+        timestamp = time.time()
+        self.cursor.executemany(
+            "INSERT INTO {}_phases VALUES(?, ?, ?, ?);".format(self.name),
+            [(test_case_name, phase, duration, timestamp)
+             for phase, duration in phases.items()])
+        self.conn.commit()
+        self._close()
+
+    def update_wids(self, test_case_name, wids):
+        if not wids:
+            return
+
+        self._open()
+
+        self.cursor.executemany(
+            "INSERT OR IGNORE INTO {}_wids VALUES(?, ?);".format(self.name),
+            [(test_case_name, wid) for wid in wids])
+        self.conn.commit()
+        self._close()
+
+    def get_wids(self, test_case_name):
+        self._open()
+
+        self.cursor.execute(
+            "SELECT wid FROM {}_wids "
+            "WHERE name=:name".format(self.name), {"name": test_case_name})
+        rows = self.cursor.fetchall()
+        self._close()
+
+        return {row[0] for row in rows}
+
     def estimate_session_duration(self, test_cases_names, run_count_max):
         duration = 0
         count_unknown = 0
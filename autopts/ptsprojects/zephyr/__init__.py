@@ -13,41 +13,49 @@
 # more details.
 #
 
+from autopts.ptsprojects import lazy_submodules
 
-import autopts.ptsprojects.zephyr.dis
-import autopts.ptsprojects.zephyr.gap
-import autopts.ptsprojects.zephyr.gatt
-import autopts.ptsprojects.zephyr.l2cap
-import autopts.ptsprojects.zephyr.sm
-import autopts.ptsprojects.zephyr.mesh
-import autopts.ptsprojects.zephyr.mmdl
-import autopts.ptsprojects.zephyr.ias
-import autopts.ptsprojects.zephyr.vcs
-import autopts.ptsprojects.zephyr.vocs
-import autopts.ptsprojects.zephyr.aics
-import autopts.ptsprojects.zephyr.pacs
-import autopts.ptsprojects.zephyr.ascs
-import autopts.ptsprojects.zephyr.bap
-import autopts.ptsprojects.zephyr.has
-import autopts.ptsprojects.zephyr.hap
-import autopts.ptsprojects.zephyr.csis
-import autopts.ptsprojects.zephyr.csip
-import autopts.ptsprojects.zephyr.micp
-import autopts.ptsprojects.zephyr.mics
-import autopts.ptsprojects.zephyr.ccp
-import autopts.ptsprojects.zephyr.vcp
-import autopts.ptsprojects.zephyr.dfum
-import autopts.ptsprojects.zephyr.mbtm
-import autopts.ptsprojects.zephyr.cas
-import autopts.ptsprojects.zephyr.cap
-import autopts.ptsprojects.zephyr.mcp
-import autopts.ptsprojects.zephyr.bass
-import autopts.ptsprojects.zephyr.mcs
-import autopts.ptsprojects.zephyr.tbs
-import autopts.ptsprojects.zephyr.tmap
-import autopts.ptsprojects.zephyr.ots
-import autopts.ptsprojects.zephyr.pbp
-# GENERATOR append 1
+# Profiles of the project. The profile modules, and with them their WID
+# modules, are imported on first access of the attribute of the profile,
+# e.g. by getattr(project, 'gap').
+PROFILES = (
+    'dis',
+    'gap',
+    'gatt',
+    'l2cap',
+    'sm',
+    'mesh',
+    'mmdl',
+    'ias',
+    'vcs',
+    'vocs',
+    'aics',
+    'pacs',
+    'ascs',
+    'bap',
+    'has',
+    'hap',
+    'csis',
+    'csip',
+    'micp',
+    'mics',
+    'ccp',
+    'vcp',
+    'dfum',
+    'mbtm',
+    'cas',
+    'cap',
+    'mcp',
+    'bass',
+    'mcs',
+    'tbs',
+    'tmap',
+    'ots',
+    'pbp',
+    # GENERATOR append 1
+)
+
+__getattr__ = lazy_submodules(__name__)
 
 # Constants
 ZEPHYR_PROJECT_URL = "https://github.com/zephyrproject-rtos/zephyr"
@@ -314,21 +314,20 @@ def test_cases(ptses):
     test_case_name_list = pts.get_test_case_list('BAP')
     tc_list = []
 
+    custom_tcs = {tc.name: tc for tc in custom_test_cases}
+
     for tc_name in test_case_name_list:
-        if tc_name.startswith('BAP/USR'):
-            # Missing MMI 20001, errata in progress
-            _pre_conditions = pre_conditions_server
-        else:
-            _pre_conditions = pre_conditions
-
-        instance = ZTestCase("BAP", tc_name,
-                             cmds=_pre_conditions,
-                             generic_wid_hdl=bap_wid_hdl)
-
-        for custom_tc in custom_test_cases:
-            if tc_name == custom_tc.name:
-                instance = custom_tc
-                break
+        instance = custom_tcs.get(tc_name)
+        if instance is None:
+            if tc_name.startswith('BAP/USR'):
+                # Missing MMI 20001, errata in progress
+                _pre_conditions = pre_conditions_server
+            else:
+                _pre_conditions = pre_conditions
+
+            instance = ZTestCase("BAP", tc_name,
+                                 cmds=_pre_conditions,
+                                 generic_wid_hdl=bap_wid_hdl)
 
         tc_list.append(instance)
 
@@ -15,11 +15,12 @@
 
 import logging
 
-from autopts.wid import generic_wid_hdl
+from autopts.wid import generic_wid_hdl, wid_modules
 
 log = logging.debug
 
 
+@wid_modules(__name__, 'autopts.wid.ccp')
 def ccp_wid_hdl(wid, description, test_case_name):
     log(f'{ccp_wid_hdl.__name__}, {wid}, {description}, {test_case_name}')
-    return generic_wid_hdl(wid, description, test_case_name, [__name__, 'autopts.wid.ccp'])
+    return generic_wid_hdl(wid, description, test_case_name, ccp_wid_hdl.wid_modules)
@@ -15,11 +15,12 @@
 
 import logging
 
-from autopts.wid import generic_wid_hdl
+from autopts.wid import generic_wid_hdl, wid_modules
 
 log = logging.debug
 
 
+@wid_modules(__name__, 'autopts.wid.csis')
 def csis_wid_hdl(wid, description, test_case_name):
     log(f'{csis_wid_hdl.__name__}, {wid}, {description}, {test_case_name}')
-    return generic_wid_hdl(wid, description, test_case_name, [__name__, 'autopts.wid.csis'])
+    return generic_wid_hdl(wid, description, test_case_name, csis_wid_hdl.wid_modules)
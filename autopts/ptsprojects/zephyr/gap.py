@@ -33,34 +33,30 @@ class SVC:
 class CHAR:
     name = (None, None, None, UUID.device_name)
 
-init_gatt_db = [TestFunc(btp.gatts_add_svc, 0, UUID.VND16_1),
-                TestFunc(btp.gatts_add_char, 0, Prop.read,
-                         Perm.read | Perm.read_authn,
-                         UUID.VND16_2),
-                TestFunc(btp.gatts_set_val, 0, '01'),
-                TestFunc(btp.gatts_add_char, 0, Prop.read,
-                         Perm.read | Perm.read_enc,
-                         UUID.VND16_3),
-                TestFunc(btp.gatts_set_val, 0, '02'),
-                TestFunc(btp.gatts_add_char, 0,
-                         Prop.read | Prop.auth_swrite,
-                         Perm.read | Perm.write,
-                         UUID.VND16_4),
-                TestFunc(btp.gatts_set_val, 0, '03'),
-                TestFunc(btp.gatts_add_char, 0,
-                         Prop.read | Prop.write,
-                         Perm.read_authn | Perm.write_authn,
-                         UUID.VND16_5),
-                TestFunc(btp.gatts_set_val, 0, '04'),
-                TestFunc(btp.gatts_start_server)]
-
-init_gatt_db2 = [TestFunc(btp.gatts_add_svc, 0, UUID.VND16_1),
-                 TestFunc(btp.gatts_add_char, 0,
-                         Prop.read | Prop.auth_swrite,
-                         Perm.read | Perm.write_authn,
-                         UUID.VND16_4),
-                TestFunc(btp.gatts_set_val, 0, '03'),
-                TestFunc(btp.gatts_start_server)]
+init_gatt_db = [TestFunc(btp.gatts_setup_db, [
+    (btp.gatts_add_svc, 0, UUID.VND16_1),
+    (btp.gatts_add_char, 0, Prop.read,
+     Perm.read | Perm.read_authn, UUID.VND16_2),
+    (btp.gatts_set_val, 0, '01'),
+    (btp.gatts_add_char, 0, Prop.read,
+     Perm.read | Perm.read_enc, UUID.VND16_3),
+    (btp.gatts_set_val, 0, '02'),
+    (btp.gatts_add_char, 0, Prop.read | Prop.auth_swrite,
+     Perm.read | Perm.write, UUID.VND16_4),
+    (btp.gatts_set_val, 0, '03'),
+    (btp.gatts_add_char, 0, Prop.read | Prop.write,
+     Perm.read_authn | Perm.write_authn, UUID.VND16_5),
+    (btp.gatts_set_val, 0, '04'),
+    (btp.gatts_start_server,),
+])]
+
+init_gatt_db2 = [TestFunc(btp.gatts_setup_db, [
+    (btp.gatts_add_svc, 0, UUID.VND16_1),
+    (btp.gatts_add_char, 0, Prop.read | Prop.auth_swrite,
+     Perm.read | Perm.write_authn, UUID.VND16_4),
+    (btp.gatts_set_val, 0, '03'),
+    (btp.gatts_start_server,),
+])]
 
 iut_manufacturer_data = 'ABCD'
 iut_appearance = '1111'
@@ -599,15 +595,14 @@ def test_cases(ptses):
     test_case_name_list = pts.get_test_case_list('GAP')
     tc_list = []
 
+    custom_tcs = {tc.name: tc for tc in custom_test_cases}
+
     for tc_name in test_case_name_list:
-        instance = ZTestCase('GAP', tc_name,
-                             cmds=pre_conditions + init_gatt_db,
-                             generic_wid_hdl=gap_wid_hdl)
-
-        for custom_tc in custom_test_cases:
-            if tc_name == custom_tc.name:
-                instance = custom_tc
-                break
+        instance = custom_tcs.get(tc_name)
+        if instance is None:
+            instance = ZTestCase('GAP', tc_name,
+                                 cmds=pre_conditions + init_gatt_db,
+                                 generic_wid_hdl=gap_wid_hdl)
 
         tc_list.append(instance)
 
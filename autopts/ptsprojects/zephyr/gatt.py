@@ -174,137 +174,137 @@ def test_cases_server(ptses):
                     TestFunc(stack.gatt_init)
     ]
 
-    init_server = [
-                     TestFunc(btp.gatts_add_svc, 1, UUID.SVND16_0),
-
-                     TestFunc(btp.gatts_add_char, 0,
-                              Prop.read | Prop.write,
-                              Perm.read | Perm.write,
-                              UUID.VND16_0),
-                     TestFunc(btp.gatts_set_val, 0, Value.eight_bytes_1),
-
-                     TestFunc(btp.gatts_add_char, 0,
-                              Prop.read | Prop.write,
-                              Perm.read_enc | Perm.write_enc,
-                              UUID.VND16_1),
-                     TestFunc(btp.gatts_set_val, 0, Value.eight_bytes_1),
-
-                     TestFunc(btp.gatts_add_char, 0,
-                              Prop.read | Prop.write,
-                              Perm.read_authn | Perm.write_authn,
-                              UUID.VND16_2),
-                     TestFunc(btp.gatts_set_val, 0, Value.eight_bytes_1),
-
-                    TestFunc(btp.gatts_add_char, 0,
-                              Prop.read | Prop.write,
-                              Perm.read_authz | Perm.write_authz,
-                              UUID.VND16_3),
-                     TestFunc(btp.gatts_set_val, 0, Value.eight_bytes_1),
-
-                     TestFunc(btp.gatts_add_char, 0,
-                              Prop.read | Prop.write | Prop.notify | Prop.indicate,
-                              Perm.read | Perm.write,
-                              UUID.VND16_4),
-                     TestFunc(btp.gatts_set_val, 0, Value.eight_bytes_1),
-                     TestFunc(btp.gatts_add_desc, 0,
-                              Perm.read | Perm.write,
-                              UUID.CCC),
-
-                     TestFunc(btp.gatts_add_char, 0,
-                              Prop.read | Prop.write | Prop.notify | Prop.indicate,
-                              Perm.read | Perm.write,
-                              UUID.VND16_5),
-                     TestFunc(btp.gatts_set_val, 0, Value.eight_bytes_1),
-                     TestFunc(btp.gatts_add_desc, 0,
-                              Perm.read | Perm.write,
-                              UUID.CCC),
-
-                     TestFunc(btp.gatts_add_char, 0,
-                              Prop.read | Prop.write_wo_resp | Prop.auth_swrite,
-                              Perm.read | Perm.write,
-                              UUID.VND16_6),
-                     TestFunc(btp.gatts_set_val, 0, Value.eight_bytes_1),
-
-                    TestFunc(btp.gatts_add_char, 0,
-                              Prop.read | Prop.write_wo_resp | Prop.auth_swrite,
-                              Perm.read_authn | Perm.write_authn,
-                              UUID.VND16_7),
-                     TestFunc(btp.gatts_set_val, 0, Value.eight_bytes_1),
-
-                      TestFunc(btp.gatts_add_char, 0,
-                              Prop.read | Prop.write | Prop.ext_prop,
-                              Perm.read | Perm.write,
-                              UUID.VND16_8),
-                     TestFunc(btp.gatts_set_val, 0, Value.eight_bytes_1),
-                     TestFunc(btp.gatts_add_desc, 0, Perm.read, UUID.CEP),
-                     TestFunc(btp.gatts_set_val, 0, '0100'),
-
-                     TestFunc(btp.gatts_add_char, 0,
-                              Prop.read | Prop.write,
-                              Perm.read_enc | Perm.write_enc,
-                              UUID.VND16_9),
-                     TestFunc(btp.gatts_set_val, 0, Value.eight_bytes_1),
-                     TestFunc(btp.gatts_set_enc_key_size, 0, 0x0f),
-
-                     TestFunc(btp.gatts_add_char, 0,
-                              Prop.read | Prop.write,
-                              Perm.read_enc | Perm.write_enc,
-                              UUID.VND16_10),
-                     TestFunc(btp.gatts_set_val, 0, Value.eight_bytes_1),
-                     TestFunc(btp.gatts_set_enc_key_size, 0, 0x0f),
-
-                     TestFunc(btp.gatts_add_char, 0,
-                              Prop.read | Prop.write,
-                              Perm.read | Perm.write,
-                              UUID.VND128_1),
-                     TestFunc(btp.gatts_set_val, 0, Value.eight_bytes_1),
-
-                     TestFunc(btp.gatts_add_svc, 0, UUID.SVND16_1),
-                     TestFunc(btp.gatts_add_inc_svc, 1),
-
-                     TestFunc(btp.gatts_add_char, 0,
-                              Prop.read | Prop.write,
-                              Perm.read | Perm.write,
-                              UUID.VND16_0),
-                     TestFunc(btp.gatts_set_val, 0, Value.long_1),
-
-                     TestFunc(btp.gatts_add_char, 0,
-                              Prop.read | Prop.write,
-                              Perm.read | Perm.write,
-                              UUID.VND16_1),
-                     TestFunc(btp.gatts_set_val, 0, Value.long_2),
-
-                     TestFunc(btp.gatts_add_char, 0,
-                              Prop.read | Prop.write,
-                              Perm.read_enc | Perm.write_enc,
-                              UUID.VND16_2),
-                     TestFunc(btp.gatts_set_val, 0, Value.long_3),
-                     TestFunc(btp.gatts_set_enc_key_size, 0, 0x0f),
-
-                     TestFunc(btp.gatts_add_char, 0,
-                              Prop.read,
-                              Perm.read,
-                              UUID.VND16_3),
-                     TestFunc(btp.gatts_set_val, 0, Value.eight_bytes_1 * 10),
-                     TestFunc(btp.gatts_add_desc, 0,
-                              Perm.read | Perm.write,
-                              UUID.VND16_4),
-                     TestFunc(btp.gatts_set_val, 0, Value.long_4),
-
-                     TestFunc(btp.gatts_add_char, 0,
-                              Prop.read | Prop.write,
-                              Perm.read | Perm.write,
-                              UUID.VND16_5),
-                     TestFunc(btp.gatts_set_val, 0, Value.long_5),
-
-                     TestFunc(btp.gatts_add_char, 0,
-                              Prop.read | Prop.write,
-                              Perm.read | Perm.write,
-                              UUID.VND16_6),
-                     TestFunc(btp.gatts_set_val, 0, Value.long_6),
-
-                     TestFunc(btp.gatts_start_server)
-                     ]
+    init_server = [TestFunc(btp.gatts_setup_db, [
+        (btp.gatts_add_svc, 1, UUID.SVND16_0),
+
+        (btp.gatts_add_char, 0,
+         Prop.read | Prop.write,
+         Perm.read | Perm.write,
+         UUID.VND16_0),
+        (btp.gatts_set_val, 0, Value.eight_bytes_1),
+
+        (btp.gatts_add_char, 0,
+         Prop.read | Prop.write,
+         Perm.read_enc | Perm.write_enc,
+         UUID.VND16_1),
+        (btp.gatts_set_val, 0, Value.eight_bytes_1),
+
+        (btp.gatts_add_char, 0,
+         Prop.read | Prop.write,
+         Perm.read_authn | Perm.write_authn,
+         UUID.VND16_2),
+        (btp.gatts_set_val, 0, Value.eight_bytes_1),
+
+        (btp.gatts_add_char, 0,
+         Prop.read | Prop.write,
+         Perm.read_authz | Perm.write_authz,
+         UUID.VND16_3),
+        (btp.gatts_set_val, 0, Value.eight_bytes_1),
+
+        (btp.gatts_add_char, 0,
+         Prop.read | Prop.write | Prop.notify | Prop.indicate,
+         Perm.read | Perm.write,
+         UUID.VND16_4),
+        (btp.gatts_set_val, 0, Value.eight_bytes_1),
+        (btp.gatts_add_desc, 0,
+         Perm.read | Perm.write,
+         UUID.CCC),
+
+        (btp.gatts_add_char, 0,
+         Prop.read | Prop.write | Prop.notify | Prop.indicate,
+         Perm.read | Perm.write,
+         UUID.VND16_5),
+        (btp.gatts_set_val, 0, Value.eight_bytes_1),
+        (btp.gatts_add_desc, 0,
+         Perm.read | Perm.write,
+         UUID.CCC),
+
+        (btp.gatts_add_char, 0,
+         Prop.read | Prop.write_wo_resp | Prop.auth_swrite,
+         Perm.read | Perm.write,
+         UUID.VND16_6),
+        (btp.gatts_set_val, 0, Value.eight_bytes_1),
+
+        (btp.gatts_add_char, 0,
+         Prop.read | Prop.write_wo_resp | Prop.auth_swrite,
+         Perm.read_authn | Perm.write_authn,
+         UUID.VND16_7),
+        (btp.gatts_set_val, 0, Value.eight_bytes_1),
+
+        (btp.gatts_add_char, 0,
+         Prop.read | Prop.write | Prop.ext_prop,
+         Perm.read | Perm.write,
+         UUID.VND16_8),
+        (btp.gatts_set_val, 0, Value.eight_bytes_1),
+        (btp.gatts_add_desc, 0, Perm.read, UUID.CEP),
+        (btp.gatts_set_val, 0, '0100'),
+
+        (btp.gatts_add_char, 0,
+         Prop.read | Prop.write,
+         Perm.read_enc | Perm.write_enc,
+         UUID.VND16_9),
+        (btp.gatts_set_val, 0, Value.eight_bytes_1),
+        (btp.gatts_set_enc_key_size, 0, 0x0f),
+
+        (btp.gatts_add_char, 0,
+         Prop.read | Prop.write,
+         Perm.read_enc | Perm.write_enc,
+         UUID.VND16_10),
+        (btp.gatts_set_val, 0, Value.eight_bytes_1),
+        (btp.gatts_set_enc_key_size, 0, 0x0f),
+
+        (btp.gatts_add_char, 0,
+         Prop.read | Prop.write,
+         Perm.read | Perm.write,
+         UUID.VND128_1),
+        (btp.gatts_set_val, 0, Value.eight_bytes_1),
+
+        (btp.gatts_add_svc, 0, UUID.SVND16_1),
+        (btp.gatts_add_inc_svc, 1),
+
+        (btp.gatts_add_char, 0,
+         Prop.read | Prop.write,
+         Perm.read | Perm.write,
+         UUID.VND16_0),
+        (btp.gatts_set_val, 0, Value.long_1),
+
+        (btp.gatts_add_char, 0,
+         Prop.read | Prop.write,
+         Perm.read | Perm.write,
+         UUID.VND16_1),
+        (btp.gatts_set_val, 0, Value.long_2),
+
+        (btp.gatts_add_char, 0,
+         Prop.read | Prop.write,
+         Perm.read_enc | Perm.write_enc,
+         UUID.VND16_2),
+        (btp.gatts_set_val, 0, Value.long_3),
+        (btp.gatts_set_enc_key_size, 0, 0x0f),
+
+        (btp.gatts_add_char, 0,
+         Prop.read,
+         Perm.read,
+         UUID.VND16_3),
+        (btp.gatts_set_val, 0, Value.eight_bytes_1 * 10),
+        (btp.gatts_add_desc, 0,
+         Perm.read | Perm.write,
+         UUID.VND16_4),
+        (btp.gatts_set_val, 0, Value.long_4),
+
+        (btp.gatts_add_char, 0,
+         Prop.read | Prop.write,
+         Perm.read | Perm.write,
+         UUID.VND16_5),
+        (btp.gatts_set_val, 0, Value.long_5),
+
+        (btp.gatts_add_char, 0,
+         Prop.read | Prop.write,
+         Perm.read | Perm.write,
+         UUID.VND16_6),
+        (btp.gatts_set_val, 0, Value.long_6),
+
+        (btp.gatts_start_server,)
+    ])]
 
     custom_test_cases = [
         ZTestCase("GATT", "GATT/SR/GAN/BV-02-C",
@@ -335,17 +335,17 @@ def test_cases_server(ptses):
     test_case_name_list = pts.get_test_case_list('GATT')
     tc_list = []
 
+    custom_tcs = {tc.name: tc for tc in custom_test_cases}
+
     for tc_name in test_case_name_list:
         if not tc_name.startswith('GATT/SR'):
             continue
-        instance = ZTestCase('GATT', tc_name,
-                             cmds=pre_conditions + init_server,
-                             generic_wid_hdl=gatt_wid_hdl)
 
-        for custom_tc in custom_test_cases:
-            if tc_name == custom_tc.name:
-                instance = custom_tc
-                break
+        instance = custom_tcs.get(tc_name)
+        if instance is None:
+            instance = ZTestCase('GATT', tc_name,
+                                 cmds=pre_conditions + init_server,
+                                 generic_wid_hdl=gatt_wid_hdl)
 
         tc_list.append(instance)
 
@@ -406,17 +406,17 @@ def test_cases_client(pts):
     test_case_name_list = pts.get_test_case_list('GATT')
     tc_list = []
 
+    custom_tcs = {tc.name: tc for tc in custom_test_cases}
+
     for tc_name in test_case_name_list:
         if not tc_name.startswith('GATT/CL'):
             continue
-        instance = ZTestCase("GATT", tc_name,
-                             cmds=pre_conditions,
-                             generic_wid_hdl=gatt_wid_hdl)
-
-        for custom_tc in custom_test_cases:
-            if tc_name == custom_tc.name:
-                instance = custom_tc
-                break
+
+        instance = custom_tcs.get(tc_name)
+        if instance is None:
+            instance = ZTestCase("GATT", tc_name,
+                                 cmds=pre_conditions,
+                                 generic_wid_hdl=gatt_wid_hdl)
 
         tc_list.append(instance)
 
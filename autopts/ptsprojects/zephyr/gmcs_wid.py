@@ -17,13 +17,14 @@ import logging
 import sys
 
 from autopts.pybtp.types import WIDParams
-from autopts.wid import generic_wid_hdl
+from autopts.wid import generic_wid_hdl, wid_modules
 from autopts.wid.gmcs import gmcs_wid_hdl as gen_wid_hdl
 
 
 log = logging.debug
 
 
+@wid_modules(__name__, 'autopts.wid.gmcs')
 def gmcs_wid_hdl(wid, description, test_case_name):
     log(f'{gmcs_wid_hdl.__name__}, {wid}, {description}, {test_case_name}')
-    return generic_wid_hdl(wid, description, test_case_name, [__name__, 'autopts.wid.gmcs'])
+    return generic_wid_hdl(wid, description, test_case_name, gmcs_wid_hdl.wid_modules)
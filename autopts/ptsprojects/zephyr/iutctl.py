@@ -13,19 +13,17 @@
 # more details.
 #
 
-import socket
 import subprocess
 import os
 import logging
 import shlex
 import sys
 import time
-import serial
 
 from autopts.pybtp import defs
 from autopts.ptsprojects.boards import Board, get_debugger_snr, tty_to_com
 from autopts.pybtp.types import BTPError
-from autopts.pybtp.iutctl_common import BTPSocketSrv, BTPWorker, BTP_ADDRESS
+from autopts.pybtp.iutctl_common import BTPSerial, BTPSocketSrv, BTPWorker, BTP_ADDRESS
 from autopts.rtt import RTTLogger, BTMON
 from autopts.ptsprojects.stack import get_stack
 from autopts.utils import get_global_end
@@ -73,6 +71,7 @@ class ZephyrCtl:
         self.native = None
         self.gdb = args.gdb
         self.is_running = False
+        self.btp_session = args.btp_session
 
         if self.tty_file and args.board_name:  # DUT is a hardware board, not QEMU
             if self.debugger_snr is None:
@@ -81,9 +80,14 @@ class ZephyrCtl:
         else:  # DUT is QEMU or a board that won't be reset
             self.board = None
 
+        # The BTP connection can outlive a test case only if the IUT is
+        # reset between test cases without restarting a process.
+        if self.btp_session and not (self.board and self.tty_file and not self.gdb):
+            log("BTP session not supported in this IUT setup, disabling it")
+            self.btp_session = False
+
         self.qemu_process = None
         self.native_process = None
-        self.socat_process = None
         self.socket_srv = None
         self.btp_socket = None
         self.test_case = None
@@ -106,37 +110,32 @@ class ZephyrCtl:
         self.is_running = True
         self.test_case = test_case
 
-        # We will reset HW after BTP socket is open. If the board was
-        # reset before this happened, it is possible to receive none,
-        # partial or whole IUT ready event. Flush serial to ignore it.
-        self.flush_serial()
+        if self.btp_session and self.btp_socket:
+            # Keep the BTP connection of the previous test case. The IUT
+            # was reset in stop() and its IUT ready event was received.
+            log("Reusing BTP session")
+            self.socket_srv.set_log_dir(test_case.log_dir)
+            self.btp_socket.reset_rx_queue()
+            return
 
-        self.socket_srv = BTPSocketSrv(test_case.log_dir)
-        self.socket_srv.open(self.btp_address)
-        self.btp_socket = BTPWorker(self.socket_srv)
+        with test_case.timed('IUT start: BTP open'):
+            if self.tty_file:
+                # Talk to the TTY directly, no socat bridge is needed
+                self.socket_srv = BTPSerial(test_case.log_dir)
+                self.socket_srv.open(self.tty_port(), SERIAL_BAUDRATE)
 
-        if self.tty_file:
-            if sys.platform == "win32":
-                # On windows socat.exe does not support setting serial baud rate.
-                # Set it with 'mode' from cmd.exe
-                com = tty_to_com(self.tty_file)
-                mode_cmd = (">nul 2>nul cmd.exe /c \"mode " + com + "BAUD=115200 PARITY=n DATA=8 STOP=1\"")
-                os.system(mode_cmd)
-
-                socat_cmd = ("socat.exe -x -v tcp:" + socket.gethostbyname(socket.gethostname()) +
-                             ":%s,retry=100,interval=1 %s,raw,b115200" %
-                             (self.socket_srv.sock.getsockname()[1], self.tty_file))
+                # We will reset HW after BTP serial is open. If the board was
+                # reset before this happened, it is possible to receive none,
+                # partial or whole IUT ready event. Flush serial to ignore it.
+                self.flush_serial()
             else:
-                socat_cmd = ("socat -x -v %s,rawer,b115200 UNIX-CONNECT:%s" %
-                             (self.tty_file, self.btp_address))
+                self.socket_srv = BTPSocketSrv(test_case.log_dir)
+                self.socket_srv.open(self.btp_address)
 
-            log("Starting socat process: %s", socat_cmd)
+        self.btp_socket = BTPWorker(self.socket_srv)
 
-            # socat dies after socket is closed, so no need to kill it
-            self.socat_process = subprocess.Popen(shlex.split(socat_cmd),
-                                                  shell=False,
-                                                  stdout=subprocess.DEVNULL,
-                                                  stderr=subprocess.DEVNULL)
+        if self.tty_file:
+            log("BTP over serial %s", self.socket_srv.addr)
         elif self.hci is not None:
             self.iut_log_file = open(os.path.join(test_case.log_dir, "autopts-iutctl-zephyr.log"), "a")
             socat_cmd = ("socat -x -v %%s,rawer,b115200 UNIX-CONNECT:%s &" %
@@ -164,27 +163,20 @@ class ZephyrCtl:
                                                  stdout=self.iut_log_file,
                                                  stderr=self.iut_log_file)
 
-        self.btp_socket.accept()
+        with test_case.timed('IUT start: BTP accept'):
+            self.btp_socket.accept()
+
+    def tty_port(self):
+        if sys.platform == 'win32':
+            return tty_to_com(self.tty_file)
+
+        return self.tty_file
 
     def flush_serial(self):
         log("%s.%s", self.__class__, self.flush_serial.__name__)
-        # Try to read data or timeout
-        try:
-            if sys.platform == 'win32':
-                tty = tty_to_com(self.tty_file)
-            else:
-                tty = self.tty_file
-
-            # The main reason why we do not use serial.Serial for
-            # boards is to have only one, generic implementation of
-            # BTPWorker/BTPSocket. Although we can still use it for
-            # flushing serial if the data does not matter.
-            ser = serial.Serial(port=tty,
-                                baudrate=SERIAL_BAUDRATE, timeout=1)
-            ser.read(99999)
-            ser.close()
-        except serial.SerialException:
-            pass
+
+        if isinstance(self.socket_srv, BTPSerial) and self.socket_srv.conn:
+            self.socket_srv.flush()
 
     def btmon_start(self):
         if self.btmon:
@@ -260,18 +252,22 @@ class ZephyrCtl:
                 stack.core and not get_global_end():
 
             stack.core.event_queues[defs.BTP_CORE_EV_IUT_READY].clear()
-            self.board.reset()
 
-            # We have to wait for IUT ready event before we close socket
-            ev = stack.core.wait_iut_ready_ev(30, False)
+            with self.test_case.timed('IUT stop: board reset'):
+                self.board.reset()
+
+                # We have to wait for IUT ready event before we close socket
+                ev = stack.core.wait_iut_ready_ev(30, False)
+
             if ev:
                 log("IUT ready event received OK")
             else:
                 log('IUT ready event NOT received!')
+                # Do not reuse the connection of an IUT in unknown state
+                self.btp_session_close()
 
-        if self.btp_socket:
-            self.btp_socket.close()
-            self.btp_socket = None
+        if not self.btp_session or get_global_end():
+            self.btp_session_close()
 
         if self.native_process and self.native_process.poll() is None:
             self.native_process.terminate()
@@ -288,13 +284,14 @@ class ZephyrCtl:
             self.iut_log_file.close()
             self.iut_log_file = None
 
-        if self.socat_process:
-            self.socat_process.terminate()
-            self.socat_process.wait()
-            self.socat_process = None
-
         self.is_running = False
 
+    def btp_session_close(self):
+        """Close BTP connection, also the one kept between test cases"""
+        if self.btp_socket:
+            self.btp_socket.close()
+            self.btp_socket = None
+
 
 class ZephyrCtlStub:
     """Zephyr OS Control Class with stubs for testing"""
@@ -336,4 +333,5 @@ def cleanup():
     global ZEPHYR
     if ZEPHYR:
         ZEPHYR.stop()
+        ZEPHYR.btp_session_close()
         ZEPHYR = None
@@ -146,15 +146,14 @@ def test_cases(ptses):
     test_case_name_list = pts.get_test_case_list('MBTM')
     tc_list = []
 
+    custom_tcs = {tc.name: tc for tc in custom_test_cases}
+
     for tc_name in test_case_name_list:
-        instance = ZTestCase('MBTM', tc_name,
-                             cmds=pre_conditions,
-                             generic_wid_hdl=mmdl_wid_hdl)
-
-        for custom_tc in custom_test_cases:
-            if tc_name == custom_tc.name:
-                instance = custom_tc
-                break
+        instance = custom_tcs.get(tc_name)
+        if instance is None:
+            instance = ZTestCase('MBTM', tc_name,
+                                 cmds=pre_conditions,
+                                 generic_wid_hdl=mmdl_wid_hdl)
 
         tc_list.append(instance)
 
@@ -106,14 +106,13 @@ def test_cases(ptses):
     tc_list = []
 
     # Use the same preconditions and MMI/WID handler for all test cases of the profile
-    for tc_name in test_case_name_list:
-        instance = ZTestCase('OTS', tc_name, cmds=pre_conditions + pre_conditions_props,
-                             generic_wid_hdl=ots_wid_hdl)
+    custom_tcs = {tc.name: tc for tc in custom_test_cases}
 
-        for custom_tc in custom_test_cases:
-            if tc_name == custom_tc.name:
-                instance = custom_tc
-                break
+    for tc_name in test_case_name_list:
+        instance = custom_tcs.get(tc_name)
+        if instance is None:
+            instance = ZTestCase('OTS', tc_name, cmds=pre_conditions + pre_conditions_props,
+                                 generic_wid_hdl=ots_wid_hdl)
 
         tc_list.append(instance)
 
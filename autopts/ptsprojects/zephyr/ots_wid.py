@@ -17,11 +17,12 @@
 import logging
 
 from autopts.pybtp.types import WIDParams
-from autopts.wid import generic_wid_hdl
+from autopts.wid import generic_wid_hdl, wid_modules
 
 log = logging.debug
 
 
+@wid_modules(__name__, 'autopts.wid.ots')
 def ots_wid_hdl(wid, description, test_case_name):
     log(f'{ots_wid_hdl.__name__}, {wid}, {description}, {test_case_name}')
-    return generic_wid_hdl(wid, description, test_case_name, [__name__, 'autopts.wid.ots'])
+    return generic_wid_hdl(wid, description, test_case_name, ots_wid_hdl.wid_modules)
@@ -217,16 +217,15 @@ def test_cases(ptses):
     test_case_name_list = pts.get_test_case_list('SM')
     tc_list = []
 
+    custom_tcs = {tc.name: tc for tc in custom_test_cases}
+
     for tc_name in test_case_name_list:
-        instance = ZTestCase('SM', tc_name,
-                             pre_conditions +
-                             [TestFunc(btp.gap_set_io_cap, IOCap.display_only)],
-                             generic_wid_hdl=sm_wid_hdl)
-
-        for custom_tc in custom_test_cases:
-            if tc_name == custom_tc.name:
-                instance = custom_tc
-                break
+        instance = custom_tcs.get(tc_name)
+        if instance is None:
+            instance = ZTestCase('SM', tc_name,
+                                 pre_conditions +
+                                 [TestFunc(btp.gap_set_io_cap, IOCap.display_only)],
+                                 generic_wid_hdl=sm_wid_hdl)
 
         tc_list.append(instance)
 
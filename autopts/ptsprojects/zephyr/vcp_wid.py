@@ -15,13 +15,14 @@
 
 import logging
 
-from autopts.wid import generic_wid_hdl
+from autopts.wid import generic_wid_hdl, wid_modules
 from autopts.pybtp import btp
 from autopts.ptsprojects.zephyr.iutctl import get_iut
 
 log = logging.debug
 
 
+@wid_modules(__name__, 'autopts.wid.vcp')
 def vcp_wid_hdl(wid, description, test_case_name):
     log(f'{vcp_wid_hdl.__name__}, {wid}, {description}, {test_case_name}')
-    return generic_wid_hdl(wid, description, test_case_name, [__name__, 'autopts.wid.vcp'])
\ No newline at end of file
+    return generic_wid_hdl(wid, description, test_case_name, vcp_wid_hdl.wid_modules)
\ No newline at end of file
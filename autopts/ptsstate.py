@@ -0,0 +1,115 @@
+#
+# auto-pts - The Bluetooth PTS Automation Framework
+#
+# Copyright (c) 2024, Codecoup.
+#
+# This program is free software; you can redistribute it and/or modify it
+# under the terms and conditions of the GNU General Public License,
+# version 2, as published by the Free Software Foundation.
+#
+# This program is distributed in the hope it will be useful, but WITHOUT
+# ANY WARRANTY; without even the implied warranty of MERCHANTABILITY or
+# FITNESS FOR A PARTICULAR PURPOSE.  See the GNU General Public License for
+# more details.
+#
+
+"""Settings of a PTS instance to restore after its restart
+
+PTSState keeps the desired value of every setting, i.e. the last value
+set by the client, and the value applied to the running PTS. Recovery
+after a PTS restart and the rollback of temporary PIXIT changes apply
+only the settings whose applied value differs from the desired one.
+"""
+
+import logging
+
+log = logging.debug
+
+WORKSPACE = 'workspace'
+CALL_TIMEOUT = 'call_timeout'
+PICS = 'pics'
+PIXIT = 'pixit'
+
+WORKSPACE_KEY = (WORKSPACE, None, None)
+
+
+class PTSState:
+    """Desired and applied PTS settings keyed by (kind, project, name)
+
+    The workspace and call timeout are keyed by (kind, None, None), the
+    PICS and PIXITs by e.g. (PIXIT, 'GAP', 'TSPX_bd_addr_iut'). The
+    workspace is always applied first, as opening it resets the PICS and
+    PIXITs to the values stored in the workspace.
+    """
+
+    def __init__(self):
+        self._desired = {}
+        self._applied = {}
+        # Keys of the values applied temporarily, see set_temp
+        self._temp = set()
+
+    def clear(self):
+        self._desired.clear()
+        self._applied.clear()
+        self._temp.clear()
+
+    def set(self, key, value):
+        """Record value set in PTS as the desired one"""
+        if key == WORKSPACE_KEY:
+            if self._desired.get(WORKSPACE_KEY, value) != value:
+                # The settings of the former workspace do not apply
+                self._desired.clear()
+
+            self._applied.clear()
+            # Kept first in the replay order
+            self._desired = {WORKSPACE_KEY: value, **self._desired}
+        else:
+            self._desired[key] = value
+
+        self._applied[key] = value
+        self._temp.discard(key)
+
+    def set_temp(self, key, value):
+        """Record value set in PTS temporarily, until revert_temp"""
+        self._applied[key] = value
+        self._temp.add(key)
+
+    def discard(self, key):
+        self._desired.pop(key, None)
+        self._applied.pop(key, None)
+        self._temp.discard(key)
+
+    def get(self, key, default=None):
+        return self._desired.get(key, default)
+
+    def invalidate(self):
+        """Nothing is applied, e.g. after PTS restart"""
+        self._applied.clear()
+        self._temp.clear()
+
+    def _is_pending(self, key):
+        return key not in self._applied or \
+            self._applied[key] != self._desired[key]
+
+    def pending(self):
+        """[(key, value)] of the desired values not applied, in the order
+        they have to be applied"""
+        if WORKSPACE_KEY in self._desired and self._is_pending(WORKSPACE_KEY):
+            # Reopening the workspace resets all the other settings
+            return list(self._desired.items())
+
+        return [(key, value) for key, value in self._desired.items()
+                if self._is_pending(key)]
+
+    def revert_temp(self):
+        """[(key, value)] of the desired values to restore after the
+        temporary changes. Temporary values of settings never set as
+        desired are left as they are."""
+        pending = [(key, self._desired[key]) for key in self._temp
+                   if key in self._desired and self._is_pending(key)]
+        self._temp.clear()
+
+        log("%s: %d of the temporary changes to revert",
+            self.revert_temp.__name__, len(pending))
+
+        return pending
@@ -72,10 +72,8 @@ def address_to_ba(bd_addr_type=None, bd_addr=None):
     return data
 
 
-def ascs_config_codec(ase_id, coding_format, vid, cid, codec_ltvs,
-                      bd_addr_type=None, bd_addr=None):
-    logging.debug(f"{ascs_config_codec.__name__}")
-
+def ascs_config_codec_cmd(ase_id, coding_format, vid, cid, codec_ltvs,
+                          bd_addr_type=None, bd_addr=None):
     data = address_to_ba(bd_addr_type, bd_addr)
     data += struct.pack('B', ase_id)
     data += struct.pack('B', coding_format)
@@ -88,32 +86,42 @@ def ascs_config_codec(ase_id, coding_format, vid, cid, codec_ltvs,
     if codec_ltvs_len:
         data += codec_ltvs
 
+    return (*ASCS['config_codec'], data)
+
+
+def ascs_config_codec(ase_id, coding_format, vid, cid, codec_ltvs,
+                      bd_addr_type=None, bd_addr=None):
+    logging.debug(f"{ascs_config_codec.__name__}")
+
     iutctl = get_iut()
-    iutctl.btp_socket.send(*ASCS['config_codec'], data=data)
+    iutctl.btp_socket.send(*ascs_config_codec_cmd(ase_id, coding_format, vid, cid, codec_ltvs,
+                                                  bd_addr_type, bd_addr))
 
     ascs_command_rsp_succ()
 
 
-def ascs_add_ase_to_cis(ase_id, cis_id, cig_id, bd_addr_type=None, bd_addr=None):
-    logging.debug(f"{ascs_add_ase_to_cis.__name__}")
-
+def ascs_add_ase_to_cis_cmd(ase_id, cis_id, cig_id, bd_addr_type=None, bd_addr=None):
     data = address_to_ba(bd_addr_type, bd_addr)
     data += struct.pack('B', ase_id)
     data += struct.pack('B', cig_id)
     data += struct.pack('B', cis_id)
 
-    iutctl = get_iut()
-    iutctl.btp_socket.send(*ASCS['add_ase_to_cis'], data=data)
+    return (*ASCS['add_ase_to_cis'], data)
 
-    ascs_command_rsp_succ()
 
+def ascs_add_ase_to_cis(ase_id, cis_id, cig_id, bd_addr_type=None, bd_addr=None):
+    logging.debug(f"{ascs_add_ase_to_cis.__name__}")
 
-def ascs_config_qos(ase_id, cig_id, cis_id, sdu_interval, framing, max_sdu,
-                    retransmission_number, max_transport_latency,
-                    presentation_delay, bd_addr_type=None, bd_addr=None):
+    iutctl = get_iut()
+    iutctl.btp_socket.send(*ascs_add_ase_to_cis_cmd(ase_id, cis_id, cig_id,
+                                                    bd_addr_type, bd_addr))
+
+    ascs_command_rsp_succ()
 
-    logging.debug(f"{ascs_config_qos.__name__}")
 
+def ascs_config_qos_cmd(ase_id, cig_id, cis_id, sdu_interval, framing, max_sdu,
+                        retransmission_number, max_transport_latency,
+                        presentation_delay, bd_addr_type=None, bd_addr=None):
     data = address_to_ba(bd_addr_type, bd_addr)
     data += struct.pack('B', ase_id)
     data += struct.pack('B', cig_id)
@@ -125,8 +133,20 @@ def ascs_config_qos(ase_id, cig_id, cis_id, sdu_interval, framing, max_sdu,
     data += struct.pack('<H', max_transport_latency)
     data += int.to_bytes(presentation_delay, 3, 'little')
 
+    return (*ASCS['config_qos'], data)
+
+
+def ascs_config_qos(ase_id, cig_id, cis_id, sdu_interval, framing, max_sdu,
+                    retransmission_number, max_transport_latency,
+                    presentation_delay, bd_addr_type=None, bd_addr=None):
+
+    logging.debug(f"{ascs_config_qos.__name__}")
+
     iutctl = get_iut()
-    iutctl.btp_socket.send(*ASCS['config_qos'], data=data)
+    iutctl.btp_socket.send(*ascs_config_qos_cmd(ase_id, cig_id, cis_id, sdu_interval,
+                                                framing, max_sdu, retransmission_number,
+                                                max_transport_latency, presentation_delay,
+                                                bd_addr_type, bd_addr))
 
     ascs_command_rsp_succ()
 
@@ -191,11 +211,9 @@ def ascs_update_metadata(ase_id, bd_addr_type=None, bd_addr=None):
     iutctl.btp_socket.send_wait_rsp(*ASCS['update_metadata'], data=data)
 
 
-def ascs_preconfig_qos(cig_id, cis_id, sdu_interval, framing, max_sdu,
-                       retransmission_number, max_transport_latency,
-                       presentation_delay):
-    logging.debug(f"{ascs_config_qos.__name__}")
-
+def ascs_preconfig_qos_cmd(cig_id, cis_id, sdu_interval, framing, max_sdu,
+                           retransmission_number, max_transport_latency,
+                           presentation_delay):
     data = bytearray()
     data += struct.pack('B', cig_id)
     data += struct.pack('B', cis_id)
@@ -206,12 +224,46 @@ def ascs_preconfig_qos(cig_id, cis_id, sdu_interval, framing, max_sdu,
     data += struct.pack('<H', max_transport_latency)
     data += int.to_bytes(presentation_delay, 3, 'little')
 
+    return (*ASCS['preconfig_qos'], data)
+
+
+def ascs_preconfig_qos(cig_id, cis_id, sdu_interval, framing, max_sdu,
+                       retransmission_number, max_transport_latency,
+                       presentation_delay):
+    logging.debug(f"{ascs_config_qos.__name__}")
+
     iutctl = get_iut()
-    iutctl.btp_socket.send(*ASCS['preconfig_qos'], data=data)
+    iutctl.btp_socket.send(*ascs_preconfig_qos_cmd(cig_id, cis_id, sdu_interval, framing,
+                                                   max_sdu, retransmission_number,
+                                                   max_transport_latency,
+                                                   presentation_delay))
 
     ascs_command_rsp_succ()
 
 
+# ASCS setup helpers that can be pipelined
+ASCS_SETUP_CMDS = {
+    ascs_config_codec: ascs_config_codec_cmd,
+    ascs_add_ase_to_cis: ascs_add_ase_to_cis_cmd,
+    ascs_config_qos: ascs_config_qos_cmd,
+    ascs_preconfig_qos: ascs_preconfig_qos_cmd,
+}
+
+
+def ascs_setup(cmds):
+    """Send ASCS setup commands pipelined
+
+    cmds -- list of tuples of an ASCS setup helper and its arguments, e.g.
+            [(ascs_add_ase_to_cis, ase_id, cis_id, cig_id), ...]
+    """
+    logging.debug(f"{ascs_setup.__name__} {cmds}")
+
+    frames = [ASCS_SETUP_CMDS[func](*args) for func, *args in cmds]
+
+    iutctl = get_iut()
+    iutctl.btp_socket.send_wait_rsp_pipelined(frames)
+
+
 def ascs_ev_operation_completed_(ascs, data, data_len):
     logging.debug('%s %r', ascs_ev_operation_completed_.__name__, data)
 
@@ -14,15 +14,24 @@
 #
 
 """Wrapper around btp messages. The functions are added as needed."""
-import binascii
 import logging
 import struct
+import threading
+import time
 
 from autopts.pybtp import defs
 from autopts.pybtp.btp.btp import CONTROLLER_INDEX, get_iut_method as get_iut,\
     btp_hdr_check, pts_addr_get, pts_addr_type_get
 from autopts.pybtp.btp.gap import __gap_current_settings_update
 from autopts.pybtp.types import BTPError, addr2btp_ba
+from autopts.utils import get_global_end
+
+# Default number of SDUs sent by IsoDataPump
+ISO_PUMP_SDUS = 100
+# Back-off in seconds when the IUT buffer is full, one 10 ms SDU interval
+ISO_PUMP_INTERVAL = 0.01
+# IsoDataPump gives up after this many SDUs in a row were not accepted
+ISO_PUMP_MAX_REJECTS = 100
 
 BAP = {
     'read_supported_cmds': (defs.BTP_SERVICE_ID_BAP,
@@ -112,14 +121,20 @@ def bap_discover(bd_addr_type=None, bd_addr=None):
     bap_command_rsp_succ()
 
 
-def bap_send(ase_id, data_ba, bd_addr_type=None, bd_addr=None):
-    logging.debug(f"{bap_send.__name__}")
-
+def _bap_send_data(ase_id, data_ba, bd_addr_type=None, bd_addr=None):
     data = address_to_ba(bd_addr_type, bd_addr)
     data += struct.pack('B', ase_id)
     data += struct.pack('B', len(data_ba))
     data += data_ba
 
+    return data
+
+
+def bap_send(ase_id, data_ba, bd_addr_type=None, bd_addr=None):
+    logging.debug(f"{bap_send.__name__}")
+
+    data = _bap_send_data(ase_id, data_ba, bd_addr_type, bd_addr)
+
     iutctl = get_iut()
     iutctl.btp_socket.send(*BAP['send'], data=data)
 
@@ -129,6 +144,126 @@ def bap_send(ase_id, data_ba, bd_addr_type=None, bd_addr=None):
     return buffered_data_len
 
 
+class IsoDataPump:
+    """Feeds an SDU to a BAP source ASE or broadcast source
+
+    The SDU is sent until the target number of SDUs was accepted by the
+    IUT or the duration elapses. BAP Send reports the number of octets
+    the IUT buffered, if it is short of the SDU the IUT buffer is full
+    and the pump backs off for an SDU interval instead of sending
+    commands that would be rejected.
+
+    The send commands wait for their responses under the BTP socket
+    lock, so pumps of several streams may run at once with start(), but
+    they should be joined before other BTP commands are sent.
+    """
+
+    def __init__(self, ase_id, sdu, sdus=None, duration=None,
+                 interval=ISO_PUMP_INTERVAL, bd_addr_type=None, bd_addr=None):
+        if sdus is None and duration is None:
+            sdus = ISO_PUMP_SDUS
+
+        self.ase_id = ase_id
+        self.sdu = bytes(sdu)
+        self.sdus = sdus
+        self.duration = duration
+        self.interval = interval
+        self._cmd_data = _bap_send_data(ase_id, self.sdu, bd_addr_type, bd_addr)
+        self._stop = threading.Event()
+        self._thread = None
+
+        self.sent = 0
+        self.octets = 0
+        self.rejected = 0
+        self.elapsed = 0.0
+
+    @property
+    def throughput(self):
+        """Octets per second accepted by the IUT"""
+        if not self.elapsed:
+            return 0.0
+
+        return self.octets / self.elapsed
+
+    def _send(self, btp_socket):
+        try:
+            tuple_data = btp_socket.send_wait_rsp(*BAP['send'], self._cmd_data)
+        except BTPError:
+            return 0
+
+        return int.from_bytes(tuple_data[0], byteorder='little')
+
+    def run(self):
+        """Send the SDUs in the calling thread"""
+        btp_socket = get_iut().btp_socket
+        start = time.monotonic()
+        deadline = None if self.duration is None else start + self.duration
+        rejects = 0
+
+        while not self._stop.is_set() and not get_global_end():
+            if self.sdus is not None and self.sent >= self.sdus:
+                break
+
+            if deadline is not None and time.monotonic() >= deadline:
+                break
+
+            buffered = self._send(btp_socket)
+            self.octets += min(buffered, len(self.sdu))
+            if buffered >= len(self.sdu):
+                self.sent += 1
+                rejects = 0
+                continue
+
+            self.rejected += 1
+            rejects += 1
+            if rejects >= ISO_PUMP_MAX_REJECTS:
+                logging.warning('ISO data pump of ASE %d stalled', self.ase_id)
+                break
+
+            self._stop.wait(self.interval)
+
+        self.elapsed = time.monotonic() - start
+
+        logging.debug('ISO data pump of ASE %d: %d SDUs, %d octets in %.3f s '
+                      '(%.0f B/s), %d rejected', self.ase_id, self.sent,
+                      self.octets, self.elapsed, self.throughput, self.rejected)
+
+        return self
+
+    def start(self):
+        """Send the SDUs from a background thread"""
+        self._thread = threading.Thread(target=self.run, daemon=True,
+                                        name=f'IsoDataPump{self.ase_id}')
+        self._thread.start()
+
+        return self
+
+    def stop(self):
+        self._stop.set()
+        self.join()
+
+    def join(self, timeout=None):
+        if self._thread:
+            self._thread.join(timeout)
+
+        return self
+
+
+def bap_send_streams(streams, sdus=None, duration=None, interval=ISO_PUMP_INTERVAL):
+    """Feed SDUs to several streams at once and wait until done.
+
+    streams -- iterable of (ase_id, sdu) tuples
+    Returns the IsoDataPumps of the streams.
+    """
+    pumps = [IsoDataPump(ase_id, sdu, sdus, duration, interval).start()
+             for ase_id, sdu in streams]
+
+    for pump in pumps:
+        pump.join()
+
+    return pumps
+
+
 def bap_broadcast_source_setup(
         streams_per_subgroup, subgroups, coding_format, vid, cid,
         codec_ltvs, sdu_interval, framing, max_sdu, retransmission_number,
@@ -473,16 +608,19 @@ def bap_send_past(src_id, bd_addr_type=None, bd_addr=None):
     bap_command_rsp_succ()
 
 
+# Address Type, Address, Status
+BAP_DISCOVERY_COMPLETED_EV = struct.Struct('<B6sB')
+
+
 def bap_ev_discovery_completed_(bap, data, data_len):
     logging.debug('%s %r', bap_ev_discovery_completed_.__name__, data)
 
-    fmt = '<B6sB'
-    if len(data) < struct.calcsize(fmt):
+    if len(data) < BAP_DISCOVERY_COMPLETED_EV.size:
         raise BTPError('Invalid data length')
 
-    addr_type, addr, status = struct.unpack_from(fmt, data)
+    addr_type, addr, status = BAP_DISCOVERY_COMPLETED_EV.unpack_from(data)
 
-    addr = binascii.hexlify(addr[::-1]).lower().decode('utf-8')
+    addr = addr[::-1].hex()
 
     logging.debug(f'BAP Discovery completed: addr {addr} addr_type '
                   f'{addr_type} status {status}')
@@ -490,38 +628,50 @@ def bap_ev_discovery_completed_(bap, data, data_len):
     bap.event_received(defs.BTP_BAP_EV_DISCOVERY_COMPLETED, (addr_type, addr, status))
 
 
-def bap_ev_codec_cap_found_(bap, data, data_len):
-    logging.debug('%s %r', bap_ev_codec_cap_found_.__name__, data)
+# Address Type, Address, PAC Direction, Coding Format, Frequencies,
+# Frame Durations, Octets per Frame, Channel Counts
+BAP_CODEC_CAP_FOUND_EV = struct.Struct('<B6sBBHBIB')
 
-    fmt = '<B6sBBHBIB'
-    if len(data) < struct.calcsize(fmt):
+
+def bap_dec_codec_cap_found_ev_data(data):
+    if len(data) < BAP_CODEC_CAP_FOUND_EV.size:
         raise BTPError('Invalid data length')
 
-    addr_type, addr, pac_dir, coding_format, frequencies, frame_durations,\
-        octets_per_frame, channel_counts = struct.unpack_from(fmt, data)
+    addr_type, addr, pac_dir, coding_format, frequencies, frame_durations, \
+        octets_per_frame, channel_counts = BAP_CODEC_CAP_FOUND_EV.unpack_from(data)
+
+    return (addr_type, addr[::-1].hex(), pac_dir, coding_format, frequencies,
+            frame_durations, octets_per_frame, channel_counts)
 
-    addr = binascii.hexlify(addr[::-1]).lower().decode('utf-8')
+
+def bap_ev_codec_cap_found_(bap, data, data_len):
+    logging.debug('%s %r', bap_ev_codec_cap_found_.__name__, data)
+
+    ev = bap_dec_codec_cap_found_ev_data(data)
+    addr_type, addr, pac_dir, coding_format, frequencies, frame_durations,\
+        octets_per_frame, channel_counts = ev
 
     logging.debug(f'Found codec capabilities: addr {addr} addr_type '
                   f'{addr_type} pac_dir {pac_dir} coding {coding_format:#x} '
                   f'freq {frequencies:#b} duration {frame_durations:#b} '
                   f'frame_len {octets_per_frame:#x} channel_counts {channel_counts:#b}')
 
-    bap.event_received(defs.BTP_BAP_EV_CODEC_CAP_FOUND,
-                       (addr_type, addr, pac_dir, coding_format, frequencies,
-                        frame_durations, octets_per_frame, channel_counts))
+    bap.event_received(defs.BTP_BAP_EV_CODEC_CAP_FOUND, ev)
+
+
+# Address Type, Address, ASE Direction, ASE ID
+BAP_ASE_FOUND_EV = struct.Struct('<B6sBB')
 
 
 def bap_ev_ase_found_(bap, data, data_len):
     logging.debug('%s %r', bap_ev_ase_found_.__name__, data)
 
-    fmt = '<B6sBB'
-    if len(data) < struct.calcsize(fmt):
+    if len(data) < BAP_ASE_FOUND_EV.size:
         raise BTPError('Invalid data length')
 
-    addr_type, addr, ase_dir, ase_id = struct.unpack_from(fmt, data)
+    addr_type, addr, ase_dir, ase_id = BAP_ASE_FOUND_EV.unpack_from(data)
 
-    addr = binascii.hexlify(addr[::-1]).lower().decode('utf-8')
+    addr = addr[::-1].hex()
 
     logging.debug(f'Found ASE: addr {addr} addr_type {addr_type}'
                   f' dir {ase_dir} ID {ase_id}')
@@ -529,42 +679,45 @@ def bap_ev_ase_found_(bap, data, data_len):
     bap.event_received(defs.BTP_BAP_EV_ASE_FOUND, (addr_type, addr, ase_dir, ase_id))
 
 
+# Address Type, Address, ASE ID, Data Length
+BAP_STREAM_RECEIVED_EV = struct.Struct('<B6sBB')
+
+
 def bap_ev_stream_received_(bap, data, data_len):
     logging.debug('%s %r', bap_ev_stream_received_.__name__, data)
 
-    fmt = '<B6sBB'
-    fmt_len = struct.calcsize(fmt)
+    fmt_len = BAP_STREAM_RECEIVED_EV.size
     if len(data) < fmt_len:
         raise BTPError('Invalid data length')
 
-    addr_type, addr, ase_id, iso_data_len = struct.unpack_from(fmt, data[:fmt_len])
+    addr_type, addr, ase_id, _iso_data_len = BAP_STREAM_RECEIVED_EV.unpack_from(data)
 
-    addr = binascii.hexlify(addr[::-1]).lower().decode('utf-8')
+    addr = addr[::-1].hex()
     iso_data = data[fmt_len:]
 
-    logging.debug(f'Stream received: addr {addr} addr_type {addr_type}'
-                  f' ID {ase_id} data {iso_data}')
+    # Called at the SDU interval, format lazily
+    logging.debug('Stream received: addr %s addr_type %s ID %s data %r',
+                  addr, addr_type, ase_id, iso_data)
 
     bap.event_received(defs.BTP_BAP_EV_STREAM_RECEIVED, (addr_type, addr, ase_id, iso_data))
 
 
+# Address Type, Address, Broadcast ID, Advertiser SID, PA Interval
+BAP_BAA_FOUND_EV = struct.Struct('<B6s3sBH')
+
+
 def bap_ev_baa_found_(bap, data, data_len):
     logging.debug('%s %r', bap_ev_baa_found_.__name__, data)
 
-    fmt = '<B6s3sBH'
-    fmt_len = struct.calcsize(fmt)
-    if len(data) < fmt_len:
+    if len(data) < BAP_BAA_FOUND_EV.size:
         raise BTPError('Invalid data length')
 
     addr_type, addr, broadcast_id, advertiser_sid, padv_interval = \
-        struct.unpack_from(fmt, data[:fmt_len])
-
-    addr = binascii.hexlify(addr[::-1]).lower().decode('utf-8')
-    broadcast_id = int.from_bytes(broadcast_id, "little")
+        BAP_BAA_FOUND_EV.unpack_from(data)
 
     ev = {'addr_type': addr_type,
-          'addr': addr,
-          'broadcast_id': broadcast_id,
+          'addr': addr[::-1].hex(),
+          'broadcast_id': int.from_bytes(broadcast_id, 'little'),
           'advertiser_sid': advertiser_sid,
           'padv_interval': padv_interval}
 
@@ -573,54 +726,52 @@ def bap_ev_baa_found_(bap, data, data_len):
     bap.event_received(defs.BTP_BAP_EV_BAA_FOUND, ev)
 
 
+# Address Type, Address, Broadcast ID, Presentation Delay, Subgroup ID,
+# BIS ID, Coding Format, VID, CID, LTVs Length
+BAP_BIS_FOUND_EV = struct.Struct('<B6s3s3sBBBHHB')
+
+
 def bap_ev_bis_found_(bap, data, data_len):
     logging.debug('%s %r', bap_ev_bis_found_.__name__, data)
 
-    fmt = '<B6s3s3sBBBHHB'
-    fmt_len = struct.calcsize(fmt)
+    fmt_len = BAP_BIS_FOUND_EV.size
     if len(data) < fmt_len:
         raise BTPError('Invalid data length')
 
     addr_type, addr, broadcast_id, pd, subgroup_id, bis_id, coding_format, vid, cid, \
-        ltvs_len = struct.unpack_from(fmt, data[:fmt_len])
-
-    addr = binascii.hexlify(addr[::-1]).lower().decode('utf-8')
-    broadcast_id = int.from_bytes(broadcast_id, "little")
-    pd = int.from_bytes(pd, "little")
-    ltvs = data[fmt_len:]
+        _ltvs_len = BAP_BIS_FOUND_EV.unpack_from(data)
 
     ev = {'addr_type': addr_type,
-          'addr': addr,
-          'broadcast_id': broadcast_id,
-          'pd': pd,
+          'addr': addr[::-1].hex(),
+          'broadcast_id': int.from_bytes(broadcast_id, 'little'),
+          'pd': int.from_bytes(pd, 'little'),
           'subgroup_id': subgroup_id,
           'bis_id': bis_id,
           'coding_format': coding_format,
           'vid': vid,
           'cid': cid,
-          'ltvs': ltvs}
+          'ltvs': data[fmt_len:]}
 
     logging.debug(f'BIS found: {ev}')
 
     bap.event_received(defs.BTP_BAP_EV_BIS_FOUND, ev)
 
 
+# Address Type, Address, Broadcast ID, BIS ID
+BAP_BIS_SYNCED_EV = struct.Struct('<B6s3sB')
+
+
 def bap_ev_bis_synced_received_(bap, data, data_len):
     logging.debug('%s %r', bap_ev_bis_synced_received_.__name__, data)
 
-    fmt = '<B6s3sB'
-    fmt_len = struct.calcsize(fmt)
-    if len(data) < fmt_len:
+    if len(data) < BAP_BIS_SYNCED_EV.size:
         raise BTPError('Invalid data length')
 
-    addr_type, addr, broadcast_id, bis_id = struct.unpack_from(fmt, data[:fmt_len])
-
-    addr = binascii.hexlify(addr[::-1]).lower().decode('utf-8')
-    broadcast_id = int.from_bytes(broadcast_id, "little")
+    addr_type, addr, broadcast_id, bis_id = BAP_BIS_SYNCED_EV.unpack_from(data)
 
     ev = {'addr_type': addr_type,
-          'addr': addr,
-          'broadcast_id': broadcast_id,
+          'addr': addr[::-1].hex(),
+          'broadcast_id': int.from_bytes(broadcast_id, 'little'),
           'bis_id': bis_id}
 
     logging.debug(f'BIS synced: {ev}')
@@ -628,80 +779,78 @@ def bap_ev_bis_synced_received_(bap, data, data_len):
     bap.event_received(defs.BTP_BAP_EV_BIS_SYNCED, ev)
 
 
+# Address Type, Address, Broadcast ID, BIS ID, Data Length
+BAP_BIS_STREAM_RECEIVED_EV = struct.Struct('<B6s3sBB')
+
+
 def bap_ev_bis_stream_received_(bap, data, data_len):
     logging.debug('%s %r', bap_ev_bis_stream_received_.__name__, data)
 
-    fmt = '<B6s3sBB'
-    fmt_len = struct.calcsize(fmt)
+    fmt_len = BAP_BIS_STREAM_RECEIVED_EV.size
     if len(data) < fmt_len:
         raise BTPError('Invalid data length')
 
-    addr_type, addr, broadcast_id, bis_id, bis_data_len = \
-        struct.unpack_from(fmt, data[:fmt_len])
-
-    addr = binascii.hexlify(addr[::-1]).lower().decode('utf-8')
-    broadcast_id = int.from_bytes(broadcast_id, "little")
-    bis_data = data[fmt_len:]
+    addr_type, addr, broadcast_id, bis_id, _bis_data_len = \
+        BAP_BIS_STREAM_RECEIVED_EV.unpack_from(data)
 
     ev = {'addr_type': addr_type,
-          'addr': addr,
-          'broadcast_id': broadcast_id,
+          'addr': addr[::-1].hex(),
+          'broadcast_id': int.from_bytes(broadcast_id, 'little'),
           'bis_id': bis_id,
-          'bid_data': bis_data}
+          'bid_data': data[fmt_len:]}
 
-    logging.debug(f'BIS data received: {ev}')
+    logging.debug('BIS data received: %r', ev)
 
     bap.event_received(defs.BTP_BAP_EV_BIS_STREAM_RECEIVED, ev)
 
 
+# Address Type, Address
+BAP_SCAN_DELEGATOR_FOUND_EV = struct.Struct('<B6s')
+
+
 def bap_ev_scan_delegator_found_(bap, data, data_len):
     logging.debug('%s %r', bap_ev_scan_delegator_found_.__name__, data)
 
-    fmt = '<B6s'
-    fmt_len = struct.calcsize(fmt)
-    if len(data) < fmt_len:
+    if len(data) < BAP_SCAN_DELEGATOR_FOUND_EV.size:
         raise BTPError('Invalid data length')
 
-    addr_type, addr = struct.unpack_from(fmt, data[:fmt_len])
-
-    addr = binascii.hexlify(addr[::-1]).lower().decode('utf-8')
+    addr_type, addr = BAP_SCAN_DELEGATOR_FOUND_EV.unpack_from(data)
 
     ev = {'addr_type': addr_type,
-          'addr': addr}
+          'addr': addr[::-1].hex()}
 
     logging.debug(f'Scan Delegator found: {ev}')
 
     bap.event_received(defs.BTP_BAP_EV_SCAN_DELEGATOR_FOUND, ev)
 
 
+# Address Type, Address, Source ID, Broadcaster Address Type, Broadcaster
+# Address, Advertiser SID, Broadcast ID, PA Sync State, BIG Encryption,
+# Number of Subgroups
+BAP_BROADCAST_RECEIVE_STATE_EV = struct.Struct('<B6sBB6sB3sBBB')
+
+
 def bap_ev_broadcast_receive_state_(bap, data, data_len):
     logging.debug('%s %r', bap_ev_broadcast_receive_state_.__name__, data)
 
-    fmt = '<B6sBB6sB3sBBB'
-    fmt_len = struct.calcsize(fmt)
+    fmt_len = BAP_BROADCAST_RECEIVE_STATE_EV.size
     if len(data) < fmt_len:
         raise BTPError('Invalid data length')
 
     (addr_type, addr, src_id, broadcaster_addr_type, broadcaster_addr,
         advertiser_sid, broadcast_id, pa_sync_state, big_encryption,
-        num_subgroups) = struct.unpack_from(fmt, data[:fmt_len])
-
-    subgroups = data[fmt_len:]
-
-    addr = binascii.hexlify(addr[::-1]).lower().decode('utf-8')
-    broadcaster_addr = binascii.hexlify(broadcaster_addr[::-1]).lower().decode('utf-8')
-    broadcast_id = int.from_bytes(broadcast_id, "little")
+        _num_subgroups) = BAP_BROADCAST_RECEIVE_STATE_EV.unpack_from(data)
 
     ev = {'addr_type': addr_type,
-          'addr': addr,
+          'addr': addr[::-1].hex(),
           'src_id': src_id,
           'broadcaster_addr_type': broadcaster_addr_type,
-          'broadcaster_addr': broadcaster_addr,
+          'broadcaster_addr': broadcaster_addr[::-1].hex(),
           'advertiser_sid': advertiser_sid,
-          'broadcast_id': broadcast_id,
+          'broadcast_id': int.from_bytes(broadcast_id, 'little'),
           'pa_sync_state': pa_sync_state,
           'big_encryption': big_encryption,
-          'subgroups': subgroups,
+          'subgroups': data[fmt_len:],
           }
 
     logging.debug(f'Broadcast Receive State event: {ev}')
@@ -709,25 +858,25 @@ def bap_ev_broadcast_receive_state_(bap, data, data_len):
     bap.event_received(defs.BTP_BAP_EV_BROADCAST_RECEIVE_STATE, ev)
 
 
+# Address Type, Address, Source ID, Advertiser SID, Broadcast ID,
+# PAST Available, PA Interval
+BAP_PA_SYNC_REQ_EV = struct.Struct('<B6sBB3sBH')
+
+
 def bap_ev_pa_syn_req(bap, data, data_len):
     logging.debug('%s %r', bap_ev_pa_syn_req.__name__, data)
 
-    fmt = '<B6sBB3sBH'
-    fmt_len = struct.calcsize(fmt)
-    if len(data) < fmt_len:
+    if len(data) < BAP_PA_SYNC_REQ_EV.size:
         raise BTPError('Invalid data length')
 
     addr_type, addr, src_id, advertiser_sid, broadcast_id, past_avail, \
-        pa_interval = struct.unpack_from(fmt, data[:fmt_len])
-
-    addr = binascii.hexlify(addr[::-1]).lower().decode('utf-8')
-    broadcast_id = int.from_bytes(broadcast_id, "little")
+        pa_interval = BAP_PA_SYNC_REQ_EV.unpack_from(data)
 
     ev = {'addr_type': addr_type,
-          'addr': addr,
+          'addr': addr[::-1].hex(),
           'src_id': src_id,
           'advertiser_sid': advertiser_sid,
-          'broadcast_id': broadcast_id,
+          'broadcast_id': int.from_bytes(broadcast_id, 'little'),
           'past_avail': past_avail,
           'pa_interval': pa_interval,
           }
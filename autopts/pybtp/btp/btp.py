@@ -17,13 +17,16 @@
 
 from collections import namedtuple
 from uuid import UUID
+import importlib
 import logging
 import re
 import struct
 import math
+import time
 
 from autopts.pybtp.common import supported_svcs_cmds, reg_unreg_service
 from autopts.ptsprojects.stack import get_stack
+from autopts.ptsprojects.stack.common import notify_event
 from autopts.ptsprojects.testcase import MMI
 from .. import defs
 from autopts.pybtp.types import BTPError, att_rsp_str
@@ -40,9 +43,6 @@ PTS_BD_ADDR = LeAddress(addr_type=0, addr='000000000000')
 LT2_BD_ADDR = LeAddress(addr_type=0, addr='000000000000')
 LT3_BD_ADDR = LeAddress(addr_type=0, addr='000000000000')
 
-# Devices found
-LeAdv = namedtuple('LeAdv', 'addr_type addr rssi flags eir')
-
 CONTROLLER_INDEX = 0
 CONTROLLER_INDEX_NONE = 0xff
 
@@ -117,11 +117,15 @@ def core_reg_svc_univ(service_key: str, service_name: str):
     iutctl = get_iut()
 
     try:
-        iutctl.btp_socket.send(*CORE[service_key])
+        cmd = CORE[service_key]
     except KeyError:
         logging.error("CORE key %s not found", service_key)
         return
 
+    # Events may follow the response right away
+    load_event_handlers(cmd[3])
+    iutctl.btp_socket.send(*cmd)
+
     core_reg_svc_rsp_succ(service_name)
 
 
@@ -683,36 +687,91 @@ def init(get_iut_method):
     set_event_handler(event_handler)
 
 
-from .gap import GAP_EV
-from .gatt import GATT_EV
-from .l2cap import L2CAP_EV
-from .mesh import MESH_EV
-from .gatt_cl import GATTC_EV
-from .aics import AICS_EV
-from .vocs import VOCS_EV
-from .vcs import VCS_EV
-from .ias import IAS_EV
-from .pacs import PACS_EV
-from .ascs import ASCS_EV
-from .bap import BAP_EV
-from .core import CORE_EV
-from .micp import MICP_EV
-from .mics import MICS_EV
-from .ccp import CCP_EV
-from .vcp import VCP_EV
-from .mcp import MCP_EV
-from .gmcs import GMCS_EV
-from .hap import HAP_EV
-from .cap import CAP_EV
-from .csip import CSIP_EV
-from .tbs import TBS_EV
-from .tmap import TMAP_EV
-from .ots import OTS_EV
-from .pbp import PBP_EV
-# GENERATOR append 2
-
 from autopts.pybtp.iutctl_common import set_event_handler
 
+# BTP services events are dispatched to, as service ID: (btp module of
+# the service, name of its event handlers dict, name of the stack layer
+# passed to the handlers). The handlers are registered by
+# load_event_handlers when the service is registered or its first event
+# is received.
+EVENT_SERVICES = {
+    defs.BTP_SERVICE_ID_MESH: ('mesh', 'MESH_EV', 'mesh'),
+    defs.BTP_SERVICE_ID_L2CAP: ('l2cap', 'L2CAP_EV', 'l2cap'),
+    defs.BTP_SERVICE_ID_GAP: ('gap', 'GAP_EV', 'gap'),
+    defs.BTP_SERVICE_ID_GATT: ('gatt', 'GATT_EV', 'gatt'),
+    defs.BTP_SERVICE_ID_GATTC: ('gatt_cl', 'GATTC_EV', 'gatt_cl'),
+    defs.BTP_SERVICE_ID_IAS: ('ias', 'IAS_EV', 'ias'),
+    defs.BTP_SERVICE_ID_VCS: ('vcs', 'VCS_EV', 'vcs'),
+    defs.BTP_SERVICE_ID_AICS: ('aics', 'AICS_EV', 'aics'),
+    defs.BTP_SERVICE_ID_VOCS: ('vocs', 'VOCS_EV', 'vocs'),
+    defs.BTP_SERVICE_ID_PACS: ('pacs', 'PACS_EV', 'pacs'),
+    defs.BTP_SERVICE_ID_ASCS: ('ascs', 'ASCS_EV', 'ascs'),
+    defs.BTP_SERVICE_ID_BAP: ('bap', 'BAP_EV', 'bap'),
+    defs.BTP_SERVICE_ID_CORE: ('core', 'CORE_EV', 'core'),
+    defs.BTP_SERVICE_ID_MICP: ('micp', 'MICP_EV', 'micp'),
+    defs.BTP_SERVICE_ID_MICS: ('mics', 'MICS_EV', 'mics'),
+    defs.BTP_SERVICE_ID_CCP: ('ccp', 'CCP_EV', 'ccp'),
+    defs.BTP_SERVICE_ID_VCP: ('vcp', 'VCP_EV', 'vcp'),
+    defs.BTP_SERVICE_ID_MCP: ('mcp', 'MCP_EV', 'mcp'),
+    defs.BTP_SERVICE_ID_GMCS: ('gmcs', 'GMCS_EV', 'gmcs'),
+    defs.BTP_SERVICE_ID_HAP: ('hap', 'HAP_EV', 'hap'),
+    defs.BTP_SERVICE_ID_CAP: ('cap', 'CAP_EV', 'cap'),
+    defs.BTP_SERVICE_ID_CSIP: ('csip', 'CSIP_EV', 'csip'),
+    defs.BTP_SERVICE_ID_TBS: ('tbs', 'TBS_EV', 'tbs'),
+    defs.BTP_SERVICE_ID_TMAP: ('tmap', 'TMAP_EV', 'tmap'),
+    defs.BTP_SERVICE_ID_OTS: ('ots', 'OTS_EV', 'ots'),
+    defs.BTP_SERVICE_ID_PBP: ('pbp', 'PBP_EV', 'pbp'),
+    # GENERATOR append 3
+}
+
+# (svc_id, op): (handler, stack layer name)
+EVENT_HANDLERS = {}
+
+# (svc_id, op): [number of events, cumulative handler time in seconds]
+EVENT_STATS = {}
+
+# Services of EVENT_SERVICES with the event handlers registered
+LOADED_EVENT_SERVICES = set()
+
+
+def register_event_handlers(svc_id, layer, handlers):
+    """Register event handlers of a BTP service.
+
+    svc_id -- BTP service ID
+    layer -- name of the stack attribute holding the layer of the service
+    handlers -- dict of opcode: handler(stack_layer, data, data_len)
+    """
+    for op, cb in handlers.items():
+        EVENT_HANDLERS[(svc_id, op)] = (cb, layer)
+        EVENT_STATS.setdefault((svc_id, op), [0, 0.0])
+
+
+def get_event_stats():
+    """Return {(svc_id, op): (count, total handler time)} of handled events"""
+    return {key: tuple(stats) for key, stats in EVENT_STATS.items() if stats[0]}
+
+
+def reset_event_stats():
+    for stats in EVENT_STATS.values():
+        stats[0] = 0
+        stats[1] = 0.0
+
+
+def load_event_handlers(svc_id):
+    """Register event handlers of the BTP service from its btp module,
+    if not registered yet. Returns False for unknown services."""
+    service = EVENT_SERVICES.get(svc_id)
+    if service is None:
+        return False
+
+    if svc_id not in LOADED_EVENT_SERVICES:
+        module, handlers, layer = service
+        module = importlib.import_module(f'autopts.pybtp.btp.{module}')
+        register_event_handlers(svc_id, layer, getattr(module, handlers))
+        LOADED_EVENT_SERVICES.add(svc_id)
+
+    return True
+
 
 def event_handler(hdr, data):
     logging.debug("%s %r %r", event_handler.__name__, hdr, data)
@@ -722,41 +781,25 @@ def event_handler(hdr, data):
         logging.info("Stack not initialized")
         return False
 
-    service_map = {
-        defs.BTP_SERVICE_ID_MESH: (MESH_EV, stack.mesh),
-        defs.BTP_SERVICE_ID_L2CAP: (L2CAP_EV, stack.l2cap),
-        defs.BTP_SERVICE_ID_GAP: (GAP_EV, stack.gap),
-        defs.BTP_SERVICE_ID_GATT: (GATT_EV, stack.gatt),
-        defs.BTP_SERVICE_ID_GATTC: (GATTC_EV, stack.gatt_cl),
-        defs.BTP_SERVICE_ID_IAS: (IAS_EV, stack.ias),
-        defs.BTP_SERVICE_ID_VCS: (VCS_EV, stack.vcs),
-        defs.BTP_SERVICE_ID_AICS: (AICS_EV, stack.aics),
-        defs.BTP_SERVICE_ID_VOCS: (VOCS_EV, stack.vocs),
-        defs.BTP_SERVICE_ID_PACS: (PACS_EV, stack.pacs),
-        defs.BTP_SERVICE_ID_ASCS: (ASCS_EV, stack.ascs),
-        defs.BTP_SERVICE_ID_BAP: (BAP_EV, stack.bap),
-        defs.BTP_SERVICE_ID_CORE: (CORE_EV, stack.core),
-        defs.BTP_SERVICE_ID_MICP: (MICP_EV, stack.micp),
-        defs.BTP_SERVICE_ID_MICS: (MICS_EV, stack.mics),
-        defs.BTP_SERVICE_ID_CCP: (CCP_EV, stack.ccp),
-        defs.BTP_SERVICE_ID_VCP: (VCP_EV, stack.vcp),
-        defs.BTP_SERVICE_ID_MCP: (MCP_EV, stack.mcp),
-        defs.BTP_SERVICE_ID_GMCS: (GMCS_EV, stack.gmcs),
-        defs.BTP_SERVICE_ID_HAP: (HAP_EV, stack.hap),
-        defs.BTP_SERVICE_ID_CAP: (CAP_EV, stack.cap),
-        defs.BTP_SERVICE_ID_CSIP: (CSIP_EV, stack.csip),
-        defs.BTP_SERVICE_ID_TBS: (TBS_EV, stack.tbs),
-        defs.BTP_SERVICE_ID_TMAP: (TMAP_EV, stack.tmap),
-        defs.BTP_SERVICE_ID_OTS: (OTS_EV, stack.ots),
-        defs.BTP_SERVICE_ID_PBP: (PBP_EV, stack.pbp),
-        # GENERATOR append 3
-    }
-
-    if hdr.svc_id in service_map:
-        event_dict, stack_obj = service_map[hdr.svc_id]
-        if hdr.op in event_dict and stack_obj:
-            cb = event_dict[hdr.op]
-            cb(stack_obj, data[0], hdr.data_len)
+    key = (hdr.svc_id, hdr.op)
+    entry = EVENT_HANDLERS.get(key)
+    if entry is None and hdr.svc_id not in LOADED_EVENT_SERVICES and \
+            load_event_handlers(hdr.svc_id):
+        entry = EVENT_HANDLERS.get(key)
+
+    if entry:
+        cb, layer = entry
+        stack_obj = getattr(stack, layer, None)
+        if stack_obj:
+            start = time.perf_counter()
+            try:
+                cb(stack_obj, data[0], hdr.data_len)
+            finally:
+                stats = EVENT_STATS[key]
+                stats[0] += 1
+                stats[1] += time.perf_counter() - start
+                # Wake up the stack waits to check the new state
+                notify_event()
             return True
 
     # TODO: Raise BTP error instead of logging
@@ -18,13 +18,14 @@ import binascii
 import logging
 import struct
 from enum import IntEnum, IntFlag
-from threading import Timer, Event
+from threading import Event
 from time import sleep
 
 from autopts.pybtp import defs
 from autopts.pybtp.btp.btp import CONTROLLER_INDEX, get_iut_method as get_iut, btp_hdr_check, pts_addr_get, pts_addr_type_get
 from autopts.ptsprojects.stack import get_stack
 from autopts.pybtp.types import addr2btp_ba, BTPError
+from autopts.utils import DEADLINE_SCHEDULER
 
 CCP = {
     'read_supported_cmds': ( defs.BTP_SERVICE_ID_CCP,
@@ -422,8 +423,7 @@ def ccp_await_event(ccp, event, timeout):
     flag.set()
 
     initial = ccp.events[event]['count']
-    timer = Timer(timeout/1000.0, ccp_timeout, [flag])
-    timer.start()
+    timer = DEADLINE_SCHEDULER.schedule(timeout/1000.0, ccp_timeout, flag)
 
     while flag.is_set():
         if ccp.events[event]['count'] > initial:
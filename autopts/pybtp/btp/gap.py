@@ -22,10 +22,11 @@ import struct
 from random import randint
 
 from autopts.ptsprojects.stack import get_stack, ConnParams
+from autopts.ptsprojects.stack.layers.gap import parse_eir_data
 from autopts.pybtp import defs
 from autopts.pybtp.types import BTPError, gap_settings_btp2txt, addr2btp_ba, Addr, OwnAddrType, AdDuration, AdType
 from autopts.pybtp.btp.btp import pts_addr_get, pts_addr_type_get, lt2_addr_get, lt2_addr_type_get, btp_hdr_check, \
-    CONTROLLER_INDEX, set_pts_addr, set_lt2_addr, LeAdv, get_iut_method as get_iut, lt3_addr_type_get, lt3_addr_get, \
+    CONTROLLER_INDEX, set_pts_addr, set_lt2_addr, get_iut_method as get_iut, lt3_addr_type_get, lt3_addr_get, \
     set_lt3_addr
 
 GAP = {
@@ -146,47 +147,65 @@ def gap_new_settings_ev_(gap, data, data_len):
     __gap_current_settings_update(curr_set)
 
 
-def gap_device_found_ev_(gap, data, data_len):
-    logging.debug("%s %r", gap_device_found_ev_.__name__, data)
+# Address Type, Address, RSSI, Flags, EIR Data Length
+GAP_DEVICE_FOUND_EV = struct.Struct('<B6sBBH')
 
-    fmt = '<B6sBBH'
-    if len(data) < struct.calcsize(fmt):
-        raise BTPError("Invalid data length")
 
-    addr_type, addr, rssi, flags, eir_len = struct.unpack_from(fmt, data)
-    eir = data[struct.calcsize(fmt):]
+def gap_dec_device_found_ev_data(data):
+    """Decodes Device Found Event data, the busiest event while scanning,
+    into (addr_type, addr, rssi, flags, eir)"""
+    hdr_len = GAP_DEVICE_FOUND_EV.size
+    if len(data) < hdr_len:
+        raise BTPError("Invalid data length")
 
-    if len(eir) != eir_len:
+    addr_type, addr, rssi, flags, eir_len = GAP_DEVICE_FOUND_EV.unpack_from(data)
+    if len(data) - hdr_len != eir_len:
         raise BTPError("Invalid data length")
 
-    addr = binascii.hexlify(addr[::-1]).lower()
+    return addr_type, binascii.hexlify(addr[::-1]), rssi, flags, data[hdr_len:]
+
+
+def gap_device_found_ev_(gap, data, data_len):
+    logging.debug("%s %r", gap_device_found_ev_.__name__, data)
+
+    addr_type, addr, rssi, flags, eir = gap_dec_device_found_ev_data(data)
 
     logging.debug("found %r type %r eir %r", addr, addr_type, eir)
 
     stack = get_stack()
-    stack.gap.found_devices.data.append(LeAdv(addr_type, addr, rssi, flags,
-                                              eir))
+    stack.gap.found_devices.add(addr_type, addr, rssi, flags, eir)
+
+
+# Address Type, Address, Interval, Latency, Timeout
+GAP_CONNECTED_EV = struct.Struct('<B6sHHH')
 
 
 def gap_connected_ev_(gap, data, data_len):
     logging.debug("%s %r", gap_connected_ev_.__name__, data)
 
-    hdr_fmt = '<B6sHHH'
+    if len(data) < GAP_CONNECTED_EV.size:
+        raise BTPError("Invalid data length")
 
-    addr_type, addr, itvl, latency, timeout = struct.unpack_from(hdr_fmt, data)
-    addr = binascii.hexlify(addr[::-1]).decode()
+    addr_type, addr, itvl, latency, timeout = GAP_CONNECTED_EV.unpack_from(data)
+    addr = addr[::-1].hex()
 
     gap.add_connection(addr, addr_type)
 
     gap.set_conn_params(ConnParams(itvl, itvl, latency, timeout))
 
 
+# Address Type, Address
+GAP_ADDR_EV = struct.Struct('<B6s')
+
+
 def gap_disconnected_ev_(gap, data, data_len):
     logging.debug("%s %r", gap_disconnected_ev_.__name__, data)
 
-    hdr_fmt = '<B6s'
-    addr_type, addr = struct.unpack_from(hdr_fmt, data)
-    addr = binascii.hexlify(addr[::-1]).decode()
+    if len(data) < GAP_ADDR_EV.size:
+        raise BTPError("Invalid data length")
+
+    addr_type, addr = GAP_ADDR_EV.unpack_from(data)
+    addr = addr[::-1].hex()
 
     gap.remove_connection(addr)
 
@@ -253,17 +272,25 @@ def gap_conn_param_update_ev_(gap, data, data_len):
     gap.set_conn_params(ConnParams(_itvl, _itvl, _latency, _timeout))
 
 
+# Address Type, Address, e.g. Security Level or Reason
+GAP_ADDR_U8_EV = struct.Struct('<B6sB')
+
+
+def gap_dec_addr_u8_ev_data(data):
+    if len(data) != GAP_ADDR_U8_EV.size:
+        raise BTPError("Invalid data length")
+
+    addr_type, addr, value = GAP_ADDR_U8_EV.unpack(data)
+
+    return addr_type, addr[::-1].hex(), value
+
+
 def gap_sec_level_changed_ev_(gap, data, data_len):
     logging.debug("%s", gap_sec_level_changed_ev_.__name__)
 
     logging.debug("received %r", data)
 
-    fmt = '<B6sB'
-    if len(data) != struct.calcsize(fmt):
-        raise BTPError("Invalid data length")
-
-    _addr_t, _addr, _level = struct.unpack_from(fmt, data)
-    _addr = binascii.hexlify(_addr[::-1]).decode()
+    _addr_t, _addr, _level = gap_dec_addr_u8_ev_data(data)
 
     gap.set_connection_sec_level(_addr, _level)
 
@@ -291,12 +318,7 @@ def gap_pairing_failed_ev_(gap, data, data_len):
 
     logging.debug("received %r", data)
 
-    fmt = '<B6sB'
-    if len(data) != struct.calcsize(fmt):
-        raise BTPError("Invalid data length")
-
-    _addr_t, _addr, _reason = struct.unpack_from(fmt, data)
-    _addr = binascii.hexlify(_addr[::-1]).decode()
+    _addr_t, _addr, _reason = gap_dec_addr_u8_ev_data(data)
 
     logging.debug("received %r", (_addr_t, _addr, _reason))
 
@@ -376,18 +398,21 @@ def gap_passkey_entry_req_ev_(gap, data, data_len):
     gap.passkey.data = randint(0, 999999)
 
 
+# Address Type, Address, Encrypted, Key Size
+GAP_ENCRYPTION_CHANGE_EV = struct.Struct('<B6sBB')
+
+
 def gap_encryption_change_ev_(gap, data, data_len):
     stack = get_stack()
     logging.debug("%s", gap_encryption_change_ev_.__name__)
 
     logging.debug("enc change received %r", data)
 
-    fmt = '<B6sBB'
-    if len(data) != struct.calcsize(fmt):
+    if len(data) != GAP_ENCRYPTION_CHANGE_EV.size:
         raise BTPError("Invalid data length")
 
-    _addr_t, _addr, _encrypted, _key_size = struct.unpack_from(fmt, data)
-    _addr = binascii.hexlify(_addr[::-1]).decode()
+    _addr_t, _addr, _encrypted, _key_size = GAP_ENCRYPTION_CHANGE_EV.unpack(data)
+    _addr = _addr[::-1].hex()
 
     logging.debug("received %r", (_addr_t, _addr, _encrypted, _key_size))
 
@@ -1273,20 +1298,6 @@ def gap_set_extended_advertising_off():
     __gap_current_settings_update(tuple_data)
 
 
-def parse_eir_data(eir):
-    data = {}
-
-    eir_len = len(eir)
-    i = 0
-    while i < eir_len:
-        data_len = eir[i]
-        data_type = eir[i+1]
-        data[data_type] = eir[i+2:i+data_len+1]
-        i += 1 + data_len
-
-    return data
-
-
 def check_discov_results(addr_type=None, addr=None, discovered=True, eir=None, uuids=None, svc_data=None):
     addr = pts_addr_get(addr).encode('utf-8')
     addr_type = pts_addr_type_get(addr_type)
@@ -1297,39 +1308,32 @@ def check_discov_results(addr_type=None, addr=None, discovered=True, eir=None, u
     found = False
 
     stack = get_stack()
-    devices = stack.gap.found_devices.data
-
-    for device in devices:
-        logging.debug("matching %r", device)
-        if addr_type != device.addr_type:
-            continue
-        if addr != device.addr:
-            continue
-        if eir and eir != device.eir:
-            continue
-
-        if device.eir:
-            data = parse_eir_data(device.eir)
-            if uuids and ((AdType.uuid16_some in data) or
-                          (AdType.uuid16_all in data)):
+    device = stack.gap.found_devices.get(addr_type, addr)
+
+    if device:
+        logging.debug("matching %r %r", device.addr, list(device.reports))
+        for report in list(device.reports.values()):
+            if eir and eir != report.eir:
+                continue
+
+            if uuids and ((AdType.uuid16_some in report.ad) or
+                          (AdType.uuid16_all in report.ad)):
                 uuid_list_type = AdType.uuid16_some if \
-                    (AdType.uuid16_some in data) else \
+                    (AdType.uuid16_some in report.ad) else \
                     AdType.uuid16_all
-                eir_uuids = [data[uuid_list_type][i:i + 2]
-                             for i in range(0, len(data[uuid_list_type]), 2)]
+                eir_uuids = [report.ad[uuid_list_type][i:i + 2]
+                             for i in range(0, len(report.ad[uuid_list_type]), 2)]
 
-                for uuid in uuids:
-                    uuid_ba = bytes.fromhex(uuid.replace("-", ""))[::-1]
-                    if uuid_ba not in eir_uuids:
-                        continue
+                if any(bytes.fromhex(uuid.replace("-", ""))[::-1] not in eir_uuids
+                       for uuid in uuids):
+                    continue
 
-            if svc_data and AdType.uuid16_svc_data in data:
-                eir_svc_data = data[AdType.uuid16_svc_data]
-                if svc_data not in eir_svc_data:
+            if svc_data and AdType.uuid16_svc_data in report.ad:
+                if svc_data not in report.ad[AdType.uuid16_svc_data]:
                     continue
 
-        found = True
-        break
+            found = True
+            break
 
     if discovered == found:
         return True
@@ -1339,7 +1343,6 @@ def check_discov_results(addr_type=None, addr=None, discovered=True, eir=None, u
 
 def check_scan_rep_and_rsp(report, response):
     stack = get_stack()
-    devices = stack.gap.found_devices.data
 
     # remove trailing zeros
     report = report.rstrip('0').upper()
@@ -1349,10 +1352,11 @@ def check_scan_rep_and_rsp(report, response):
     if len(response) % 2 != 0:
         response += '0'
 
-    for device in devices:
-        eir = str(binascii.hexlify(device.eir)).lstrip('b\'').rstrip('\'').upper()
-        if report in eir and response in eir:
-            return True
+    for device in stack.gap.found_devices:
+        for adv_report in list(device.reports.values()):
+            eir = adv_report.hex
+            if report in eir and response in eir:
+                return True
     return False
 
 
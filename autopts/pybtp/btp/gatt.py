@@ -21,7 +21,8 @@ import struct
 
 from autopts.ptsprojects.stack import GattCharacteristic, GattCharacteristicDescriptor, GattService
 from autopts.pybtp import defs
-from autopts.pybtp.btp.btp import btp_hdr_check, CONTROLLER_INDEX, get_iut_method as get_iut, btp2uuid, \
+from autopts.pybtp import codec
+from autopts.pybtp.btp.btp import btp_hdr_check, CONTROLLER_INDEX, get_iut_method as get_iut, \
     clear_verify_values, add_to_verify_values, get_verify_values, pts_addr_get, pts_addr_type_get
 from autopts.pybtp.btp.gap import gap_wait_for_connection
 from autopts.pybtp.types import BTPError, addr2btp_ba
@@ -120,11 +121,7 @@ GATT_EV = {
 }
 
 
-def gatts_add_svc(svc_type, uuid):
-    logging.debug("%s %r %r", gatts_add_svc.__name__, svc_type, uuid)
-
-    iutctl = get_iut()
-
+def gatts_add_svc_cmd(svc_type, uuid):
     data_ba = bytearray()
     uuid_ba = bytes.fromhex(uuid.replace("-", ""))
 
@@ -132,16 +129,20 @@ def gatts_add_svc(svc_type, uuid):
     data_ba.extend(chr(len(uuid_ba)).encode('utf-8'))
     data_ba.extend(uuid_ba)
 
-    iutctl.btp_socket.send(*GATTS['add_svc'], data=data_ba)
-
-    gatt_command_rsp_succ()
+    return (*GATTS['add_svc'], data_ba)
 
 
-def gatts_add_inc_svc(hdl):
-    logging.debug("%s %r", gatts_add_inc_svc.__name__, hdl)
+def gatts_add_svc(svc_type, uuid):
+    logging.debug("%s %r %r", gatts_add_svc.__name__, svc_type, uuid)
 
     iutctl = get_iut()
 
+    iutctl.btp_socket.send(*gatts_add_svc_cmd(svc_type, uuid))
+
+    gatt_command_rsp_succ()
+
+
+def gatts_add_inc_svc_cmd(hdl):
     if isinstance(hdl, str):
         hdl = int(hdl, 16)
 
@@ -149,17 +150,20 @@ def gatts_add_inc_svc(hdl):
     hdl_ba = struct.pack('H', hdl)
     data_ba.extend(hdl_ba)
 
-    iutctl.btp_socket.send(*GATTS['add_inc_svc'], data=data_ba)
-
-    gatt_command_rsp_succ()
+    return (*GATTS['add_inc_svc'], data_ba)
 
 
-def gatts_add_char(hdl, prop, perm, uuid):
-    logging.debug("%s %r %r %r %r", gatts_add_char.__name__, hdl, prop, perm,
-                  uuid)
+def gatts_add_inc_svc(hdl):
+    logging.debug("%s %r", gatts_add_inc_svc.__name__, hdl)
 
     iutctl = get_iut()
 
+    iutctl.btp_socket.send(*gatts_add_inc_svc_cmd(hdl))
+
+    gatt_command_rsp_succ()
+
+
+def gatts_add_char_cmd(hdl, prop, perm, uuid):
     if isinstance(hdl, str):
         hdl = int(hdl, 16)
 
@@ -181,43 +185,51 @@ def gatts_add_char(hdl, prop, perm, uuid):
     data_ba.extend(chr(len(uuid_ba)).encode('utf-8'))
     data_ba.extend(uuid_ba)
 
-    iutctl.btp_socket.send(*GATTS['add_char'], data=data_ba)
+    return (*GATTS['add_char'], data_ba)
+
+
+def gatts_add_char(hdl, prop, perm, uuid):
+    logging.debug("%s %r %r %r %r", gatts_add_char.__name__, hdl, prop, perm,
+                  uuid)
+
+    iutctl = get_iut()
+
+    iutctl.btp_socket.send(*gatts_add_char_cmd(hdl, prop, perm, uuid))
 
     gatt_command_rsp_succ()
 
 
-def gatts_set_val(hdl, val):
-    logging.debug("%s %r %r ", gatts_set_val.__name__, hdl, val)
+GATTS_SET_VAL_CMD = codec.Schema('GattsSetValCmd',
+                                 ('hdl', 'H'),
+                                 ('val_len', 'H'),
+                                 ('val', codec.Bytes('val_len')))
 
-    iutctl = get_iut()
 
+def gatts_set_val_cmd(hdl, val):
     if isinstance(hdl, str):
         hdl = int(hdl, 16)
 
-    data_ba = bytearray()
-    hdl_ba = struct.pack('H', hdl)
     if isinstance(val, str):
         val_ba = binascii.unhexlify(bytearray(val, 'utf-8'))
     elif isinstance(val, bytes):
         val_ba = binascii.unhexlify(val)
     else:
         val_ba = binascii.unhexlify(bytearray(val.encode('utf-8')))
-    val_len_ba = struct.pack('H', len(val_ba))
 
-    data_ba.extend(hdl_ba)
-    data_ba.extend(val_len_ba)
-    data_ba.extend(val_ba)
+    return (*GATTS['set_val'], GATTS_SET_VAL_CMD.encode(hdl, None, val_ba))
 
-    iutctl.btp_socket.send(*GATTS['set_val'], data=data_ba)
 
-    gatt_command_rsp_succ()
+def gatts_set_val(hdl, val):
+    logging.debug("%s %r %r ", gatts_set_val.__name__, hdl, val)
 
+    iutctl = get_iut()
 
-def gatts_add_desc(hdl, perm, uuid):
-    logging.debug("%s %r %r %r", gatts_add_desc.__name__, hdl, perm, uuid)
+    iutctl.btp_socket.send(*gatts_set_val_cmd(hdl, val))
+
+    gatt_command_rsp_succ()
 
-    iutctl = get_iut()
 
+def gatts_add_desc_cmd(hdl, perm, uuid):
     if isinstance(hdl, str):
         hdl = int(hdl, 16)
 
@@ -235,11 +247,25 @@ def gatts_add_desc(hdl, perm, uuid):
     data_ba.extend(chr(len(uuid_ba)).encode('utf-8'))
     data_ba.extend(uuid_ba)
 
-    iutctl.btp_socket.send(*GATTS['add_desc'], data=data_ba)
+    return (*GATTS['add_desc'], data_ba)
+
+
+def gatts_add_desc(hdl, perm, uuid):
+    logging.debug("%s %r %r %r", gatts_add_desc.__name__, hdl, perm, uuid)
+
+    iutctl = get_iut()
+
+    iutctl.btp_socket.send(*gatts_add_desc_cmd(hdl, perm, uuid))
 
     gatt_command_rsp_succ()
 
 
+GATTS_CHANGE_DATABASE_CMD = codec.Schema('GattsChangeDatabaseCmd',
+                                         ('start_hdl', 'H'),
+                                         ('end_hdl', 'H'),
+                                         ('vis', 'B'))
+
+
 def gatts_change_database(start_hdl, end_hdl, vis):
     logging.debug("%s %r %r %r", gatts_change_database.__name__, start_hdl, end_hdl, vis)
 
@@ -251,14 +277,9 @@ def gatts_change_database(start_hdl, end_hdl, vis):
     if isinstance(end_hdl, str):
         end_hdl = int(end_hdl, 16)
 
-    data_ba = bytearray()
-    start_hdl_ba = struct.pack('H', start_hdl)
-    end_hdl_ba = struct.pack('H', end_hdl)
-    data_ba.extend(start_hdl_ba)
-    data_ba.extend(end_hdl_ba)
-    data_ba.extend(chr(vis).encode('utf-8'))
+    data = GATTS_CHANGE_DATABASE_CMD.encode(start_hdl, end_hdl, vis)
 
-    iutctl.btp_socket.send(*GATTS['change_database'], data=data_ba)
+    iutctl.btp_socket.send(*GATTS['change_database'], data=data)
 
     gatt_command_rsp_succ()
 
@@ -282,21 +303,20 @@ def gatts_notify_mult(bd_addr_type, bd_addr, cnt, handles):
     gatt_command_rsp_succ()
 
 
+def gatts_start_server_cmd():
+    return GATTS['start_server']
+
+
 def gatts_start_server():
     logging.debug("%s", gatts_start_server.__name__)
 
     iutctl = get_iut()
-    iutctl.btp_socket.send(*GATTS['start_server'])
+    iutctl.btp_socket.send(*gatts_start_server_cmd())
 
     gatt_command_rsp_succ()
 
 
-def gatts_set_enc_key_size(hdl, enc_key_size):
-    logging.debug("%s %r %r", gatts_set_enc_key_size.__name__,
-                  hdl, enc_key_size)
-
-    iutctl = get_iut()
-
+def gatts_set_enc_key_size_cmd(hdl, enc_key_size):
     if isinstance(hdl, str):
         hdl = int(hdl, 16)
 
@@ -306,25 +326,65 @@ def gatts_set_enc_key_size(hdl, enc_key_size):
     data_ba.extend(hdl_ba)
     data_ba.extend(chr(enc_key_size).encode('utf-8'))
 
-    iutctl.btp_socket.send(*GATTS['set_enc_key_size'], data=data_ba)
+    return (*GATTS['set_enc_key_size'], data_ba)
+
+
+def gatts_set_enc_key_size(hdl, enc_key_size):
+    logging.debug("%s %r %r", gatts_set_enc_key_size.__name__,
+                  hdl, enc_key_size)
+
+    iutctl = get_iut()
+
+    iutctl.btp_socket.send(*gatts_set_enc_key_size_cmd(hdl, enc_key_size))
 
     gatt_command_rsp_succ()
 
 
+# GATT server database setup helpers that can be pipelined
+GATTS_SETUP_CMDS = {
+    gatts_add_svc: gatts_add_svc_cmd,
+    gatts_add_inc_svc: gatts_add_inc_svc_cmd,
+    gatts_add_char: gatts_add_char_cmd,
+    gatts_set_val: gatts_set_val_cmd,
+    gatts_add_desc: gatts_add_desc_cmd,
+    gatts_set_enc_key_size: gatts_set_enc_key_size_cmd,
+    gatts_start_server: gatts_start_server_cmd,
+}
+
+
+def gatts_setup_db(cmds):
+    """Set up GATT server database with pipelined BTP commands
+
+    cmds -- list of tuples of a GATT server helper and its arguments, e.g.
+            [(gatts_add_svc, 0, UUID.VND16_1), (gatts_start_server,)]
+    """
+    logging.debug("%s %r", gatts_setup_db.__name__, cmds)
+
+    frames = [GATTS_SETUP_CMDS[func](*args) for func, *args in cmds]
+
+    iutctl = get_iut()
+    iutctl.btp_socket.send_wait_rsp_pipelined(frames)
+
+
+# Address Type, Address, Notification Type, Handle, Data Length
+GATTC_NOTIFICATION_EV = struct.Struct('<B6sBHH')
+
+
 def gattc_dec_notification_ev_data(frame):
-    fmt = '<B6sBHH'
-    if len(frame) < struct.calcsize(fmt):
+    hdr_len = GATTC_NOTIFICATION_EV.size
+    if len(frame) < hdr_len:
         raise BTPError("Invalid data length")
 
-    addr_type, addr, notification_type, handle, data_len = struct.unpack_from(fmt, frame)
-    data = frame[struct.calcsize(fmt):]
-
-    if len(data) != data_len:
+    addr_type, addr, notification_type, handle, data_len = \
+        GATTC_NOTIFICATION_EV.unpack_from(frame)
+    if len(frame) - hdr_len != data_len:
         raise BTPError("Invalid data length")
 
-    addr = binascii.hexlify(addr[::-1]).lower().decode()
+    return addr_type, addr[::-1].hex(), notification_type, handle, frame[hdr_len:]
+
 
-    return addr_type, addr, notification_type, handle, data
+# Attribute ID, Data Length
+GATTS_ATTR_VALUE_CHANGED_EV = struct.Struct('<HH')
 
 
 def gatts_dec_attr_value_changed_ev_data(frame):
@@ -337,13 +397,15 @@ def gatts_dec_attr_value_changed_ev_data(frame):
     +--------------+-------------+------+
 
     """
-    hdr = '<HH'
-    hdr_len = struct.calcsize(hdr)
+    hdr_len = GATTS_ATTR_VALUE_CHANGED_EV.size
+    if len(frame) < hdr_len:
+        raise BTPError("Invalid data length")
 
-    (handle, data_len) = struct.unpack_from(hdr, frame)
-    data = struct.unpack_from('%ds' % data_len, frame, hdr_len)
+    handle, data_len = GATTS_ATTR_VALUE_CHANGED_EV.unpack_from(frame)
+    if len(frame) < hdr_len + data_len:
+        raise BTPError("Invalid data length")
 
-    return handle, data
+    return handle, (frame[hdr_len:hdr_len + data_len],)
 
 
 def gatts_attr_value_changed_ev():
@@ -363,40 +425,25 @@ def gatts_attr_value_changed_ev():
     return handle, data
 
 
-def dec_gatts_get_attrs_rp(data, data_len):
-    logging.debug("%s %r %r", dec_gatts_get_attrs_rp.__name__, data, data_len)
-
-    hdr = '<B'
-    hdr_len = struct.calcsize(hdr)
-    data_len = data_len - hdr_len
+GATTS_ATTR = codec.Schema('GattsAttr',
+                          ('handle', 'H'),
+                          ('permission', 'B'),
+                          ('_type_uuid_len', 'B'),
+                          ('type_uuid', codec.Bytes('_type_uuid_len', codec.btp_uuid)))
 
-    (attr_count, attrs) = struct.unpack(hdr + '%ds' % data_len, data)
+GATTS_GET_ATTRS_RP = codec.Schema('GattsGetAttrsRp',
+                                  ('_attr_count', 'B'),
+                                  ('attrs', codec.List(GATTS_ATTR, '_attr_count')))
 
-    attributes = []
 
-    while (attr_count - 1) >= 0:
-        hdr = '<HBB'
-        hdr_len = struct.calcsize(hdr)
-        data_len = data_len - hdr_len
-
-        (handle, permission, type_uuid_len, frag) = \
-            struct.unpack(hdr + '%ds' % data_len, attrs)
-
-        data_len = data_len - type_uuid_len
-
-        (type_uuid, attrs) = struct.unpack('%ds%ds' % (type_uuid_len,
-                                                       data_len), frag)
-
-        type_uuid = btp2uuid(type_uuid_len, type_uuid)
-
-        attributes.append((handle, permission, type_uuid))
+def dec_gatts_get_attrs_rp(data, data_len):
+    logging.debug("%s %r %r", dec_gatts_get_attrs_rp.__name__, data, data_len)
 
-        attr_count = attr_count - 1
+    rp = GATTS_GET_ATTRS_RP.decode(data)
 
-        logging.debug("handle %r perm %r type_uuid %r", handle, permission,
-                      type_uuid)
+    logging.debug("attributes %r", rp.attrs)
 
-    return attributes
+    return rp.attrs
 
 
 def gatts_get_attrs(start_handle=0x0001, end_handle=0xffff, type_uuid=None):
@@ -1148,6 +1195,29 @@ def gatt_command_rsp_succ():
     btp_hdr_check(tuple_hdr, defs.BTP_SERVICE_ID_GATT)
 
 
+GATT_SVC_ATTR = codec.Schema('GattSvcAttr',
+                             ('start_hdl', 'H'),
+                             ('end_hdl', 'H'),
+                             ('_uuid_len', 'B'),
+                             ('uuid', codec.Bytes('_uuid_len', codec.btp_uuid)))
+
+GATT_INCL_ATTR = codec.Schema('GattInclAttr',
+                              ('incl_hdl', 'H'),
+                              ('svc', GATT_SVC_ATTR))
+
+GATT_CHRC_ATTR = codec.Schema('GattChrcAttr',
+                              ('chrc_hdl', 'H'),
+                              ('val_hdl', 'H'),
+                              ('props', 'B'),
+                              ('_uuid_len', 'B'),
+                              ('uuid', codec.Bytes('_uuid_len', codec.btp_uuid)))
+
+GATT_DESC_ATTR = codec.Schema('GattDescAttr',
+                              ('hdl', 'H'),
+                              ('_uuid_len', 'B'),
+                              ('uuid', codec.Bytes('_uuid_len', codec.btp_uuid)))
+
+
 def gatt_dec_svc_attr(data):
     """Decodes Service Attribute data from Discovery Response data.
 
@@ -1158,14 +1228,15 @@ def gatt_dec_svc_attr(data):
     +--------------+------------+-------------+------+
 
     """
-    hdr = '<HHB'
-    hdr_len = struct.calcsize(hdr)
+    attr, attr_len = GATT_SVC_ATTR.decode_from(data)
 
-    start_hdl, end_hdl, uuid_len = struct.unpack_from(hdr, data)
-    (uuid,) = struct.unpack_from('%ds' % uuid_len, data, hdr_len)
-    uuid = btp2uuid(uuid_len, uuid)
+    return tuple(attr), attr_len
 
-    return (start_hdl, end_hdl, uuid), hdr_len + uuid_len
+
+def _incl_attr_tuple(attr):
+    incl_hdl, svc = attr
+
+    return (incl_hdl,), tuple(svc)
 
 
 def gatt_dec_incl_attr(data):
@@ -1178,13 +1249,9 @@ def gatt_dec_incl_attr(data):
     +-----------------+-------------------+
 
     """
-    hdr = '<H'
-    hdr_len = struct.calcsize(hdr)
-
-    incl_hdl = struct.unpack_from(hdr, data)
-    svc, svc_len = gatt_dec_svc_attr(data[hdr_len:])
+    attr, attr_len = GATT_INCL_ATTR.decode_from(data)
 
-    return (incl_hdl, svc), hdr_len + svc_len
+    return _incl_attr_tuple(attr), attr_len
 
 
 def gatt_dec_chrc_attr(data):
@@ -1197,14 +1264,9 @@ def gatt_dec_chrc_attr(data):
     +--------+--------------+------------+-------------+------+
 
     """
-    hdr = '<HHBB'
-    hdr_len = struct.calcsize(hdr)
-
-    chrc_hdl, val_hdl, props, uuid_len = struct.unpack_from(hdr, data)
-    (uuid,) = struct.unpack_from('%ds' % uuid_len, data, hdr_len)
-    uuid = btp2uuid(uuid_len, uuid)
+    attr, attr_len = GATT_CHRC_ATTR.decode_from(data)
 
-    return (chrc_hdl, val_hdl, props, uuid), hdr_len + uuid_len
+    return tuple(attr), attr_len
 
 
 def gatt_dec_desc_attr(data):
@@ -1217,14 +1279,20 @@ def gatt_dec_desc_attr(data):
     +--------+-------------+------+
 
     """
-    hdr = '<HB'
-    hdr_len = struct.calcsize(hdr)
+    attr, attr_len = GATT_DESC_ATTR.decode_from(data)
 
-    hdl, uuid_len = struct.unpack_from(hdr, data)
-    (uuid,) = struct.unpack_from('%ds' % uuid_len, data, hdr_len)
-    uuid = btp2uuid(uuid_len, uuid)
+    return tuple(attr), attr_len
 
-    return (hdl, uuid), hdr_len + uuid_len
+
+GATT_DISC_RSP = {
+    attr_type: codec.Schema('GattDiscRsp',
+                            ('_attr_cnt', 'B'),
+                            ('attrs', codec.List(attr_schema, '_attr_cnt')))
+    for attr_type, attr_schema in (('service', GATT_SVC_ATTR),
+                                   ('include', GATT_INCL_ATTR),
+                                   ('characteristic', GATT_CHRC_ATTR),
+                                   ('descriptor', GATT_DESC_ATTR))
+}
 
 
 def gatt_dec_disc_rsp(data, attr_type):
@@ -1237,28 +1305,19 @@ def gatt_dec_disc_rsp(data, attr_type):
     +------------------+------------+
 
     """
-    attrs_len = len(data) - 1
-    attr_cnt, attrs = struct.unpack('B%ds' % attrs_len, data)
+    if attr_type not in GATT_DISC_RSP:
+        attr_type = 'descriptor'
 
-    attrs_list = []
-    offset = 0
+    rsp = GATT_DISC_RSP[attr_type].decode(data)
 
-    # TODO: Use types instead of tuples
+    if attr_type == 'include':
+        return [_incl_attr_tuple(attr) for attr in rsp.attrs]
 
-    for x in range(attr_cnt):
-        if attr_type == "service":
-            attr, attr_len = gatt_dec_svc_attr(attrs[offset:])
-        elif attr_type == "include":
-            attr, attr_len = gatt_dec_incl_attr(attrs[offset:])
-        elif attr_type == "characteristic":
-            attr, attr_len = gatt_dec_chrc_attr(attrs[offset:])
-        else:  # descriptor
-            attr, attr_len = gatt_dec_desc_attr(attrs[offset:])
+    return rsp.attrs
 
-        attrs_list.append(attr)
-        offset += attr_len
 
-    return attrs_list
+# ATT Response, Data Length
+GATT_READ_RSP = struct.Struct('<BH')
 
 
 def gatt_dec_read_rsp(data):
@@ -1271,38 +1330,34 @@ def gatt_dec_read_rsp(data):
     +--------------+-------------+------+
 
     """
-    hdr = '<BH'
-    hdr_len = struct.calcsize(hdr)
-
-    att_rsp, val_len = struct.unpack_from(hdr, data)
-    val = struct.unpack_from('%ds' % val_len, data, hdr_len)
+    hdr_len = GATT_READ_RSP.size
+    if len(data) < hdr_len:
+        raise BTPError("Invalid data length")
 
-    return att_rsp, val
+    att_rsp, val_len = GATT_READ_RSP.unpack_from(data)
+    if len(data) < hdr_len + val_len:
+        raise BTPError("Invalid data length")
 
+    return att_rsp, (data[hdr_len:hdr_len + val_len],)
 
-def gatt_dec_read_uuid_rsp(data):
-    """Decodes Read UUID Response data.
-    """
-    offset = 0
 
-    hdr = '<BB'
-    hdr_len = struct.calcsize(hdr)
+GATT_CHAR_VALUE = codec.Schema('GattCharValue',
+                               ('handle', 'H'),
+                               ('_data_len', 'B'),
+                               ('val', codec.Bytes('_data_len')))
 
-    att_rsp, val_count = struct.unpack_from(hdr, data, offset)
-    offset += hdr_len
-    char_values = []
+GATT_READ_UUID_RSP = codec.Schema('GattReadUuidRsp',
+                                  ('att_rsp', 'B'),
+                                  ('_val_count', 'B'),
+                                  ('values', codec.List(GATT_CHAR_VALUE, '_val_count')))
 
-    for i in range(val_count):
-        hdr = '<HB'
-        hdr_len = struct.calcsize(hdr)
-        handle, data_len = struct.unpack_from(hdr, data, offset)
-        offset += hdr_len
-        val = struct.unpack_from('%ds' % data_len, data, offset)[0]
-        offset += data_len
 
-        char_values.append((handle, val))
+def gatt_dec_read_uuid_rsp(data):
+    """Decodes Read UUID Response data.
+    """
+    rsp = GATT_READ_UUID_RSP.decode(data)
 
-    return att_rsp, char_values
+    return rsp.att_rsp, rsp.values
 
 
 def gatt_dec_write_rsp(data):
@@ -15,13 +15,12 @@
 
 """Wrapper around btp messages. The functions are added as needed."""
 
-import binascii
 import logging
 import struct
 
 from autopts.ptsprojects.stack import get_stack
 from autopts.pybtp import defs
-from autopts.pybtp.types import addr2btp_ba, L2CAPConnectionResponse
+from autopts.pybtp.types import addr2btp_ba, BTPPipelineError, L2CAPConnectionResponse
 from autopts.pybtp.btp.btp import CONTROLLER_INDEX, btp_hdr_check, pts_addr_get, pts_addr_type_get, get_iut_method as get_iut
 from autopts.pybtp.btp.gap import gap_wait_for_connection
 
@@ -129,26 +128,61 @@ def l2cap_disconn(chan_id):
     l2cap_command_rsp_succ(defs.BTP_L2CAP_CMD_DISCONNECT)
 
 
+L2CAP_SEND_DATA_HDR = struct.Struct('<BH')
+
+
 def l2cap_send_data(chan_id, val, val_mtp=None):
     logging.debug("%s %r %r %r", l2cap_send_data.__name__, chan_id, val,
                   val_mtp)
 
     iutctl = get_iut()
 
+    val_ba = bytes.fromhex(val)
     if val_mtp:
-        val *= int(val_mtp)
+        val_ba *= int(val_mtp)
 
-    val_ba = bytes.fromhex(val)
-    val_len_ba = struct.pack('H', len(val_ba))
+    iutctl.btp_socket.send_wait_rsp(*L2CAP['send_data'],
+                                    L2CAP_SEND_DATA_HDR.pack(chan_id, len(val_ba)) + val_ba)
 
-    data_ba = bytearray(chr(chan_id).encode('utf-8'))
-    data_ba.extend(val_len_ba)
-    data_ba.extend(val_ba)
+    stack = get_stack()
+    stack.l2cap.tx(chan_id, val_ba)
+
+
+def l2cap_send(chan_id, data, mtu=None):
+    """Send data on the channel, segmented into SDUs of the peer MTU.
 
-    iutctl.btp_socket.send_wait_rsp(*L2CAP['send_data'], data=data_ba)
+    data -- bytes-like object, e.g. bytes or memoryview
+    mtu -- max SDU length, the peer MTU of the channel by default
 
+    The SDUs are sent back-to-back without waiting for each response.
+    Returns the number of SDUs sent.
+    """
+    logging.debug("%s %r %d", l2cap_send.__name__, chan_id, len(data))
+
+    iutctl = get_iut()
     stack = get_stack()
-    stack.l2cap.tx(chan_id, val)
+
+    if mtu is None:
+        chan = stack.l2cap.chan_lookup_id(chan_id)
+        mtu = chan.peer_mtu if chan and chan.peer_mtu else max(len(data), 1)
+
+    data = memoryview(data).cast('B')
+    sdus = [data[offset:offset + mtu] for offset in range(0, len(data), mtu)] or [data]
+    frames = [(*L2CAP['send_data'], L2CAP_SEND_DATA_HDR.pack(chan_id, len(sdu)) + sdu)
+              for sdu in sdus]
+
+    try:
+        iutctl.btp_socket.send_wait_rsp_pipelined(frames)
+    except BTPPipelineError as e:
+        for sdu, rsp in zip(sdus, e.responses):
+            if rsp is not None:
+                stack.l2cap.tx(chan_id, sdu)
+        raise
+
+    for sdu in sdus:
+        stack.l2cap.tx(chan_id, sdu)
+
+    return len(sdus)
 
 
 def l2cap_listen(psm, transport, mtu=0, response=L2CAPConnectionResponse.success):
@@ -257,14 +291,11 @@ def l2cap_disconnected_ev(l2cap, data, data_len):
 def l2cap_data_rcv_ev(l2cap, data, data_len):
     logging.debug("%s %r %r", l2cap_data_rcv_ev.__name__, data, data_len)
 
-    hdr_fmt = '<BH'
-    hdr_len = struct.calcsize(hdr_fmt)
-
-    chan_id, data_len = struct.unpack_from(hdr_fmt, data)
-    data_rx = struct.unpack_from('%ds' % data_len, data, hdr_len)[0]
+    chan_id, data_len = L2CAP_SEND_DATA_HDR.unpack_from(data)
+    data_rx = memoryview(data)[L2CAP_SEND_DATA_HDR.size:L2CAP_SEND_DATA_HDR.size + data_len]
     l2cap.rx(chan_id, data_rx)
 
-    logging.debug("id:%r, data:%s", chan_id, binascii.hexlify(data_rx))
+    logging.debug("id:%r, data len:%d", chan_id, len(data_rx))
 
 
 def l2cap_reconfigured_ev(l2cap, data, data_len):
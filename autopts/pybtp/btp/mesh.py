@@ -600,23 +600,27 @@ def mesh_va_del(label):
     iutctl.btp_socket.send_wait_rsp(*MESH['va_del'], data=data)
 
 
+# Test ID, Current Faults Count, Registered Faults Count
+MESH_HEALTH_FAULTS_RP = struct.Struct('<BBB')
+
+
 def mesh_health_generate_faults():
     logging.debug("%s", mesh_health_generate_faults.__name__)
 
     iutctl = get_iut()
     (rsp,) = iutctl.btp_socket.send_wait_rsp(*MESH['health_generate_faults'])
 
-    hdr_fmt = '<BBB'
-    hdr_len = struct.calcsize(hdr_fmt)
+    hdr_len = MESH_HEALTH_FAULTS_RP.size
+    if len(rsp) < hdr_len:
+        raise BTPError("Invalid data length")
 
-    (test_id, cur_faults_cnt, reg_faults_cnt) = \
-        struct.unpack_from(hdr_fmt, rsp)
-    (cur_faults,) = struct.unpack_from('<%ds' % cur_faults_cnt, rsp, hdr_len)
-    (reg_faults,) = struct.unpack_from('<%ds' % reg_faults_cnt, rsp,
-                                       hdr_len + cur_faults_cnt)
+    test_id, cur_faults_cnt, reg_faults_cnt = MESH_HEALTH_FAULTS_RP.unpack_from(rsp)
+    reg_faults_start = hdr_len + cur_faults_cnt
+    if len(rsp) < reg_faults_start + reg_faults_cnt:
+        raise BTPError("Invalid data length")
 
-    cur_faults = binascii.hexlify(cur_faults)
-    reg_faults = binascii.hexlify(reg_faults)
+    cur_faults = binascii.hexlify(rsp[hdr_len:reg_faults_start])
+    reg_faults = binascii.hexlify(rsp[reg_faults_start:reg_faults_start + reg_faults_cnt])
 
     return test_id, cur_faults, reg_faults
 
@@ -912,6 +916,22 @@ def mesh_iv_test_mode_autoinit():
     stack.mesh.iv_test_mode_autoinit = True
 
 
+# TTL, CTL, Source, Destination, Payload Length
+MESH_NET_RECV_EV = struct.Struct('<BBHHB')
+
+
+def mesh_dec_net_rcv_ev_data(data):
+    hdr_len = MESH_NET_RECV_EV.size
+    if len(data) < hdr_len:
+        raise BTPError("Invalid data length")
+
+    ttl, ctl, src, dst, payload_len = MESH_NET_RECV_EV.unpack_from(data)
+    if len(data) < hdr_len + payload_len:
+        raise BTPError("Invalid data length")
+
+    return ttl, ctl, src, dst, binascii.hexlify(data[hdr_len:hdr_len + payload_len])
+
+
 def mesh_net_rcv_ev(mesh, data, data_len):
     stack = get_stack()
 
@@ -920,14 +940,7 @@ def mesh_net_rcv_ev(mesh, data, data_len):
 
     logging.debug("%s %r %r", mesh_net_rcv_ev.__name__, data, data_len)
 
-    hdr_fmt = '<BBHHB'
-    hdr_len = struct.calcsize(hdr_fmt)
-
-    (ttl, ctl, src, dst, payload_len) = struct.unpack_from(hdr_fmt, data, 0)
-    (payload,) = struct.unpack_from('<%ds' % payload_len, data, hdr_len)
-    payload = binascii.hexlify(payload)
-
-    stack.mesh.net_recv_ev_data.data = (ttl, ctl, src, dst, payload)
+    stack.mesh.net_recv_ev_data.data = mesh_dec_net_rcv_ev_data(data)
 
 
 def mesh_invalid_bearer_ev(mesh, data, data_len):
@@ -82,38 +82,50 @@ def pacs_command_rsp_succ(timeout=20.0):
     return tuple_data
 
 
+def pacs_set_location_cmd(dir, location):
+    data = bytearray(struct.pack("<BI", dir, location))
+
+    return (*PACS['set_location'], data)
+
+
 def pacs_set_location(dir, location):
     logging.debug(f"{pacs_set_location.__name__} {dir} {location}")
 
     iutctl = get_iut()
 
-    data = bytearray(struct.pack("<BI", dir, location))
-
-    iutctl.btp_socket.send(*PACS['set_location'], data=data)
+    iutctl.btp_socket.send(*pacs_set_location_cmd(dir, location))
 
     pacs_command_rsp_succ()
 
 
+def pacs_set_available_contexts_cmd(sink_contexts, source_contexts):
+    data = bytearray(struct.pack("<HH", sink_contexts, source_contexts))
+
+    return (*PACS['set_available_contexts'], data)
+
+
 def pacs_set_available_contexts(sink_contexts, source_contexts):
     logging.debug(f"{pacs_set_available_contexts.__name__} {sink_contexts} {source_contexts}")
 
     iutctl = get_iut()
 
-    data = bytearray(struct.pack("<HH", sink_contexts, source_contexts))
-
-    iutctl.btp_socket.send(*PACS['set_available_contexts'], data=data)
+    iutctl.btp_socket.send(*pacs_set_available_contexts_cmd(sink_contexts, source_contexts))
 
     pacs_command_rsp_succ()
 
 
+def pacs_set_supported_contexts_cmd(sink_contexts, source_contexts):
+    data = bytearray(struct.pack("<HH", sink_contexts, source_contexts))
+
+    return (*PACS['set_supported_contexts'], data)
+
+
 def pacs_set_supported_contexts(sink_contexts, source_contexts):
     logging.debug(f"{pacs_set_supported_contexts.__name__} {sink_contexts} {source_contexts}")
 
     iutctl = get_iut()
 
-    data = bytearray(struct.pack("<HH", sink_contexts, source_contexts))
-
-    iutctl.btp_socket.send(*PACS['set_supported_contexts'], data=data)
+    iutctl.btp_socket.send(*pacs_set_supported_contexts_cmd(sink_contexts, source_contexts))
 
     pacs_command_rsp_succ()
 
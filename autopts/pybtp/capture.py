@@ -0,0 +1,193 @@
+#
+# auto-pts - The Bluetooth PTS Automation Framework
+#
+# Copyright (c) 2024, Codecoup.
+#
+# This program is free software; you can redistribute it and/or modify it
+# under the terms and conditions of the GNU General Public License,
+# version 2, as published by the Free Software Foundation.
+#
+# This program is distributed in the hope it will be useful, but WITHOUT
+# ANY WARRANTY; without even the implied warranty of MERCHANTABILITY or
+# FITNESS FOR A PARTICULAR PURPOSE.  See the GNU General Public License for
+# more details.
+#
+
+"""Binary capture of the BTP traffic
+
+The frames sent to and received from the IUT are appended to a capture
+file by a background writer thread, so the RX and TX paths do not format
+any text. Captures are rendered to the text format of the former
+autopts-iutctl.log with tools/btp_capture_print.py.
+
+Capture file format:
+    magic (8 bytes), then records of
+    timestamp (double) | direction (u8) | frame length (u32) | frame
+"""
+
+import logging
+import queue
+import re
+import struct
+import threading
+from datetime import datetime
+
+from autopts.pybtp import defs
+from autopts.pybtp.parser import HDR_LEN, dec_hdr
+
+CAPTURE_FILENAME = "autopts-iutctl.btpcap"
+CAPTURE_MAGIC = b'BTPCAP\x01\x00'
+CAPTURE_RX = 0
+CAPTURE_TX = 1
+
+# Max number of frames buffered for the writer thread
+CAPTURE_QUEUE_SIZE = 4096
+
+RECORD_HDR = struct.Struct('<dBI')
+
+BTP_STATUS = {
+    1: 'Fail',
+    2: 'Unknown Command',
+    3: 'Not Ready',
+    4: 'Invalid Index'
+}
+
+
+class CaptureWriter:
+    """Appends BTP frames to a capture file from a background thread"""
+
+    def __init__(self, path):
+        self.path = path
+        self._file = open(path, 'ab')
+        if self._file.tell() == 0:
+            self._file.write(CAPTURE_MAGIC)
+
+        self._queue = queue.Queue(maxsize=CAPTURE_QUEUE_SIZE)
+        self._thread = threading.Thread(target=self._writer_task, daemon=True,
+                                        name='BTPCaptureWriter')
+        self._thread.start()
+
+    def write(self, timestamp, direction, *chunks):
+        """Queue frame, given as one or more byte chunks, for writing.
+
+        Blocks only if the writer thread falls CAPTURE_QUEUE_SIZE frames
+        behind.
+        """
+        length = 0
+        for chunk in chunks:
+            length += len(chunk)
+
+        self._queue.put(b''.join((RECORD_HDR.pack(timestamp, direction, length),
+                                  *chunks)))
+
+    def _writer_task(self):
+        while True:
+            records = []
+            record = self._queue.get()
+
+            # Write everything queued meanwhile at once, up to the close
+            while record is not None:
+                records.append(record)
+                try:
+                    record = self._queue.get_nowait()
+                except queue.Empty:
+                    break
+
+            closed = record is None
+
+            try:
+                self._file.write(b''.join(records))
+                self._file.flush()
+            except (OSError, ValueError) as e:
+                logging.error("BTP capture write failed: %r", e)
+
+            if closed:
+                break
+
+    def close(self):
+        """Write the queued frames and close the capture file"""
+        if self._thread is None:
+            return
+
+        self._queue.put(None)
+        self._thread.join()
+        self._thread = None
+        self._file.close()
+
+
+def read_capture(path):
+    """Yield (timestamp, direction, frame) records of a capture file"""
+    with open(path, 'rb') as f:
+        if f.read(len(CAPTURE_MAGIC)) != CAPTURE_MAGIC:
+            raise ValueError(f'{path} is not a BTP capture file')
+
+        while True:
+            hdr = f.read(RECORD_HDR.size)
+            if len(hdr) < RECORD_HDR.size:
+                # Truncated capture of an interrupted run
+                return
+
+            timestamp, direction, length = RECORD_HDR.unpack(hdr)
+            frame = f.read(length)
+            if len(frame) < length:
+                return
+
+            yield timestamp, direction, frame
+
+
+def _build_opcode_names():
+    """Map (service ID, opcode) to the name of the command or event"""
+    services = {}
+    for name, value in vars(defs).items():
+        if name.startswith('BTP_SERVICE_ID_') and isinstance(value, int):
+            services.setdefault(name[len('BTP_SERVICE_ID_'):], value)
+
+    names = {}
+    for svc_name, svc_id in services.items():
+        prefixes = (f'BTP_{svc_name}_CMD_', f'BTP_{svc_name}_EV_')
+        for name, value in vars(defs).items():
+            if name.startswith(prefixes) and isinstance(value, int):
+                names.setdefault((svc_id, value), name)
+
+    return names
+
+
+OPCODE_NAMES = None
+
+
+def opcode_name(svc_id, op):
+    global OPCODE_NAMES
+
+    if op == 0:
+        return 'BTP_ERROR'
+
+    if OPCODE_NAMES is None:
+        OPCODE_NAMES = _build_opcode_names()
+
+    return OPCODE_NAMES.get((svc_id, op), 'BTP Undecoded')
+
+
+def format_record(timestamp, direction, frame):
+    """Render capture record in the autopts-iutctl.log text format"""
+    current_time = datetime.fromtimestamp(timestamp).strftime('%H:%M:%S:%f')[:-3]
+    tuple_hdr = dec_hdr(frame[:HDR_LEN])
+    hex_data = ' '.join(f'{b:02x}' for b in frame)
+
+    parsed = f'{opcode_name(tuple_hdr.svc_id, tuple_hdr.op)} ' \
+             f'(0x{tuple_hdr.svc_id:02x}|0x{tuple_hdr.op:02x}|0x{tuple_hdr.ctrl_index:02x})' \
+             f'\n{" " * 17} raw data ({tuple_hdr.data_len}):'
+
+    if direction == CAPTURE_RX and tuple_hdr.op == 0:
+        status = frame[HDR_LEN] if len(frame) > HDR_LEN else None
+        return f'{current_time}\t<- Response:  {parsed} {hex_data} ' \
+               f'{BTP_STATUS.get(status, status)}'
+
+    indent = ' ' * 18
+    hex_data = hex_data[:14] + "|" + hex_data[14 + 1:]
+    if len(hex_data) > 47:
+        # This ensures clean text indentation for longer raw data, with 16 bytes per line
+        hex_data = '\n' + indent + re.sub(r'(.{48})', r'\1\n' + indent, hex_data)
+
+    arrow = '>' if direction == CAPTURE_TX else '<'
+
+    return f'{current_time}\t{arrow} {parsed} {hex_data}'
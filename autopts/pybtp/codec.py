@@ -0,0 +1,384 @@
+#
+# auto-pts - The Bluetooth PTS Automation Framework
+#
+# Copyright (c) 2024, Codecoup.
+#
+# This program is free software; you can redistribute it and/or modify it
+# under the terms and conditions of the GNU General Public License,
+# version 2, as published by the Free Software Foundation.
+#
+# This program is distributed in the hope it will be useful, but WITHOUT
+# ANY WARRANTY; without even the implied warranty of MERCHANTABILITY or
+# FITNESS FOR A PARTICULAR PURPOSE.  See the GNU General Public License for
+# more details.
+#
+
+"""Declarative BTP data codec
+
+BTP command, response and event data is declared once as a Schema, e.g.
+
+    GATT_SVC_ATTR = Schema('GattSvcAttr',
+                           ('start_hdl', 'H'),
+                           ('end_hdl', 'H'),
+                           ('_uuid_len', 'B'),
+                           ('uuid', Bytes('_uuid_len', conv=btp_uuid)))
+
+Consecutive fixed size fields are compiled into a single struct.Struct.
+Records of fixed size fields, optionally followed by one bytes field, are
+unpacked by that struct at once; only schemas with lists or nested schemas
+walk their fields while decoding. Decoded records are namedtuples, records
+in lists and nested records are plain tuples. Fields with a leading
+underscore (e.g. length fields) are consumed while decoding, but are not
+stored in the record.
+
+Fixed size event data is decoded with a precompiled struct.Struct in its
+handler instead, a schema does not pay off for a single unpack_from().
+"""
+
+import struct
+from collections import namedtuple
+from operator import itemgetter
+
+from autopts.pybtp.types import BTPError
+
+
+def btp_uuid(uu):
+    """16-bit or 128-bit BTP UUID to upper case hex string"""
+    if len(uu) == 2:
+        return '%04X' % (uu[0] | uu[1] << 8)
+    if len(uu) != 16:
+        raise ValueError(f'Invalid UUID length {len(uu)}')
+    return uu[::-1].hex().upper()
+
+
+class Bytes:
+    """Variable length bytes field
+
+    length -- name of an earlier field holding the length, or None if the
+              field takes the rest of the data
+    conv -- optional function converting the bytes
+    """
+
+    def __init__(self, length=None, conv=None):
+        self.length = length
+        self.conv = conv
+
+
+class List:
+    """List of records of a schema
+
+    count -- name of an earlier field holding the number of records
+    """
+
+    def __init__(self, schema, count):
+        self.schema = schema
+        self.count = count
+
+
+_STRUCT, _BYTES, _LIST, _NESTED = range(4)
+
+# Builds a namedtuple from an iterable of its values without the argument
+# parsing of its constructor
+_new = tuple.__new__
+
+
+def _picker(keep, count):
+    """Function picking the values at indexes keep out of count values as
+    a tuple, or None if all values are kept"""
+    if len(keep) == count:
+        return None
+    if not keep:
+        return lambda values: ()
+    if len(keep) == 1:
+        return lambda values, idx=keep[0]: (values[idx],)
+    return itemgetter(*keep)
+
+
+class Schema:
+    """Layout of BTP data
+
+    fields -- (name, fmt) or (name, fmt, conv) tuples, where fmt is
+              a struct format character (little endian is implied),
+              Bytes, List or a nested Schema
+    exact -- if True, decode fails if not all data was consumed
+
+    decode(buf) returns the record decoded from buf, decode_from(buf,
+    offset) returns (record, offset of the data following the record).
+    Both raise BTPError if the data is too short. Bytes fields are slices
+    of buf, so decoding a memoryview does not copy them.
+    """
+
+    def __init__(self, name, *fields, exact=False):
+        self.name = name
+        self.exact = exact
+
+        names = [field[0] for field in fields]
+        self._names = names
+        self.record = namedtuple(name, [n for n in names if not n.startswith('_')])
+
+        # Compile fields into segments, consecutive fixed size fields
+        # share a struct.Struct
+        self._segments = []
+        self._length_fields = []
+        fmt = ''
+        convs = []
+        struct_names = []
+        for idx, field in enumerate(fields):
+            field_name, field_fmt = field[:2]
+            conv = field[2] if len(field) > 2 else None
+
+            if isinstance(field_fmt, str):
+                fmt += field_fmt
+                convs.append(conv)
+                struct_names.append(field_name)
+                continue
+
+            if fmt:
+                self._add_struct(fmt, convs, struct_names)
+                fmt = ''
+                convs = []
+                struct_names = []
+
+            if isinstance(field_fmt, Bytes):
+                length_idx = None if field_fmt.length is None else \
+                    names.index(field_fmt.length)
+                self._segments.append((_BYTES, length_idx, field_fmt.conv))
+                if length_idx is not None:
+                    self._length_fields.append((length_idx, idx))
+            elif isinstance(field_fmt, List):
+                self._segments.append((_LIST, names.index(field_fmt.count),
+                                       field_fmt.schema))
+            elif isinstance(field_fmt, Schema):
+                self._segments.append((_NESTED, None, field_fmt))
+            else:
+                raise TypeError(f'Invalid format of field {field_name}')
+
+        if fmt:
+            self._add_struct(fmt, convs, struct_names)
+
+        self.decode_from, self.decode = self._compile(names)
+
+    def _add_struct(self, fmt, convs, field_names):
+        compiled = struct.Struct('<' + fmt)
+        count = len(compiled.unpack(bytes(compiled.size)))
+        if count != len(convs):
+            raise TypeError(f'Format {fmt!r} of fields {", ".join(field_names)} of '
+                            f'{self.name} has {count} values, expected one per field')
+
+        self._segments.append((_STRUCT, compiled, (count, convs)))
+
+    def _compile(self, names):
+        """Build decode_from() and decode() functions of the schema"""
+        keep = [idx for idx, name in enumerate(names) if not name.startswith('_')]
+        pick = _picker(keep, len(names))
+
+        if self._segments and self._segments[0][0] == _STRUCT and \
+                (len(self._segments) == 1 or
+                 (len(self._segments) == 2 and self._segments[1][0] == _BYTES)):
+            compile_ = self._compile_flat
+            self._decode_list_from = self._compile_flat_list(keep)
+        else:
+            compile_ = self._compile_walk
+            self._decode_list_from = self._compile_walk_list()
+
+        # Records in lists and nested records are plain tuples, building
+        # a namedtuple per list item costs more than decoding it
+        self._decode_tuple_from = compile_(pick, None)
+        decode_from = compile_(pick, self.record)
+
+        msg = f'Invalid data length of {self.name}'
+        exact = self.exact
+
+        def decode(buf):
+            record, offset = decode_from(buf)
+            if exact and offset != len(buf):
+                raise BTPError(msg)
+
+            return record
+
+        return decode_from, decode
+
+    def _compile_flat(self, pick, record):
+        """Decoder of fixed size fields, optionally followed by one bytes
+        field, unpacked with a single precompiled struct"""
+        _, compiled, (_, convs) = self._segments[0]
+        unpack_from = compiled.unpack_from
+        size = compiled.size
+        convs = tuple((idx, conv) for idx, conv in enumerate(convs) if conv)
+        has_bytes = len(self._segments) == 2
+        if has_bytes:
+            _, length_idx, bytes_conv = self._segments[1]
+        msg = f'Invalid data length of {self.name}'
+
+        def decode_from(buf, offset=0):
+            try:
+                values = unpack_from(buf, offset)
+            except struct.error:
+                raise BTPError(msg) from None
+
+            end = offset + size
+            if convs:
+                values = list(values)
+                for idx, conv in convs:
+                    values[idx] = conv(values[idx])
+                values = tuple(values)
+
+            if has_bytes:
+                start = end
+                end = len(buf) if length_idx is None else start + values[length_idx]
+                if end > len(buf):
+                    raise BTPError(msg)
+
+                data = buf[start:end]
+                values += (bytes_conv(data) if bytes_conv else data,)
+
+            if pick:
+                values = pick(values)
+
+            return (values if record is None else _new(record, values)), end
+
+        return decode_from
+
+    def _compile_flat_list(self, keep):
+        """Decoder of a list of records of _compile_flat() layout, with the
+        record decoding inlined in the loop"""
+        _, compiled, (count, convs) = self._segments[0]
+        unpack_from = compiled.unpack_from
+        size = compiled.size
+        convs = tuple((idx, conv) for idx, conv in enumerate(convs) if conv)
+        # Struct values are picked before the bytes field is appended
+        pick = _picker([idx for idx in keep if idx < count], count)
+        has_bytes = len(self._segments) == 2
+        if has_bytes:
+            _, length_idx, bytes_conv = self._segments[1]
+            keep_bytes = count in keep
+        msg = f'Invalid data length of {self.name}'
+
+        def decode_list_from(buf, offset, count):
+            items = []
+            append = items.append
+            buf_len = len(buf)
+            for _ in range(count):
+                try:
+                    values = unpack_from(buf, offset)
+                except struct.error:
+                    raise BTPError(msg) from None
+
+                offset += size
+                if convs:
+                    values = list(values)
+                    for idx, conv in convs:
+                        values[idx] = conv(values[idx])
+                    values = tuple(values)
+
+                if not has_bytes:
+                    append(pick(values) if pick else values)
+                    continue
+
+                end = buf_len if length_idx is None else offset + values[length_idx]
+                if end > buf_len:
+                    raise BTPError(msg)
+
+                if pick:
+                    values = pick(values)
+                if keep_bytes:
+                    data = buf[offset:end]
+                    values += (bytes_conv(data) if bytes_conv else data,)
+                append(values)
+                offset = end
+
+            return items, offset
+
+        return decode_list_from
+
+    def _compile_walk(self, pick, record):
+        """Decoder walking the segments, for lists and nested schemas"""
+        segments = []
+        for kind, arg, extra in self._segments:
+            if kind == _STRUCT:
+                extra = tuple((idx, conv) for idx, conv in enumerate(extra[1]) if conv)
+            elif kind == _LIST:
+                extra = extra._decode_list_from
+            elif kind == _NESTED:
+                extra = extra._decode_tuple_from
+            segments.append((kind, arg, extra))
+
+        msg = f'Invalid data length of {self.name}'
+
+        def decode_from(buf, offset=0):
+            values = []
+            for kind, arg, extra in segments:
+                if kind == _STRUCT:
+                    try:
+                        unpacked = arg.unpack_from(buf, offset)
+                    except struct.error:
+                        raise BTPError(msg) from None
+
+                    offset += arg.size
+                    base = len(values)
+                    values.extend(unpacked)
+                    for idx, conv in extra:
+                        values[base + idx] = conv(values[base + idx])
+                elif kind == _BYTES:
+                    end = len(buf) if arg is None else offset + values[arg]
+                    if end > len(buf):
+                        raise BTPError(msg)
+
+                    data = buf[offset:end]
+                    values.append(extra(data) if extra else data)
+                    offset = end
+                elif kind == _LIST:
+                    items, offset = extra(buf, offset, values[arg])
+                    values.append(items)
+                else:
+                    item, offset = extra(buf, offset)
+                    values.append(item)
+
+            values = pick(values) if pick else tuple(values)
+
+            return (values if record is None else _new(record, values)), offset
+
+        return decode_from
+
+    def _compile_walk_list(self):
+        """Decoder of a list of records walking their segments"""
+        def decode_list_from(buf, offset, count):
+            decode_from = self._decode_tuple_from
+            items = []
+            append = items.append
+            for _ in range(count):
+                item, offset = decode_from(buf, offset)
+                append(item)
+
+            return items, offset
+
+        return decode_list_from
+
+    def encode(self, *values):
+        """Encode values of all fields of the schema.
+
+        Length fields given as None are set to the length of their Bytes
+        field. Lists and nested schemas are not supported.
+        """
+        values = list(values)
+        if len(values) != len(self._names):
+            raise TypeError(f'{self.name} takes {len(self._names)} values')
+
+        for length_idx, bytes_idx in self._length_fields:
+            if values[length_idx] is None:
+                values[length_idx] = len(values[bytes_idx])
+
+        data = bytearray()
+        idx = 0
+        for kind, arg, extra in self._segments:
+            if kind == _STRUCT:
+                count = extra[0]
+                data += arg.pack(*values[idx:idx + count])
+                idx += count
+            elif kind == _BYTES:
+                data += values[idx]
+                idx += 1
+            else:
+                raise TypeError(f'Encoding of {self.name} is not supported')
+
+        return bytes(data)
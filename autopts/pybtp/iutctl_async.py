@@ -0,0 +1,485 @@
+#
+# auto-pts - The Bluetooth PTS Automation Framework
+#
+# Copyright (c) 2024, Codecoup.
+#
+# This program is free software; you can redistribute it and/or modify it
+# under the terms and conditions of the GNU General Public License,
+# version 2, as published by the Free Software Foundation.
+#
+# This program is distributed in the hope it will be useful, but WITHOUT
+# ANY WARRANTY; without even the implied warranty of MERCHANTABILITY or
+# FITNESS FOR A PARTICULAR PURPOSE.  See the GNU General Public License for
+# more details.
+#
+
+"""asyncio BTP transport
+
+One event loop can drive the BTP connections of many IUTs, instead of
+one RX thread per IUT. AsyncBTPWorker exposes the synchronous BTPWorker
+API on top of it, so the pybtp/btp helpers work unchanged with:
+
+    self.btp_socket = AsyncBTPWorker(AsyncBTPSocketSrv(log_dir))
+    self.btp_socket.open(self.btp_address)
+    ...
+    self.btp_socket.accept()
+"""
+
+import asyncio
+import collections
+import concurrent.futures
+import logging
+import os
+import socket
+import sys
+import threading
+
+from autopts.pybtp import iutctl_common
+from autopts.pybtp.iutctl_common import BTPSocket, BTPWorker, BTP_ADDRESS, \
+    PIPELINE_WINDOW, READ_POLL_INTERVAL
+from autopts.pybtp.parser import dec_hdr, dec_data, HDR_LEN
+from autopts.pybtp.types import BTPError, BTPPipelineError
+from autopts.utils import get_global_end, raise_on_global_end
+
+log = logging.debug
+
+
+def cancel_on_global_end():
+    """Coroutine counterpart of raise_on_global_end. RunEnd must not be
+    raised in the event loop, so the operation is cancelled instead and
+    BTPEventLoop.run raises RunEnd in the calling thread."""
+    if get_global_end():
+        raise asyncio.CancelledError
+
+
+class BTPEventLoop:
+    """asyncio event loop running in a daemon thread, shared by the BTP
+    connections of all IUTs"""
+
+    def __init__(self):
+        self.loop = asyncio.new_event_loop()
+        self._thread = threading.Thread(target=self._run, daemon=True,
+                                        name='BTPEventLoop')
+        self._thread.start()
+
+    def _run(self):
+        asyncio.set_event_loop(self.loop)
+        self.loop.run_forever()
+
+    def run(self, coro, timeout=None):
+        """Run coroutine in the event loop and wait for its result.
+
+        If the coroutine was cancelled because of the global end,
+        RunEnd is raised.
+        """
+        future = asyncio.run_coroutine_threadsafe(coro, self.loop)
+        try:
+            return future.result(timeout)
+        except concurrent.futures.CancelledError:
+            raise_on_global_end()
+            raise
+        except concurrent.futures.TimeoutError:
+            future.cancel()
+            raise socket.timeout
+
+    def stop(self):
+        self.loop.call_soon_threadsafe(self.loop.stop)
+        self._thread.join()
+        self.loop.close()
+
+
+BTP_EVENT_LOOP = None
+_btp_event_loop_lock = threading.Lock()
+
+
+def get_btp_event_loop():
+    global BTP_EVENT_LOOP
+
+    with _btp_event_loop_lock:
+        if BTP_EVENT_LOOP is None:
+            BTP_EVENT_LOOP = BTPEventLoop()
+
+        return BTP_EVENT_LOOP
+
+
+class AsyncBTPSocket(BTPSocket):
+    """BTPSocket over asyncio streams. The I/O methods are coroutines."""
+
+    def __init__(self, log_dir=None):
+        super().__init__(log_dir)
+        self.reader = None
+        self.writer = None
+
+    async def read(self, timeout=None):
+        """Read BTP frame from the stream"""
+        try:
+            hdr = await self.reader.readexactly(HDR_LEN)
+            tuple_hdr = dec_hdr(hdr)
+            logging.debug("Received: hdr: %r", hdr)
+
+            data = await self.reader.readexactly(tuple_hdr.data_len)
+        except asyncio.IncompleteReadError:
+            # The connection is closed and the socket should be reinited
+            raise socket.error
+
+        self.log_rx_frame(hdr, tuple_hdr, data)
+
+        return tuple_hdr, dec_data(data)
+
+    async def send(self, svc_id, op, ctrl_index, data):
+        """Send BTP formated data over the stream"""
+        self.writer.write(self.encode_frame(svc_id, op, ctrl_index, data))
+        await self.writer.drain()
+
+    async def close(self):
+        BTPSocket.close(self)
+
+        if self.writer:
+            self.writer.close()
+            try:
+                await self.writer.wait_closed()
+            except OSError as e:
+                logging.exception(e)
+
+        self.reader = None
+        self.writer = None
+        self.addr = None
+
+
+class AsyncBTPSocketSrv(AsyncBTPSocket):
+
+    def __init__(self, log_dir=None):
+        super().__init__(log_dir)
+        self.server = None
+        self._connected = None
+
+    async def open(self, addres=BTP_ADDRESS, port=0):
+        """Open BTP socket for IUT"""
+        if os.path.exists(addres):
+            os.remove(addres)
+
+        self._connected = asyncio.get_running_loop().create_future()
+
+        # queue only one connection
+        if sys.platform == "win32":
+            self.server = await asyncio.start_server(
+                self._on_connect, socket.gethostname(), port, backlog=1)
+        else:
+            self.server = await asyncio.start_unix_server(
+                self._on_connect, addres, backlog=1)
+
+    def _on_connect(self, reader, writer):
+        if self._connected.done():
+            writer.close()
+            return
+
+        self._connected.set_result((reader, writer))
+
+    async def accept(self, timeout=10.0):
+        """Accept incoming IUT connection
+
+        timeout - accept timeout in seconds"""
+        try:
+            self.reader, self.writer = await asyncio.wait_for(
+                asyncio.shield(self._connected), timeout)
+        except asyncio.TimeoutError:
+            raise socket.timeout
+
+        self.addr = self.writer.get_extra_info('peername')
+
+    async def close(self):
+        await super().close()
+
+        if self.server:
+            self.server.close()
+            await self.server.wait_closed()
+
+        self.server = None
+
+
+class AsyncBTPSocketCli(AsyncBTPSocket):
+
+    async def open(self, addr):
+        self.addr = addr
+
+    async def accept(self, timeout=10.0):
+        try:
+            self.reader, self.writer = await asyncio.wait_for(
+                asyncio.open_connection(*self.addr), timeout)
+        except asyncio.TimeoutError:
+            raise socket.timeout
+
+
+class BTPEventSubscription:
+    """Queue of BTP events with given service ID and opcode"""
+
+    def __init__(self, conn, svc_id, op):
+        self._conn = conn
+        self.key = (svc_id, op)
+        self._queue = asyncio.Queue()
+
+    def _put(self, frame):
+        self._queue.put_nowait(frame)
+
+    async def get(self, timeout=None):
+        """Wait for the next event, returns (tuple_hdr, tuple_data)"""
+        loop = asyncio.get_running_loop()
+        deadline = None if timeout is None else loop.time() + timeout
+
+        while True:
+            cancel_on_global_end()
+
+            wait_time = READ_POLL_INTERVAL
+            if deadline is not None:
+                remaining = deadline - loop.time()
+                if remaining <= 0:
+                    raise socket.timeout
+                wait_time = min(remaining, wait_time)
+
+            try:
+                return await asyncio.wait_for(self._queue.get(), wait_time)
+            except asyncio.TimeoutError:
+                continue
+
+    def __aiter__(self):
+        return self
+
+    async def __anext__(self):
+        return await self.get()
+
+    def close(self):
+        self._conn.unsubscribe(self)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        self.close()
+
+
+class AsyncBTPConnection:
+    """asyncio counterpart of BTPWorker
+
+    Responses are matched with the pending commands in FIFO order. Events
+    are passed to the registered event handler, the global one by default,
+    and to the subscriptions for their (svc_id, opcode). Frames nobody
+    handled can be fetched with read(). Pending operations are cancelled
+    on the global end.
+    """
+
+    def __init__(self, sock):
+        self._socket = sock
+        self._pending = collections.deque()
+        self._subscriptions = collections.defaultdict(list)
+        self._rx_queue = None
+        self._lock = None
+        self._tasks = []
+
+        self.event_handler_cb = None
+
+    async def accept(self, timeout=10.0):
+        logging.debug("%s", self.accept.__name__)
+
+        await self._socket.accept(timeout)
+
+        self._rx_queue = asyncio.Queue()
+        self._lock = asyncio.Lock()
+        self._tasks = [asyncio.create_task(self._rx_task()),
+                       asyncio.create_task(self._global_end_task())]
+
+    async def _rx_task(self):
+        log('BTP RX task started')
+        try:
+            while True:
+                frame = await self._socket.read()
+                hdr = frame[0]
+
+                if hdr.op >= 0x80:
+                    self._dispatch_event(frame)
+                    continue
+
+                while self._pending:
+                    fut = self._pending.popleft()
+                    if not fut.done():
+                        fut.set_result(frame)
+                        break
+                else:
+                    self._rx_queue.put_nowait(frame)
+        except socket.error:
+            log('socket.error: AsyncBTPSocket is closed')
+        finally:
+            self._cancel_pending()
+            log('BTP RX task finishing...')
+
+    def _dispatch_event(self, frame):
+        hdr = frame[0]
+        handled = False
+
+        event_handler = self.event_handler_cb or iutctl_common.EVENT_HANDLER
+        if event_handler:
+            try:
+                handled = event_handler(*frame) is True
+            except Exception as e:
+                logging.error("%r", e)
+
+        for subscription in self._subscriptions.get((hdr.svc_id, hdr.op), []):
+            subscription._put(frame)
+            handled = True
+
+        if not handled:
+            self._rx_queue.put_nowait(frame)
+
+    async def _global_end_task(self):
+        while not get_global_end():
+            await asyncio.sleep(READ_POLL_INTERVAL)
+
+        log('Global end, cancelling BTP operations')
+        for task in self._tasks:
+            if task is not asyncio.current_task():
+                task.cancel()
+
+    def _cancel_pending(self):
+        while self._pending:
+            self._pending.popleft().cancel()
+
+    def subscribe(self, svc_id, op):
+        """Subscribe to BTP events with given service ID and opcode"""
+        subscription = BTPEventSubscription(self, svc_id, op)
+        self._subscriptions[subscription.key].append(subscription)
+
+        return subscription
+
+    def unsubscribe(self, subscription):
+        subscriptions = self._subscriptions.get(subscription.key, [])
+        if subscription in subscriptions:
+            subscriptions.remove(subscription)
+
+    async def read(self, timeout=20.0):
+        """Read frame not consumed by a command or an event handler"""
+        logging.debug("%s", self.read.__name__)
+
+        deadline = asyncio.get_running_loop().time() + timeout
+
+        while True:
+            cancel_on_global_end()
+
+            remaining = deadline - asyncio.get_running_loop().time()
+            if remaining <= 0:
+                raise socket.timeout
+
+            try:
+                return await asyncio.wait_for(self._rx_queue.get(),
+                                              min(remaining, READ_POLL_INTERVAL))
+            except asyncio.TimeoutError:
+                continue
+
+    async def send(self, svc_id, op, ctrl_index, data):
+        async with self._lock:
+            await self._socket.send(svc_id, op, ctrl_index, data)
+
+    async def _send_cmd(self, svc_id, op, ctrl_index, data):
+        cancel_on_global_end()
+
+        fut = asyncio.get_running_loop().create_future()
+        self._pending.append(fut)
+        await self._socket.send(svc_id, op, ctrl_index, data)
+
+        return fut
+
+    @staticmethod
+    async def _wait_rsp(fut, timeout):
+        try:
+            return await asyncio.wait_for(fut, timeout)
+        except asyncio.TimeoutError:
+            raise socket.timeout
+
+    async def send_wait_rsp(self, svc_id, op, ctrl_index, data, timeout=20.0):
+        async with self._lock:
+            fut = await self._send_cmd(svc_id, op, ctrl_index, data)
+            tuple_hdr, tuple_data = await self._wait_rsp(fut, timeout)
+
+        BTPWorker._check_rsp(svc_id, op, tuple_hdr)
+
+        return tuple_data
+
+    async def send_wait_rsp_pipelined(self, frames, window=PIPELINE_WINDOW,
+                                      timeout=20.0):
+        """See BTPWorker.send_wait_rsp_pipelined"""
+        responses = [None] * len(frames)
+        errors = []
+
+        async with self._lock:
+            futures = []
+            for i, (svc_id, op, _, _) in enumerate(frames):
+                while not errors and len(futures) < len(frames) and \
+                        len(futures) - i < window:
+                    futures.append(await self._send_cmd(*frames[len(futures)]))
+
+                # All the commands in flight are drained
+                if i == len(futures):
+                    break
+
+                tuple_hdr, tuple_data = await self._wait_rsp(futures[i], timeout)
+
+                try:
+                    BTPWorker._check_rsp(svc_id, op, tuple_hdr)
+                    responses[i] = tuple_data
+                except BTPError as e:
+                    errors.append((i, frames[i], e))
+
+        if errors:
+            raise BTPPipelineError(errors, responses, len(futures))
+
+        return responses
+
+    async def close(self):
+        for task in self._tasks:
+            task.cancel()
+
+        await asyncio.gather(*self._tasks, return_exceptions=True)
+        self._tasks = []
+
+        self._cancel_pending()
+        self._subscriptions.clear()
+
+        await self._socket.close()
+
+    def register_event_handler(self, event_handler):
+        self.event_handler_cb = event_handler
+
+
+class AsyncBTPWorker:
+    """Synchronous BTPWorker API over AsyncBTPConnection
+
+    The socket is opened and the connection is driven in the shared
+    BTP event loop, so no thread is created per IUT.
+    """
+
+    def __init__(self, sock, event_loop=None):
+        self._loop = event_loop or get_btp_event_loop()
+        self._socket = sock
+        self.conn = AsyncBTPConnection(sock)
+
+    def open(self, *args, **kwargs):
+        self._loop.run(self._socket.open(*args, **kwargs))
+
+    def accept(self, timeout=10.0):
+        self._loop.run(self.conn.accept(timeout))
+
+    def read(self, timeout=20.0):
+        return self._loop.run(self.conn.read(timeout))
+
+    def send(self, svc_id, op, ctrl_index, data):
+        self._loop.run(self.conn.send(svc_id, op, ctrl_index, data))
+
+    def send_wait_rsp(self, svc_id, op, ctrl_index, data):
+        return self._loop.run(self.conn.send_wait_rsp(svc_id, op, ctrl_index, data))
+
+    def send_wait_rsp_pipelined(self, frames, window=PIPELINE_WINDOW):
+        return self._loop.run(self.conn.send_wait_rsp_pipelined(frames, window))
+
+    def close(self):
+        self._loop.run(self.conn.close())
+
+    def register_event_handler(self, event_handler):
+        self.conn.register_event_handler(event_handler)
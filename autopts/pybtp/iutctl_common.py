@@ -19,16 +19,16 @@ import queue
 import socket
 import sys
 import threading
-import binascii
-import re
+import time
+import serial
 
 
 from abc import abstractmethod
 
 from autopts.pybtp import defs
 from autopts.pybtp.defs import *
-from datetime import datetime
-from autopts.pybtp.types import BTPError
+from autopts.pybtp.capture import CAPTURE_FILENAME, CAPTURE_RX, CAPTURE_TX, CaptureWriter
+from autopts.pybtp.types import BTPError, BTPPipelineError
 from autopts.pybtp.parser import enc_frame, dec_hdr, repr_hdr, dec_data, HDR_LEN
 from autopts.utils import get_global_end, raise_on_global_end
 
@@ -37,6 +37,18 @@ log = logging.debug
 # BTP communication transport: unix domain socket file name
 BTP_ADDRESS = "/tmp/bt-stack-tester"
 
+SERIAL_BAUDRATE = 115200
+
+# Timeout in seconds of a single serial port read, the read deadline of
+# a BTP frame is checked between the reads
+SERIAL_READ_TIMEOUT = 0.05
+
+# Max time in seconds BTPWorker.read blocks before checking the global end
+READ_POLL_INTERVAL = 0.1
+
+# Default max number of pipelined BTP commands awaiting response
+PIPELINE_WINDOW = 2
+
 EVENT_HANDLER = None
 
 
@@ -52,9 +64,14 @@ class BTPSocket:
     def __init__(self, log_dir=None):
         self.conn = None
         self.addr = None
-        self.btp_service_id_dict = None
-        self.log_file = open(os.path.join(log_dir, "autopts-iutctl.log"), "a")
-        self.btp_service_id_dict = self.get_svc_id()
+        self.capture = CaptureWriter(os.path.join(log_dir, CAPTURE_FILENAME))
+
+    def set_log_dir(self, log_dir):
+        """Continue capturing to the log directory of another test case"""
+        if self.capture:
+            self.capture.close()
+
+        self.capture = CaptureWriter(os.path.join(log_dir, CAPTURE_FILENAME))
 
     @abstractmethod
     def open(self, address):
@@ -64,48 +81,6 @@ class BTPSocket:
     def accept(self, timeout=10.0):
         pass
 
-    @staticmethod
-    def get_svc_id():
-        """Looks for BTP_SVC_ID variables from the defs.py"""
-        btp_service_ids = {}
-
-        for name, value in vars(defs).items():
-            if name.startswith('BTP_SERVICE_ID_') and isinstance(value, int):
-                trimmed_name = name.replace('BTP_SERVICE_ID_', '')
-                btp_service_ids[trimmed_name] = value
-
-        return btp_service_ids
-
-    def write_to_log(self, req, data, hex_data):
-        """Log decoded header and raw data"""
-        current_time = datetime.now().strftime('%H:%M:%S:%f')
-        f = self.log_file
-        indent = ' ' * 18
-
-        hex_data = hex_data[:14] + "|" + hex_data[14 + 1:]
-
-        if len(hex_data) > 47:
-            # This ensures clean text indentation for longer raw data, with 16 bytes per line
-            hex_data = '\n' + indent + re.sub(r'(.{48})', r'\1\n' + indent, hex_data)
-
-        if req:
-            f.write(f'{current_time[:-3]}\t> {self.parse_data(data)} {hex_data}\n')
-        else:
-            f.write(f'{current_time[:-3]}\t< {self.parse_data(data)} {hex_data}\n')
-
-    def write_err_status(self, data, hex_data, status):
-        """Log command status value for error response"""
-        current_time = datetime.now().strftime('%H:%M:%S:%f')
-        f = self.log_file
-        status_values = {
-            1: 'Fail',
-            2: 'Unknown Command',
-            3: 'Not Ready',
-            4: 'Invalid Index'
-        }
-        err_status = status_values[int(status)]
-        f.write(f'{current_time[:-3]}\t<- Response:  {self.parse_data(data)} {hex_data} {err_status}\n')
-
     def read(self, timeout=20.0):
         """Read BTP data from socket
 
@@ -125,7 +100,6 @@ class BTPSocket:
             hdr_memview = hdr_memview[nbytes:]
             toread_hdr_len -= nbytes
 
-        hex_hdr = ' '.join(hdr.hex()[i:i+2] for i in range(0, len(hdr.hex()), 2))
         tuple_hdr = dec_hdr(hdr)
         toread_data_len = tuple_hdr.data_len
 
@@ -143,22 +117,18 @@ class BTPSocket:
             data_memview = data_memview[nbytes:]
             toread_data_len -= nbytes
 
-        data_string = binascii.hexlify(data).decode('utf-8')
-        data_string = ' '.join(f'{data_string[i:i+2]}' for i in range(0, len(data_string), 2))
-        raw_data = hex_hdr if data_string == '' else hex_hdr + ' ' + data_string
-
-        if tuple_hdr.op == 0:
-            self.write_err_status(tuple_hdr, raw_data, data_string)
-        else:
-            # 0 for logging response, 1 for command
-            self.write_to_log(0, tuple_hdr, raw_data)
-        log(f"Received data: { {data_string} }, {data}")
+        self.log_rx_frame(hdr, tuple_hdr, data)
 
         self.conn.settimeout(None)
         return tuple_hdr, dec_data(data)
 
-    def send(self, svc_id, op, ctrl_index, data):
-        """Send BTP formated data over socket"""
+    def log_rx_frame(self, hdr, tuple_hdr, data):
+        """Capture received BTP frame"""
+        self.capture.write(time.time(), CAPTURE_RX, hdr, data)
+        log("Received data: %r", data)
+
+    def encode_frame(self, svc_id, op, ctrl_index, data):
+        """Encode BTP frame and capture it"""
         logging.debug("%s, %r %r %r %r",
                       self.send.__name__, svc_id, op, ctrl_index, str(data))
 
@@ -166,49 +136,19 @@ class BTPSocket:
 
         logging.debug("sending frame %r", frame.hex())
 
-        hex_data = ' '.join(frame.hex()[i:i+2] for i in range(0, len(frame.hex()), 2))
-        tuple_data = (svc_id, op, ctrl_index, len(data) if isinstance(data, (str,  bytearray)) else data)
-        # 0 for logging response, 1 for command
-        self.write_to_log(1, tuple_data, hex_data)
-        self.conn.send(frame)
-
-    def parse_data(self, data):
-        def get_btp_cmd_name(prefix, op_code):
-            """Looks for BTP Command variables from the defs.py"""
-            if op_code in ('0x0', '0x00'):
-                return 'BTP_ERROR'
-            for key, value in vars(defs).items():
-                if (key.startswith(f'BTP_{prefix}_CMD_') and value == int(op_code, 16)) or\
-                        (key.startswith(f'BTP_{prefix}_EV_') and value == int(op_code, 16)):
-                    return key
-
-            return 'BTP Undecoded'  # Return if no matching variable is found
-
-        parsed_data = ''
-        svc_name = ''
-        if isinstance(data, str):
-            svc_id = data[:2]
-            opc = data[2:4]
-        else:
-            svc_id, opc, ctrl_idx, data_len = data[0], data[1], data[2], data[3]
-        for name, btp_id in self.btp_service_id_dict.items():
-            if btp_id == int(svc_id):
-                svc_name += name
-                break
+        self.capture.write(time.time(), CAPTURE_TX, frame)
 
-        indent = "\n" + (" " * 17)
-        to_hex = lambda x: "0x{:02x}".format(int(x))
-        btp_command = get_btp_cmd_name(svc_name, to_hex(opc))
-        parsed_data += f'{btp_command} ({to_hex(svc_id)}|{to_hex(opc)}|{to_hex(ctrl_idx)}){indent} ' \
-                       f'raw data ({data_len}):'
+        return frame
 
-        return parsed_data
+    def send(self, svc_id, op, ctrl_index, data):
+        """Send BTP formated data over socket"""
+        self.conn.send(self.encode_frame(svc_id, op, ctrl_index, data))
 
     @abstractmethod
     def close(self):
-        self.log_file.close()
-        self.log_file = None
-        pass
+        if self.capture:
+            self.capture.close()
+            self.capture = None
 
 
 class BTPSocketSrv(BTPSocket):
@@ -265,6 +205,7 @@ class BTPSocketCli(BTPSocket):
         self.conn.connect(self.addr)
 
     def close(self):
+        super().close()
         try:
             if self.conn:
                 self.conn.shutdown(socket.SHUT_RDWR)
@@ -276,6 +217,93 @@ class BTPSocketCli(BTPSocket):
             self.addr = None
 
 
+class BTPSerial(BTPSocket):
+    """BTP transport talking to the IUT TTY directly, in place of
+    BTPSocketSrv bridged to the TTY by socat."""
+
+    def __init__(self, log_dir=None):
+        super().__init__(log_dir)
+        self._rx_buf = bytearray()
+
+    def open(self, tty, baudrate=SERIAL_BAUDRATE):
+        """Open IUT serial port"""
+        self.addr = tty
+        self.conn = serial.Serial(port=tty, baudrate=baudrate,
+                                  timeout=SERIAL_READ_TIMEOUT)
+
+    def accept(self, timeout=10.0):
+        """Serial port is connected once opened, nothing to accept"""
+        pass
+
+    def flush(self):
+        """Drop stale data, e.g. partial IUT ready event received before
+        the IUT was reset, without waiting for a read timeout"""
+        self.conn.reset_input_buffer()
+        while self.conn.in_waiting:
+            self.conn.read(self.conn.in_waiting)
+        self._rx_buf.clear()
+
+    def _read_exact(self, length, deadline):
+        while len(self._rx_buf) < length:
+            if time.monotonic() >= deadline:
+                raise socket.timeout
+
+            try:
+                # Read what is available, but at least one byte
+                chunk = self.conn.read(max(1, min(self.conn.in_waiting,
+                                                  length - len(self._rx_buf))))
+            except serial.SerialException as e:
+                raise socket.error(e)
+
+            self._rx_buf += chunk
+
+        data = bytes(self._rx_buf[:length])
+        del self._rx_buf[:length]
+
+        return data
+
+    def read(self, timeout=20.0):
+        """Read BTP data from serial port
+
+        Partially received frame is kept until the next read, if timeout
+        occurs in the middle of it.
+
+        timeout - read timeout in seconds"""
+        deadline = time.monotonic() + timeout
+
+        # Peek header, to not lose it if the data does not arrive in time
+        hdr = self._read_exact(HDR_LEN, deadline)
+        self._rx_buf[:0] = hdr
+        tuple_hdr = dec_hdr(hdr)
+
+        frame = self._read_exact(HDR_LEN + tuple_hdr.data_len, deadline)
+        data = frame[HDR_LEN:]
+
+        logging.debug("Received: hdr: %s %r", repr_hdr(tuple_hdr), hdr)
+        self.log_rx_frame(hdr, tuple_hdr, data)
+
+        return tuple_hdr, dec_data(data)
+
+    def send(self, svc_id, op, ctrl_index, data):
+        """Send BTP formated data over serial port"""
+        try:
+            self.conn.write(self.encode_frame(svc_id, op, ctrl_index, data))
+        except serial.SerialException as e:
+            raise socket.error(e)
+
+    def close(self):
+        super().close()
+        try:
+            if self.conn:
+                self.conn.close()
+        except serial.SerialException as e:
+            logging.exception(e)
+        finally:
+            self.conn = None
+            self.addr = None
+            self._rx_buf.clear()
+
+
 class BTPWorker:
     def __init__(self, sock):
         super().__init__()
@@ -318,34 +346,29 @@ class BTPWorker:
 
         log(f'{threading.current_thread().name} finishing...')
 
-    @staticmethod
-    def _read_timeout(flag):
-        flag.clear()
-
     def read(self, timeout=20.0):
         logging.debug("%s", self.read.__name__)
 
-        flag = threading.Event()
-        flag.set()
-
-        t = threading.Timer(timeout, self._read_timeout, [flag])
-        t.start()
+        deadline = time.monotonic() + timeout
 
-        while flag.is_set():
+        while True:
             raise_on_global_end()
 
-            if self._rx_queue.empty():
-                continue
+            remaining = deadline - time.monotonic()
+            if remaining <= 0:
+                raise socket.timeout
 
-            t.cancel()
+            # Block on the queue, but wake up periodically to stay
+            # responsive to the global end.
+            try:
+                data = self._rx_queue.get(timeout=min(remaining, READ_POLL_INTERVAL))
+            except queue.Empty:
+                continue
 
-            data = self._rx_queue.get()
             self._rx_queue.task_done()
 
             return data
 
-        raise socket.timeout
-
     def send(self, svc_id, op, ctrl_index, data):
         self._lock.acquire()
         try:
@@ -353,30 +376,79 @@ class BTPWorker:
         finally:
             self._lock.release()
 
+    @staticmethod
+    def _check_rsp(svc_id, op, tuple_hdr):
+        if tuple_hdr.svc_id != svc_id:
+            raise BTPError(
+                "Incorrect service ID %s in the response, expected %s!" %
+                (tuple_hdr.svc_id, svc_id))
+
+        if tuple_hdr.op == defs.BTP_STATUS:
+            raise BTPError("Error opcode in response!")
+
+        if op != tuple_hdr.op:
+            raise BTPError(
+                "Invalid opcode 0x%.2x in the response, expected 0x%.2x!" %
+                (tuple_hdr.op, op))
+
     def send_wait_rsp(self, svc_id, op, ctrl_index, data):
         self._lock.acquire()
         try:
             self._socket.send(svc_id, op, ctrl_index, data)
             tuple_hdr, tuple_data = self.read()
 
-            if tuple_hdr.svc_id != svc_id:
-                raise BTPError(
-                    "Incorrect service ID %s in the response, expected %s!" %
-                    (tuple_hdr.svc_id, svc_id))
+            self._check_rsp(svc_id, op, tuple_hdr)
 
-            if tuple_hdr.op == defs.BTP_STATUS:
-                raise BTPError("Error opcode in response!")
+            return tuple_data
+        finally:
+            self._lock.release()
 
-            if op != tuple_hdr.op:
-                raise BTPError(
-                    "Invalid opcode 0x%.2x in the response, expected 0x%.2x!" %
-                    (tuple_hdr.op, op))
+    def send_wait_rsp_pipelined(self, frames, window=PIPELINE_WINDOW):
+        """Send BTP commands back-to-back without waiting for each response.
 
-            return tuple_data
+        BTP responses come in the order of the commands, so they are matched
+        in FIFO order. At most 'window' commands are in flight, to not
+        overflow the command buffers of the IUT.
+
+        frames -- list of (svc_id, op, ctrl_index, data) tuples
+        window -- max number of commands sent without a response
+
+        Returns list of response data. If any of the commands failed, the
+        remaining commands are not sent and BTPPipelineError is raised after
+        the responses of the commands in flight have been received.
+        """
+        responses = [None] * len(frames)
+        errors = []
+
+        self._lock.acquire()
+        try:
+            next_to_send = 0
+            for i, (svc_id, op, _, _) in enumerate(frames):
+                while not errors and next_to_send < len(frames) and \
+                        next_to_send - i < window:
+                    self._socket.send(*frames[next_to_send])
+                    next_to_send += 1
+
+                # All the commands in flight are drained
+                if i == next_to_send:
+                    break
+
+                tuple_hdr, tuple_data = self.read()
+
+                try:
+                    self._check_rsp(svc_id, op, tuple_hdr)
+                    responses[i] = tuple_data
+                except BTPError as e:
+                    errors.append((i, frames[i], e))
         finally:
             self._lock.release()
 
-    def _reset_rx_queue(self):
+        if errors:
+            raise BTPPipelineError(errors, responses, next_to_send)
+
+        return responses
+
+    def reset_rx_queue(self):
         while not self._rx_queue.empty():
             try:
                 self._rx_queue.get_nowait()
@@ -403,7 +475,7 @@ class BTPWorker:
                 log('Waiting for _rx_worker to finish ...')
                 self._rx_worker.join(timeout=1)
 
-        self._reset_rx_queue()
+        self.reset_rx_queue()
 
         self._socket.close()
 
@@ -18,6 +18,10 @@ from collections import namedtuple
 
 HDR_LEN = 5
 
+HDR = struct.Struct('<BBBH')
+
+Header = namedtuple('Header', 'svc_id op ctrl_index data_len')
+
 
 def dec_hdr(frame):
     """Decode BTP frame header
@@ -29,18 +33,14 @@ def dec_hdr(frame):
     +------------+--------+------------------+-------------+
 
     """
-    Header = namedtuple('Header', 'svc_id op ctrl_index data_len')
-
-    return Header._make(struct.unpack("<BBBH", frame))
+    return Header._make(HDR.unpack(frame))
 
 
 def repr_hdr(header):
     return f"Header(svc_id=0x{header.svc_id:02x}, op=0x{header.op:02x}, ctrl_index=0x{header.ctrl_index:02x}, data_len=0x{header.data_len:02x})"
 
 def dec_data(frame):
-    data_len = len(frame)
-
-    return struct.unpack('<%ds' % data_len, frame)
+    return (bytes(frame),)
 
 
 def enc_frame(svc_id, op, ctrl_index, data):
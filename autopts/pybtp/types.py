@@ -60,6 +60,25 @@ class BTPError(Exception):
     """
 
 
+class BTPPipelineError(BTPError):
+    """Exception raised if any of the pipelined BTP commands failed.
+
+    errors -- list of (index, frame, BTPError) tuples of failed commands
+    responses -- list of response data, None for failed and not sent commands
+    sent -- number of commands sent, the commands following a failure are
+            not sent
+    """
+
+    def __init__(self, errors, responses, sent):
+        self.errors = errors
+        self.responses = responses
+        self.sent = sent
+        msg = '; '.join(f'command {i} (svc_id {frame[0]}, op 0x{frame[1]:02x}): {e}'
+                        for i, frame, e in errors)
+        super().__init__(f'{len(errors)} of {len(responses)} pipelined commands failed, '
+                         f'{len(responses) - sent} not sent: {msg}')
+
+
 class SynchError(Exception):
     """Exception raised if cannot synchronize"""
 
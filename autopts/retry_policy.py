@@ -0,0 +1,149 @@
+#
+# auto-pts - The Bluetooth PTS Automation Framework
+#
+# Copyright (c) 2024, Codecoup.
+#
+# This program is free software; you can redistribute it and/or modify it
+# under the terms and conditions of the GNU General Public License,
+# version 2, as published by the Free Software Foundation.
+#
+# This program is distributed in the hope it will be useful, but WITHOUT
+# ANY WARRANTY; without even the implied warranty of MERCHANTABILITY or
+# FITNESS FOR A PARTICULAR PURPOSE.  See the GNU General Public License for
+# more details.
+#
+
+"""Adaptive retry of failed test cases
+
+RetryPolicy decides how many times a failed test case is retried from
+the history of its runs in the TestCaseTable:
+- test cases that failed all their last runs with the same status fail
+  deterministically and are not retried if they fail with it again,
+- flaky test cases are retried as many times as needed to pass with
+  RETRY_CONFIDENCE probability, up to the configured retry count,
+- chronically flaky test cases are quarantined, i.e. run in a separate
+  pass after all other test cases.
+"""
+
+import logging
+import math
+from collections import Counter
+
+# Number of the last runs of a test case the decisions are based on
+HISTORY_LEN = 10
+
+# Minimum number of runs in the history to deviate from the configured
+# retry count
+MIN_HISTORY = 3
+
+# Probability of a flaky test case to pass within its retries
+RETRY_CONFIDENCE = 0.95
+
+# Flaky test cases passing less often are quarantined
+QUARANTINE_PASS_RATE = 0.5
+
+log = logging.debug
+
+
+class RunHistory:
+    """Summary of the last runs of a test case"""
+
+    def __init__(self, runs):
+        # [(status, duration)], newest first
+        self.runs = runs
+        self.statuses = Counter(status for status, _ in runs)
+        self.passes = self.statuses['PASS']
+
+    def __len__(self):
+        return len(self.runs)
+
+    @property
+    def pass_rate(self):
+        return self.passes / len(self.runs) if self.runs else None
+
+    @property
+    def deterministic_failure(self):
+        """Status of all the last runs if they failed the same way, or None"""
+        if len(self.runs) < MIN_HISTORY or len(self.statuses) != 1 or self.passes:
+            return None
+
+        return self.runs[0][0]
+
+    @property
+    def flaky(self):
+        return len(self.runs) >= MIN_HISTORY and 0 < self.passes < len(self.runs)
+
+    def mean_duration(self, status=None):
+        durations = [duration for run_status, duration in self.runs
+                     if status is None or run_status == status]
+        return sum(durations) / len(durations) if durations else 0.0
+
+
+class RetryPolicy:
+    """Retry decisions of a test run based on the TestCaseTable history
+
+    The time saved by retries not run is estimated from the mean duration
+    of the former runs and collected in saved_time.
+    """
+
+    def __init__(self, db):
+        self.db = db
+        self._history = {}
+        self.skipped_retries = 0
+        self.saved_time = 0.0
+        self.quarantined = []
+
+    def history(self, test_case):
+        history = self._history.get(test_case)
+        if history is None:
+            history = RunHistory(self.db.get_history(test_case, HISTORY_LEN))
+            self._history[test_case] = history
+
+        return history
+
+    def record(self, test_case, status, duration):
+        """Store result of a test case run, retries included"""
+        self.db.add_run(test_case, status, duration)
+
+    def is_quarantined(self, test_case):
+        history = self.history(test_case)
+        if history.flaky and history.pass_rate < QUARANTINE_PASS_RATE:
+            log('Quarantined %s, pass rate %.2f', test_case, history.pass_rate)
+            self.quarantined.append(test_case)
+            return True
+
+        return False
+
+    def retry_limit(self, test_case, limit):
+        """Number of retries of the test case, at most limit"""
+        history = self.history(test_case)
+        if not history.flaky:
+            return limit
+
+        # Retries needed to pass with RETRY_CONFIDENCE probability
+        needed = math.ceil(math.log(1 - RETRY_CONFIDENCE) /
+                           math.log(1 - history.pass_rate)) - 1
+
+        return max(0, min(limit, needed))
+
+    def give_up(self, test_case, status, retries_left):
+        """True if the test case failed again as deterministically before,
+        so its retries left are not worth running"""
+        history = self.history(test_case)
+        if retries_left <= 0 or status != history.deterministic_failure:
+            return False
+
+        self.skip(test_case, retries_left, history.mean_duration(status))
+
+        return True
+
+    def skip(self, test_case, retries, duration):
+        log('Skipped %d retries of %s', retries, test_case)
+        self.skipped_retries += retries
+        self.saved_time += retries * duration
+
+    def print_summary(self):
+        print(f'Adaptive retry: {self.skipped_retries} retries skipped, '
+              f'~{round(self.saved_time)} s saved')
+        if self.quarantined:
+            print('Quarantined flaky test cases: ' + ', '.join(self.quarantined))
@@ -0,0 +1,420 @@
+#
+# auto-pts - The Bluetooth PTS Automation Framework
+#
+# Copyright (c) 2024, Codecoup.
+#
+# This program is free software; you can redistribute it and/or modify it
+# under the terms and conditions of the GNU General Public License,
+# version 2, as published by the Free Software Foundation.
+#
+# This program is distributed in the hope it will be useful, but WITHOUT
+# ANY WARRANTY; without even the implied warranty of MERCHANTABILITY or
+# FITNESS FOR A PARTICULAR PURPOSE.  See the GNU General Public License for
+# more details.
+#
+
+"""Sharding of test case runs across test stations
+
+A station is a set of PTS instances with an IUT. The test cases are
+split into a shard per station by ShardScheduler and the stations run
+their shards at once.
+
+The BTP stack and the IUT control are global to the client process, so
+stations with real IUTs run a client process each, which takes its test
+cases from a ShardServer with RemoteShard (see --shard-server option and
+tools/autopts_shards.py). Stations run in threads of one process with
+run_stations only with stub IUTs, e.g. FakeProxy and AUTO_PTS_LOCAL.
+"""
+
+import json
+import logging
+import os
+import threading
+from collections import deque
+from multiprocessing import AuthenticationError
+from multiprocessing.connection import Client as ConnClient, Listener
+
+from autopts.utils import get_global_end
+
+# Expected duration in seconds of the test cases without statistics
+DEFAULT_DURATION = 60.0
+
+# Environment variable passing the authentication key of the shard server,
+# generated per run, to the station processes as hex
+SHARD_AUTHKEY_ENV = 'AUTOPTS_SHARD_AUTHKEY'
+
+log = logging.debug
+
+
+class Station:
+    """Test station
+
+    name -- unique name of the station
+    pts_count -- number of PTS instances, i.e. the max number of lower
+                 testers of the test cases run on the station
+    args -- autoptsclient command line arguments of the station, e.g.
+            the PTS server addresses and ports, IUT tty and board
+    ptses -- PTS proxies of the station, if it is run in this process
+    """
+
+    def __init__(self, name, pts_count=None, args=None, ptses=None):
+        self.name = name
+        self.args = list(args or [])
+        self.ptses = list(ptses or [])
+        self.pts_count = pts_count or len(self.ptses) or 1
+
+    @staticmethod
+    def from_dict(station):
+        return Station(station['name'], station.get('pts_count'),
+                       station.get('args'))
+
+    def __repr__(self):
+        return f'Station({self.name!r}, pts_count={self.pts_count})'
+
+
+def load_stations(path):
+    """Load station definitions from a JSON file, e.g.
+
+    [{"name": "station1", "pts_count": 2,
+      "args": ["zephyr-master", "-i", "192.168.0.2", "192.168.0.3",
+               "-t", "/dev/ttyACM0", "-b", "nrf52"]}]
+    """
+    with open(path, 'r') as f:
+        return [Station.from_dict(station) for station in json.load(f)]
+
+
+def get_durations(db, test_cases):
+    """Expected durations of the test cases from the TestCaseTable.
+
+    Test cases without statistics are assumed to take the mean duration
+    of the known ones.
+    """
+    durations = {}
+    if db:
+        for test_case in test_cases:
+            duration = db.get_mean_duration(test_case)
+            if duration is not None:
+                durations[test_case] = duration
+
+    default = DEFAULT_DURATION
+    if durations:
+        default = sum(durations.values()) / len(durations)
+
+    for test_case in test_cases:
+        durations.setdefault(test_case, default)
+
+    return durations
+
+
+class ShardScheduler:
+    """Distributes test cases across stations
+
+    Test cases are taken longest first (longest-processing-time-first)
+    and each is assigned to the least loaded station with enough PTS
+    instances for its lower testers. Stations run their own shard
+    longest first. A station whose shard ran dry steals the shortest
+    test case it can run from the station with the most work left.
+
+    durations -- {test case: expected duration}
+    lt_counts -- {test case: number of lower testers}, 1 by default
+    """
+
+    def __init__(self, stations, test_cases, durations=None, lt_counts=None):
+        self._lock = threading.Lock()
+        self.stations = {station.name: station for station in stations}
+        self.durations = dict(durations or {})
+        self.lt_counts = dict(lt_counts or {})
+        self.shards = {name: deque() for name in self.stations}
+        self.loads = dict.fromkeys(self.stations, 0.0)
+        self.stolen = 0
+        # Test cases no station has enough PTS instances for
+        self.unschedulable = []
+        # Stations that ran out of test cases and stopped taking them
+        self.drained = set()
+        # True once the stations have reported the lower tester counts
+        self.lt_counts_known = lt_counts is not None
+
+        for test_case in sorted(test_cases, key=self.duration, reverse=True):
+            self._assign(test_case)
+
+        for name, shard in self.shards.items():
+            log('Shard of %s: %d test cases, %.0f s', name, len(shard),
+                self.loads[name])
+
+    def duration(self, test_case):
+        return self.durations.get(test_case, DEFAULT_DURATION)
+
+    def lt_count(self, test_case):
+        return self.lt_counts.get(test_case, 1)
+
+    def _can_run(self, name, test_case):
+        return self.stations[name].pts_count >= self.lt_count(test_case)
+
+    def _assign(self, test_case, first=False):
+        names = [name for name in self.stations
+                 if name not in self.drained and self._can_run(name, test_case)]
+        if not names:
+            logging.error('No running station has %d PTS instances for %s',
+                          self.lt_count(test_case), test_case)
+            self.unschedulable.append(test_case)
+            return
+
+        name = min(names, key=self.loads.get)
+        if first:
+            self.shards[name].appendleft(test_case)
+        else:
+            self.shards[name].append(test_case)
+        self.loads[name] += self.duration(test_case)
+
+    def _take(self, name, index):
+        shard = self.shards[name]
+        test_case = shard[index]
+        del shard[index]
+        self.loads[name] -= self.duration(test_case)
+
+        return test_case
+
+    def next(self, name):
+        """Next test case of the station, None if there is nothing left"""
+        with self._lock:
+            if self.shards[name]:
+                return self._take(name, 0)
+
+            victims = sorted((victim for victim in self.shards if victim != name),
+                             key=self.loads.get, reverse=True)
+            for victim in victims:
+                shard = self.shards[victim]
+                for index in range(len(shard) - 1, -1, -1):
+                    if self._can_run(name, shard[index]):
+                        test_case = self._take(victim, index)
+                        self.stolen += 1
+                        log('%s stole %s from %s', name, test_case, victim)
+                        return test_case
+
+            # The station stops taking test cases, do not requeue to it
+            self.drained.add(name)
+
+        return None
+
+    def pending(self):
+        """Test cases not taken by the stations yet"""
+        with self._lock:
+            return [test_case for shard in self.shards.values() for test_case in shard]
+
+    def set_lt_counts(self, lt_counts):
+        """Set the numbers of lower testers of the test cases, known only
+        to the stations with the test case instances, and reassign the
+        test cases that cannot run on the station of their shard"""
+        with self._lock:
+            self.lt_counts_known = True
+            moved = []
+            for name, shard in self.shards.items():
+                for index in range(len(shard) - 1, -1, -1):
+                    test_case = shard[index]
+                    if lt_counts.get(test_case, 1) != self.lt_count(test_case):
+                        moved.append(self._take(name, index))
+
+            self.lt_counts.update(lt_counts)
+            for test_case in sorted(moved, key=self.duration, reverse=True):
+                self._assign(test_case)
+
+    def requeue(self, test_case, lt_count):
+        """Reassign test case, that turned out to need lt_count lower
+        testers, to a station that has enough PTS instances"""
+        with self._lock:
+            self.lt_counts[test_case] = lt_count
+            self._assign(test_case, first=True)
+
+
+class LocalShard:
+    """Test cases of a station run in this process"""
+
+    def __init__(self, scheduler, name):
+        self.scheduler = scheduler
+        self.name = name
+
+    def __iter__(self):
+        while not get_global_end():
+            test_case = self.scheduler.next(self.name)
+            if test_case is None:
+                return
+
+            yield test_case
+
+    def __len__(self):
+        return len(self.scheduler.shards[self.name])
+
+    def requeue(self, test_case, lt_count):
+        self.scheduler.requeue(test_case, lt_count)
+
+    def report(self, test_case, status, duration, run_count):
+        pass
+
+
+def run_stations(scheduler, run_station):
+    """Run the shards of all stations at once, a thread per station.
+
+    run_station -- function(station, shard) running the test cases of the
+                   shard on the station, returns TestCaseRunStats
+
+    Returns {station name: TestCaseRunStats}.
+    """
+    results = {}
+    errors = []
+
+    def station_task(station):
+        try:
+            results[station.name] = run_station(
+                station, LocalShard(scheduler, station.name))
+        except BaseException as e:
+            logging.exception(e)
+            errors.append(e)
+
+    threads = [threading.Thread(target=station_task, args=(station,),
+                                name=f'Station-{station.name}')
+               for station in scheduler.stations.values()]
+
+    for thread in threads:
+        thread.start()
+
+    for thread in threads:
+        thread.join()
+
+    if errors:
+        raise errors[0]
+
+    return results
+
+
+class ShardServer:
+    """Serves the shards of a ShardScheduler to station client processes
+
+    Requests of RemoteShard are tuples:
+    ('next', station) -- replied with the next test case or None
+    ('count', station) -- replied with the number of test cases in the shard
+    ('pending', station) -- replied with the test cases not taken yet, or
+                            None if the lower tester counts are known
+    ('lt_counts', station, {test_case: lt_count})
+    ('requeue', station, test_case, lt_count)
+    ('result', station, test_case, status, duration, run_count)
+
+    Results of the stations are collected in results as {station name:
+    [(test_case, status, duration, run_count)]}.
+
+    The requests are pickled, so only clients with authkey may connect,
+    see SHARD_AUTHKEY_ENV.
+    """
+
+    def __init__(self, scheduler, authkey, address=('127.0.0.1', 0)):
+        self.scheduler = scheduler
+        self.results = {name: [] for name in scheduler.stations}
+        self._listener = Listener(address, authkey=authkey)
+        self.address = self._listener.address
+        self._thread = threading.Thread(target=self._accept_task, daemon=True,
+                                        name='ShardServer')
+
+    def start(self):
+        self._thread.start()
+        return self
+
+    def close(self):
+        self._listener.close()
+
+    def _accept_task(self):
+        while True:
+            try:
+                conn = self._listener.accept()
+            except AuthenticationError as e:
+                logging.error('Shard client rejected: %s', e)
+                continue
+            except OSError:
+                # Listener closed
+                return
+
+            threading.Thread(target=self._serve, args=(conn,), daemon=True,
+                             name='ShardServerConn').start()
+
+    def _serve(self, conn):
+        with conn:
+            while True:
+                try:
+                    request = conn.recv()
+                except (EOFError, OSError):
+                    return
+
+                cmd, name, *params = request
+                if cmd == 'next':
+                    conn.send(self.scheduler.next(name))
+                elif cmd == 'count':
+                    conn.send(len(self.scheduler.shards[name]))
+                elif cmd == 'pending':
+                    conn.send(None if self.scheduler.lt_counts_known
+                              else self.scheduler.pending())
+                elif cmd == 'lt_counts':
+                    self.scheduler.set_lt_counts(*params)
+                elif cmd == 'requeue':
+                    self.scheduler.requeue(*params)
+                elif cmd == 'result':
+                    self.results[name].append(tuple(params))
+                else:
+                    logging.error('Invalid shard request %r', request)
+
+
+class RemoteShard:
+    """Test cases of a station taken from a ShardServer"""
+
+    def __init__(self, address, name, authkey):
+        self.name = name
+        self._conn = ConnClient(address, authkey=authkey)
+
+    def __iter__(self):
+        while not get_global_end():
+            self._conn.send(('next', self.name))
+            test_case = self._conn.recv()
+            if test_case is None:
+                return
+
+            yield test_case
+
+    def __len__(self):
+        self._conn.send(('count', self.name))
+        return self._conn.recv()
+
+    def set_lt_counts(self, get_lt_count):
+        """Report the numbers of lower testers of the test cases to the
+        server, unless another station already has.
+
+        get_lt_count -- function(test_case) returning the number
+        """
+        self._conn.send(('pending', self.name))
+        test_cases = self._conn.recv()
+        if test_cases is None:
+            return
+
+        self._conn.send(('lt_counts', self.name,
+                         {test_case: get_lt_count(test_case) for test_case in test_cases}))
+
+    def requeue(self, test_case, lt_count):
+        self._conn.send(('requeue', self.name, test_case, lt_count))
+
+    def report(self, test_case, status, duration, run_count):
+        self._conn.send(('result', self.name, test_case, status, duration, run_count))
+
+    def close(self):
+        self._conn.close()
+
+
+def parse_address(address):
+    """'host:port' to (host, port)"""
+    host, port = address.rsplit(':', 1)
+    return host, int(port)
+
+
+def get_shard_authkey():
+    """Authentication key of the shard server passed by autopts_shards.py"""
+    authkey = os.environ.get(SHARD_AUTHKEY_ENV)
+    if not authkey:
+        raise ValueError(f'{SHARD_AUTHKEY_ENV} is not set, the stations of a '
+                         f'multi-station run are started by tools/autopts_shards.py')
+
+    return bytes.fromhex(authkey)
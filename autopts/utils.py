@@ -16,15 +16,18 @@
 
 """Utilities"""
 import ctypes
+import heapq
+import itertools
 import logging
 import os
+import queue
 import sys
 import threading
 import traceback
 import xmlrpc.client
 import hid
 import psutil
-from time import sleep
+from time import monotonic, sleep
 
 
 PTS_WORKSPACE_FILE_EXT = ".pqw6"
@@ -59,23 +62,177 @@ def log_running_threads():
         logging.debug(f"Thread Name: {thread.name}")
 
 
+class DeadlineHandle:
+    """Callback scheduled with DeadlineScheduler.schedule"""
+    def __init__(self, scheduler, func, args):
+        self._scheduler = scheduler
+        self.func = func
+        self.args = args
+        self.cancelled = False
+        self.fired = False
+
+    def cancel(self):
+        """Returns False if the callback has already been called"""
+        return self._scheduler.cancel(self)
+
+
+class DeadlineScheduler:
+    """Calls callbacks at their deadlines from a single thread, shared by
+    all the waits with a timeout, instead of a threading.Timer thread per
+    wait. The callbacks must not block, as they delay the next ones.
+    """
+    def __init__(self):
+        self._cond = threading.Condition(threading.Lock())
+        # (deadline, sequence number, handle)
+        self._heap = []
+        self._seq = itertools.count()
+        self._thread = None
+        self._cancelled_in_heap = 0
+        self.scheduled = 0
+        self.fired = 0
+        self.cancelled = 0
+        self.peak_threads = 0
+
+    def schedule(self, timeout, func, *args):
+        """Calls func(*args) after timeout seconds, unless cancelled"""
+        handle = DeadlineHandle(self, func, args)
+
+        with self._cond:
+            heapq.heappush(self._heap, (monotonic() + timeout, next(self._seq), handle))
+            self.scheduled += 1
+            self.peak_threads = max(self.peak_threads, threading.active_count())
+
+            if self._thread is None:
+                self._thread = threading.Thread(target=self._run, name='DeadlineScheduler',
+                                                daemon=True)
+                self._thread.start()
+
+            self._cond.notify()
+
+        return handle
+
+    def cancel(self, handle):
+        with self._cond:
+            if handle.fired or handle.cancelled:
+                return not handle.fired
+
+            handle.cancelled = True
+            self.cancelled += 1
+            self._cancelled_in_heap += 1
+
+            # Most waits end before their deadline, do not let the
+            # cancelled ones pile up until then
+            if self._cancelled_in_heap > 64 and \
+                    self._cancelled_in_heap > len(self._heap) // 2:
+                self._heap = [item for item in self._heap if not item[2].cancelled]
+                heapq.heapify(self._heap)
+                self._cancelled_in_heap = 0
+
+            return True
+
+    def _next_due(self):
+        """Pops the next handle due, waits until there is one"""
+        with self._cond:
+            while True:
+                while self._heap and self._heap[0][2].cancelled:
+                    heapq.heappop(self._heap)
+                    self._cancelled_in_heap -= 1
+
+                if not self._heap:
+                    self._cond.wait()
+                    continue
+
+                remaining = self._heap[0][0] - monotonic()
+                if remaining > 0:
+                    self._cond.wait(remaining)
+                    continue
+
+                handle = heapq.heappop(self._heap)[2]
+                handle.fired = True
+                self.fired += 1
+
+                return handle
+
+    def _run(self):
+        while True:
+            handle = self._next_due()
+            try:
+                handle.func(*handle.args)
+            except Exception as e:
+                logging.exception(e)
+
+    def stats(self):
+        """Thread and timer counts, to check no thread is created per wait"""
+        with self._cond:
+            return {'threads': threading.active_count(),
+                    'peak_threads': self.peak_threads,
+                    'timers_scheduled': self.scheduled,
+                    'timers_pending': len(self._heap) - self._cancelled_in_heap,
+                    'timers_fired': self.fired,
+                    'timers_cancelled': self.cancelled}
+
+
+# Process-wide deadline service of the waits with a timeout
+DEADLINE_SCHEDULER = DeadlineScheduler()
+
+
+class WakeUp:
+    """Wakeup primitive that can be shared by multiple producers, e.g.
+    a queue and async results, so a single waiter is woken up by any
+    of them. A notification sent while nobody waits is not lost."""
+    def __init__(self):
+        self._cond = threading.Condition(threading.Lock())
+        self._pending = False
+
+    def notify(self):
+        with self._cond:
+            self._pending = True
+            self._cond.notify_all()
+
+    def wait(self, timeout=None):
+        """Returns True if woken up by a notification, False on timeout"""
+        with self._cond:
+            if not self._pending:
+                self._cond.wait(timeout)
+            pending = self._pending
+            self._pending = False
+            return pending
+
+
+class WakeUpQueue(queue.Queue):
+    """Queue that notifies a WakeUp object on each put"""
+    def __init__(self, maxsize=0, wakeup=None):
+        super().__init__(maxsize)
+        self.wakeup = wakeup if wakeup else WakeUp()
+
+    def put(self, item, block=True, timeout=None):
+        super().put(item, block, timeout)
+        self.wakeup.notify()
+
+
 class ResultWithFlag:
     """"""
-    def __init__(self, init_value=None):
+    def __init__(self, init_value=None, wakeup=None):
         self.result = init_value
         self.event = threading.Event()
         self.lock = threading.Lock()
+        # Optional WakeUp shared with other producers
+        self.wakeup = wakeup
 
     def is_set(self):
         return self.event.is_set()
 
     def set_flag(self):
         self.event.set()
+        if self.wakeup:
+            self.wakeup.notify()
 
     def set(self, value):
         with self.lock:
             self.result = value
             self.event.set()
+        if self.wakeup:
+            self.wakeup.notify()
 
     def get(self, timeout=None, predicate=None, clear=False):
         """
@@ -111,18 +268,21 @@ class ResultWithFlag:
         def on_timeout():
             nonlocal raise_timeout
             raise_timeout = True
-            self.event.set()
+            self.set_flag()
 
         timer = None
         if timeout:
-            timer = threading.Timer(timeout, on_timeout)
-            timer.name = f'Timer{timer.name}'
-            timer.start()
+            timer = DEADLINE_SCHEDULER.schedule(timeout, on_timeout)
 
         try:
             while predicate() and not self.event.is_set():
                 raise_on_global_end()
-                self.event.wait(1)
+                if self.wakeup:
+                    # Woken up by any producer sharing the WakeUp,
+                    # so the predicate is rechecked without delay.
+                    self.wakeup.wait(1)
+                else:
+                    self.event.wait(1)
         finally:
             if timer:
                 timer.cancel()
@@ -12,36 +12,52 @@
 # FITNESS FOR A PARTICULAR PURPOSE.  See the GNU General Public License for
 # more details.
 #
+import importlib
 from typing import NamedTuple
 
-from .wid import generic_wid_hdl
-from .l2cap import l2cap_wid_hdl
-from .mesh import mesh_wid_hdl, mesh_wid_hdl_rpr_2ptses
-from .mesh import mesh_wid_hdl, mesh_wid_hdl_rpr_2ptses,\
-    mesh_wid_hdl_rpr_persistent_storage,\
-    mesh_wid_hdl_rpr_persistent_storage_alt
-from .mmdl import mmdl_wid_hdl
-from .vcs import vcs_wid_hdl
-from .ias import ias_wid_hdl
-from .vocs import vocs_wid_hdl
-from .aics import aics_wid_hdl
-from .pacs import pacs_wid_hdl
-from .ascs import ascs_wid_hdl
-from .bap import bap_wid_hdl
-from .has import has_wid_hdl
-from .csis import csis_wid_hdl
-from .csip import csip_wid_hdl
-from .micp import micp_wid_hdl
-from .mics import mics_wid_hdl
-from .ccp import ccp_wid_hdl
-from .vcp import vcp_wid_hdl
-from .mcp import mcp_wid_hdl
-from .bass import bass_wid_hdl
-from .gmcs import gmcs_wid_hdl
-from .csip import csip_wid_hdl
-from .tbs import tbs_wid_hdl
-from .gtbs import gtbs_wid_hdl
-from .tmap import tmap_wid_hdl
-from .ots import ots_wid_hdl
-from .pbp import pbp_wid_hdl
-# GENERATOR append 1
+# WID handlers: module defining the handler. The WID modules are imported
+# on first access of their handler, e.g. from autopts.wid import bap_wid_hdl.
+WID_HANDLERS = {
+    'generic_wid_hdl': 'wid',
+    'wid_modules': 'wid',
+    'l2cap_wid_hdl': 'l2cap',
+    'mesh_wid_hdl': 'mesh',
+    'mesh_wid_hdl_rpr_2ptses': 'mesh',
+    'mesh_wid_hdl_rpr_persistent_storage': 'mesh',
+    'mesh_wid_hdl_rpr_persistent_storage_alt': 'mesh',
+    'mmdl_wid_hdl': 'mmdl',
+    'vcs_wid_hdl': 'vcs',
+    'ias_wid_hdl': 'ias',
+    'vocs_wid_hdl': 'vocs',
+    'aics_wid_hdl': 'aics',
+    'pacs_wid_hdl': 'pacs',
+    'ascs_wid_hdl': 'ascs',
+    'bap_wid_hdl': 'bap',
+    'has_wid_hdl': 'has',
+    'csis_wid_hdl': 'csis',
+    'csip_wid_hdl': 'csip',
+    'micp_wid_hdl': 'micp',
+    'mics_wid_hdl': 'mics',
+    'ccp_wid_hdl': 'ccp',
+    'vcp_wid_hdl': 'vcp',
+    'mcp_wid_hdl': 'mcp',
+    'bass_wid_hdl': 'bass',
+    'gmcs_wid_hdl': 'gmcs',
+    'tbs_wid_hdl': 'tbs',
+    'gtbs_wid_hdl': 'gtbs',
+    'tmap_wid_hdl': 'tmap',
+    'ots_wid_hdl': 'ots',
+    'pbp_wid_hdl': 'pbp',
+    # GENERATOR append 1
+}
+
+
+def __getattr__(name):
+    module = WID_HANDLERS.get(name)
+    if module is None:
+        raise AttributeError(f'module {__name__!r} has no attribute {name!r}')
+
+    handler = getattr(importlib.import_module(f'{__name__}.{module}'), name)
+    globals()[name] = handler
+
+    return handler
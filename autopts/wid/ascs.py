@@ -20,14 +20,15 @@ from autopts.ptsprojects.stack import get_stack
 from autopts.pybtp import btp
 from autopts.pybtp.types import WIDParams
 from autopts.wid.bap import create_lc3_ltvs_bytes
-from autopts.wid import generic_wid_hdl
+from autopts.wid import generic_wid_hdl, wid_modules
 
 log = logging.debug
 
 
+@wid_modules(__name__)
 def ascs_wid_hdl(wid, description, test_case_name):
     log(f'{ascs_wid_hdl.__name__}, {wid}, {description}, {test_case_name}')
-    return generic_wid_hdl(wid, description, test_case_name, [__name__])
+    return generic_wid_hdl(wid, description, test_case_name, ascs_wid_hdl.wid_modules)
 
 
 # wid handlers section begin
@@ -20,16 +20,17 @@ from time import sleep
 from autopts.ptsprojects.stack import get_stack, WildCard
 from autopts.ptsprojects.testcase import MMI
 from autopts.pybtp import btp
-from autopts.pybtp.btp import pts_addr_get, pts_addr_type_get, ascs_add_ase_to_cis, lt2_addr_get, lt2_addr_type_get
+from autopts.pybtp.btp import pts_addr_get, pts_addr_type_get, lt2_addr_get, lt2_addr_type_get
 from autopts.pybtp.types import *
-from autopts.wid import generic_wid_hdl
+from autopts.wid import generic_wid_hdl, wid_modules
 
 log = logging.debug
 
 
+@wid_modules(__name__)
 def bap_wid_hdl(wid, description, test_case_name):
     log(f'{bap_wid_hdl.__name__}, {wid}, {description}, {test_case_name}')
-    return generic_wid_hdl(wid, description, test_case_name, [__name__])
+    return generic_wid_hdl(wid, description, test_case_name, bap_wid_hdl.wid_modules)
 
 
 # wid handlers section begin
@@ -332,12 +333,7 @@ def hdl_wid_114(params: WIDParams):
 
     data = bytearray([j for j in range(0, 41)])
 
-    for i in range(1, 100):
-        try:
-            btp.bap_send(0, data)
-        except BTPError:
-            # Buffer full
-            pass
+    btp.IsoDataPump(0, data, sdus=99).run()
 
     stack.bap.hdl_wid_114_cnt += 1
 
@@ -465,7 +461,8 @@ def hdl_wid_300(_: WIDParams):
     if not found:
         return False
 
-    return btp.check_discov_results(uuids=[UUID.AVAILABLE_AUDIO_CTXS])
+    # Available Audio Contexts are advertised in the ASCS service data
+    return btp.check_discov_results(svc_data=bytes.fromhex(UUID.ASCS)[::-1])
 
 
 def bytes_to_ltvs(data):
@@ -760,10 +757,11 @@ def hdl_wid_303(params: WIDParams):
     presentation_delay = 40000
     qos_config = QOS_CONFIG_SETTINGS[qos_set_name]
 
-    ascs_add_ase_to_cis(ase_id, cis_id, cig_id, addr_type, addr)
-    btp.ascs_preconfig_qos(cig_id, cis_id, *qos_config, presentation_delay)
-
-    btp.ascs_config_qos(ase_id, cig_id, cis_id, *qos_config, presentation_delay)
+    btp.ascs_setup([
+        (btp.ascs_add_ase_to_cis, ase_id, cis_id, cig_id, addr_type, addr),
+        (btp.ascs_preconfig_qos, cig_id, cis_id, *qos_config, presentation_delay),
+        (btp.ascs_config_qos, ase_id, cig_id, cis_id, *qos_config, presentation_delay),
+    ])
     stack.ascs.wait_ascs_operation_complete_ev(addr_type, addr, ase_id, 30)
 
     config = create_default_config()
@@ -827,10 +825,11 @@ def hdl_wid_304(params: WIDParams):
     presentation_delay = 40000
     qos_config = QOS_CONFIG_SETTINGS[f'{sampling_freq_str}_1_1']
 
-    ascs_add_ase_to_cis(ase_id, cis_id, cig_id, addr_type, addr)
-    btp.ascs_preconfig_qos(cig_id, cis_id, *qos_config, presentation_delay)
-
-    btp.ascs_config_qos(ase_id, cig_id, cis_id, *qos_config, presentation_delay)
+    btp.ascs_setup([
+        (btp.ascs_add_ase_to_cis, ase_id, cis_id, cig_id, addr_type, addr),
+        (btp.ascs_preconfig_qos, cig_id, cis_id, *qos_config, presentation_delay),
+        (btp.ascs_config_qos, ase_id, cig_id, cis_id, *qos_config, presentation_delay),
+    ])
     stack.ascs.wait_ascs_operation_complete_ev(addr_type, addr, ase_id, 30)
 
     # Enable streams
@@ -898,10 +897,11 @@ def hdl_wid_305(params: WIDParams):
     presentation_delay = 40000
     qos_config = QOS_CONFIG_SETTINGS[f'{sampling_freq_str}_1_1']
 
-    ascs_add_ase_to_cis(ase_id, cis_id, cig_id, addr_type, addr)
-    btp.ascs_preconfig_qos(cig_id, cis_id, *qos_config, presentation_delay)
-
-    btp.ascs_config_qos(ase_id, cig_id, cis_id, *qos_config, presentation_delay)
+    btp.ascs_setup([
+        (btp.ascs_add_ase_to_cis, ase_id, cis_id, cig_id, addr_type, addr),
+        (btp.ascs_preconfig_qos, cig_id, cis_id, *qos_config, presentation_delay),
+        (btp.ascs_config_qos, ase_id, cig_id, cis_id, *qos_config, presentation_delay),
+    ])
     stack.ascs.wait_ascs_operation_complete_ev(addr_type, addr, ase_id, 30)
 
     # Enable streams
@@ -973,10 +973,11 @@ def hdl_wid_306(params: WIDParams):
     presentation_delay = 40000
     qos_config = QOS_CONFIG_SETTINGS[f'{sampling_freq_str}_1_1']
 
-    ascs_add_ase_to_cis(ase_id, cis_id, cig_id, addr_type, addr)
-    btp.ascs_preconfig_qos(cig_id, cis_id, *qos_config, presentation_delay)
-
-    btp.ascs_config_qos(ase_id, cig_id, cis_id, *qos_config, presentation_delay)
+    btp.ascs_setup([
+        (btp.ascs_add_ase_to_cis, ase_id, cis_id, cig_id, addr_type, addr),
+        (btp.ascs_preconfig_qos, cig_id, cis_id, *qos_config, presentation_delay),
+        (btp.ascs_config_qos, ase_id, cig_id, cis_id, *qos_config, presentation_delay),
+    ])
     stack.ascs.wait_ascs_operation_complete_ev(addr_type, addr, ase_id, 30)
 
     # Enable streams
@@ -1142,17 +1143,18 @@ def preconfig_qos(config):
         # Adjust max sdu size to the number of channels
         config.max_sdu_size = config.max_sdu_size * count_1_bits(config.audio_locations)
 
-    ascs_add_ase_to_cis(config.ase_id, config.cis_id, config.cig_id,
-                        config.addr_type, config.addr)
-
-    btp.ascs_preconfig_qos(config.cig_id,
-                           config.cis_id,
-                           config.sdu_interval,
-                           config.framing,
-                           config.max_sdu_size,
-                           config.retransmission_number,
-                           config.max_transport_latency,
-                           config.presentation_delay)
+    btp.ascs_setup([
+        (btp.ascs_add_ase_to_cis, config.ase_id, config.cis_id, config.cig_id,
+         config.addr_type, config.addr),
+        (btp.ascs_preconfig_qos, config.cig_id,
+         config.cis_id,
+         config.sdu_interval,
+         config.framing,
+         config.max_sdu_size,
+         config.retransmission_number,
+         config.max_transport_latency,
+         config.presentation_delay),
+    ])
 
 
 def config_qos(config):
@@ -1417,14 +1419,9 @@ def hdl_wid_311(params: WIDParams):
 
     # PTS does not send an explicit message, but for each
     # configured SINK it expects to receive any ISO data.
-    for i in range(1, 10):
-        for config in stack.bap.ase_configs:
-            if config.audio_dir == AudioDir.SINK:
-                try:
-                    btp.bap_send(config.ase_id, stream_data[config.ase_id])
-                except BTPError:
-                    # Buffer full
-                    pass
+    btp.bap_send_streams([(config.ase_id, stream_data[config.ase_id])
+                          for config in stack.bap.ase_configs
+                          if config.audio_dir == AudioDir.SINK], sdus=9)
 
     return True
 
@@ -1534,10 +1531,11 @@ def hdl_wid_315(params: WIDParams):
     presentation_delay = 40000
     qos_config = (7500, 0x00, 40, 2, 10)
 
-    ascs_add_ase_to_cis(ase_id, cis_id, cig_id, addr_type, addr)
-    btp.ascs_preconfig_qos(cig_id, cis_id, *qos_config, presentation_delay)
-
-    btp.ascs_config_qos(ase_id, cig_id, cis_id, *qos_config, presentation_delay)
+    btp.ascs_setup([
+        (btp.ascs_add_ase_to_cis, ase_id, cis_id, cig_id, addr_type, addr),
+        (btp.ascs_preconfig_qos, cig_id, cis_id, *qos_config, presentation_delay),
+        (btp.ascs_config_qos, ase_id, cig_id, cis_id, *qos_config, presentation_delay),
+    ])
     stack.ascs.wait_ascs_operation_complete_ev(addr_type, addr, ase_id, 30)
 
     return True
@@ -1964,13 +1962,7 @@ def hdl_wid_377(_: WIDParams):
 
     data = bytearray([j for j in range(0, 41)])
 
-    for i in range(1, 10):
-        for ase_id in sources:
-            try:
-                btp.bap_send(ase_id, data)
-            except BTPError:
-                # Buffer full
-                pass
+    btp.bap_send_streams([(ase_id, data) for ase_id in sources], sdus=9)
 
     return True
 
@@ -2080,13 +2072,7 @@ def hdl_wid_387(_: WIDParams):
 
     data = bytearray([j for j in range(0, 41)])
 
-    for i in range(1, 10):
-        for ase_id in sources:
-            try:
-                btp.bap_send(ase_id, data)
-            except BTPError:
-                # Buffer full
-                pass
+    btp.bap_send_streams([(ase_id, data) for ase_id in sources], sdus=9)
 
     return True
 
@@ -19,14 +19,15 @@ from autopts.ptsprojects.stack import get_stack, WildCard
 from autopts.pybtp import btp, defs
 from autopts.pybtp.btp import pts_addr_get, pts_addr_type_get, ascs_add_ase_to_cis, lt2_addr_get, lt2_addr_type_get
 from autopts.pybtp.types import WIDParams, UUID, gap_settings_btp2txt, AdType, AdFlags
-from autopts.wid import generic_wid_hdl
+from autopts.wid import generic_wid_hdl, wid_modules
 
 log = logging.debug
 
 
+@wid_modules(__name__)
 def bass_wid_hdl(wid, description, test_case_name):
     log(f'{bass_wid_hdl.__name__}, {wid}, {description}, {test_case_name}')
-    return generic_wid_hdl(wid, description, test_case_name, [__name__])
+    return generic_wid_hdl(wid, description, test_case_name, bass_wid_hdl.wid_modules)
 
 
 def hdl_wid_100(_: WIDParams):
@@ -24,9 +24,9 @@ from autopts.pybtp.btp import pts_addr_get, pts_addr_type_get, lt2_addr_get, lt2
     lt3_addr_type_get
 from autopts.pybtp.btp.pacs import pacs_set_available_contexts
 from autopts.pybtp.defs import AUDIO_METADATA_STREAMING_AUDIO_CONTEXTS, AUDIO_METADATA_CCID_LIST
-from autopts.pybtp.types import WIDParams, ASCSState, BTPError, PaSyncState, Addr
+from autopts.pybtp.types import WIDParams, ASCSState, PaSyncState, Addr
 from autopts.pybtp.btp.cap import announcements
-from autopts.wid import generic_wid_hdl
+from autopts.wid import generic_wid_hdl, wid_modules
 from autopts.wid.bap import (create_default_config, AudioDir, get_audio_locations_from_pac,
                              create_lc3_ltvs_bytes, CODEC_CONFIG_SETTINGS, QOS_CONFIG_SETTINGS,
                              BAS_CONFIG_SETTINGS)
@@ -34,9 +34,10 @@ from autopts.wid.bap import (create_default_config, AudioDir, get_audio_location
 log = logging.debug
 
 
+@wid_modules(__name__)
 def cap_wid_hdl(wid, description, test_case_name):
     log(f'{cap_wid_hdl.__name__}, {wid}, {description}, {test_case_name}')
-    return generic_wid_hdl(wid, description, test_case_name, [__name__])
+    return generic_wid_hdl(wid, description, test_case_name, cap_wid_hdl.wid_modules)
 
 
 # wid handlers section begin
@@ -174,12 +175,7 @@ def hdl_wid_114(params: WIDParams):
 
     # PTS does not send an explicit message, but for each
     # configured SINK it expects to receive any ISO data.
-    for i in range(1, 10):
-        try:
-            btp.bap_send(0, data)
-        except BTPError:
-            # Buffer full
-            pass
+    btp.IsoDataPump(0, data, sdus=9).run()
 
     return True
 
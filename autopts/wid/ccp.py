@@ -24,7 +24,7 @@ from enum import IntEnum, IntFlag
 from autopts.pybtp import btp, defs
 from autopts.ptsprojects.stack import get_stack
 from autopts.pybtp.types import WIDParams
-from autopts.wid import generic_wid_hdl
+from autopts.wid import generic_wid_hdl, wid_modules
 
 log = logging.debug
 
@@ -75,9 +75,10 @@ global __gtbs_ccpc_handle, __round
 
 __gtbs_ccpc_handle, __round = None, None
 
+@wid_modules(__name__)
 def ccp_wid_hdl(wid, description, test_case_name):
     log(f'{ccp_wid_hdl.__name__}, {wid}, {description}, {test_case_name}')
-    return generic_wid_hdl(wid, description, test_case_name, [__name__])
+    return generic_wid_hdl(wid, description, test_case_name, ccp_wid_hdl.wid_modules)
 
 
 # wid handlers section begin
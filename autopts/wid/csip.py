@@ -20,14 +20,15 @@ import struct
 from autopts.pybtp import btp, defs
 from autopts.ptsprojects.stack import get_stack
 from autopts.pybtp.types import AdType, OwnAddrType, WIDParams, gap_settings_btp2txt
-from autopts.wid import generic_wid_hdl
+from autopts.wid import generic_wid_hdl, wid_modules
 
 log = logging.debug
 
 
+@wid_modules(__name__)
 def csip_wid_hdl(wid, description, test_case_name):
     log(f'{csip_wid_hdl.__name__}, {wid}, {description}, {test_case_name}')
-    return generic_wid_hdl(wid, description, test_case_name, [__name__])
+    return generic_wid_hdl(wid, description, test_case_name, csip_wid_hdl.wid_modules)
 
 
 def hdl_wid_3(_: WIDParams):
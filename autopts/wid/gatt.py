@@ -25,16 +25,17 @@ from autopts.pybtp.types import Prop, Perm, IOCap, UUID, WIDParams, BTPError
 from autopts.ptsprojects.testcase import MMI
 from autopts.ptsprojects.stack import get_stack, GattPrimary, GattService, GattSecondary, GattServiceIncluded, \
     GattCharacteristic, GattCharacteristicDescriptor, GattDB
-from autopts.wid import generic_wid_hdl
+from autopts.wid import generic_wid_hdl, wid_modules
 
 log = logging.debug
 
 indication_subbed_already = False
 
 
+@wid_modules(__name__)
 def gatt_wid_hdl(wid, description, test_case_name):
     log(f'{gatt_wid_hdl.__name__}, {wid}, {description}, {test_case_name}')
-    return generic_wid_hdl(wid, description, test_case_name, [__name__])
+    return generic_wid_hdl(wid, description, test_case_name, gatt_wid_hdl.wid_modules)
 
 
 def gattc_wid_hdl_multiple_indications(wid, description, test_case_name):
@@ -27,16 +27,17 @@ from autopts.pybtp.types import Prop, Perm, IOCap, UUID, WIDParams, GATTErrorCod
 from autopts.ptsprojects.testcase import MMI
 from autopts.ptsprojects.stack import get_stack, GattPrimary, GattService, GattSecondary, GattServiceIncluded, \
     GattCharacteristic, GattCharacteristicDescriptor, GattDB
-from autopts.wid import generic_wid_hdl
+from autopts.wid import generic_wid_hdl, wid_modules
 
 log = logging.debug
 
 indication_subbed_already = False
 
 
+@wid_modules(__name__)
 def gatt_cl_wid_hdl(wid, description, test_case_name):
     log(f'{gatt_cl_wid_hdl.__name__}, {wid}, {description}, {test_case_name}')
-    return generic_wid_hdl(wid, description, test_case_name, [__name__])
+    return generic_wid_hdl(wid, description, test_case_name, gatt_cl_wid_hdl.wid_modules)
 
 
 #TODO: port all GATT wids to GATT Client service
@@ -23,7 +23,7 @@ from autopts.ptsprojects.testcase import MMI
 from autopts.pybtp.defs import AUDIO_METADATA_STREAMING_AUDIO_CONTEXTS
 from autopts.pybtp.types import *
 from autopts.pybtp.btp.btp import pts_addr_get, pts_addr_type_get, lt2_addr_get, lt2_addr_type_get
-from autopts.wid import generic_wid_hdl
+from autopts.wid import generic_wid_hdl, wid_modules
 
 log = logging.debug
 
@@ -44,9 +44,10 @@ def create_default_config():
                      metadata_ltvs=None,
                      mono=None)
 
+@wid_modules(__name__)
 def hap_wid_hdl(wid, description, test_case_name):
     log(f'{hap_wid_hdl.__name__}, {wid}, {description}, {test_case_name}')
-    return generic_wid_hdl(wid, description, test_case_name, [__name__])
+    return generic_wid_hdl(wid, description, test_case_name, hap_wid_hdl.wid_modules)
 
 def hap_start_hap_discovery(addr_type, addr):
     stack = get_stack()
@@ -21,7 +21,7 @@ from enum import IntFlag
 from autopts.pybtp import btp, defs
 from autopts.ptsprojects.stack import get_stack
 from autopts.pybtp.types import WIDParams
-from autopts.wid import generic_wid_hdl
+from autopts.wid import generic_wid_hdl, wid_modules
 
 class PresetProperty(IntFlag):
     BT_HAS_PROP_NONE      = 0
@@ -31,9 +31,10 @@ class PresetProperty(IntFlag):
 log = logging.debug
 
 
+@wid_modules(__name__)
 def has_wid_hdl(wid, description, test_case_name):
     log(f'{has_wid_hdl.__name__}, {wid}, {description}, {test_case_name}')
-    return generic_wid_hdl(wid, description, test_case_name, [__name__])
+    return generic_wid_hdl(wid, description, test_case_name, has_wid_hdl.wid_modules)
 
 
 # wid handlers section begin
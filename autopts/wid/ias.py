@@ -19,14 +19,15 @@ from autopts.pybtp import btp
 from autopts.ptsprojects.stack import get_stack
 from autopts.pybtp.types import WIDParams
 from autopts.ptsprojects.stack import get_stack
-from autopts.wid import generic_wid_hdl
+from autopts.wid import generic_wid_hdl, wid_modules
 
 log = logging.debug
 
 
+@wid_modules(__name__)
 def ias_wid_hdl(wid, description, test_case_name):
     log(f'{ias_wid_hdl.__name__}, {wid}, {description}, {test_case_name}')
-    return generic_wid_hdl(wid, description, test_case_name, [__name__])
+    return generic_wid_hdl(wid, description, test_case_name, ias_wid_hdl.wid_modules)
 
 
 def hdl_wid_20001(_: WIDParams):
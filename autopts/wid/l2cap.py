@@ -21,14 +21,15 @@ import time
 from autopts.ptsprojects.stack import get_stack
 from autopts.pybtp import btp
 from autopts.pybtp.types import BTPError, WIDParams
-from autopts.wid import generic_wid_hdl
+from autopts.wid import generic_wid_hdl, wid_modules
 
 log = logging.debug
 
 
+@wid_modules(__name__)
 def l2cap_wid_hdl(wid, description, test_case_name):
     log(f'{l2cap_wid_hdl.__name__}, {wid}, {description}, {test_case_name}')
-    return generic_wid_hdl(wid, description, test_case_name, [__name__])
+    return generic_wid_hdl(wid, description, test_case_name, l2cap_wid_hdl.wid_modules)
 
 
 # wid handlers section begin
@@ -94,7 +95,7 @@ def hdl_wid_37(params: WIDParams):
     if tx_data is None or len(tx_data) < 1:
         return False
 
-    return data[0] == tx_data[0]
+    return data[0].upper() == tx_data[0].hex().upper()
 
 
 def hdl_wid_38(_: WIDParams):
@@ -177,7 +178,7 @@ def hdl_wid_43(_: WIDParams):
     if not channel:
         return False
 
-    btp.l2cap_send_data(0, 'FF' * channel.peer_mps)
+    btp.l2cap_send(0, b'\xff' * channel.peer_mps)
 
     return True
 
@@ -254,7 +255,7 @@ def hdl_wid_55(_: WIDParams):
     if not channel:
         return False
 
-    btp.l2cap_send_data(0, '00' * channel.peer_mps)
+    btp.l2cap_send(0, bytes(channel.peer_mps))
     return True
 
 
@@ -514,8 +515,7 @@ def hdl_wid_257(_: WIDParams):
     if not channel:
         return False
 
-    for _ in range(2):
-        btp.l2cap_send_data(0, '00' * channel.peer_mtu)
+    btp.l2cap_send(0, bytes(2 * channel.peer_mtu))
     return True
 
 
@@ -526,8 +526,7 @@ def hdl_wid_258(_: WIDParams):
     if not channel:
         return False
 
-    for _ in range(2):
-        btp.l2cap_send_data(0, '00' * channel.peer_mtu)
+    btp.l2cap_send(0, bytes(2 * channel.peer_mtu))
     return True
 
 
@@ -571,7 +570,7 @@ def hdl_wid_262(_: WIDParams):
         return False
 
     for _ in range(5):
-        btp.l2cap_send_data(0, '00' * channel.peer_mtu)
+        btp.l2cap_send(0, bytes(channel.peer_mtu))
         time.sleep(2)
     return True
 
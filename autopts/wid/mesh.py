@@ -20,15 +20,16 @@ import time
 from autopts.pybtp import btp
 from autopts.pybtp.types import Perm, MeshVals, WIDParams, UUID
 from autopts.ptsprojects.stack import get_stack
-from autopts.wid import generic_wid_hdl
+from autopts.wid import generic_wid_hdl, wid_modules
 
 # Mesh ATS ver. 1.0
 log = logging.debug
 
 
+@wid_modules(__name__)
 def mesh_wid_hdl(wid, description, test_case_name):
     log(f'{mesh_wid_hdl.__name__}, {wid}, {description}, {test_case_name}')
-    return generic_wid_hdl(wid, description, test_case_name, [__name__])
+    return generic_wid_hdl(wid, description, test_case_name, mesh_wid_hdl.wid_modules)
 
 
 def mesh_wid_hdl_rpr_2ptses(wid, description, test_case_name):
@@ -21,15 +21,16 @@ import time
 from autopts.pybtp import btp
 from autopts.ptsprojects.stack import get_stack
 from autopts.pybtp.types import WIDParams
-from autopts.wid import generic_wid_hdl
+from autopts.wid import generic_wid_hdl, wid_modules
 
 # MMDL ATS ver. 1.0
 log = logging.debug
 
 
+@wid_modules(__name__)
 def mmdl_wid_hdl(wid, description, test_case_name):
     log(f'{mmdl_wid_hdl.__name__}, {wid}, {description}, {test_case_name}')
-    return generic_wid_hdl(wid, description, test_case_name, [__name__])
+    return generic_wid_hdl(wid, description, test_case_name, mmdl_wid_hdl.wid_modules)
 
 
 def iut_reset():
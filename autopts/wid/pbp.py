@@ -19,17 +19,18 @@ import struct
 
 from autopts.ptsprojects.stack import get_stack, WildCard
 from autopts.pybtp.defs import AUDIO_METADATA_STREAMING_AUDIO_CONTEXTS, AUDIO_METADATA_PROGRAM_INFO
-from autopts.pybtp.types import WIDParams, CODEC_CONFIG_SETTINGS, create_lc3_ltvs_bytes, BTPError
-from autopts.wid import generic_wid_hdl
+from autopts.pybtp.types import WIDParams, CODEC_CONFIG_SETTINGS, create_lc3_ltvs_bytes
+from autopts.wid import generic_wid_hdl, wid_modules
 from autopts.pybtp import btp, defs
 from autopts.wid.bap import BAS_CONFIG_SETTINGS
 
 log = logging.debug
 
 
+@wid_modules(__name__)
 def pbp_wid_hdl(wid, description, test_case_name):
     log(f'{pbp_wid_hdl.__name__}, {wid}, {description}, {test_case_name}')
-    return generic_wid_hdl(wid, description, test_case_name, [__name__])
+    return generic_wid_hdl(wid, description, test_case_name, pbp_wid_hdl.wid_modules)
 
 
 def hdl_wid_100(_: WIDParams):
@@ -256,11 +257,6 @@ def hdl_wid_552(params: WIDParams):
 
     # PTS does not send an explicit message, but for each
     # configured SINK it expects to receive any ISO data.
-    for i in range(1, 10):
-        try:
-            btp.bap_send(0, data)
-        except BTPError:
-            # Buffer full
-            pass
+    btp.IsoDataPump(0, data, sdus=9).run()
 
     return True
@@ -21,13 +21,14 @@ from autopts.pybtp import btp
 from autopts.pybtp import defs
 from autopts.pybtp.btp import pts_addr_get, pts_addr_type_get
 from autopts.pybtp.types import WIDParams
-from autopts.wid import generic_wid_hdl
+from autopts.wid import generic_wid_hdl, wid_modules
 
 log = logging.debug
 
+@wid_modules(__name__)
 def tbs_wid_hdl(wid, description, test_case_name):
     log(f'{tbs_wid_hdl.__name__}, {wid}, {description}, {test_case_name}')
-    return generic_wid_hdl(wid, description, test_case_name, [__name__])
+    return generic_wid_hdl(wid, description, test_case_name, tbs_wid_hdl.wid_modules)
 
 
 # wid handlers section begin
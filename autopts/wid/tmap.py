@@ -21,7 +21,7 @@ from argparse import Namespace
 from autopts.ptsprojects.stack import get_stack
 from autopts.pybtp import btp
 from autopts.pybtp.defs import AUDIO_METADATA_STREAMING_AUDIO_CONTEXTS
-from autopts.wid import generic_wid_hdl
+from autopts.wid import generic_wid_hdl, wid_modules
 from autopts.pybtp.types import *
 from autopts.pybtp.btp.btp import pts_addr_get, pts_addr_type_get, lt2_addr_get, lt2_addr_type_get
 from autopts.ptsprojects.testcase import MMI
@@ -54,9 +54,10 @@ def trigger_discovery_if_needed(params):
         stack.vcp.wait_discovery_completed_ev(addr_type, addr, 10)
 
 
+@wid_modules(__name__)
 def tmap_wid_hdl(wid, description, test_case_name):
     log(f'{tmap_wid_hdl.__name__}, {wid}, {description}, {test_case_name}')
-    return generic_wid_hdl(wid, description, test_case_name, [__name__])
+    return generic_wid_hdl(wid, description, test_case_name, tmap_wid_hdl.wid_modules)
 
 
 # wid handlers section begin
@@ -613,12 +614,7 @@ def hdl_wid_506(params: WIDParams):
 
     # PTS does not send an explicit message, but for each
     # configured SINK it expects to receive any ISO data.
-    for i in range(1, 10):
-        try:
-            btp.bap_send(0, data)
-        except BTPError:
-            # Buffer full
-            pass
+    btp.IsoDataPump(0, data, sdus=9).run()
 
     return True
 
@@ -22,14 +22,15 @@ from autopts.pybtp import btp
 from autopts.pybtp import defs
 from autopts.pybtp.types import WIDParams
 from autopts.ptsprojects.stack import get_stack
-from autopts.wid import generic_wid_hdl
+from autopts.wid import generic_wid_hdl, wid_modules
 
 log = logging.debug
 
 
+@wid_modules(__name__)
 def vcp_wid_hdl(wid, description, test_case_name):
     log(f'{vcp_wid_hdl.__name__}, {wid}, {description}, {test_case_name}')
-    return generic_wid_hdl(wid, description, test_case_name, [__name__])
+    return generic_wid_hdl(wid, description, test_case_name, vcp_wid_hdl.wid_modules)
 
 # wid handlers section begin
 
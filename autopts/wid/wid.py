@@ -1,23 +1,65 @@
 import importlib
 import logging
+import re
 
 from ..pybtp.types import WIDParams, MissingWIDError
 
 log = logging.debug
 
+WID_HDL_NAME = re.compile(r'hdl_wid_(0|[1-9][0-9]*)')
+
+# WID dispatch tables, as tuple of module names: {wid: handler}
+WID_TABLES = {}
 
-def _generic_wid_hdl(wid, description, test_case_name, module_names):
-    wid_hdl = None
-    wid_str = f'hdl_wid_{wid}'
 
-    for module_name in module_names:
+def get_wid_table(module_names):
+    """WID dispatch table {wid: handler} of the hdl_wid_<wid> handlers of
+    the modules, compiled at the first use. The handler of the module
+    listed first in module_names wins."""
+    key = tuple(module_names)
+    table = WID_TABLES.get(key)
+    if table is not None:
+        return table
+
+    table = {}
+    for module_name in reversed(key):
         module = importlib.import_module(module_name)
-        if hasattr(module, wid_str):
-            wid_hdl = getattr(module, wid_str)
-            break
+        for name, value in vars(module).items():
+            match = WID_HDL_NAME.fullmatch(name)
+            if match and callable(value):
+                table[int(match.group(1))] = value
+
+    WID_TABLES[key] = table
+
+    return table
+
+
+def wid_modules(*module_names):
+    """Decorator of the generic WID handlers dispatching with generic_wid_hdl,
+    sets the modules of the hdl_wid_<wid> handlers as their wid_modules"""
+    def decorator(wid_hdl):
+        wid_hdl.wid_modules = module_names
+        return wid_hdl
+
+    return decorator
+
+
+def get_test_case_wid_table(test_case):
+    """WID dispatch table of the generic WID handler of the test case,
+    e.g. gap_wid_hdl, or None if the handler has no wid_modules, i.e. it
+    dispatches on its own"""
+    module_names = getattr(test_case.generic_wid_hdl, 'wid_modules', None)
+    if module_names is None:
+        return None
+
+    return get_wid_table(module_names)
+
+
+def _generic_wid_hdl(wid, description, test_case_name, module_names):
+    wid_hdl = get_wid_table(module_names).get(wid)
 
     if wid_hdl is None:
-        raise MissingWIDError(f'No {wid_str} found!')
+        raise MissingWIDError(f'No hdl_wid_{wid} found!')
 
     return wid_hdl(WIDParams(wid, description, test_case_name))
 
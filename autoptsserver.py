@@ -55,7 +55,7 @@ import serial.tools.list_ports
 
 from autopts import ptscontrol
 from autopts.config import SERVER_PORT
-from autopts.utils import CounterWithFlag, get_global_end, exit_if_admin, ykush_replug_usb, ykush_set_usb_power, \
+from autopts.utils import DEADLINE_SCHEDULER, CounterWithFlag, get_global_end, exit_if_admin, ykush_replug_usb, ykush_set_usb_power, \
     print_thread_stack_trace, active_hub_server_replug_usb, active_hub_server_set_usb_power
 from autopts.winutils import kill_all_processes
 
@@ -263,6 +263,10 @@ class PyPTSWithCallback(ptscontrol.PyPTS, threading.Thread):
 
         log("_pts_thread_work finished")
 
+    def _superguard_timeout(self):
+        # Stopping PTS takes a while, do not block the deadline scheduler
+        threading.Thread(target=self.stop_pts, name='SuperguardThread').start()
+
     def _handle_ptscontrol_request(self, timeout=None):
         # Wait for request to call a ptscontrol method
         try:
@@ -278,9 +282,7 @@ class PyPTSWithCallback(ptscontrol.PyPTS, threading.Thread):
         try:
             if self.args.superguard:
                 timeout = self.args.superguard
-                timer = threading.Timer(timeout, self.stop_pts)
-                timer.name = f'SuperguardTimer{timer.name}'
-                timer.start()
+                timer = DEADLINE_SCHEDULER.schedule(timeout, self._superguard_timeout)
 
             method = getattr(self, method_name)
             result = method(*args)
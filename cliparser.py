@@ -17,9 +17,9 @@
 import argparse
 import logging
 import os
+import shutil
 import time
 
-from distutils.spawn import find_executable
 from autopts.config import SERVER_PORT, CLIENT_PORT, MAX_SERVER_RESTART_TIME
 from autopts.ptsprojects.boards import tty_exists, com_to_tty, get_debugger_snr
 from autopts.ptsprojects.testcase_db import DATABASE_FILE
@@ -64,6 +64,29 @@ class CliParser(argparse.ArgumentParser):
                           help="Repeat test if failed. Parameter specifies "
                                "maximum repeat count per test")
 
+        self.add_argument("--adaptive_retry", action='store_true', default=False,
+                          help="Adapt the retry count of every test case to "
+                               "the history of its results in the test case "
+                               "database and run chronically flaky test cases "
+                               "at the end. Requires --store")
+
+        self.add_argument("--pipeline", action='store_true', default=False,
+                          help="Prepare the next test case, i.e. load its "
+                               "profile, look up its instances and create its "
+                               "log directory, while the current one waits for "
+                               "the device to settle down")
+
+        self.add_argument("--memory_profile", type=int, default=0, metavar='N',
+                          help="Take a tracemalloc snapshot every N test cases "
+                               "and write the memory timeline of the session "
+                               "to memory_timeline.json in the session log "
+                               "directory. 0 disables the profiler")
+
+        self.add_argument("--memory_leak_threshold", type=float, default=50.0,
+                          metavar='MB',
+                          help="Growth of the traced memory in MB since the "
+                               "first snapshot flagged as a memory leak")
+
         self.add_argument("--stress_test", action='store_true', default=False,
                           help="Repeat every test even if previous result was PASS")
 
@@ -93,6 +116,14 @@ class CliParser(argparse.ArgumentParser):
         self.add_argument("--pylink_reset", action='store_true', default=False,
                           help="Use pylink reset.")
 
+        self.add_argument("--shard-server", metavar='HOST:PORT', default=None,
+                          help="Run the test cases served to this station by "
+                               "the shard server of a multi-station run, "
+                               "see tools/autopts_shards.py")
+
+        self.add_argument("--shard-station", default=None,
+                          help="Name of this station in the multi-station run")
+
         # Hidden option to save test cases data in TestCase.db
         self.add_argument("-s", "--store", action="store_true",
                           default=False, help=argparse.SUPPRESS)
@@ -159,6 +190,12 @@ class CliParser(argparse.ArgumentParser):
                               help="Skip board resets to avoid gdb server disconnection.",
                               action='store_true', default=False)
 
+            self.add_argument("--btp-session",
+                              help="Keep BTP connection to the IUT open between "
+                              "test cases. The IUT is still reset after each "
+                              "test case.",
+                              action='store_true', default=False)
+
         if 'btp_tcp' in self.cli_support:
             self.add_argument("--btp-tcp-ip", type=str, default='127.0.0.1',
                               help="IP for external btp client over TCP/IP.")
@@ -220,7 +257,7 @@ class CliParser(argparse.ArgumentParser):
     def check_args_qemu(self, args):
         msg = ''
 
-        if args.qemu_bin and not find_executable(args.qemu_bin):
+        if args.qemu_bin and not shutil.which(args.qemu_bin):
             msg += 'QEMU mode: {} is needed but not found!\n'.format(args.qemu_bin)
 
         if args.kernel_image is None or not os.path.isfile(args.kernel_image):
@@ -276,6 +313,9 @@ class CliParser(argparse.ArgumentParser):
         if not args.local_addr:
             args.local_addr = ['127.0.0.1'] * len(args.cli_port)
 
+        if args.shard_server and not args.shard_station:
+            return args, 'Shard mode: --shard-station was not specified!\n'
+
         for cli in self.cli_support:
             check_method = getattr(self, 'check_args_{}'.format(cli))
             msg = check_method(args)
@@ -1,17 +1,48 @@
+import contextlib
+import importlib
+import json
 import os
 import shutil
+import socket
+import subprocess
 import sys
+import tempfile
+import threading
+import time
+import types
 import unittest
+from argparse import Namespace
+from multiprocessing import AuthenticationError
 from os.path import dirname, abspath
 from pathlib import Path
-from unittest.mock import patch
+from unittest.mock import ANY, patch
 
-from autopts.client import FakeProxy, TestCaseRunStats
+from autopts.client import FakeProxy, TestCaseRunStats, check_wid_handlers, prepare_test_case, \
+    run_test_cases, run_test_cases_sharded
+from autopts import ptsstate
 from autopts.config import FILE_PATHS
+from autopts.memory_profiler import MemoryProfiler
+from autopts.ptsprojects.stack.common import EventQueue, Property, StreamSink, WildCard, notify_event, \
+    wait_for_event, wait_for_queue_event, wait_for_stream_event
+from autopts.ptsprojects.stack.layers.bap import BAP, BAP_SCAN_EVENTS_MAXLEN
+from autopts.ptsprojects.stack.layers.gap import DiscoveryStore
+from autopts.ptsprojects.stack.layers.l2cap import L2cap, L2capData
+from autopts.ptsprojects.zephyr import iutctl as zephyr_iutctl
+from autopts.ptsprojects import testcase
 from autopts.ptsprojects.testcase_db import TestCaseTable
+from autopts.pybtp import codec, defs
+from autopts.pybtp.capture import CAPTURE_FILENAME, CAPTURE_RX, CAPTURE_TX, format_record, read_capture
+from autopts.pybtp.iutctl_async import AsyncBTPSocketSrv, AsyncBTPWorker
+from autopts.pybtp.iutctl_common import SERIAL_READ_TIMEOUT, BTPSerial, BTPSocket, BTPSocketCli, \
+    BTPWorker
+from autopts.pybtp.parser import HDR_LEN, dec_hdr
+from autopts.pybtp.types import AdType, BTPError, BTPPipelineError, MissingWIDError
+from autopts.sharding import RemoteShard, ShardScheduler, ShardServer, Station
 from autoptsclient_bot import import_bot_projects, import_bot_module
 from test.mocks.mocked_test_cases import mock_workspace_test_cases, test_case_list_generation_samples
+from autopts.bot.common import BotClient
 from autopts.bot.common_features import report
+from autopts.utils import DeadlineScheduler, ResultWithFlag, WakeUp, WakeUpQueue
 
 
 DATABASE_FILE = 'test/mocks/zephyr_database.db'
@@ -27,6 +58,58 @@ def delete_file(file_path):
         pass
 
 
+class LoopbackSocket(BTPSocket):
+    """BTPSocket connected to one end of a socket pair"""
+
+    def __init__(self, conn, log_dir):
+        super().__init__(log_dir)
+        self._pending_conn = conn
+
+    def open(self, address=None):
+        pass
+
+    def accept(self, timeout=10.0):
+        self.conn = self._pending_conn
+
+    def close(self):
+        super().close()
+        self.conn.close()
+        self.conn = None
+
+
+def echo_iut(conn, failing_ops, max_in_flight):
+    """Respond to each command with an empty response of the same opcode,
+    or with a status response if the opcode is in failing_ops."""
+    conn.settimeout(0.05)
+    buf = b''
+    while True:
+        try:
+            chunk = conn.recv(4096)
+        except socket.timeout:
+            chunk = None
+        except OSError:
+            break
+
+        if chunk == b'':
+            break
+
+        if chunk:
+            buf += chunk
+            max_in_flight.append(len(buf) // HDR_LEN)
+
+        while len(buf) >= HDR_LEN:
+            tuple_hdr = dec_hdr(buf[:HDR_LEN])
+            frame_len = HDR_LEN + tuple_hdr.data_len
+            if len(buf) < frame_len:
+                break
+
+            hdr, buf = buf[:HDR_LEN], buf[frame_len:]
+            if tuple_hdr.op in failing_ops:
+                conn.sendall(hdr[:1] + bytes([defs.BTP_STATUS]) + hdr[2:3] + b'\x01\x00\x01')
+            else:
+                conn.sendall(hdr[:3] + b'\x00\x00')
+
+
 class MyTestCase(unittest.TestCase):
     def setUp(self):
         os.chdir(dirname(dirname(abspath(__file__))))
@@ -243,6 +326,999 @@ class MyTestCase(unittest.TestCase):
                                 results, regressions, progresses, new_cases)
         assert os.path.exists(FILE_PATHS['REPORT_DIFF_TXT_FILE'])
 
+    def test_sharded_run(self):
+        """Check test cases are sharded longest first, multi-LT test cases
+        run on a station with enough PTS instances, idle stations steal
+        work and the station results are merged."""
+        durations = {'A/1': 40, 'A/2': 30, 'A/3': 20, 'A/4': 10, 'A/5': 5, 'B/1': 50}
+        big = Station('big', ptses=[FakeProxy(), FakeProxy()])
+        small = Station('small', ptses=[FakeProxy()])
+
+        scheduler = ShardScheduler([big, small], list(durations), durations, {'B/1': 2})
+        assert list(scheduler.shards['big']) == ['B/1', 'A/3', 'A/4']
+        assert list(scheduler.shards['small']) == ['A/1', 'A/2', 'A/5']
+
+        # Station small finished early, it cannot take B/1 and steals the
+        # shortest test case of big
+        assert scheduler.next('big') == 'B/1'
+        assert [scheduler.next('small') for _ in range(3)] == ['A/1', 'A/2', 'A/5']
+        assert scheduler.next('small') == 'A/4' and scheduler.stolen == 1
+
+        ran = {}
+
+        def stub_run_test_case(ptses, _instances, test_case, stats, *_):
+            ran[test_case] = len(ptses)
+            time.sleep(durations[test_case] / 2000)
+            stats.update(test_case, durations[test_case], 'PASS')
+            return 'PASS', durations[test_case]
+
+        args = Namespace(test_cases=list(durations), retry=0, retry_config=None,
+                         recovery=False, not_recover=[], stress_test=False,
+                         superguard=0, cli_port=[65000])
+        stats = TestCaseRunStats(['A', 'B'], args.test_cases, 0,
+                                 xml_results_file=FILE_PATHS['TC_STATS_RESULTS_XML_FILE'])
+        stats.session_log_dir = FILE_PATHS['TMP_DIR']
+
+        # Earlier tests of the client may have ended the run globally
+        # or replaced run_test_cases
+        with patch('autopts.utils.GLOBAL_END', False), \
+                patch('autopts.client.run_test_cases', run_test_cases), \
+                patch('autopts.client.run_test_case', stub_run_test_case):
+            run_test_cases_sharded([big, small], [testcase.TestCaseLT1('B', 'B/1', lt2='B/1_LT2')],
+                                   args, stats)
+
+        assert sorted(ran) == sorted(durations) and ran['B/1'] == 2
+        assert set(stats.get_results()) == set(durations)
+        assert stats.get_status_count() == {'PASS': 6}
+        for station in ('big', 'small'):
+            os.remove(FILE_PATHS['TC_STATS_RESULTS_XML_FILE'].replace('.xml', f'_{station}.xml'))
+
+    def test_sharded_run_requeue(self):
+        """Check a test case that needs more PTS instances than its station
+        has is reported once, with the result of the station it was
+        requeued to, and an unschedulable one with its LT verdict."""
+        lt_counts = {'A/1': 1, 'B/1': 2, 'C/1': 3}
+        durations = {'B/1': 50, 'A/1': 40, 'C/1': 5}
+        small = Station('small', ptses=[FakeProxy()])
+        big = Station('big', ptses=[FakeProxy(), FakeProxy()])
+        ran = []
+
+        def stub_run_test_case(ptses, _instances, test_case, stats, *_):
+            # As run_test_case_wrapper, the status is stored before the
+            # test case is requeued
+            status = 'PASS'
+            if len(ptses) < lt_counts[test_case]:
+                status = f'LT{lt_counts[test_case]}_NOT_AVAILABLE'
+            elif test_case == 'A/1':
+                # Station big must not drain before B/1 is requeued to it
+                time.sleep(0.2)
+            ran.append((test_case, len(ptses), status))
+            stats.update(test_case, 0, status)
+            return status, 0
+
+        args = Namespace(test_cases=list(durations), retry=0, retry_config=None,
+                         recovery=False, not_recover=[], stress_test=False,
+                         superguard=0, cli_port=[65000])
+        stats = TestCaseRunStats(['A', 'B', 'C'], args.test_cases, 0,
+                                 xml_results_file=FILE_PATHS['TC_STATS_RESULTS_XML_FILE'])
+        stats.session_log_dir = FILE_PATHS['TMP_DIR']
+
+        with patch('autopts.utils.GLOBAL_END', False), \
+                patch('autopts.client.run_test_cases', run_test_cases), \
+                patch('autopts.client.run_test_case', stub_run_test_case):
+            run_test_cases_sharded([small, big], [], args, stats)
+
+        assert ('B/1', 1, 'LT2_NOT_AVAILABLE') in ran and ('B/1', 2, 'PASS') in ran
+        # Each test case is in the results once
+        assert set(stats.get_results()) == set(durations)
+        assert stats.get_status_count() == {'PASS': 2, 'LT3_NOT_AVAILABLE': 1}
+        for station in ('big', 'small'):
+            os.remove(FILE_PATHS['TC_STATS_RESULTS_XML_FILE'].replace('.xml', f'_{station}.xml'))
+
+    def test_shard_requeue(self):
+        """Check a test case requeued after its stations drained is
+        reported unschedulable and the lower tester counts reported by a
+        remote station reassign the test cases."""
+        scheduler = ShardScheduler([Station('A', 1), Station('B', 2)], ['t1'], {'t1': 10})
+        station = 'A' if scheduler.shards['A'] else 'B'
+        other = 'B' if station == 'A' else 'A'
+        assert scheduler.next(station) == 't1' and scheduler.next(other) is None
+        scheduler.requeue('t1', 2)
+        assert scheduler.next(station) is None
+        assert scheduler.unschedulable == ['t1']
+
+        scheduler = ShardScheduler([Station('A', 1), Station('B', 2)],
+                                   ['t1', 't2', 't3'], {'t1': 30, 't2': 20, 't3': 10})
+        assert list(scheduler.shards['A']) == ['t1']
+        server = ShardServer(scheduler, b'key').start()
+        with self.assertRaises(AuthenticationError):
+            RemoteShard(server.address, 'A', b'other key')
+        shard = RemoteShard(server.address, 'A', b'key')
+        try:
+            shard.set_lt_counts(lambda test_case: 2 if test_case == 't1' else 1)
+            # Counts are reported once
+            shard.set_lt_counts(lambda test_case: 3)
+            assert len(shard) == 0
+            assert scheduler.lt_counts == {'t1': 2, 't2': 1, 't3': 1}
+            assert 't1' in scheduler.shards['B']
+        finally:
+            shard.close()
+            server.close()
+
+    def test_test_case_registry(self):
+        """Check test cases are indexed by name and lower tester and only
+        the profiles and factories of the looked up test cases are run."""
+        loaded = []
+
+        def gap_test_cases():
+            loaded.append('GAP')
+            return [testcase.TestCaseLT1('GAP', 'GAP/1', lt2='GAP/1-LT2'),
+                    testcase.TestCaseLT2('GAP', 'GAP/1-LT2'),
+                    testcase.TestCaseLT1('GAP', 'GAP/1')]
+
+        def gatt_test_cases():
+            loaded.append('GATT')
+            return [testcase.TestCaseLT1('GATT', 'GATT/1')]
+
+        registry = testcase.TestCaseRegistry()
+        registry.add_profile('GAP', gap_test_cases)
+        registry.add_profile('GATT', gatt_test_cases)
+        registry.add('L2CAP/1', lambda: loaded.append('L2CAP/1') or testcase.TestCaseLT1('L2CAP', 'L2CAP/1'))
+
+        gap_1 = registry.get('GAP/1')
+        assert gap_1.name_lt2 == 'GAP/1-LT2' and loaded == ['GAP']
+        assert isinstance(registry.get('GAP/1-LT2', 2), testcase.TestCaseLT2)
+        assert registry.get('GAP/1-LT2') is None and loaded == ['GAP']
+
+        # Factories run once
+        assert registry.get('L2CAP/1') is registry.get('L2CAP/1')
+        assert loaded == ['GAP', 'L2CAP/1']
+
+        # Unknown prefix loads the remaining profiles
+        assert registry.get('OTHER/1') is None and loaded == ['GAP', 'L2CAP/1', 'GATT']
+        assert registry.get('GATT/1').project_name == 'GATT'
+
+    def test_result_wakeup_by_queue(self):
+        """Check that a put on a steps queue sharing the WakeUp with
+        an async result wakes up the waiter without the 1s poll delay."""
+
+        wakeup = WakeUp()
+        result = ResultWithFlag(wakeup=wakeup)
+        steps_queue = WakeUpQueue(wakeup=wakeup)
+
+        timer = threading.Timer(0.1, steps_queue.put, [('step',)])
+        timer.start()
+
+        start = time.monotonic()
+        result.wait(timeout=5, predicate=steps_queue.empty)
+        elapsed = time.monotonic() - start
+        timer.join()
+
+        assert not steps_queue.empty()
+        assert elapsed < 0.5
+
+        steps_queue.get()
+        threading.Timer(0.1, result.set, ['PASS']).start()
+        assert result.get(timeout=5, predicate=steps_queue.empty) == 'PASS'
+
+    def test_btp_send_wait_rsp_pipelined(self):
+        """Check that pipelined BTP responses are matched in FIFO order and
+        that no command is sent after a failure, the commands in flight are
+        drained before it is reported."""
+
+        cli, iut = socket.socketpair()
+        max_in_flight = []
+        failing_op = defs.BTP_CORE_CMD_UNREGISTER_SERVICE
+        iut_thread = threading.Thread(target=echo_iut,
+                                      args=(iut, [failing_op], max_in_flight),
+                                      daemon=True)
+        iut_thread.start()
+
+        worker = BTPWorker(LoopbackSocket(cli, tempfile.mkdtemp()))
+        worker.accept()
+
+        ok = (defs.BTP_SERVICE_ID_CORE, defs.BTP_CORE_CMD_READ_SUPPORTED_COMMANDS,
+              defs.BTP_INDEX_NONE, b'')
+        fail = (defs.BTP_SERVICE_ID_CORE, failing_op, defs.BTP_INDEX_NONE, b'\x01')
+
+        try:
+            assert worker.send_wait_rsp_pipelined([ok] * 5, window=2) == [(b'',)] * 5
+            assert max(max_in_flight) <= 2
+
+            with self.assertRaises(BTPPipelineError) as cm:
+                worker.send_wait_rsp_pipelined([ok, fail, ok, ok, ok], window=2)
+            assert [i for i, _, _ in cm.exception.errors] == [1]
+            assert cm.exception.sent == 3
+            assert cm.exception.responses == [(b'',), None, (b'',), None, None]
+
+            # Nothing is left in the RX queue after a failed pipeline
+            assert worker.send_wait_rsp(*ok) == (b'',)
+        finally:
+            worker.close()
+            iut.close()
+
+    @unittest.skipIf(sys.platform == 'win32', 'requires unix domain socket')
+    def test_async_btp_worker(self):
+        """Check the synchronous adapter of the asyncio BTP transport and
+        event subscriptions."""
+
+        log_dir = tempfile.mkdtemp()
+        address = os.path.join(log_dir, 'btp')
+        worker = AsyncBTPWorker(AsyncBTPSocketSrv(log_dir))
+        worker.open(address)
+
+        iut = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+        iut.connect(address)
+        iut_thread = threading.Thread(target=echo_iut, args=(iut, [], []), daemon=True)
+        iut_thread.start()
+        worker.accept()
+
+        ev_op = 0x80
+        subscription = worker.conn.subscribe(defs.BTP_SERVICE_ID_CORE, ev_op)
+
+        try:
+            assert worker.send_wait_rsp(defs.BTP_SERVICE_ID_CORE,
+                                        defs.BTP_CORE_CMD_READ_SUPPORTED_COMMANDS,
+                                        defs.BTP_INDEX_NONE, b'') == (b'',)
+
+            iut.sendall(bytes([defs.BTP_SERVICE_ID_CORE, ev_op,
+                               defs.BTP_INDEX_NONE, 1, 0, 0xaa]))
+            tuple_hdr, tuple_data = worker._loop.run(subscription.get(timeout=5))
+            assert tuple_hdr.op == ev_op
+            assert tuple_data == (b'\xaa',)
+
+            # Events without subscribers end up on the RX queue
+            subscription.close()
+            iut.sendall(bytes([defs.BTP_SERVICE_ID_CORE, ev_op,
+                               defs.BTP_INDEX_NONE, 0, 0]))
+            assert worker.read(timeout=5)[0].op == ev_op
+
+            # unless handled by the registered event handler
+            events = []
+            worker.register_event_handler(lambda hdr, data: events.append(hdr.op) or True)
+            iut.sendall(bytes([defs.BTP_SERVICE_ID_CORE, ev_op + 1,
+                               defs.BTP_INDEX_NONE, 0, 0]))
+            assert wait_for_event(5, lambda: events) and events == [ev_op + 1]
+            self.assertRaises(socket.timeout, worker.read, timeout=0.2)
+        finally:
+            worker.close()
+            iut.close()
+
+    def test_zephyr_btp_session(self):
+        """Check the BTP session of the Zephyr IUT is kept between test
+        cases and closed after an IUT reset failure and at the end."""
+        iuts = []
+
+        class LoopbackSerial(LoopbackSocket):
+            def __init__(self, log_dir):
+                conn, iut = socket.socketpair()
+                iuts.append(iut)
+                super().__init__(conn, log_dir)
+
+            def open(self, port, baudrate):
+                self.addr = port
+
+        class StubBoard:
+            def __init__(self, name, iutctl):
+                self.ready = True
+                self.resets = 0
+
+            def reset(self):
+                self.resets += 1
+                if self.ready:
+                    ready_events.append((defs.BTP_CORE_EV_IUT_READY, ()))
+
+        ready_events = []
+        core = Namespace(event_queues={defs.BTP_CORE_EV_IUT_READY: ready_events},
+                         wait_iut_ready_ev=lambda timeout, remove=True:
+                         ready_events.pop(0) if ready_events else None)
+        test_case = Namespace(log_dir=tempfile.mkdtemp(), name='TEST/1',
+                              timed=lambda phase: contextlib.nullcontext())
+        args = Namespace(pylink_reset=False, device_core='NRF52840_XXAA', debugger_snr='1',
+                         kernel_image=None, tty_file='/dev/ttyACM0', hci=None, gdb=False,
+                         btp_session=True, board_name='nrf52', rtt_log=False, btmon=False)
+
+        with patch.object(zephyr_iutctl, 'BTPSerial', LoopbackSerial), \
+                patch.object(zephyr_iutctl, 'Board', StubBoard), \
+                patch.object(zephyr_iutctl, 'get_stack', return_value=Namespace(core=core)), \
+                patch('autopts.utils.GLOBAL_END', False):
+            iutctl = zephyr_iutctl.ZephyrCtl(args)
+            assert iutctl.btp_session
+
+            iutctl.start(test_case)
+            worker = iutctl.btp_socket
+            # A response left unread by the test case
+            iuts[0].sendall(bytes([defs.BTP_SERVICE_ID_CORE, 1, defs.BTP_INDEX_NONE, 0, 0]))
+            assert wait_for_event(5, lambda: not worker._rx_queue.empty())
+
+            iutctl.stop()
+            assert iutctl.board.resets == 1 and iutctl.btp_socket is worker
+            iutctl.start(test_case)
+            assert iutctl.btp_socket is worker and worker._rx_queue.empty()
+            assert len(iuts) == 1
+
+            # No IUT ready event after the reset
+            iutctl.board.ready = False
+            iutctl.stop()
+            assert iutctl.btp_socket is None and worker._socket.conn is None
+
+            iutctl.board.ready = True
+            iutctl.start(test_case)
+            assert iutctl.btp_socket is not worker and len(iuts) == 2
+
+            with patch('autopts.utils.GLOBAL_END', True):
+                iutctl.stop()
+            assert iutctl.btp_socket is None and iutctl.board.resets == 2
+
+        for iut in iuts:
+            iut.close()
+        shutil.rmtree(test_case.log_dir)
+
+    @unittest.skipIf(sys.platform == 'win32', 'requires pty')
+    def test_btp_serial(self):
+        """Check BTP over a serial port against a pty pair: stale data is
+        flushed and a frame split by a read timeout is not lost."""
+        import pty
+        import tty
+
+        master, slave = pty.openpty()
+        tty.setraw(master)
+        tty.setraw(slave)
+
+        btp_serial = BTPSerial(tempfile.mkdtemp())
+        btp_serial.open(os.ttyname(slave))
+        worker = BTPWorker(btp_serial)
+        worker.accept()
+
+        try:
+            os.write(master, b'\x00\x81\xff')
+            time.sleep(0.1)
+            btp_serial.flush()
+
+            rsp = bytes([defs.BTP_SERVICE_ID_CORE, defs.BTP_CORE_CMD_READ_SUPPORTED_COMMANDS,
+                         defs.BTP_INDEX_NONE, 2, 0, 0xaa, 0xbb])
+            os.write(master, rsp[:6])
+            time.sleep(1.5)
+            os.write(master, rsp[6:])
+
+            tuple_hdr, tuple_data = worker.read(timeout=5)
+            assert tuple_hdr.op == defs.BTP_CORE_CMD_READ_SUPPORTED_COMMANDS
+            assert tuple_data == (b'\xaa\xbb',)
+            # The port is not reconfigured by the reads
+            assert btp_serial.conn.timeout == SERIAL_READ_TIMEOUT
+
+            worker.send(defs.BTP_SERVICE_ID_CORE,
+                        defs.BTP_CORE_CMD_READ_SUPPORTED_COMMANDS,
+                        defs.BTP_INDEX_NONE, b'')
+            assert os.read(master, HDR_LEN) == bytes([
+                defs.BTP_SERVICE_ID_CORE, defs.BTP_CORE_CMD_READ_SUPPORTED_COMMANDS,
+                defs.BTP_INDEX_NONE, 0, 0])
+        finally:
+            worker.close()
+            os.close(master)
+            os.close(slave)
+
+    def test_btp_codec(self):
+        """Check round trip of a schema and decoding of lists and nested
+        records in one pass, including length errors."""
+        attr = codec.Schema('Attr',
+                            ('hdl', 'H'),
+                            ('_uuid_len', 'B'),
+                            ('uuid', codec.Bytes('_uuid_len', codec.btp_uuid)))
+        rsp = codec.Schema('Rsp',
+                           ('_count', 'B'),
+                           ('attrs', codec.List(attr, '_count')),
+                           exact=True)
+
+        data = attr.encode(0x0102, None, b'\x00\x28')
+        assert data == b'\x02\x01\x02\x00\x28'
+        assert attr.decode(data) == (0x0102, '2800')
+
+        uuid128 = bytes(range(16))
+        data = b'\x02' + data + attr.encode(3, None, uuid128)
+        decoded = rsp.decode(memoryview(data))
+        assert decoded.attrs[0] == (0x0102, '2800')
+        assert decoded.attrs[1] == (3, uuid128[::-1].hex().upper())
+        assert decoded._asdict() == {'attrs': decoded.attrs}
+
+        for invalid in (data[:-1], data + b'\x00', b'\x01\x01\x00\x02\x00'):
+            with self.assertRaises(BTPError):
+                rsp.decode(invalid)
+
+        # A struct format is one value per field
+        with self.assertRaises(TypeError):
+            codec.Schema('Invalid', ('hdl', 'H'), ('x', '3B'))
+
+    def test_btp_capture(self):
+        """Check the frames captured by the writer thread are rendered
+        in the autopts-iutctl.log text format."""
+        log_dir = tempfile.mkdtemp()
+        sock = LoopbackSocket(None, log_dir)
+        sock.encode_frame(defs.BTP_SERVICE_ID_CORE,
+                          defs.BTP_CORE_CMD_READ_SUPPORTED_COMMANDS,
+                          defs.BTP_INDEX_NONE, b'')
+        hdr = bytes([defs.BTP_SERVICE_ID_GAP, 0, 0, 1, 0])
+        sock.log_rx_frame(hdr, dec_hdr(hdr), b'\x02')
+        sock.capture.close()
+
+        records = list(read_capture(os.path.join(log_dir, CAPTURE_FILENAME)))
+        assert [r[1:] for r in records] == [
+            (CAPTURE_TX, b'\x00\x01\xff\x00\x00'),
+            (CAPTURE_RX, hdr + b'\x02')]
+
+        lines = [format_record(*r).split('\t', 1)[1] for r in records]
+        assert lines[0] == '> BTP_CORE_CMD_READ_SUPPORTED_COMMANDS (0x00|0x01|0xff)\n' \
+                           f'{" " * 18}raw data (0): 00 01 ff 00 00|'
+        assert lines[1] == '<- Response:  BTP_ERROR (0x01|0x00|0x00)\n' \
+                           f'{" " * 18}raw data (1): 01 00 00 01 00 02 Unknown Command'
+
+        # The capture is closed with the transport
+        cli = BTPSocketCli(log_dir)
+        capture_thread = cli.capture._thread
+        cli.close()
+        assert cli.capture is None and not capture_thread.is_alive()
+
+    def test_stack_wait_notified(self):
+        """Check the stack waits are woken up by events instead of
+        polling and still time out."""
+        queue = [(1, 'a')]
+        prop = Property(None)
+
+        def producer():
+            time.sleep(0.2)
+            queue.append((2, 'b'))
+            notify_event()
+            time.sleep(0.2)
+            prop.data = 'set'
+
+        thread = threading.Thread(target=producer)
+        start = time.monotonic()
+        thread.start()
+
+        ev = wait_for_queue_event(queue, lambda i, _: i == 2, 5, True)
+        assert ev == (2, 'b') and queue == [(1, 'a')]
+        assert wait_for_event(5, lambda: prop.data) == 'set'
+        assert time.monotonic() - start < 1
+        thread.join()
+
+        start = time.monotonic()
+        assert wait_for_queue_event(queue, lambda i, _: i == 3, 0.3, True) is None
+        assert wait_for_event(0.3, lambda: None) is False
+        assert 0.6 <= time.monotonic() - start < 1.5
+
+    def test_event_queue(self):
+        """Check indexed lookup and removal, capacity limits and the list
+        behaviour relied on by the WID handlers."""
+        events = EventQueue((0, 1), maxlen=3)
+        for ev in [(0, 'a', 1), (0, 'b', 2), (0, 'a', 3), (1, 'a', 4)]:
+            events.append(ev)
+
+        assert events.evicted == 1 and len(events) == 3
+        assert events[0] == (0, 'b', 2) and list(events)[-1] == (1, 'a', 4)
+        assert events.lookup(0, 'a') == [(0, 'a', 3)]
+
+        ev = wait_for_queue_event(events, lambda *ev: ev[2] == 4, 1, True, key=(1, 'a'))
+        assert ev == (1, 'a', 4) and events == [(0, 'b', 2), (0, 'a', 3)]
+        assert wait_for_queue_event(events, lambda *_: True, 1, False,
+                                    key=(WildCard(), 'a')) == (0, 'b', 2)
+
+        dicts = EventQueue(('broadcast_id',), maxlen=1, evict=False)
+        dicts.append({'broadcast_id': 1})
+        dicts.append({'broadcast_id': 2})
+        assert dicts.dropped == 1 and dicts.lookup(2) == []
+        dicts.remove({'broadcast_id': 1})
+        assert dicts == [] and not dicts
+
+    def test_bap_scan_event_queues(self):
+        """Check the events repeated while scanning are bounded in the BAP
+        layer, the announcements of the oldest advertisers are evicted."""
+        btp_bap = importlib.import_module('autopts.pybtp.btp.bap')
+        bap = BAP()
+        queue = bap.event_queues[defs.BTP_BAP_EV_BAA_FOUND]
+
+        for i in range(BAP_SCAN_EVENTS_MAXLEN + 2):
+            data = btp_bap.BAP_BAA_FOUND_EV.pack(0, bytes([i, 0, 0, 0, 0, 0]),
+                                                 b'\x01\x02\x03', 0, 8)
+            btp_bap.bap_ev_baa_found_(bap, data, len(data))
+
+        assert len(queue) == BAP_SCAN_EVENTS_MAXLEN
+        assert queue.evicted == 2 and queue.dropped == 0
+        assert bap.wait_baa_found_ev(0, '000000000000', 0.1) is None
+        ev = bap.wait_baa_found_ev(0, f'0000000000{BAP_SCAN_EVENTS_MAXLEN + 1:02x}', 0.1)
+        assert ev['broadcast_id'] == 0x030201
+        assert len(queue) == BAP_SCAN_EVENTS_MAXLEN - 1
+
+        for ev_type in [defs.BTP_BAP_EV_BIS_FOUND, defs.BTP_BAP_EV_SCAN_DELEGATOR_FOUND,
+                        defs.BTP_BAP_EV_BROADCAST_RECEIVE_STATE, defs.BTP_BAP_EV_PA_SYNC_REQ]:
+            assert bap.event_queues[ev_type].maxlen == BAP_SCAN_EVENTS_MAXLEN
+
+    def test_stream_sink(self):
+        """Check stream data events are aggregated per stream and each
+        consuming wait takes one event."""
+        sink = StreamSink(('broadcast_id', 'bis_id'), 'data', recent=2)
+        for i in range(1000):
+            sink.append({'broadcast_id': 1, 'bis_id': 1, 'data': bytes([i % 256] * 40)})
+        sink.append({'broadcast_id': 1, 'bis_id': 2, 'data': b'\x01'})
+
+        stream = sink.get(1, 1)
+        assert len(sink) == 1001 and len(stream.recent) == 2
+        assert stream.count == 1000 and stream.octets == 40000
+        assert stream.first_seen <= stream.last_seen
+
+        ev = wait_for_stream_event(sink, (1, 2), 1, True)
+        assert ev == {'broadcast_id': 1, 'bis_id': 2, 'data': b'\x01'}
+        assert wait_for_stream_event(sink, (1, 2), 0.2, False) is None
+        assert wait_for_stream_event(sink, (WildCard(), 1), 1, False)['data'][0] == 999 % 256
+        assert wait_for_stream_event(sink, (2, 1), 0.2, True) is None
+
+    def test_iso_data_pump(self):
+        """Check the pump backs off while the IUT buffer is full and counts
+        only the accepted SDUs."""
+        bap = importlib.import_module('autopts.pybtp.btp.bap')
+        sdu = bytes(range(40))
+        # Full buffer, partially buffered SDU and an error in between
+        responses = [40, 40, 0, 10, BTPError('Buffer full'), 40, 40]
+
+        class FakeSocket:
+            def send_wait_rsp(self, svc_id, op, ctrl_index, data):
+                assert (svc_id, op) == (defs.BTP_SERVICE_ID_BAP, defs.BTP_BAP_CMD_SEND)
+                assert data.endswith(bytes([1, len(sdu)]) + sdu)
+                rsp = responses.pop(0)
+                if isinstance(rsp, Exception):
+                    raise rsp
+                return rsp.to_bytes(4, 'little'),
+
+        iut = type('FakeIut', (), {'btp_socket': FakeSocket()})()
+        with patch.object(bap, 'get_iut', return_value=iut):
+            pump = bap.IsoDataPump(1, sdu, sdus=4, interval=0.01).start().join(5)
+
+        assert not responses
+        assert (pump.sent, pump.rejected, pump.octets) == (4, 3, 170)
+        assert pump.elapsed >= 0.03 and pump.throughput > 0
+
+    def test_l2cap_bulk_data(self):
+        """Check the channel ring buffers wrap and drop the oldest SDUs, and
+        bulk data is segmented to the peer MTU."""
+        ring = L2capData(size=10)
+        for sdu in (b'abcd', b'efgh', b'ijklmn', b'op'):
+            ring.append(sdu)
+        assert ring.get() == [b'ijklmn', b'op'] and ring.dropped == 2
+        assert (ring.sdus, ring.octets) == (4, 16)
+        ring.clear()
+        assert ring.get() == [] and ring.octets == 16
+
+        l2cap_btp = importlib.import_module('autopts.pybtp.btp.l2cap')
+        l2cap = L2cap(psm=0x80, initial_mtu=100)
+        l2cap.connected(0, 0x80, 10, 10, 100, 100, 0, b'')
+        sent = []
+
+        class FakeSocket:
+            def send_wait_rsp_pipelined(self, frames):
+                sent.extend(frames)
+                return [b''] * len(frames)
+
+        iut = type('FakeIut', (), {'btp_socket': FakeSocket()})()
+        stack = type('FakeStack', (), {'l2cap': l2cap})()
+        with patch.object(l2cap_btp, 'get_iut', return_value=iut), \
+                patch.object(l2cap_btp, 'get_stack', return_value=stack):
+            assert l2cap_btp.l2cap_send(0, memoryview(bytes(range(25)))) == 3
+
+        assert [frame[3][1:3] for frame in sent] == [b'\x0a\x00', b'\x0a\x00', b'\x05\x00']
+        assert b''.join(l2cap.tx_data_get(0)) == bytes(range(25))
+
+    def test_discovery_store(self):
+        """Check repeated advertising reports are merged per device and
+        the store is bounded."""
+        found = DiscoveryStore(max_devices=2, max_reports=2)
+        adv = bytes([3, AdType.uuid16_svc_data, 0x0a, 0x0b])
+        found.add(0, b'000000000002', 0xc0, 0, adv)
+        for _ in range(100):
+            found.add(0, b'000000000001', 0xc0, 0, adv)
+        found.add(0, b'000000000001', 0xc5, 0, b'')
+        found.add(0, b'000000000003', 0xc0, 0, adv)
+
+        assert len(found) == 2 and found.evicted == 1
+        assert found.get(0, b'000000000002') is None
+
+        device = found.get(0, b'000000000001')
+        assert device.count == 101 and device.rssi == 0xc5 and device.eir == b''
+        assert device.reports[adv].count == 100
+        assert device.reports[adv].ad == {AdType.uuid16_svc_data: b'\x0a\x0b'}
+        assert device.reports[adv].hex == '03160A0B'
+
+        # Reports matched against the advertised service UUIDs
+        gap = importlib.import_module('autopts.pybtp.btp.gap')
+        found.clear()
+        found.add(0, b'000000000001', 0xc0, 0, bytes([5, AdType.uuid16_some, 0x4e, 0x18, 0x50, 0x18]))
+        stack = Namespace(gap=Namespace(found_devices=found))
+        with patch.object(gap, 'get_stack', return_value=stack):
+            assert gap.check_discov_results(0, '00:00:00:00:00:01', uuids=['184E', '1850'])
+            assert gap.check_discov_results(0, '00:00:00:00:00:01', uuids=['184E', '184F'],
+                                            discovered=False)
+            assert gap.check_discov_results(0, '00:00:00:00:00:04', uuids=['184E'],
+                                            discovered=False)
+
+
+    def test_btp_event_dispatch(self):
+        """Check events are dispatched from the registered handlers and
+        counted per opcode."""
+        # The btp package exports its own name over the btp module
+        btp = importlib.import_module('autopts.pybtp.btp.btp')
+
+        received = []
+        layer = object()
+        stack = type('FakeStack', (), {'gap': layer, 'mesh': None})()
+        hdr = dec_hdr(bytes([0xfe, 0x80, 0, 1, 0]))
+
+        with patch.dict(btp.EVENT_HANDLERS), patch.dict(btp.EVENT_STATS), \
+                patch.object(btp, 'get_stack', return_value=stack):
+            btp.register_event_handlers(0xfe, 'gap', {
+                0x80: lambda obj, data, data_len: received.append((obj, data, data_len)),
+            })
+            btp.register_event_handlers(0xfe, 'mesh', {0x81: lambda *args: None})
+
+            assert btp.event_handler(hdr, (b'\x01',))
+            assert btp.event_handler(hdr, (b'\x02',))
+            assert not btp.event_handler(hdr._replace(op=0x81), (b'',))
+            assert not btp.event_handler(hdr._replace(op=0x82), (b'',))
+
+            assert received == [(layer, b'\x01', 1), (layer, b'\x02', 1)]
+            stats = btp.get_event_stats()
+            assert list(stats) == [(0xfe, 0x80)] and stats[(0xfe, 0x80)][0] == 2
+
+            btp.reset_event_stats()
+            assert btp.get_event_stats() == {}
+
+            # Counted per run of test cases and logged at its end
+            btp.event_handler(hdr, (b'\x03',))
+
+            def stub_run_test_case(ptses, _instances, test_case, stats, *_):
+                btp.event_handler(hdr, (b'\x04',))
+                stats.update(test_case, 1, 'PASS')
+                return 'PASS', 1
+
+            log_dir = tempfile.mkdtemp()
+            args = Namespace(test_cases=['T/1'], retry=0, retry_config=None, recovery=False,
+                             not_recover=[], stress_test=False, superguard=0, cli_port=[65000])
+            stats = TestCaseRunStats(['T'], ['T/1'], 0,
+                                     xml_results_file=os.path.join(log_dir, 'r.xml'))
+            stats.session_log_dir = log_dir
+
+            with patch('autopts.utils.GLOBAL_END', False), \
+                    patch('autopts.client.run_test_case', stub_run_test_case), \
+                    patch('autopts.client.log') as log:
+                run_test_cases([], [], args, stats)
+
+            log.assert_any_call(ANY, [((0xfe, 0x80), (1, ANY))])
+            shutil.rmtree(log_dir)
+
+
+    def test_lazy_profile_loading(self):
+        """Check profile modules are imported on first access and BTP
+        event handlers are registered with the first event of a service."""
+        code = ("import sys, importlib\n"
+                "project = importlib.import_module('autopts.ptsprojects.zephyr')\n"
+                "loaded = lambda name: 'autopts.ptsprojects.zephyr.' + name in sys.modules\n"
+                "assert not loaded('gap') and not loaded('bap')\n"
+                "assert project.gap.test_cases and loaded('gap') and not loaded('bap')\n"
+                "assert 'autopts.wid.bap' not in sys.modules\n"
+                "assert getattr(project, 'nonexistent', None) is None\n")
+        subprocess.run([sys.executable, '-c', code], check=True,
+                       cwd=dirname(dirname(abspath(__file__))))
+
+        btp = importlib.import_module('autopts.pybtp.btp.btp')
+        hdr = dec_hdr(bytes([defs.BTP_SERVICE_ID_GAP, defs.BTP_GAP_EV_NEW_SETTINGS,
+                             0, 4, 0]))
+        stack = type('FakeStack', (), {'gap': None})()
+
+        with patch.dict(btp.EVENT_HANDLERS, clear=True), patch.dict(btp.EVENT_STATS), \
+                patch.object(btp, 'LOADED_EVENT_SERVICES', set()), \
+                patch.object(btp, 'get_stack', return_value=stack):
+            btp.event_handler(hdr, (b'\x00' * 4,))
+            assert btp.LOADED_EVENT_SERVICES == {defs.BTP_SERVICE_ID_GAP}
+            assert (defs.BTP_SERVICE_ID_GAP, defs.BTP_GAP_EV_NEW_SETTINGS) in btp.EVENT_HANDLERS
+            assert not btp.load_event_handlers(0xee)
+
+    def test_wid_dispatch_table(self):
+        """Check WID dispatch tables honour the module order and WIDs
+        received in former runs without handler are reported."""
+        wid = importlib.import_module('autopts.wid.wid')
+        profile = types.ModuleType('test_profile_wid')
+        common = types.ModuleType('test_common_wid')
+        profile.hdl_wid_1 = lambda params: 'profile'
+        common.hdl_wid_1 = lambda params: 'common'
+        common.hdl_wid_2 = lambda params: params.wid
+
+        @wid.wid_modules('test_profile_wid', 'test_common_wid')
+        def test_wid_hdl(wid_num, description, test_case_name):
+            return wid.generic_wid_hdl(wid_num, description, test_case_name,
+                                       test_wid_hdl.wid_modules)
+
+        # Handlers dispatching on their own are not called for the table
+        micp_wid_hdl = importlib.import_module('autopts.wid.micp').micp_wid_hdl
+
+        db_file = os.path.join(tempfile.mkdtemp(), 'TestCase.db')
+        db = TestCaseTable('test', db_file)
+        registry = testcase.TestCaseRegistry.from_instances(
+            [testcase.TestCaseLT1('TEST', 'TEST/1', generic_wid_hdl=test_wid_hdl),
+             testcase.TestCaseLT1('MICP', 'MICP/CL/1', generic_wid_hdl=micp_wid_hdl)])
+
+        with patch.dict(sys.modules, test_profile_wid=profile, test_common_wid=common), \
+                patch.dict(wid.WID_TABLES, clear=True):
+            assert test_wid_hdl(1, '', 'TEST/1') == 'profile'
+            assert test_wid_hdl(2, '', 'TEST/1') == 2
+            self.assertRaises(MissingWIDError, test_wid_hdl, 3, '', 'TEST/1')
+            assert len(wid.WID_TABLES) == 1
+
+            db.update_wids('TEST/1', {1, 2, 3, 4})
+            db.update_wids('MICP/CL/1', {1})
+            with patch('logging.exception') as log_exception:
+                assert check_wid_handlers(registry, ['TEST/1', 'MICP/CL/1'], db) == \
+                    {'TEST/1': [3, 4]}
+            log_exception.assert_not_called()
+
+        shutil.rmtree(os.path.dirname(db_file))
+
+    def test_adaptive_retry_policy(self):
+        """Check retries follow the run history: deterministic failures are
+        not retried, flaky test cases are retried only as needed and the
+        chronically flaky ones are run last."""
+        db_file = os.path.join(tempfile.mkdtemp(), 'TestCase.db')
+        db = TestCaseTable('test', db_file)
+        history = {'T/DET': ['FAIL'] * 5,
+                   'T/FLAKY': ['PASS'] * 8 + ['FAIL'] * 2,
+                   'T/QUAR': ['PASS'] + ['FAIL'] * 3}
+        durations = {'T/DET': 10, 'T/FLAKY': 5, 'T/QUAR': 1, 'T/NEW': 1}
+        for test_case, results in history.items():
+            for result in results:
+                db.add_run(test_case, result, durations[test_case])
+
+        ran = []
+
+        def stub_run_test_case(ptses, _instances, test_case, stats, *_):
+            ran.append(test_case)
+            status = 'PASS' if test_case in ('T/QUAR', 'T/NEW') else 'FAIL'
+            stats.update(test_case, durations[test_case], status)
+            return status, durations[test_case]
+
+        test_cases = ['T/DET', 'T/QUAR', 'T/FLAKY', 'T/NEW']
+        args = Namespace(test_cases=test_cases, retry=3, retry_config=None,
+                         recovery=False, not_recover=[], stress_test=False,
+                         superguard=0, cli_port=[65000], adaptive_retry=True)
+        stats = TestCaseRunStats(['T'], test_cases, 3, db=db,
+                                 xml_results_file=os.path.join(os.path.dirname(db_file), 'r.xml'))
+        stats.session_log_dir = FILE_PATHS['TMP_DIR']
+
+        with patch('autopts.utils.GLOBAL_END', False), \
+                patch('autopts.client.RetryPolicy.print_summary', autospec=True) as print_summary, \
+                patch('autopts.client.run_test_case', stub_run_test_case):
+            run_test_cases([], [], args, stats)
+
+        assert ran == ['T/DET', 'T/FLAKY', 'T/FLAKY', 'T/NEW', 'T/QUAR']
+        # 3 retries of T/DET and 2 of T/FLAKY skipped
+        policy = print_summary.call_args[0][0]
+        assert policy.quarantined == ['T/QUAR']
+        assert policy.skipped_retries == 5 and policy.saved_time == 40
+        assert len(db.get_history('T/DET', 100)) == 6
+        assert len(db.get_history('T/NEW', 100)) == 1
+
+        # The bot resumes a run broken at T/NEW with the test cases not
+        # completed, regardless of their order in the test case list
+        tmp_dir = os.path.dirname(db_file)
+        bot = BotClient.__new__(BotClient)
+        bot.args = Namespace(store=False)
+        bot.test_case_database = None
+        bot.backup = {'available': False, 'all_stats': None, 'tc_stats': None}
+        bot.file_paths = {name: os.path.join(tmp_dir, name) for name in
+                          ('ALL_STATS_JSON_FILE', 'TC_STATS_JSON_FILE', 'TEST_CASES_JSON_FILE')}
+        with open(bot.file_paths['TEST_CASES_JSON_FILE'], 'w') as f:
+            json.dump({'c.conf': test_cases}, f)
+
+        for name, completed in (('ALL_STATS', []), ('TC_STATS', ['T/DET', 'T/FLAKY'])):
+            backup_stats = TestCaseRunStats(['T'], test_cases, 0,
+                                            xml_results_file=os.path.join(tmp_dir, f'{name}.xml'))
+            for test_case in completed:
+                backup_stats.update(test_case, 1, 'FAIL')
+            backup_stats.pending_config = 'c.conf'
+            backup_stats.pending_test_case = 'T/NEW'
+            backup_stats.save_to_backup(bot.file_paths[f'{name}_JSON_FILE'])
+
+        bot.load_backup_of_previous_run()
+        assert bot.backup['run_order'] == ['c.conf']
+        assert bot.backup['args_per_config']['c.conf'].test_cases == ['T/QUAR']
+
+        shutil.rmtree(tmp_dir)
+
+    def test_pipelined_setup(self):
+        """Check the next test case, including the load of its profile, is
+        prepared while the current one settles down and retries are
+        prepared in place."""
+        events = []
+
+        def profile(project, names):
+            def test_cases():
+                events.append(f'load {project}')
+                instances = [testcase.TestCaseLT1(project, name) for name in names]
+                for instance in instances:
+                    # No pre_tc.py and post_tc.py scripts
+                    instance.run_pre_and_post_sp = False
+                return instances
+
+            return test_cases
+
+        registry = testcase.TestCaseRegistry()
+        registry.add_profile('A', profile('A', ['A/1', 'A/2']))
+        registry.add_profile('B', profile('B', ['B/1']))
+        test_cases = ['A/1', 'A/2', 'B/1']
+        log_dir = tempfile.mkdtemp()
+
+        def stub_run_test_case(ptses, instances, test_case, stats, *args):
+            prepared = args[3]
+            if prepared is None:
+                events.append(f'prepare {test_case}')
+                prepared = prepare_test_case(ptses, instances, test_case, args[0])
+            assert os.path.exists(prepared.test_case_lts[0].log_dir)
+            events.append(f'run {test_case}')
+            prepared.test_case_lts[0].post_run('')
+            events.append(f'end {test_case}')
+            prepared.discard()
+            status = 'FAIL' if test_case == 'A/2' else 'PASS'
+            stats.update(test_case, 0.01, status)
+            return status, 0.01
+
+        args = Namespace(test_cases=test_cases, retry=1, retry_config=None,
+                         recovery=False, not_recover=[], stress_test=False,
+                         superguard=0, cli_port=[65000], pipeline=True)
+        stats = TestCaseRunStats(['A', 'B'], test_cases, 1,
+                                 xml_results_file=os.path.join(log_dir, 'r.xml'))
+        stats.session_log_dir = log_dir
+
+        with patch('autopts.utils.GLOBAL_END', False), \
+                patch('autopts.ptsprojects.testcase.SETTLE_DOWN_TIME', 0.01), \
+                patch('autopts.client.TestCasePipeline.print_summary', autospec=True) as print_summary, \
+                patch('autopts.client.run_test_case', stub_run_test_case):
+            run_test_cases([FakeProxy()], registry, args, stats)
+
+        # Profile B is loaded while A/2 settles down, before A/2 is retried
+        assert events == ['load A', 'run A/1', 'end A/1',
+                          'run A/2', 'load B', 'end A/2',
+                          'prepare A/2', 'run A/2', 'end A/2',
+                          'run B/1', 'end B/1']
+        pipeline = print_summary.call_args[0][0]
+        assert pipeline.prepared_count == 2
+
+        shutil.rmtree(log_dir)
+
+    def test_pts_state_recovery(self):
+        """Check PTS recovery and the temporary change rollback replay
+        only the settings that differ from the desired ones."""
+        calls = []
+
+        class FakePTSCom:
+            def OpenWorkspace(self, path):
+                calls.append(('OpenWorkspace', path))
+
+            def UpdatePics(self, project, entry, value):
+                calls.append(('UpdatePics', project, entry, value))
+
+            def UpdatePixitParam(self, project, param, value):
+                calls.append(('UpdatePixitParam', project, param, value))
+
+        pts = FakePTSCom()
+        state = ptsstate.PTSState()
+        apply = {ptsstate.WORKSPACE: lambda _, __, path: pts.OpenWorkspace(path),
+                 ptsstate.PICS: pts.UpdatePics,
+                 ptsstate.PIXIT: pts.UpdatePixitParam}
+
+        def apply_state(settings):
+            for (kind, project, name), value in settings:
+                apply[kind](project, name, value)
+                state.set((kind, project, name), value)
+
+        apply_state([(ptsstate.WORKSPACE_KEY, 'zephyr.pqw6'),
+                     ((ptsstate.PICS, 'GAP', 'TSPC_gap_1_1'), True),
+                     ((ptsstate.PICS, 'GAP', 'TSPC_gap_1_1'), False),
+                     ((ptsstate.PIXIT, 'GAP', 'TSPX_iut_privacy'), 'FALSE')])
+        state.set_temp((ptsstate.PIXIT, 'GAP', 'TSPX_iut_privacy'), 'TRUE')
+        state.set_temp((ptsstate.PIXIT, 'GAP', 'TSPX_delete_link_key'), 'TRUE')
+        assert state.pending() == [((ptsstate.PIXIT, 'GAP', 'TSPX_iut_privacy'), 'FALSE')]
+
+        calls.clear()
+        apply_state(state.revert_temp())
+        assert calls == [('UpdatePixitParam', 'GAP', 'TSPX_iut_privacy', 'FALSE')]
+        assert state.pending() == []
+
+        # PTS restarted: the workspace first, the repeated PICS once
+        calls.clear()
+        state.invalidate()
+        apply_state(state.pending())
+        assert calls == [('OpenWorkspace', 'zephyr.pqw6'),
+                         ('UpdatePics', 'GAP', 'TSPC_gap_1_1', False),
+                         ('UpdatePixitParam', 'GAP', 'TSPX_iut_privacy', 'FALSE')]
+
+        # Settings of another workspace do not apply
+        state.set(ptsstate.WORKSPACE_KEY, 'mynewt.pqw6')
+        state.invalidate()
+        assert state.pending() == [(ptsstate.WORKSPACE_KEY, 'mynewt.pqw6')]
+
+    def test_phase_timing(self):
+        """Check the phases of test case runs are timed, summed over the
+        retries in the results and ranked by total time in the report."""
+        tc = testcase.TestCase('GAP', 'GAP/TEST/BV-01-C', ptsproject_name='none',
+                               cmds=[testcase.TestFunc(time.sleep, 0.02),
+                                     testcase.TestFuncCleanUp(time.sleep, 0.01)])
+        log_dir = tempfile.mkdtemp()
+        stats = TestCaseRunStats(['GAP'], [tc.name], 1,
+                                 xml_results_file=os.path.join(log_dir, 'r.xml'))
+
+        with patch('autopts.ptsprojects.testcase.get_global_end', return_value=True):
+            for _ in range(2):
+                tc.reset()
+                tc.pre_run()
+                with tc.timed('WID 104'):
+                    time.sleep(0.005)
+                tc.post_run(None)
+                stats.update(tc.name, 1, 'FAIL', phases=tc.get_phase_times())
+
+        report = stats.get_phase_report()
+        assert [phase for phase, _, _ in report] == \
+            ['pre_run: sleep', 'post_run: sleep', 'GAP WID 104']
+        assert all(count == 2 for _, _, count in report)
+        assert report[0][1] >= 0.04
+
+        stats.update_phases(tc.name, {'recovery': 1.0})
+        assert stats.get_phase_report()[0] == ('recovery', 1.0, 1)
+
+        shutil.rmtree(log_dir)
+
+    def test_deadline_scheduler(self):
+        """Check deadlines fire in order from one thread, cancelled ones do
+        not fire and timed waits do not start a thread each."""
+        scheduler = DeadlineScheduler()
+        fired = []
+        done = threading.Event()
+        scheduler.schedule(0.03, fired.append, 'late')
+        scheduler.schedule(0.01, fired.append, 'early')
+        assert scheduler.schedule(0.02, fired.append, 'cancelled').cancel()
+        scheduler.schedule(0.04, done.set)
+        assert done.wait(1)
+        assert fired == ['early', 'late']
+        stats = scheduler.stats()
+        assert stats['timers_fired'] == 3 and stats['timers_cancelled'] == 1
+        assert stats['timers_pending'] == 0
+
+        threads = threading.active_count()
+        for _ in range(200):
+            ResultWithFlag('PASS').wait(timeout=10, predicate=lambda: False)
+        self.assertRaises(TimeoutError, ResultWithFlag().wait, timeout=0.01)
+        assert threading.active_count() <= threads + 1
+
+    def test_memory_profiler(self):
+        """Check memory growth is attributed to the allocating line and
+        flagged as a leak over the threshold."""
+        log_dir = tempfile.mkdtemp()
+        timeline_file = os.path.join(log_dir, 'memory_timeline.json')
+        profiler = MemoryProfiler(2, 1.0, timeline_file)
+        leaked = []
+
+        profiler.start()
+        try:
+            for i in range(4):
+                leaked.append(bytearray(512 * 1024))
+                entry = profiler.check(f'TEST/{i}')
+                assert (entry is None) == (i % 2 == 0)
+        finally:
+            profiler.stop()
+
+        with open(timeline_file) as f:
+            timeline = json.load(f)
+
+        assert [entry['test_cases'] for entry in timeline] == [0, 2, 4]
+        assert profiler.leak and timeline[-1]['growth_mb'] >= 2
+        assert __file__ in timeline[-1]['top_growth'][0]['location']
+
+        shutil.rmtree(log_dir)
+
 
 if __name__ == '__main__':
     unittest.main()
@@ -0,0 +1,109 @@
+#!/usr/bin/env python
+
+#
+# auto-pts - The Bluetooth PTS Automation Framework
+#
+# Copyright (c) 2024, Codecoup.
+#
+# This program is free software; you can redistribute it and/or modify it
+# under the terms and conditions of the GNU General Public License,
+# version 2, as published by the Free Software Foundation.
+#
+# This program is distributed in the hope it will be useful, but WITHOUT
+# ANY WARRANTY; without even the implied warranty of MERCHANTABILITY or
+# FITNESS FOR A PARTICULAR PURPOSE.  See the GNU General Public License for
+# more details.
+#
+
+"""Multi-station test run.
+
+Shards the test cases across the stations defined in a JSON file (see
+autopts/sharding.py load_stations), starts an autoptsclient process per
+station, which takes its test cases from the shard server, and merges
+the results of the stations into one results file.
+
+Usage:
+$ python ./tools/autopts_shards.py stations.json autoptsclient-zephyr.py \
+    -c GAP/SEC/AUT/BV-11-C GATT/SR/GAC/BV-01-C --database-file TestCase.db \
+    --table zephyr_nrf52
+"""
+import argparse
+import os
+import secrets
+import subprocess
+import sys
+
+AUTOPTS_REPO = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, AUTOPTS_REPO)
+
+from autopts.client import TestCaseRunStats
+from autopts.ptsprojects.testcase_db import TestCaseTable
+from autopts.sharding import SHARD_AUTHKEY_ENV, ShardScheduler, ShardServer, get_durations, \
+    load_stations
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__,
+                                     formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('stations', help='JSON file with the station definitions')
+    parser.add_argument('client', help='autoptsclient script run by the stations')
+    parser.add_argument('-c', '--test-cases', nargs='+', required=True,
+                        help='Names of the test cases to run')
+    parser.add_argument('--database-file', default=None,
+                        help='Test case database with the durations')
+    parser.add_argument('--table', default=None,
+                        help='Table of the test case database, e.g. zephyr_nrf52')
+    parser.add_argument('--ip', default='127.0.0.1',
+                        help='Address the shard server listens on')
+    parser.add_argument('-o', '--output', default='shard_results.xml',
+                        help='Merged results XML file')
+    args = parser.parse_args()
+
+    stations = load_stations(args.stations)
+
+    db = None
+    if args.database_file and args.table:
+        db = TestCaseTable(args.table, args.database_file)
+
+    # The numbers of lower testers are reported by the stations, see
+    # RemoteShard.set_lt_counts
+    scheduler = ShardScheduler(stations, args.test_cases,
+                               get_durations(db, args.test_cases))
+    # The server may listen on a non-loopback address and unpickles the
+    # requests, the key is passed to the stations in the environment,
+    # where it is not visible in the process list
+    authkey = secrets.token_bytes(32)
+    server = ShardServer(scheduler, authkey, (args.ip, 0)).start()
+    address = '{}:{}'.format(*server.address)
+    env = dict(os.environ, **{SHARD_AUTHKEY_ENV: authkey.hex()})
+
+    processes = [subprocess.Popen([sys.executable, args.client, *station.args,
+                                   '--shard-server', address,
+                                   '--shard-station', station.name], env=env)
+                 for station in stations]
+
+    try:
+        for process in processes:
+            process.wait()
+    finally:
+        server.close()
+
+    if os.path.exists(args.output):
+        os.remove(args.output)
+
+    stats = TestCaseRunStats([], args.test_cases, 0,
+                             xml_results_file=os.path.abspath(args.output))
+    for name, results in server.results.items():
+        for test_case, status, duration, _ in results:
+            stats.update(test_case, duration, status)
+
+    if scheduler.unschedulable:
+        print('Not run, no station has enough PTS instances: ' +
+              ', '.join(scheduler.unschedulable))
+
+    print(f'Test cases stolen by idle stations: {scheduler.stolen}')
+    stats.print_summary()
+
+
+if __name__ == '__main__':
+    main()
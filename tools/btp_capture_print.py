@@ -0,0 +1,56 @@
+#!/usr/bin/env python
+
+#
+# auto-pts - The Bluetooth PTS Automation Framework
+#
+# Copyright (c) 2024, Codecoup.
+#
+# This program is free software; you can redistribute it and/or modify it
+# under the terms and conditions of the GNU General Public License,
+# version 2, as published by the Free Software Foundation.
+#
+# This program is distributed in the hope it will be useful, but WITHOUT
+# ANY WARRANTY; without even the implied warranty of MERCHANTABILITY or
+# FITNESS FOR A PARTICULAR PURPOSE.  See the GNU General Public License for
+# more details.
+#
+
+"""Pretty-printer of the BTP capture files.
+
+Renders autopts-iutctl.btpcap files from the test case log directories
+in the text format of autopts-iutctl.log.
+
+Usage:
+$ python ./tools/btp_capture_print.py logs/.../autopts-iutctl.btpcap
+$ python ./tools/btp_capture_print.py -o autopts-iutctl.log autopts-iutctl.btpcap
+"""
+import argparse
+import os
+import sys
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from autopts.pybtp.capture import format_record, read_capture
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__,
+                                     formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('captures', nargs='+',
+                        help='BTP capture files')
+    parser.add_argument('-o', '--output', default=None,
+                        help='Output text file, stdout by default')
+    args = parser.parse_args()
+
+    out = open(args.output, 'w') if args.output else sys.stdout
+    try:
+        for capture in args.captures:
+            for record in read_capture(capture):
+                out.write(format_record(*record) + '\n')
+    finally:
+        if args.output:
+            out.close()
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,159 @@
+#!/usr/bin/env python
+
+#
+# auto-pts - The Bluetooth PTS Automation Framework
+#
+# Copyright (c) 2024, Codecoup.
+#
+# This program is free software; you can redistribute it and/or modify it
+# under the terms and conditions of the GNU General Public License,
+# version 2, as published by the Free Software Foundation.
+#
+# This program is distributed in the hope it will be useful, but WITHOUT
+# ANY WARRANTY; without even the implied warranty of MERCHANTABILITY or
+# FITNESS FOR A PARTICULAR PURPOSE.  See the GNU General Public License for
+# more details.
+#
+
+"""Micro-benchmark of the BTP data decoders.
+
+Compares the current decoders, precompiled structs for fixed size data
+and codec schemas for lists, with the hand written struct decoding they
+replaced, on representative GAP, GATT, BAP and MESH data.
+
+Usage:
+$ python ./tools/btp_codec_benchmark.py -n 20000 -r 15
+"""
+import argparse
+import binascii
+import os
+import struct
+import sys
+import timeit
+from collections import namedtuple
+from uuid import UUID
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from autopts.pybtp import parser
+from autopts.pybtp.btp import bap, gap, gatt, mesh
+from autopts.pybtp.types import BTPError
+
+
+def legacy_dec_hdr(frame):
+    Header = namedtuple('Header', 'svc_id op ctrl_index data_len')
+
+    return Header._make(struct.unpack("<BBBH", frame))
+
+
+def legacy_device_found(data):
+    fmt = '<B6sBBH'
+    if len(data) < struct.calcsize(fmt):
+        raise BTPError("Invalid data length")
+
+    addr_type, addr, rssi, flags, eir_len = struct.unpack_from(fmt, data)
+    eir = data[struct.calcsize(fmt):]
+
+    if len(eir) != eir_len:
+        raise BTPError("Invalid data length")
+
+    addr = binascii.hexlify(addr[::-1]).lower()
+    return addr_type, addr, rssi, flags, eir
+
+
+def legacy_btp2uuid(uuid_len, uu):
+    if uuid_len == 2:
+        (uu,) = struct.unpack("<H", uu)
+        return format(uu, 'x').upper().rjust(4, '0')
+    return UUID(bytes=uu[::-1]).hex.upper()
+
+
+def legacy_get_attrs(data):
+    hdr = '<B'
+    hdr_len = struct.calcsize(hdr)
+    data_len = len(data)
+    (attr_count,) = struct.unpack_from(hdr, data)
+    attrs = []
+    offset = hdr_len
+    while data_len > offset:
+        attr_fmt = '<HBB'
+        attr_len = struct.calcsize(attr_fmt)
+        handle, permission, type_len = struct.unpack_from(attr_fmt, data, offset)
+        offset += attr_len
+        (type_uuid,) = struct.unpack_from('%ds' % type_len, data, offset)
+        offset += type_len
+        attrs.append((handle, permission, legacy_btp2uuid(type_len, type_uuid)))
+    return attrs
+
+
+def legacy_codec_cap_found(data):
+    fmt = '<B6sBBHBIB'
+    if len(data) < struct.calcsize(fmt):
+        raise BTPError('Invalid data length')
+
+    addr_type, addr, pac_dir, coding_format, frequencies, frame_durations, \
+        octets_per_frame, channel_counts = struct.unpack_from(fmt, data)
+    addr = binascii.hexlify(addr[::-1]).lower().decode('utf-8')
+    return (addr_type, addr, pac_dir, coding_format, frequencies,
+            frame_durations, octets_per_frame, channel_counts)
+
+
+def legacy_net_rcv(data):
+    hdr_fmt = '<BBHHB'
+    hdr_len = struct.calcsize(hdr_fmt)
+    (ttl, ctl, src, dst, payload_len) = struct.unpack_from(hdr_fmt, data, 0)
+    (payload,) = struct.unpack_from('<%ds' % payload_len, data, hdr_len)
+    return ttl, ctl, src, dst, binascii.hexlify(payload)
+
+
+HDR = struct.pack('<BBBH', 1, 0x80, 0, 16)
+DEVICE_FOUND = struct.pack('<B6sBBH', 0, bytes(range(6)), 0xc4, 6, 31) + bytes(31)
+GET_ATTRS = bytes([8]) + b''.join(
+    struct.pack('<HBB', hdl, 0, 2) + struct.pack('<H', 0x2800 + hdl)
+    for hdl in range(8))
+CODEC_CAP = struct.pack('<B6sBBHBIB', 0, bytes(6), 1, 6, 0xff, 3, 0x780028, 1)
+NET_RCV = struct.pack('<BBHHB', 5, 0, 1, 2, 16) + bytes(16)
+
+CASES = [
+    ('parser.dec_hdr', lambda: legacy_dec_hdr(HDR), lambda: parser.dec_hdr(HDR)),
+    ('gap device found', lambda: legacy_device_found(DEVICE_FOUND),
+     lambda: gap.gap_dec_device_found_ev_data(DEVICE_FOUND)),
+    ('gatt get attrs (8)', lambda: legacy_get_attrs(GET_ATTRS),
+     lambda: gatt.GATTS_GET_ATTRS_RP.decode(GET_ATTRS)),
+    ('bap codec cap found', lambda: legacy_codec_cap_found(CODEC_CAP),
+     lambda: bap.bap_dec_codec_cap_found_ev_data(CODEC_CAP)),
+    ('mesh net recv', lambda: legacy_net_rcv(NET_RCV),
+     lambda: mesh.mesh_dec_net_rcv_ev_data(NET_RCV)),
+]
+
+
+def run(count, repeat):
+    print(f"{'Decoder':<22}{'legacy (us)':>12}{'codec (us)':>12}{'speedup':>9}")
+    for name, legacy, new in CASES:
+        # Interleave the measurements, so both see the same machine load
+        legacy_times = []
+        new_times = []
+        for _ in range(repeat):
+            legacy_times.append(timeit.timeit(legacy, number=count))
+            new_times.append(timeit.timeit(new, number=count))
+
+        legacy_time = min(legacy_times) / count
+        new_time = min(new_times) / count
+        print(f"{name:<22}{legacy_time * 1e6:>12.2f}{new_time * 1e6:>12.2f}"
+              f"{legacy_time / new_time:>8.2f}x")
+
+
+def main():
+    parser_ = argparse.ArgumentParser(description=__doc__,
+                                      formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser_.add_argument('-n', '--count', type=int, default=100000,
+                         help='Number of decodes per measurement')
+    parser_.add_argument('-r', '--repeat', type=int, default=7,
+                         help='Number of measurements, the best is reported')
+    args = parser_.parse_args()
+
+    run(args.count, args.repeat)
+
+
+if __name__ == '__main__':
+    main()
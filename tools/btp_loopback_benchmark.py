@@ -0,0 +1,139 @@
+#!/usr/bin/env python
+
+#
+# auto-pts - The Bluetooth PTS Automation Framework
+#
+# Copyright (c) 2024, Codecoup.
+#
+# This program is free software; you can redistribute it and/or modify it
+# under the terms and conditions of the GNU General Public License,
+# version 2, as published by the Free Software Foundation.
+#
+# This program is distributed in the hope it will be useful, but WITHOUT
+# ANY WARRANTY; without even the implied warranty of MERCHANTABILITY or
+# FITNESS FOR A PARTICULAR PURPOSE.  See the GNU General Public License for
+# more details.
+#
+
+"""Benchmark of the BTP receive path over a loopback socket pair.
+
+Sends BTP commands with BTPWorker.send_wait_rsp to an echo IUT running
+in a thread and reports the CPU time of the process and the round-trip
+latency of the request/response pairs.
+
+Usage:
+$ python ./tools/btp_loopback_benchmark.py -n 10000
+"""
+import argparse
+import os
+import socket
+import statistics
+import sys
+import tempfile
+import threading
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from autopts.pybtp import defs
+from autopts.pybtp.iutctl_common import BTPSocket, BTPWorker
+from autopts.pybtp.parser import HDR_LEN, dec_hdr
+
+
+class LoopbackSocket(BTPSocket):
+    """BTPSocket connected to one end of a socket pair"""
+
+    def __init__(self, conn, log_dir):
+        super().__init__(log_dir)
+        self._pending_conn = conn
+
+    def open(self, address=None):
+        pass
+
+    def accept(self, timeout=10.0):
+        self.conn = self._pending_conn
+
+    def close(self):
+        super().close()
+        self.conn.close()
+        self.conn = None
+
+
+def recv_exact(conn, length):
+    buf = bytearray()
+    while len(buf) < length:
+        chunk = conn.recv(length - len(buf))
+        if not chunk:
+            return None
+        buf += chunk
+    return bytes(buf)
+
+
+def echo_iut(conn):
+    """Respond to each command with an empty response of the same opcode"""
+    while True:
+        hdr = recv_exact(conn, HDR_LEN)
+        if hdr is None:
+            break
+
+        tuple_hdr = dec_hdr(hdr)
+        if tuple_hdr.data_len and recv_exact(conn, tuple_hdr.data_len) is None:
+            break
+
+        conn.sendall(hdr[:3] + b'\x00\x00')
+
+
+def run(count, data_len):
+    cli, iut = socket.socketpair()
+    iut_thread = threading.Thread(target=echo_iut, args=(iut,), daemon=True)
+    iut_thread.start()
+
+    log_dir = tempfile.mkdtemp()
+    worker = BTPWorker(LoopbackSocket(cli, log_dir))
+    worker.accept()
+
+    data = bytes(data_len)
+    latencies = []
+    threads_before = threading.active_count()
+    cpu_start = time.process_time()
+    wall_start = time.perf_counter()
+
+    try:
+        for _ in range(count):
+            start = time.perf_counter()
+            worker.send_wait_rsp(defs.BTP_SERVICE_ID_CORE,
+                                 defs.BTP_CORE_CMD_READ_SUPPORTED_COMMANDS,
+                                 defs.BTP_INDEX_NONE, data)
+            latencies.append(time.perf_counter() - start)
+    finally:
+        wall = time.perf_counter() - wall_start
+        cpu = time.process_time() - cpu_start
+        threads_after = threading.active_count()
+        worker.close()
+        iut.close()
+
+    latencies.sort()
+    print(f"Round trips:      {count}")
+    print(f"Wall time:        {wall:.3f} s")
+    print(f"CPU time:         {cpu:.3f} s ({cpu / wall * 100:.1f}% of wall time)")
+    print(f"Latency mean:     {statistics.mean(latencies) * 1e6:.1f} us")
+    print(f"Latency p50:      {latencies[len(latencies) // 2] * 1e6:.1f} us")
+    print(f"Latency p99:      {latencies[int(len(latencies) * 0.99)] * 1e6:.1f} us")
+    print(f"Latency max:      {latencies[-1] * 1e6:.1f} us")
+    print(f"Threads (before/after): {threads_before}/{threads_after}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__,
+                                     formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('-n', '--count', type=int, default=10000,
+                        help='Number of request/response pairs')
+    parser.add_argument('-l', '--data-len', type=int, default=0,
+                        help='Length of command data in bytes')
+    args = parser.parse_args()
+
+    run(args.count, args.data_len)
+
+
+if __name__ == '__main__':
+    main()
@@ -26,8 +26,8 @@ import readline
 import binascii
 import argparse
 import threading
+import shutil
 import subprocess
-from distutils.spawn import find_executable
 
 from autopts.pybtp import btp
 from autopts.pybtp import defs
@@ -253,7 +253,7 @@ class StartZephyrCmd(Cmd):
             print("QEMU kernel image %s not found!" % repr(kernel_image))
             return
 
-        if not find_executable('xterm'):
+        if not shutil.which('xterm'):
             print("xterm is needed but not found!")
             return
 
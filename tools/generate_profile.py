@@ -299,7 +299,7 @@ Events:
 }
 
 changes_to_prepend = {
-    f'{project_path}/__init__.py': {1: f"import autopts.ptsprojects.{basename(project_path)}.{profile_name_lower}\n"},
+    f'{project_path}/__init__.py': {1: f"    '{profile_name_lower}',\n"},
     f'{AUTOPTS_REPO}/autopts/pybtp/defs.py': {
         1: f"BTP_SERVICE_ID_{profile_name_upper} = {profile_id}\n",
         2: f"BTP_{profile_name_upper}_CMD_READ_SUPPORTED_COMMANDS = 0x01\nBTP_{profile_name_upper}_EV_DUMMY_COMPLETED = 0x80\n\n",
@@ -310,15 +310,15 @@ changes_to_prepend = {
         3: f"    def {profile_name_lower}_init(self):\n        self.{profile_name_lower} = {profile_name_upper}()\n\n",
         4: f"        if self.{profile_name_lower}:\n            self.{profile_name_lower}_init()\n\n",
     },
-    f'{AUTOPTS_REPO}/autopts/wid/__init__.py': {1: f"from .{profile_name_lower} import {profile_name_lower}_wid_hdl\n"},
+    f'{AUTOPTS_REPO}/autopts/wid/__init__.py': {1: f"    '{profile_name_lower}_wid_hdl': '{profile_name_lower}',\n"},
     f'{AUTOPTS_REPO}/autopts/pybtp/btp/btp.py': {
         1: f"""def core_reg_svc_{profile_name_lower}():
     core_reg_svc_univ("{profile_name_lower}_reg", "{profile_name_upper}")
 
 
 """,
-        2: f"from .{profile_name_lower} import {profile_name_upper}_EV\n",
-        3: f"        defs.BTP_SERVICE_ID_{profile_name_upper}: ({profile_name_upper}_EV, stack.{profile_name_lower}),\n",
+        3: f"    defs.BTP_SERVICE_ID_{profile_name_upper}: ('{profile_name_lower}', '{profile_name_upper}_EV', "
+           f"'{profile_name_lower}'),\n",
     },
     f'{AUTOPTS_REPO}/autopts/pybtp/btp/__init__.py': {1: f"from autopts.pybtp.btp.{profile_name_lower} import *\n"},
     f'{AUTOPTS_REPO}/doc/overview.txt': {1: f" {profile_id} {profile_name_upper} Service\n"},
@@ -0,0 +1,107 @@
+#!/usr/bin/env python
+
+#
+# auto-pts - The Bluetooth PTS Automation Framework
+#
+# Copyright (c) 2024, Codecoup.
+#
+# This program is free software; you can redistribute it and/or modify it
+# under the terms and conditions of the GNU General Public License,
+# version 2, as published by the Free Software Foundation.
+#
+# This program is distributed in the hope it will be useful, but WITHOUT
+# ANY WARRANTY; without even the implied warranty of MERCHANTABILITY or
+# FITNESS FOR A PARTICULAR PURPOSE.  See the GNU General Public License for
+# more details.
+#
+
+"""Import time benchmark of the client startup.
+
+Each scenario is run several times in a fresh interpreter:
+- help: autoptsclient-<project>.py --help
+- profile: client and project imported and the test cases module of one
+  profile loaded, as at a run of the test cases of that profile only
+- all: client and project imported and all profiles loaded
+
+Usage:
+$ python ./tools/import_benchmark.py
+$ python ./tools/import_benchmark.py -p mynewt --profile L2CAP -n 10
+"""
+import argparse
+import os
+import statistics
+import subprocess
+import sys
+import time
+
+AUTOPTS_REPO = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+LOAD_SNIPPET = """
+import sys, time
+start = time.perf_counter()
+import importlib
+import autopts.client
+project = importlib.import_module('autopts.ptsprojects.{project}')
+for profile in {profiles}:
+    getattr(project, profile)
+elapsed = time.perf_counter() - start
+print(elapsed, len([m for m in sys.modules if m.startswith('autopts.')]))
+"""
+
+
+def run_help(project):
+    start = time.perf_counter()
+    subprocess.run([sys.executable, os.path.join(AUTOPTS_REPO, f'autoptsclient-{project}.py'),
+                    '--help'], cwd=AUTOPTS_REPO, check=True,
+                   stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+
+    return time.perf_counter() - start, None
+
+
+def run_load(project, profiles):
+    out = subprocess.run([sys.executable, '-c',
+                          LOAD_SNIPPET.format(project=project, profiles=profiles)],
+                         cwd=AUTOPTS_REPO, check=True, capture_output=True,
+                         text=True).stdout.split()
+
+    return float(out[0]), int(out[1])
+
+
+def benchmark(name, runs, fn, *args):
+    times = []
+    modules = None
+    for _ in range(runs):
+        elapsed, modules = fn(*args)
+        times.append(elapsed)
+
+    modules = '' if modules is None else f'{modules:8d}'
+    print(f'{name:<24} {statistics.median(times) * 1000:8.1f} '
+          f'{min(times) * 1000:8.1f} {modules}')
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__,
+                                     formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('-p', '--project', default='zephyr',
+                        help='Project, e.g. zephyr, mynewt, bluez')
+    parser.add_argument('--profile', default='GAP',
+                        help='Profile of the single profile scenario')
+    parser.add_argument('-n', '--runs', type=int, default=5,
+                        help='Runs of each scenario')
+    args = parser.parse_args()
+
+    sys.path.insert(0, AUTOPTS_REPO)
+    import importlib
+    project = importlib.import_module(f'autopts.ptsprojects.{args.project}')
+
+    print(f'{"scenario":<24} {"median":>8} {"min":>8} {"modules":>8}')
+    print(f'{"":<24} {"[ms]":>8} {"[ms]":>8} {"autopts":>8}')
+    benchmark('help', args.runs, run_help, args.project)
+    benchmark(f'profile {args.profile}', args.runs, run_load, args.project,
+              [args.profile.lower()])
+    benchmark('all profiles', args.runs, run_load, args.project,
+              list(project.PROFILES))
+
+
+if __name__ == '__main__':
+    main()